@@ -0,0 +1,217 @@
+"""
+Alignment Cache
+--------------------------------
+Cache theo nội dung cho kết quả alignment của MFA.
+Khóa cache là hash của audio + transcript đã chuẩn hóa + ngôn ngữ + phiên bản model,
+nên các request trùng lặp (retry, cùng một câu thoại, audio ví dụ) không phải chạy lại MFA.
+
+- Tầng bộ nhớ: LRU giới hạn theo số entry
+- Tầng đĩa: JSON trên đĩa, giới hạn tổng dung lượng, xóa entry ít dùng nhất khi vượt giới hạn. Thời điểm dùng
+  gần nhất được ghi tường minh vào atime bằng os.utime (không phụ thuộc noatime/relatime của mount), kể cả khi
+  hit ở tầng bộ nhớ (tối đa một lần mỗi ACCESS_TOUCH_INTERVAL giây); mtime là thời điểm lưu, dùng cho TTL
+- Cả hai tầng đều có TTL
+- get/put đọc ghi đĩa nên được gọi trong thread (asyncio.to_thread); các thao tác đều thread-safe
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Khoảng thời gian tối thiểu giữa hai lần ghi atime của cùng một entry khi hit ở tầng bộ nhớ
+ACCESS_TOUCH_INTERVAL = 60.0
+
+
+def make_cache_key(audio_hash: str, normalized_transcript: str, language: str, model_signature: str) -> str:
+    """Tạo khóa cache từ hash audio, transcript đã chuẩn hóa, ngôn ngữ và phiên bản model"""
+    digest = hashlib.sha256()
+    for part in (audio_hash, normalized_transcript, language, model_signature):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class AlignmentCache:
+    """Cache hai tầng (bộ nhớ + đĩa) cho dữ liệu alignment MFA"""
+
+    def __init__(self, cache_dir: Path, memory_entries: int = 256, disk_max_bytes: int = 512 * 1024 * 1024,
+                 ttl: float = 7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl = ttl
+
+        # key -> [thời điểm lưu, dữ liệu, lần ghi atime gần nhất]
+        self._memory: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0,
+        }
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._disk_bytes = sum(p.stat().st_size for p in self.cache_dir.glob("*/*.json"))
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Lấy alignment từ cache, trả về None nếu không có hoặc đã hết hạn"""
+        now = time.time()
+
+        path = self._disk_path(key)
+        touch_at = None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, data, touched_at = entry
+                if now - stored_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    if now - touched_at >= ACCESS_TOUCH_INTERVAL:
+                        entry[2] = now
+                        touch_at = stored_at
+                else:
+                    del self._memory[key]
+                    self.counters["expired"] += 1
+                    entry = None
+        if entry is not None:
+            if touch_at is not None:
+                # Entry đang nóng ở tầng bộ nhớ không được bị coi là ít dùng ở tầng đĩa
+                try:
+                    os.utime(path, (now, touch_at))
+                except OSError:
+                    pass
+            return data
+
+        try:
+            stat = path.stat()
+            if now - stat.st_mtime > self.ttl:
+                self._remove_disk_entry(path)
+                with self._lock:
+                    self.counters["expired"] += 1
+            else:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                # Ghi atime tường minh làm thứ tự LRU cho tầng đĩa, giữ nguyên mtime (thời điểm lưu)
+                os.utime(path, (now, stat.st_mtime))
+                with self._lock:
+                    self._remember(key, data, stat.st_mtime, now)
+                    self.counters["disk_hits"] += 1
+                return data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to read alignment cache entry {path}: {e}")
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def put(self, key: str, data: Dict[str, Any]):
+        """Lưu alignment vào cả hai tầng cache"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, data, now, now)
+
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            payload = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            old_size = path.stat().st_size if path.exists() else 0
+            # Ghi ra tệp tạm rồi đổi tên để các process khác không đọc phải tệp dở dang
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_bytes += len(payload) - old_size
+                self.counters["stores"] += 1
+                over_limit = self._disk_bytes > self.disk_max_bytes
+        except Exception as e:
+            logger.warning(f"Failed to write alignment cache entry {path}: {e}")
+            return
+
+        # Chỉ một thread dọn tầng đĩa tại một thời điểm, các thread khác không chờ
+        if over_limit and self._evict_lock.acquire(blocking=False):
+            try:
+                self._evict_disk()
+            finally:
+                self._evict_lock.release()
+
+    def clear(self):
+        """Xóa toàn bộ cache"""
+        with self._lock:
+            self._memory.clear()
+        for path in self.cache_dir.glob("*/*.json"):
+            self._remove_disk_entry(path)
+        with self._lock:
+            self._disk_bytes = 0
+
+    def _remember(self, key: str, data: Dict[str, Any], stored_at: float, touched_at: float):
+        """Thêm entry vào tầng bộ nhớ (gọi khi giữ self._lock)"""
+        self._memory[key] = [stored_at, data, touched_at]
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _remove_disk_entry(self, path: Path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+            with self._lock:
+                self._disk_bytes -= size
+        except FileNotFoundError:
+            pass
+
+    def _evict_disk(self):
+        """Xóa entry hết hạn và entry ít dùng nhất cho tới khi dưới 90% giới hạn dung lượng"""
+        now = time.time()
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            # atime: lần dùng gần nhất (ghi bằng os.utime khi hit), mtime: thời điểm lưu
+            entries.append((stat.st_atime, stat.st_mtime, stat.st_size, path))
+        with self._lock:
+            self._disk_bytes = sum(e[2] for e in entries)
+
+        target = self.disk_max_bytes * 0.9
+        for atime, mtime, size, path in sorted(entries):
+            if self._disk_bytes <= target and now - mtime <= self.ttl:
+                continue
+            self._remove_disk_entry(path)
+            with self._lock:
+                self.counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê hit/miss và dung lượng của cache"""
+        with self._lock:
+            counters = dict(self.counters)
+            memory_entries = len(self._memory)
+            disk_bytes = self._disk_bytes
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        lookups = hits + counters["misses"]
+        return {
+            **counters,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "memory_entries": memory_entries,
+            "memory_max_entries": self.memory_entries,
+            "disk_bytes": disk_bytes,
+            "disk_max_bytes": self.disk_max_bytes,
+            "ttl": self.ttl,
+        }
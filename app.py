@@ -14,35 +14,73 @@ Hướng dẫn sử dụng:
 
 import os
 import json
+import shutil
 import time
 import uuid
 import tempfile
 import subprocess
 import logging
+from contextlib import ExitStack, asynccontextmanager, nullcontext
 from typing import Dict, List, Optional, Any
 from pathlib import Path
 from datetime import datetime
 
 import asyncio
-import aiofiles
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends, BackgroundTasks, Request
-from fastapi.responses import JSONResponse, HTMLResponse, FileResponse
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends, BackgroundTasks, Request, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, HTMLResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 
-# Cấu hình logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("./logs/api.log")
-    ]
-)
+from mfa_pool import MFAWorkerPool, PoolQueueFullError
+from mfa_worker import temporary_directory_args
+from alignment_cache import AlignmentCache, make_cache_key
+from scheduler import AdmissionError, AlignmentScheduler, SharedSlots
+from jobs import CallbackURLError, InMemoryJobStore, JobManager, SQLiteJobStore, check_callback_url
+from uploads import InvalidAudioError, SavedUpload, UploadTooLargeError, save_upload_streaming
+from batch_corpus import ArchiveLimitError, BatchItem, build_corpora, collect_alignment_outputs, extract_archive_items
+from timeline_format import MEDIA_TYPES, ColumnarTimeline, TimelineFormatError, encode_response, negotiate_format
+from resample import DEFAULT_MIN_FRAMES, ResampleOptions, resample_timeline
+from streaming import StreamingSession, StreamProtocolError, message_text, parse_control_message
+from longform import LongformError, LongformOptions, align_longform, write_segment
+from preview_engine import estimate_alignment
+from health import HealthMonitor, evaluate_readiness, run_check_command
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry, StageTimings
+from audio_ingest import AudioDecodeError, IngestOptions, IngestPool, ingest_audio, shift_alignment
+from timeline_index import TimelineIndex, TimelineStore
+from realign import plan_realign_windows, splice_alignment
+from language_packs import LanguageRegistry, LanguageResourceError
+from startup import StartupTracker, parse_language_list, write_warmup_clip
+from text_normalization import NormalizedTranscript
+from scratch import ScratchSpace, Workspace, estimate_workspace_bytes
+from mfa_output import read_alignment, output_suffix
+
 logger = logging.getLogger(__name__)
 
+# Cấu hình logging (LOG_FILE rỗng: chỉ ghi ra stderr)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.getenv("LOG_FILE", "./logs/api.log")
+
+_logging_configured = False
+
+def configure_logging():
+    """Cấu hình root logger một lần (khi khởi động server hoặc launcher), không chạy lúc import module"""
+    global _logging_configured
+    if _logging_configured:
+        return
+    root = logging.getLogger()
+    handlers = [logging.StreamHandler()]
+    if LOG_FILE:
+        Path(LOG_FILE).parent.mkdir(parents=True, exist_ok=True)
+        handlers.append(logging.FileHandler(LOG_FILE))
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    _logging_configured = True
+
 # Khởi tạo FastAPI app
 app = FastAPI(
     title="Viseme Generation API",
@@ -59,6 +97,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Từ chối sớm request upload quá lớn dựa trên Content-Length, trước khi đọc body
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    if request.method == "POST":
+        if request.url.path == "/api/generate-viseme/batch":
+            limit = MAX_BATCH_UPLOAD_BYTES
+        else:
+            limit = MAX_UPLOAD_BYTES
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit + MULTIPART_OVERHEAD_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"error": f"Request body too large ({content_length} bytes, max {limit} bytes)"}
+            )
+    return await call_next(request)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -68,50 +122,335 @@ templates = Jinja2Templates(directory="templates")
 # Cấu hình đường dẫn
 BASE_DIR = Path(__file__).resolve().parent
 TEMP_DIR = Path(tempfile.gettempdir()) / "viseme_api"
-TEMP_DIR.mkdir(exist_ok=True)
-UPLOAD_DIR = TEMP_DIR / "uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
-RESULTS_DIR = TEMP_DIR / "results"
-RESULTS_DIR.mkdir(exist_ok=True)
+UPLOAD_DIR = TEMP_DIR / "uploads"  # Workspace trên đĩa khi không dùng được (hoặc hết quota) thư mục trên RAM
+RESULTS_DIR = TEMP_DIR / "results"  # Không còn được ghi, chỉ dọn tệp mồ côi của phiên bản cũ
+BATCH_DIR = TEMP_DIR / "batches"
+
+# Workspace cho từng request (audio, transcript, JSON alignment, thư mục tạm của MFA), xem scratch.py:
+# ưu tiên tmpfs trong giới hạn quota chung cho mọi worker dùng cùng thư mục ("" để chỉ dùng đĩa)
+SCRATCH_RAM_DIR = os.getenv("SCRATCH_RAM_DIR", "/dev/shm/viseme_api" if Path("/dev/shm").is_dir() else "")
+SCRATCH_RAM_QUOTA_MB = int(os.getenv("SCRATCH_RAM_QUOTA_MB", "512"))
+SCRATCH_RAM_MIN_FREE_MB = int(os.getenv("SCRATCH_RAM_MIN_FREE_MB", "64"))  # Chừa lại trên tmpfs cho process khác
+# Dọn workspace/tệp mồ côi (worker bị kill giữa chừng) khi khởi động và theo chu kỳ (0: chỉ khi khởi động)
+SCRATCH_SWEEP_INTERVAL = float(os.getenv("SCRATCH_SWEEP_INTERVAL", "600"))
+SCRATCH_ORPHAN_MAX_AGE = float(os.getenv("SCRATCH_ORPHAN_MAX_AGE", str(6 * 3600)))
+
+scratch_space = ScratchSpace(
+    UPLOAD_DIR,
+    ram_dir=Path(SCRATCH_RAM_DIR) if SCRATCH_RAM_DIR else None,
+    ram_quota_bytes=SCRATCH_RAM_QUOTA_MB * 1024 * 1024,
+    ram_min_free_bytes=SCRATCH_RAM_MIN_FREE_MB * 1024 * 1024,
+)
+scratch_sweep_task: Optional[asyncio.Task] = None
+
+def prepare_directories():
+    """Tạo các thư mục tạm (lúc khởi động, không phải lúc import)"""
+    for directory in (UPLOAD_DIR, BATCH_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+    scratch_space.prepare()
 
-# Đường dẫn đến tệp mapping phoneme sang viseme
-VIETNAMESE_PHONEME_TO_VISEME_MAP_PATH = BASE_DIR / "data/vietnamese-phoneme-to-viseme.json"
-ENGLISH_PHONEME_TO_VISEME_MAP_PATH = BASE_DIR / "data/english-phoneme-to-viseme.json"
+def sweep_scratch() -> int:
+    """Xóa workspace của process đã chết và tệp tạm quá SCRATCH_ORPHAN_MAX_AGE"""
+    return scratch_space.sweep(SCRATCH_ORPHAN_MAX_AGE, extra_dirs=(RESULTS_DIR, BATCH_DIR))
+
+async def scratch_sweep_loop():
+    """Dọn scratch theo chu kỳ SCRATCH_SWEEP_INTERVAL"""
+    while True:
+        await asyncio.sleep(SCRATCH_SWEEP_INTERVAL)
+        try:
+            removed = await asyncio.to_thread(sweep_scratch)
+            if removed:
+                logger.warning(f"Removed {removed} orphaned scratch entries")
+        except Exception as e:
+            logger.error(f"Error sweeping scratch space: {e}")
+
+# Số item tối đa trong một request batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+# Giới hạn kích thước upload: một tệp audio, và toàn bộ request batch
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "200")) * 1024 * 1024
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("MAX_BATCH_UPLOAD_MB", "2048")) * 1024 * 1024
+# Tổng dung lượng sau giải nén của archive batch (chống zip bomb)
+MAX_BATCH_ARCHIVE_EXTRACTED_BYTES = int(os.getenv("MAX_BATCH_ARCHIVE_EXTRACTED_MB", "4096")) * 1024 * 1024
+# Phần dư cho các trường form và boundary multipart khi so sánh với Content-Length
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+
+# Thư mục gói ngôn ngữ (mapping phoneme -> viseme, model MFA, chuẩn hóa, clip ví dụ), xem language_packs.py
+LANGUAGE_PACKS_DIR = Path(os.getenv("LANGUAGE_PACKS_DIR", str(BASE_DIR / "data/languages")))
+# Chu kỳ quét lại thư mục gói để thêm/cập nhật ngôn ngữ không cần khởi động lại (0: chỉ qua API reload)
+LANGUAGE_PACKS_RELOAD_INTERVAL = float(os.getenv("LANGUAGE_PACKS_RELOAD_INTERVAL", "30"))
+
+# Chuẩn hóa transcript trước khi align (đọc số, ký hiệu, từ viết tắt theo gói ngôn ngữ) và kiểm tra từ với
+# từ điển MFA: "report" (ghi từ ngoài từ điển vào metadata), "reject" (trả lỗi 422 trước khi chạy MFA),
+# "off" (không nạp từ điển, không kiểm tra)
+TRANSCRIPT_OOV_POLICY = os.getenv("TRANSCRIPT_OOV_POLICY", "report")
+# Thư mục model của MFA (chứa pretrained_models/dictionary), mặc định như MFA: ~/Documents/MFA
+MFA_ROOT_DIR = Path(os.getenv("MFA_ROOT_DIR", str(Path.home() / "Documents" / "MFA")))
 
 # Đường dẫn tới MFA và model
-MFA_CMD = "mfa"  # Đảm bảo MFA đã được cài đặt và có trong PATH
-
-# Cấu hình model cho từng ngôn ngữ
-LANGUAGE_MODELS = {
-    "vi": {
-        "acoustic_model": "vietnamese_mfa",
-        "dictionary": "vietnamese_mfa"
-    },
-    "en": {
-        "acoustic_model": "english_us_arpa",
-        "dictionary": "english_us_arpa"
-    }
-}
-
-# Load mapping phoneme sang viseme cho tiếng Việt
-try:
-    with open(VIETNAMESE_PHONEME_TO_VISEME_MAP_PATH, "r", encoding="utf-8") as f:
-        vietnamese_phoneme_to_viseme_data = json.load(f)
-        VIETNAMESE_PHONEME_TO_VISEME_MAP = vietnamese_phoneme_to_viseme_data["phonemeToViseme"]
-    logger.info(f"Loaded Vietnamese phoneme to viseme mapping from {VIETNAMESE_PHONEME_TO_VISEME_MAP_PATH}")
-except Exception as e:
-    logger.error(f"Error loading Vietnamese phoneme to viseme mapping: {e}")
-    raise
-
-# Load mapping phoneme sang viseme cho tiếng Anh
-try:
-    with open(ENGLISH_PHONEME_TO_VISEME_MAP_PATH, "r", encoding="utf-8") as f:
-        english_phoneme_to_viseme_data = json.load(f)
-        ENGLISH_PHONEME_TO_VISEME_MAP = english_phoneme_to_viseme_data["phonemeToViseme"]
-    logger.info(f"Loaded English phoneme to viseme mapping from {ENGLISH_PHONEME_TO_VISEME_MAP_PATH}")
-except Exception as e:
-    logger.error(f"Error loading English phoneme to viseme mapping: {e}")
-    raise
+MFA_CMD = os.getenv("MFA_CMD", "mfa")  # Đảm bảo MFA đã được cài đặt và có trong PATH (benchmark dùng benchmarks/fake_mfa.py)
+# Định dạng output của MFA: "json" hoặc "long_textgrid" (đọc trực tiếp TextGrid, bỏ bước MFA xuất JSON)
+MFA_OUTPUT_FORMAT = os.getenv("MFA_OUTPUT_FORMAT", "json")
+MFA_OUTPUT_SUFFIX = output_suffix(MFA_OUTPUT_FORMAT)
+# Cách đọc JSON alignment: "auto" (orjson nếu đã cài, nếu không thì json của thư viện chuẩn), "json" hoặc
+# "scan" (quét regex chỉ các tier words/phones: bộ nhớ đỉnh thấp hơn vài lần nhưng chậm hơn json.load)
+MFA_OUTPUT_PARSER = os.getenv("MFA_OUTPUT_PARSER", "auto")
+
+# Cấu hình pool worker MFA chạy lâu dài (thay cho một tiến trình `mfa align_one` mỗi request; bỏ được thời gian
+# khởi động Python và import MFA, model vẫn được nạp lại mỗi request)
+MFA_POOL_ENABLED = os.getenv("MFA_POOL_ENABLED", "0") == "1"
+MFA_POOL_SIZE = int(os.getenv("MFA_POOL_SIZE", "2"))  # Số worker cho mỗi ngôn ngữ
+MFA_POOL_QUEUE_SIZE = int(os.getenv("MFA_POOL_QUEUE_SIZE", "32"))  # Số request chờ tối đa cho mỗi ngôn ngữ
+MFA_POOL_BACKEND = os.getenv("MFA_POOL_BACKEND", "mfa")  # "mfa" hoặc "stub" (test không cần MFA)
+MFA_POOL_HEALTH_INTERVAL = float(os.getenv("MFA_POOL_HEALTH_INTERVAL", "30"))
+MFA_POOL_REQUEST_TIMEOUT = float(os.getenv("MFA_POOL_REQUEST_TIMEOUT", "600"))
+MFA_POOL_STUB_LATENCY = float(os.getenv("MFA_POOL_STUB_LATENCY", "0"))  # Độ trễ giả lập của backend stub (giây)
+
+mfa_pool: Optional[MFAWorkerPool] = None
+
+# Cấu hình admission control cho alignment (mặc định số alignment đồng thời = số CPU)
+ALIGN_MAX_CONCURRENT = int(os.getenv("ALIGN_MAX_CONCURRENT", "0")) or None
+ALIGN_MAX_QUEUE = int(os.getenv("ALIGN_MAX_QUEUE", "32"))
+ALIGN_MAX_WAIT = float(os.getenv("ALIGN_MAX_WAIT", "120"))
+ALIGN_TOTAL_JOBS = int(os.getenv("ALIGN_TOTAL_JOBS", "0")) or None  # Tổng số --num_jobs chia cho các alignment
+# Thư mục tệp khóa để giới hạn ALIGN_MAX_CONCURRENT áp dụng chung cho mọi worker (launcher.py tự đặt)
+ALIGN_SHARED_SLOTS_DIR = os.getenv("ALIGN_SHARED_SLOTS_DIR")
+# Thời gian tối đa chờ alignment và job đang chạy kết thúc khi tắt server
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "60"))
+
+alignment_scheduler = AlignmentScheduler(
+    max_concurrent=ALIGN_MAX_CONCURRENT,
+    max_queue=ALIGN_MAX_QUEUE,
+    max_wait=ALIGN_MAX_WAIT,
+    total_jobs=ALIGN_TOTAL_JOBS,
+    shared_slots=SharedSlots(
+        Path(ALIGN_SHARED_SLOTS_DIR), ALIGN_MAX_CONCURRENT or os.cpu_count() or 1
+    ) if ALIGN_SHARED_SLOTS_DIR else None,
+)
+
+# Cấu hình cache alignment theo nội dung (hash audio + transcript + ngôn ngữ + model)
+ALIGNMENT_CACHE_ENABLED = os.getenv("ALIGNMENT_CACHE_ENABLED", "1") == "1"
+ALIGNMENT_CACHE_DIR = Path(os.getenv("ALIGNMENT_CACHE_DIR", str(TEMP_DIR / "cache")))
+ALIGNMENT_CACHE_MEMORY_ENTRIES = int(os.getenv("ALIGNMENT_CACHE_MEMORY_ENTRIES", "256"))
+ALIGNMENT_CACHE_DISK_MB = int(os.getenv("ALIGNMENT_CACHE_DISK_MB", "512"))
+ALIGNMENT_CACHE_TTL = float(os.getenv("ALIGNMENT_CACHE_TTL", str(7 * 24 * 3600)))
+# Thay đổi giá trị này khi cập nhật phiên bản MFA hoặc model để vô hiệu hóa cache cũ
+MFA_MODEL_VERSION = os.getenv("MFA_MODEL_VERSION", "1")
+CACHE_BYPASS_HEADER = "X-Cache-Bypass"
+
+alignment_cache = AlignmentCache(
+    ALIGNMENT_CACHE_DIR,
+    memory_entries=ALIGNMENT_CACHE_MEMORY_ENTRIES,
+    disk_max_bytes=ALIGNMENT_CACHE_DISK_MB * 1024 * 1024,
+    ttl=ALIGNMENT_CACHE_TTL,
+) if ALIGNMENT_CACHE_ENABLED else None
+
+# Lưu timeline (phone, từ, câu) theo request_id/job_id để truy vấn theo thời gian qua /api/timelines/...
+TIMELINE_STORE_ENABLED = os.getenv("TIMELINE_STORE_ENABLED", "1") == "1"
+TIMELINE_STORE_DIR = Path(os.getenv("TIMELINE_STORE_DIR", str(TEMP_DIR / "timelines")))
+TIMELINE_STORE_MEMORY_ENTRIES = int(os.getenv("TIMELINE_STORE_MEMORY_ENTRIES", "64"))
+TIMELINE_STORE_DISK_MB = int(os.getenv("TIMELINE_STORE_DISK_MB", "256"))
+TIMELINE_STORE_TTL = float(os.getenv("TIMELINE_STORE_TTL", str(24 * 3600)))
+
+timeline_store = TimelineStore(
+    # Tầng đĩa dùng chung giữa các worker; tầng bộ nhớ của TimelineStore giữ chỉ mục đã dựng
+    AlignmentCache(
+        TIMELINE_STORE_DIR,
+        memory_entries=0,
+        disk_max_bytes=TIMELINE_STORE_DISK_MB * 1024 * 1024,
+        ttl=TIMELINE_STORE_TTL,
+    ),
+    memory_entries=TIMELINE_STORE_MEMORY_ENTRIES,
+) if TIMELINE_STORE_ENABLED else None
+
+# Cấu hình job bất đồng bộ (submit/poll)
+JOB_STORE_BACKEND = os.getenv("JOB_STORE_BACKEND", "memory")  # "memory" hoặc "sqlite"
+JOB_STORE_PATH = Path(os.getenv("JOB_STORE_PATH", str(TEMP_DIR / "jobs.sqlite3")))
+JOB_CONCURRENCY_PER_LANGUAGE = int(os.getenv("JOB_CONCURRENCY_PER_LANGUAGE", "2"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", str(24 * 3600)))
+# Với SQLite store (dùng chung giữa các worker), chu kỳ kiểm tra job bị hủy từ worker khác
+JOB_CANCEL_POLL_INTERVAL = float(os.getenv("JOB_CANCEL_POLL_INTERVAL", "2"))
+# Chu kỳ xóa job hết hạn và đánh dấu failed các job mồ côi (process chạy job đã chết)
+JOB_MAINTENANCE_INTERVAL = float(os.getenv("JOB_MAINTENANCE_INTERVAL", "60"))
+# Job chưa xong không có heartbeat quá thời gian này cũng bị coi là mồ côi (0: chỉ kiểm tra PID)
+JOB_HEARTBEAT_TIMEOUT = float(os.getenv("JOB_HEARTBEAT_TIMEOUT", "300")) or None
+# Host được nhận callback, cách nhau bởi dấu phẩy (cho phép cả host nội bộ); rỗng: mọi host có địa chỉ public
+JOB_CALLBACK_ALLOWED_HOSTS = {host.strip().lower() for host in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",")
+                              if host.strip()}
+
+job_manager: Optional[JobManager] = None
+
+# Cấu hình health check: các lệnh MFA chạy trong nền theo chu kỳ, endpoint chỉ đọc kết quả đã lưu
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "60"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "30"))
+READY_MAX_QUEUE_RATIO = float(os.getenv("READY_MAX_QUEUE_RATIO", "0.9"))  # Hàng đợi đầy hơn mức này thì không ready
+
+health_monitor: Optional[HealthMonitor] = None
+
+# Cấu hình streaming qua WebSocket
+STREAM_WINDOW_SECONDS = float(os.getenv("STREAM_WINDOW_SECONDS", "1.5"))  # Audio chưa chốt tối thiểu để align
+STREAM_FINAL_MARGIN = float(os.getenv("STREAM_FINAL_MARGIN", "0.4"))  # Từ kết thúc gần cuối cửa sổ hơn mức này chưa được chốt
+STREAM_HOLDBACK_WORDS = int(os.getenv("STREAM_HOLDBACK_WORDS", "1"))  # Số từ cuối cửa sổ luôn để tạm thời
+STREAM_MAX_PENDING_SECONDS = float(os.getenv("STREAM_MAX_PENDING_SECONDS", "30"))
+
+active_stream_sessions: Dict[str, StreamingSession] = {}
+
+# Cấu hình long-form: audio dài được chia tại khoảng lặng và align song song theo từng đoạn
+LONGFORM_ENABLED = os.getenv("LONGFORM_ENABLED", "1") == "1"
+LONGFORM_MIN_SECONDS = float(os.getenv("LONGFORM_MIN_SECONDS", "120"))  # Tự bật long-form khi audio dài hơn
+LONGFORM_SEGMENT_SECONDS = float(os.getenv("LONGFORM_SEGMENT_SECONDS", "30"))
+LONGFORM_MAX_SEGMENT_SECONDS = float(os.getenv("LONGFORM_MAX_SEGMENT_SECONDS", "60"))
+LONGFORM_MAX_PARALLEL = int(os.getenv("LONGFORM_MAX_PARALLEL", "0")) or None  # Mặc định bằng số CPU
+# Độ dài tối đa khi gộp hai đoạn có điểm cắt không chắc chắn (0: gấp đôi LONGFORM_MAX_SEGMENT_SECONDS)
+LONGFORM_MAX_MERGED_SECONDS = float(os.getenv("LONGFORM_MAX_MERGED_SECONDS", "0")) or None
+
+# Cấu hình align lại một phần (/api/timelines/{id}/realign) khi transcript chỉ đổi vài từ
+REALIGN_CONTEXT_WORDS = int(os.getenv("REALIGN_CONTEXT_WORDS", "2"))  # Số từ không đổi hai bên vùng thay đổi
+REALIGN_MARGIN_SECONDS = float(os.getenv("REALIGN_MARGIN_SECONDS", "0.15"))
+REALIGN_MAX_FRACTION = float(os.getenv("REALIGN_MAX_FRACTION", "0.5"))  # Vùng thay đổi dài hơn thì align lại toàn bộ
+
+# Engine tạo alignment: "mfa" (chính xác) hoặc "preview" (ước lượng nhanh không cần MFA)
+ALIGNMENT_ENGINES = ("mfa", "preview")
+
+# Cấu hình chuẩn hóa audio: giải mã, mono, đổi tần số lấy mẫu, cắt khoảng lặng đầu/cuối
+INGEST_SAMPLE_RATE = int(os.getenv("INGEST_SAMPLE_RATE", "16000"))  # Tần số lấy mẫu của acoustic model
+INGEST_TRIM_SILENCE = os.getenv("INGEST_TRIM_SILENCE", "1") == "1"
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_USE_PROCESSES = os.getenv("INGEST_USE_PROCESSES", "1") == "1"  # 0: dùng thread pool
+
+ingest_options = IngestOptions(sample_rate=INGEST_SAMPLE_RATE, trim_silence=INGEST_TRIM_SILENCE)
+# Batch align cả corpus một lần nên không cắt khoảng lặng (không cần bù offset cho từng item)
+batch_ingest_options = IngestOptions(sample_rate=INGEST_SAMPLE_RATE, trim_silence=False)
+ingest_pool: Optional[IngestPool] = None
+
+longform_options = LongformOptions(
+    target_segment_seconds=LONGFORM_SEGMENT_SECONDS,
+    max_segment_seconds=LONGFORM_MAX_SEGMENT_SECONDS,
+    max_parallel=LONGFORM_MAX_PARALLEL,
+    max_merged_seconds=LONGFORM_MAX_MERGED_SECONDS,
+)
+
+# Tài nguyên theo ngôn ngữ (bảng mapping đã kiểm tra, mapper đã biên dịch, bộ chuẩn hóa transcript và từ điển),
+# nạp khi khởi động hoặc khi cần
+language_registry = LanguageRegistry(LANGUAGE_PACKS_DIR, mfa_root=MFA_ROOT_DIR,
+                                     check_dictionary=TRANSCRIPT_OOV_POLICY != "off")
+language_reload_task: Optional[asyncio.Task] = None
+
+# Cấu hình khởi động: ngôn ngữ nạp trước ("all", "" = nạp khi có request đầu tiên, hoặc "vi,en"),
+# chạy thử pool chuẩn hóa audio và aligner với clip dựng sẵn trước khi báo ready
+STARTUP_PRELOAD_LANGUAGES = os.getenv("STARTUP_PRELOAD_LANGUAGES", "all")
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+READY_REQUIRE_WARMUP = os.getenv("READY_REQUIRE_WARMUP", "1") == "1"  # 0: ready ngay khi nhận request
+
+startup_tracker = StartupTracker()
+warmup_task: Optional[asyncio.Task] = None
+
+# Metrics cho endpoint /metrics (định dạng Prometheus)
+metrics_registry = MetricsRegistry()
+REQUESTS_TOTAL = metrics_registry.counter(
+    "lipsync_requests", "Viseme generation requests", ["endpoint", "language"])
+REQUEST_FAILURES_TOTAL = metrics_registry.counter(
+    "lipsync_request_failures", "Failed viseme generation requests by reason", ["endpoint", "language", "reason"])
+REQUESTS_IN_FLIGHT = metrics_registry.gauge(
+    "lipsync_requests_in_flight", "Viseme generation requests currently being processed", ["endpoint"])
+REQUEST_DURATION_SECONDS = metrics_registry.histogram(
+    "lipsync_request_duration_seconds", "End-to-end request processing time", ["endpoint", "language"])
+STAGE_DURATION_SECONDS = metrics_registry.histogram(
+    "lipsync_stage_duration_seconds", "Time spent in each pipeline stage", ["stage", "language"])
+MFA_EXIT_TOTAL = metrics_registry.counter(
+    "lipsync_mfa_exit", "MFA subprocess exits by command and exit code", ["command", "code"])
+TRANSCRIPT_OOV_WORDS_TOTAL = metrics_registry.counter(
+    "lipsync_transcript_oov_words", "Transcript words missing from the MFA dictionary", ["language"])
+
+def collect_runtime_metrics():
+    """Số liệu lấy từ scheduler, pool worker, bộ chuyển đổi phoneme và quá trình khởi động lúc scrape"""
+    scheduler = alignment_scheduler.stats()
+    yield ("lipsync_alignment_active", "gauge", "Alignments currently running", [
+        ("lipsync_alignment_active", {}, scheduler["active"])])
+    yield ("lipsync_alignment_queued", "gauge", "Alignments waiting for a scheduler slot", [
+        ("lipsync_alignment_queued", {}, scheduler["waiting"])])
+    yield ("lipsync_alignment_admission", "counter", "Scheduler admission outcomes", [
+        ("lipsync_alignment_admission_total", {"outcome": outcome}, scheduler[outcome])
+        for outcome in ("admitted", "rejected", "timed_out")])
+    
+    if mfa_pool is not None:
+        pool = mfa_pool.stats()
+        yield ("lipsync_mfa_pool_queued", "gauge", "Requests waiting for an MFA worker", [
+            ("lipsync_mfa_pool_queued", {"language": language}, info["queued"])
+            for language, info in pool["languages"].items()])
+        yield ("lipsync_mfa_pool_busy_workers", "gauge", "MFA workers currently aligning", [
+            ("lipsync_mfa_pool_busy_workers", {"language": language},
+             sum(worker["busy"] for worker in info["workers"]))
+            for language, info in pool["languages"].items()])
+        yield ("lipsync_mfa_worker_startup_seconds", "gauge", "Time for the last start of each MFA worker", [
+            ("lipsync_mfa_worker_startup_seconds", {"worker": worker["name"]}, worker["startup_time"])
+            for info in pool["languages"].values() for worker in info["workers"]
+            if worker["startup_time"] is not None])
+        yield ("lipsync_mfa_worker_exit", "counter", "MFA commands run inside pool workers by op and exit code", [
+            ("lipsync_mfa_worker_exit_total", {"op": op, "code": str(code)}, count)
+            for (op, code), count in sorted(mfa_pool.exit_codes.items())])
+    
+    if alignment_cache is not None:
+        cache = alignment_cache.stats()
+        yield ("lipsync_alignment_cache_lookups", "counter", "Alignment cache lookups by result", [
+            ("lipsync_alignment_cache_lookups_total", {"result": result}, cache[result])
+            for result in ("memory_hits", "disk_hits", "misses")])
+    
+    if job_manager is not None:
+        yield ("lipsync_jobs_orphaned", "counter", "Unfinished jobs marked failed because their worker process died", [
+            ("lipsync_jobs_orphaned_total", {}, job_manager.stats()["orphans_failed"])])
+    
+    if ingest_pool is not None:
+        yield ("lipsync_ingest_pool_restarts", "counter", "Ingest pools recreated after a worker process died", [
+            ("lipsync_ingest_pool_restarts_total", {}, ingest_pool.restarts)])
+    
+    scratch = scratch_space.stats()
+    yield ("lipsync_scratch_workspaces", "counter", "Request workspaces created by storage medium", [
+        ("lipsync_scratch_workspaces_total", {"medium": medium}, count)
+        for medium, count in scratch["workspaces"].items()])
+    yield ("lipsync_scratch_ram_fallbacks", "counter", "Workspaces placed on disk because the RAM quota was full", [
+        ("lipsync_scratch_ram_fallbacks_total", {}, scratch["ram_fallbacks"])])
+    yield ("lipsync_scratch_ram_reserved_bytes", "gauge", "RAM scratch quota currently reserved", [
+        ("lipsync_scratch_ram_reserved_bytes", {}, scratch["ram_reserved_bytes"])])
+    yield ("lipsync_scratch_ram_reserved_all_workers_bytes", "gauge",
+           "RAM scratch quota reserved by all workers sharing the RAM directory", [
+               ("lipsync_scratch_ram_reserved_all_workers_bytes", {}, scratch["ram_reserved_bytes_all_workers"])])
+    yield ("lipsync_scratch_swept", "counter", "Orphaned scratch entries removed by the sweeper", [
+        ("lipsync_scratch_swept_total", {}, scratch["swept"])])
+    
+    yield ("lipsync_unmapped_phonemes", "counter", "Phonemes without a viseme mapping", [
+        ("lipsync_unmapped_phonemes_total", {"language": language, "phoneme": phoneme}, count)
+        for language, resources in language_registry.loaded().items()
+        for phoneme, count in sorted(resources.mapper.unknown_counts().items())])
+    
+    yield ("lipsync_startup_phase_seconds", "gauge", "Duration of each startup phase", [
+        ("lipsync_startup_phase_seconds", {"phase": phase}, seconds)
+        for phase, seconds in startup_tracker.phases.items()])
+    if startup_tracker.time_to_ready is not None:
+        yield ("lipsync_time_to_ready_seconds", "gauge", "Seconds from process start until the service was ready", [
+            ("lipsync_time_to_ready_seconds", {}, startup_tracker.time_to_ready)])
+
+metrics_registry.register_collector(collect_runtime_metrics)
+
+def new_stage_timings(language: str) -> StageTimings:
+    """Bộ đo thời gian từng bước cho một request (ghi vào lipsync_stage_duration_seconds)"""
+    return StageTimings(STAGE_DURATION_SECONDS, language)
+
+def failure_reason(error: Exception) -> str:
+    """Phân loại lỗi của request thành nhãn reason có số giá trị giới hạn"""
+    if isinstance(error, AdmissionError):
+        return "queue_full" if error.status_code == 429 else "queue_timeout"
+    if isinstance(error, PoolQueueFullError):
+        return "pool_full"
+    if isinstance(error, HTTPException):
+        return {
+            400: "invalid_request",
+            406: "not_acceptable",
+            413: "too_large",
+            415: "unsupported_audio",
+            422: "unknown_words",
+        }.get(error.status_code, "alignment_failed" if error.status_code == 500 else f"http_{error.status_code}")
+    return "internal_error"
 
 # Models
 class VisemeGenerationRequest(BaseModel):
@@ -126,6 +465,11 @@ class VisemeGenerationResponse(BaseModel):
     transcript: str = Field(..., description="Văn bản đã xử lý")
     language: str = Field(..., description="Ngôn ngữ được sử dụng")
     metadata: Dict[str, Any] = Field(..., description="Metadata của quá trình xử lý")
+    frame_track: Optional[Dict[str, Any]] = Field(None, description="Track viseme theo khung hình (khi có fps)")
+    word_timeline: Optional[List[Dict[str, Any]]] = Field(
+        None, description="Tier từ, mỗi từ kèm dải phone [phone_start, phone_end) trong viseme_timeline")
+    sentence_timeline: Optional[List[Dict[str, Any]]] = Field(
+        None, description="Tier câu, mỗi câu kèm dải từ [word_start, word_end) trong word_timeline")
 
 class ErrorResponse(BaseModel):
     error: str = Field(..., description="Mô tả lỗi")
@@ -146,10 +490,94 @@ def cleanup_temp_files(file_paths: List[Path]):
         except Exception as e:
             logger.warning(f"Failed to delete temporary file {file_path}: {e}")
 
+def cleanup_temp_dir(dir_path: Path):
+    """Xóa thư mục tạm thời (corpus batch) sau khi xử lý xong"""
+    try:
+        if dir_path.exists():
+            shutil.rmtree(dir_path)
+            logger.info(f"Deleted temporary directory: {dir_path}")
+    except Exception as e:
+        logger.warning(f"Failed to delete temporary directory {dir_path}: {e}")
+
+def normalize_transcript(transcript: str) -> str:
+    """Chuẩn hóa văn bản (xóa ký tự đặc biệt, chuyển về chữ thường)"""
+    return transcript.lower()
+
+def normalize_for_alignment(transcript: str, language: str, check: bool = True) -> NormalizedTranscript:
+    """Chuẩn hóa transcript theo gói ngôn ngữ (nạp gói và từ điển nếu chưa nạp) và kiểm tra từ với từ điển"""
+    try:
+        normalizer = language_registry.get(language).normalizer
+    except LanguageResourceError as e:
+        raise HTTPException(status_code=500, detail=f"Language resources for {language} are unavailable: {e}")
+    return normalizer.normalize(transcript, check=check and TRANSCRIPT_OOV_POLICY != "off")
+
+def check_normalized_transcript(normalized: NormalizedTranscript, language: str):
+    """Ghi metrics từ ngoài từ điển; lỗi 400 nếu không còn từ nào, 422 nếu có từ lạ và policy là reject"""
+    if not normalized.words:
+        raise HTTPException(status_code=400, detail="Transcript has no words to align")
+    if normalized.oov_words:
+        TRANSCRIPT_OOV_WORDS_TOTAL.inc(len(normalized.oov_words), language=language)
+        if TRANSCRIPT_OOV_POLICY == "reject":
+            shown = ", ".join(normalized.oov_words[:20])
+            more = f" (+{len(normalized.oov_words) - 20} more)" if len(normalized.oov_words) > 20 else ""
+            raise HTTPException(
+                status_code=422,
+                detail=f"Words not in the {normalized.dictionary} dictionary: {shown}{more}"
+            )
+
+async def prepare_transcript(transcript: str, language: str, timings: Optional[StageTimings] = None,
+                             check: bool = True) -> NormalizedTranscript:
+    """Chuẩn hóa và kiểm tra transcript ngoài event loop (lần đầu có thể phải nạp từ điển)"""
+    with timings.stage("normalize") if timings is not None else nullcontext():
+        normalized = await asyncio.to_thread(normalize_for_alignment, transcript, language, check)
+    check_normalized_transcript(normalized, language)
+    return normalized
+
+def get_model_signature(language: str) -> str:
+    """Chuỗi định danh model của một ngôn ngữ, dùng trong khóa cache alignment"""
+    spec = language_registry.spec(language)
+    return f"{spec.acoustic_model}|{spec.dictionary}|{spec.model_version or MFA_MODEL_VERSION}"
+
+async def save_audio_upload(upload: UploadFile, dest: Path, max_bytes: Optional[int] = None) -> SavedUpload:
+    """Lưu tệp audio upload theo từng chunk, chuyển lỗi kích thước/định dạng thành HTTPException"""
+    try:
+        return await save_upload_streaming(upload, dest, max_bytes or MAX_UPLOAD_BYTES)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidAudioError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+def build_resample_options(fps: Optional[float], merge_visemes: bool = True,
+                           min_viseme_frames: float = DEFAULT_MIN_FRAMES,
+                           crossfade: float = 0.0) -> Optional[ResampleOptions]:
+    """Tạo tùy chọn chuyển sang track theo khung hình từ tham số request (None nếu không yêu cầu fps)"""
+    if fps is None:
+        return None
+    try:
+        return ResampleOptions(fps, merge=merge_visemes, min_frames=min_viseme_frames, crossfade=crossfade)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def validate_engine(engine: str):
+    """Kiểm tra engine alignment được yêu cầu"""
+    if engine not in ALIGNMENT_ENGINES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported engine: {engine}. Supported engines: {', '.join(ALIGNMENT_ENGINES)}"
+        )
+
+def request_content_length(request: Request) -> int:
+    """Kích thước body theo header Content-Length (0 nếu không có), dùng để ước lượng dung lượng workspace"""
+    content_length = request.headers.get("content-length", "")
+    return int(content_length) if content_length.isdigit() else 0
+
+def is_cache_bypassed(request: Request) -> bool:
+    """Kiểm tra header yêu cầu bỏ qua cache alignment"""
+    return request.headers.get(CACHE_BYPASS_HEADER, "").lower() in ("1", "true", "yes")
+
 def create_lab_file(transcript: str, output_path: Path) -> Path:
     """Tạo tệp .lab từ văn bản cho MFA"""
-    # Chuẩn hóa văn bản (xóa ký tự đặc biệt, chuyển về chữ thường)
-    normalized_transcript = transcript.lower()
+    normalized_transcript = normalize_transcript(transcript)
     
     # Ghi văn bản vào tệp .txt
     with open(output_path, "w", encoding="utf-8") as f:
@@ -158,34 +586,59 @@ def create_lab_file(transcript: str, output_path: Path) -> Path:
     logger.info(f"Created lab file at {output_path}")
     return output_path
 
-async def run_mfa_align(audio_path: Path, transcript_path: Path, output_path: Path, language: str) -> bool:
-    """Chạy Montreal Forced Aligner để tạo alignment"""
-    start_time = time.time()
-    logger.info(f"Starting MFA alignment for {language}: {audio_path} with {transcript_path}")
-    
+async def run_mfa_align(audio_path: Path, transcript_path: Path, output_path: Path, language: str,
+                        background: bool = False, timings: Optional[StageTimings] = None,
+                        temporary_directory: Optional[Path] = None) -> bool:
+    """
+    Chạy Montreal Forced Aligner để tạo alignment (chờ lượt từ alignment_scheduler).
+    temporary_directory: thư mục làm việc riêng của MFA (trong workspace của request, bị xóa cùng workspace).
+    """
     # Lấy model phù hợp với ngôn ngữ
-    if language not in LANGUAGE_MODELS:
+    if language not in language_registry:
         logger.error(f"Unsupported language: {language}")
         return False
+    timings = timings or new_stage_timings(language)
     
-    acoustic_model = LANGUAGE_MODELS[language]["acoustic_model"]
-    dictionary = LANGUAGE_MODELS[language]["dictionary"]
-    
-    cmd = [
-        MFA_CMD, "align_one",
-        str(audio_path), str(transcript_path),
-        acoustic_model, dictionary,
-        str(output_path),
-        "--output_format", "json",
-        "--single_speaker",
-        "--use_mp",
-        "--num_jobs", "8",
-        "--clean",
-        "--final_clean",
-        "--overwrite",
-        "--textgrid_cleanup"
-    ]
-    
+    async with alignment_scheduler.slot(background=background) as slot:
+        timings.add("queue_wait", slot.queue_time)
+        start_time = time.time()
+        logger.info(f"Starting MFA alignment for {language}: {audio_path} with {transcript_path} "
+                    f"(queued {slot.queue_time:.2f}s, num_jobs={slot.num_jobs})")
+        
+        if mfa_pool is not None:
+            # Gửi request tới worker đã được làm nóng
+            with timings.stage("alignment"):
+                success = await mfa_pool.align(language, audio_path, transcript_path, output_path,
+                                               num_jobs=slot.num_jobs, temporary_directory=temporary_directory,
+                                               output_format=MFA_OUTPUT_FORMAT)
+            if success:
+                logger.info(f"MFA alignment completed in {time.time() - start_time:.2f}s (worker pool)")
+            return success
+        
+        spec = language_registry.spec(language)
+        
+        cmd = [
+            MFA_CMD, "align_one",
+            str(audio_path), str(transcript_path),
+            spec.acoustic_model, spec.dictionary,
+            str(output_path),
+            "--output_format", MFA_OUTPUT_FORMAT,
+            "--single_speaker",
+            "--use_mp",
+            "--num_jobs", str(slot.num_jobs),
+            "--clean",
+            "--final_clean",
+            "--overwrite",
+            "--textgrid_cleanup",
+            *temporary_directory_args(temporary_directory),
+        ]
+        
+        # Khi chạy lệnh mfa mới, thời gian alignment gồm cả thời gian khởi động MFA
+        with timings.stage("alignment"):
+            return await run_mfa_command(cmd, "MFA alignment", start_time)
+
+async def run_mfa_command(cmd: List[str], description: str, start_time: float) -> bool:
+    """Chạy một lệnh MFA trong process riêng, trả về True nếu thành công"""
     try:
         # Chạy MFA trong một process riêng
         process = await asyncio.create_subprocess_exec(
@@ -195,205 +648,509 @@ async def run_mfa_align(audio_path: Path, transcript_path: Path, output_path: Pa
         )
         
         stdout, stderr = await process.communicate()
+        MFA_EXIT_TOTAL.inc(command=cmd[1], code=str(process.returncode))
         
         if process.returncode != 0:
-            logger.error(f"MFA alignment failed with code {process.returncode}")
+            logger.error(f"{description} failed with code {process.returncode}")
             logger.error(f"MFA stderr: {stderr.decode()}")
             return False
         
-        logger.info(f"MFA alignment completed in {time.time() - start_time:.2f}s")
+        logger.info(f"{description} completed in {time.time() - start_time:.2f}s")
         return True
     
     except Exception as e:
         logger.error(f"Error running MFA: {e}")
         return False
 
-def map_phoneme_to_viseme(phoneme: str, language: str) -> int:
-    """Chuyển đổi phoneme sang viseme sử dụng bảng mapping"""
-    # Chọn bảng mapping dựa trên ngôn ngữ
-    if language == "vi":
-        phoneme_to_viseme_map = VIETNAMESE_PHONEME_TO_VISEME_MAP
-        
-        # Xử lý đặc biệt cho phoneme tiếng Việt
-        if phoneme in phoneme_to_viseme_map:
-            return phoneme_to_viseme_map[phoneme]
+async def run_mfa_align_corpus(corpus_dir: Path, output_dir: Path, language: str,
+                               temporary_directory: Optional[Path] = None) -> bool:
+    """Chạy `mfa align` một lần cho cả corpus (dùng cho endpoint batch)"""
+    if language not in language_registry:
+        logger.error(f"Unsupported language: {language}")
+        return False
+    
+    async with alignment_scheduler.slot() as slot:
+        start_time = time.time()
+        logger.info(f"Starting MFA corpus alignment for {language}: {corpus_dir} "
+                    f"(queued {slot.queue_time:.2f}s, num_jobs={slot.num_jobs})")
         
-        # Nếu không tìm thấy, thử loại bỏ các ký tự đánh dấu thanh điệu và độ dài
-        import re
-        simplified_phoneme = re.sub(r'[ː˦˥˨ˀ˦˨˩ˀ˩˦˩˨̚ʷw͡]', '', phoneme)
+        if mfa_pool is not None:
+            success = await mfa_pool.align_corpus(language, corpus_dir, output_dir, num_jobs=slot.num_jobs,
+                                                  temporary_directory=temporary_directory,
+                                                  output_format=MFA_OUTPUT_FORMAT)
+            if success:
+                logger.info(f"MFA corpus alignment completed in {time.time() - start_time:.2f}s (worker pool)")
+            return success
         
-        if simplified_phoneme in phoneme_to_viseme_map:
-            return phoneme_to_viseme_map[simplified_phoneme]
-    elif language == "en":
-        phoneme_to_viseme_map = ENGLISH_PHONEME_TO_VISEME_MAP
+        cmd = [
+            MFA_CMD, "align",
+            str(corpus_dir),
+            language_registry.spec(language).dictionary,
+            language_registry.spec(language).acoustic_model,
+            str(output_dir),
+            "--output_format", MFA_OUTPUT_FORMAT,
+            "--use_mp",
+            "--num_jobs", str(slot.num_jobs),
+            "--clean",
+            "--final_clean",
+            "--overwrite",
+            "--textgrid_cleanup",
+            *temporary_directory_args(temporary_directory),
+        ]
         
-        # Xử lý phoneme tiếng Anh
-        if phoneme in phoneme_to_viseme_map:
-            return phoneme_to_viseme_map[phoneme]
+        return await run_mfa_command(cmd, "MFA corpus alignment", start_time)
+
+async def align_audio_segment(audio_path: Path, transcript: str, language: str,
+                              background: bool = False, timings: Optional[StageTimings] = None) -> Dict[str, Any]:
+    """
+    Align một đoạn audio ngắn (cửa sổ streaming, đoạn long-form) và trả về dữ liệu alignment MFA.
+    Tệp trung gian được tạo cạnh tệp audio (trong workspace của request/phiên) và bị xóa ngay sau khi align.
+    """
+    transcript_path = audio_path.with_name(f"{audio_path.stem}_transcript.txt")
+    mfa_output_path = audio_path.with_name(f"{audio_path.stem}_alignment{MFA_OUTPUT_SUFFIX}")
+    mfa_temp_dir = audio_path.with_name(f"{audio_path.stem}_mfa")
+    timings = timings or new_stage_timings(language)
+    try:
+        create_lab_file(transcript, transcript_path)
+        if not await run_mfa_align(audio_path, transcript_path, mfa_output_path, language,
+                                   background=background, timings=timings, temporary_directory=mfa_temp_dir):
+            raise RuntimeError(f"Failed to align {audio_path.name} for {language}")
+        with timings.stage("parse"):
+            return load_mfa_alignment(mfa_output_path)
+    finally:
+        cleanup_temp_files([transcript_path, mfa_output_path])
+        cleanup_temp_dir(mfa_temp_dir)
+
+async def realign_changed_windows(request_id: str, audio_path: Path, duration: float, transcript: str,
+                                  language: str, base: TimelineIndex,
+                                  timings: StageTimings, work_dir: Path) -> tuple:
+    """
+    Align lại chỉ các cửa sổ audio quanh những từ thay đổi so với timeline cũ rồi ghép vào timeline cũ.
+    Trả về (dữ liệu alignment, thống kê); dữ liệu là None khi vùng thay đổi quá lớn (caller align toàn bộ).
+    """
+    windows = plan_realign_windows(base.words, transcript.split(), duration,
+                                   REALIGN_CONTEXT_WORDS, REALIGN_MARGIN_SECONDS)
+    realigned_seconds = sum(window.duration for window in windows)
+    stats = {
+        "windows": [window.to_dict() for window in windows],
+        "realigned_seconds": realigned_seconds,
+        "total_seconds": duration,
+    }
+    if not windows:
+        return base.to_alignment(), {**stats, "mode": "unchanged"}
+    if realigned_seconds > duration * REALIGN_MAX_FRACTION:
+        return None, {**stats, "mode": "full"}
     
-    # Nếu vẫn không tìm thấy, trả về viseme mặc định (0 - Rest)
-    logger.warning(f"No viseme mapping found for phoneme: {phoneme} in {language}, using default 0")
-    return 0
+    async def align_window(window):
+        if not window.words:
+            return None
+        window_path = work_dir / f"{request_id}_realign{window.index:03d}.wav"
+        try:
+            await asyncio.to_thread(write_segment, audio_path, window, window_path)
+            return await align_audio_segment(window_path, " ".join(window.words), language, timings=timings)
+        finally:
+            window_path.unlink(missing_ok=True)
+    
+    try:
+        alignments = await asyncio.gather(*(align_window(window) for window in windows))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=f"Incremental re-alignment failed: {str(e)}")
+    with timings.stage("splice"):
+        mfa_data = splice_alignment(base.to_alignment(), windows, alignments)
+    return mfa_data, {**stats, "mode": "incremental"}
+
+def map_phoneme_to_viseme(phoneme: str, language: str) -> int:
+    """Chuyển đổi phoneme sang viseme sử dụng bảng mapping"""
+    if language not in language_registry:
+        # Ngôn ngữ không hỗ trợ, trả về viseme mặc định (0 - Rest)
+        logger.warning(f"No viseme mapping found for phoneme: {phoneme} in {language}, using default 0")
+        return 0
+    return language_registry.get(language).mapper.map(phoneme)
+
+def load_mfa_alignment(mfa_output_path: Path) -> Dict[str, Any]:
+    """
+    Đọc và kiểm tra tệp alignment từ MFA (JSON hoặc TextGrid theo phần mở rộng).
+    Chỉ giữ tier words và phones; raise ValueError nếu tệp không hợp lệ.
+    """
+    try:
+        return read_alignment(mfa_output_path, backend=MFA_OUTPUT_PARSER)
+    except ValueError as e:
+        logger.error(f"Invalid MFA alignment output in {mfa_output_path}: {e}")
+        raise ValueError(f"Invalid MFA alignment output: {e}")
 
 def convert_mfa_json_to_viseme_timeline(mfa_json_path: Path, language: str) -> List[Dict[str, Any]]:
-    """Chuyển đổi kết quả JSON từ MFA thành timeline viseme"""
+    """Chuyển đổi kết quả alignment từ MFA (JSON hoặc TextGrid) thành timeline viseme"""
+    try:
+        return convert_mfa_data_to_viseme_timeline(load_mfa_alignment(mfa_json_path), language)
+    except Exception as e:
+        logger.error(f"Error converting MFA JSON to viseme timeline: {e}")
+        raise
+
+def convert_mfa_data_to_viseme_timeline(mfa_data: Dict[str, Any], language: str) -> List[Dict[str, Any]]:
+    """Chuyển đổi dữ liệu alignment MFA (đã đọc) thành timeline viseme"""
     try:
-        with open(mfa_json_path, "r", encoding="utf-8") as f:
-            mfa_data = json.load(f)
-        
-        if not mfa_data or "tiers" not in mfa_data or "phones" not in mfa_data["tiers"] or "entries" not in mfa_data["tiers"]["phones"]:
-            logger.error(f"Invalid MFA JSON format in {mfa_json_path}")
-            raise ValueError("Invalid MFA JSON format")
-        
         phone_entries = mfa_data["tiers"]["phones"]["entries"]
-        viseme_timeline = []
         
-        for entry in phone_entries:
-            start_time = entry[0]
-            end_time = entry[1]
-            phoneme = entry[2]
-            
-            viseme = map_phoneme_to_viseme(phoneme, language)
-            
-            viseme_timeline.append({
-                "start": start_time,
-                "end": end_time,
-                "duration": end_time - start_time,
-                "phoneme": phoneme,
-                "viseme": viseme
-            })
+        # Chuyển cả tier phone sang viseme trong một lần gọi
+        visemes = language_registry.get(language).mapper.map_many([entry[2] for entry in phone_entries]).tolist()
         
-        return viseme_timeline
+        return [
+            {
+                "start": entry[0],
+                "end": entry[1],
+                "duration": entry[1] - entry[0],
+                "phoneme": entry[2],
+                "viseme": viseme
+            }
+            for entry, viseme in zip(phone_entries, visemes)
+        ]
     
     except Exception as e:
-        logger.error(f"Error converting MFA JSON to viseme timeline: {e}")
+        logger.error(f"Error converting MFA data to viseme timeline: {e}")
         raise
 
+def convert_mfa_data_to_columnar_timeline(mfa_data: Dict[str, Any], language: str) -> ColumnarTimeline:
+    """Chuyển đổi dữ liệu alignment MFA thành timeline dạng cột (không dựng dict cho từng phone)"""
+    try:
+        phone_entries = mfa_data["tiers"]["phones"]["entries"]
+        visemes = language_registry.get(language).mapper.map_many([entry[2] for entry in phone_entries])
+        return ColumnarTimeline.from_entries(phone_entries, visemes)
+    
+    except Exception as e:
+        logger.error(f"Error converting MFA data to columnar timeline: {e}")
+        raise
+
+# Vòng đời ứng dụng
+async def start_mfa_pool():
+    """Khởi động pool worker MFA nếu được bật"""
+    global mfa_pool
+    if not MFA_POOL_ENABLED:
+        return
+    mfa_pool = MFAWorkerPool(
+        language_registry.models(),
+        size=MFA_POOL_SIZE,
+        queue_size=MFA_POOL_QUEUE_SIZE,
+        backend=MFA_POOL_BACKEND,
+        request_timeout=MFA_POOL_REQUEST_TIMEOUT,
+        health_interval=MFA_POOL_HEALTH_INTERVAL,
+        stub_latency=MFA_POOL_STUB_LATENCY,
+    )
+    await mfa_pool.start()
+    if mfa_pool.language_models and mfa_pool.alive_workers() == 0:
+        # Không worker nào khởi động được (vd không import được MFA): gọi `mfa` trực tiếp cho từng request
+        logger.warning("No MFA pool worker could start (is montreal_forced_aligner importable?), "
+                       f"disabling the pool and running {MFA_CMD} per request")
+        await mfa_pool.stop()
+        mfa_pool = None
+
+def start_job_manager():
+    """Khởi tạo job manager với job store đã cấu hình"""
+    global job_manager
+    if JOB_STORE_BACKEND == "sqlite":
+        store = SQLiteJobStore(JOB_STORE_PATH)
+    else:
+        store = InMemoryJobStore()
+    job_manager = JobManager(
+        store,
+        run_viseme_job,
+        concurrency_per_language=JOB_CONCURRENCY_PER_LANGUAGE,
+        result_ttl=JOB_RESULT_TTL,
+        cleanup=lambda payload: scratch_space.release_path(Path(payload["workspace"])),
+        cancel_poll_interval=JOB_CANCEL_POLL_INTERVAL if JOB_STORE_BACKEND == "sqlite" else None,
+        maintenance_interval=JOB_MAINTENANCE_INTERVAL,
+        heartbeat_timeout=JOB_HEARTBEAT_TIMEOUT,
+        callback_allowed_hosts=JOB_CALLBACK_ALLOWED_HOSTS,
+    )
+
+async def start_health_monitor():
+    """Bắt đầu kiểm tra sức khỏe định kỳ trong nền"""
+    global health_monitor
+    health_monitor = HealthMonitor(check_mfa_components, interval=HEALTH_CHECK_INTERVAL)
+    await health_monitor.start()
+
+async def warm_up(languages: List[str]):
+    """
+    Chạy thử trước request đầu tiên: spawn các process của pool chuẩn hóa audio và align clip dựng sẵn
+    cho từng ngôn ngữ đã nạp (mfa_pool hoặc `mfa align_one`). Lỗi chỉ được ghi lại, không chặn ready.
+    """
+    try:
+        # Dùng workspace như request thật (cùng thư mục scratch, cùng đường đi tới MFA)
+        with scratch_space.workspace("warmup") as workspace:
+            clip_path = workspace.path / "warmup.wav"
+            ingested_paths = [workspace.path / f"warmup_{i}.wav" for i in range(INGEST_WORKERS)]
+            with startup_tracker.phase("warmup_ingest"):
+                await asyncio.to_thread(write_warmup_clip, clip_path, INGEST_SAMPLE_RATE)
+                # Mỗi worker nhận một tác vụ để cả pool được khởi tạo (spawn + import numpy)
+                await asyncio.gather(*(ingest_audio(clip_path, path, batch_ingest_options, ingest_pool)
+                                       for path in ingested_paths))
+            for language in languages:
+                with startup_tracker.phase(f"warmup_align_{language}"):
+                    await align_audio_segment(clip_path, language_registry.get(language).spec.warmup_text,
+                                              language, background=True)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.warning(f"Warm-up failed, serving without it: {e}")
+    startup_tracker.mark_ready()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Khởi động: logging, thư mục tạm, gói ngôn ngữ và tài nguyên (theo STARTUP_PRELOAD_LANGUAGES), pool MFA,
+    job manager, pool chuẩn hóa audio, health monitor; warm-up và quét lại gói ngôn ngữ chạy nền sau khi
+    bắt đầu nhận request.
+    Tắt: health monitor, job, alignment còn lại và pool MFA, pool chuẩn hóa audio.
+    """
+    global ingest_pool, warmup_task, language_reload_task, scratch_sweep_task
+    configure_logging()
+    with startup_tracker.phase("directories"):
+        prepare_directories()
+        removed = sweep_scratch()
+        if removed:
+            logger.warning(f"Removed {removed} orphaned scratch entries left by a previous run")
+    with startup_tracker.phase("language_packs"):
+        await asyncio.to_thread(language_registry.reload)
+    preload = parse_language_list(STARTUP_PRELOAD_LANGUAGES, language_registry.codes())
+    with startup_tracker.phase("languages"):
+        try:
+            language_registry.load(preload)
+        except LanguageResourceError:
+            # Đã ghi log; ngôn ngữ lỗi được báo trong /api/health và request dùng ngôn ngữ đó sẽ lỗi
+            preload = [language for language in preload if language in language_registry.loaded()]
+    with startup_tracker.phase("mfa_pool"):
+        await start_mfa_pool()
+    with startup_tracker.phase("job_manager"):
+        start_job_manager()
+        await job_manager.start()
+    with startup_tracker.phase("ingest_pool"):
+        ingest_pool = IngestPool(INGEST_WORKERS, use_processes=INGEST_USE_PROCESSES)
+    with startup_tracker.phase("health_monitor"):
+        await start_health_monitor()
+    
+    if LANGUAGE_PACKS_RELOAD_INTERVAL > 0:
+        language_reload_task = asyncio.create_task(language_reload_loop())
+    if SCRATCH_SWEEP_INTERVAL > 0:
+        scratch_sweep_task = asyncio.create_task(scratch_sweep_loop())
+    
+    startup_tracker.mark_serving()
+    if STARTUP_WARMUP:
+        warmup_task = asyncio.create_task(warm_up(preload))
+    else:
+        startup_tracker.mark_ready()
+    
+    try:
+        yield
+    finally:
+        for task in (warmup_task, language_reload_task, scratch_sweep_task):
+            if task is not None and not task.done():
+                task.cancel()
+        if health_monitor is not None:
+            await health_monitor.stop()
+        # Chờ các job đang chạy kết thúc (tối đa SHUTDOWN_DRAIN_TIMEOUT), hủy phần còn lại
+        if job_manager is not None:
+            await job_manager.shutdown(drain_timeout=SHUTDOWN_DRAIN_TIMEOUT)
+        # Chờ các alignment còn lại (cửa sổ streaming, ...) rồi dừng pool worker MFA
+        await alignment_scheduler.drain(SHUTDOWN_DRAIN_TIMEOUT)
+        if mfa_pool is not None:
+            await mfa_pool.stop()
+        if ingest_pool is not None:
+            ingest_pool.shutdown()
+
+app.router.lifespan_context = lifespan
+
+def compute_viseme_statistics(viseme_timeline: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Tính tổng thời lượng và số lượng từng viseme trong timeline"""
+    viseme_counts = {}
+    total_duration = 0
+    for item in viseme_timeline:
+        viseme = item["viseme"]
+        duration = item["duration"]
+        total_duration += duration
+        viseme_counts[str(viseme)] = viseme_counts.get(str(viseme), 0) + 1
+    
+    return {
+        "total_duration": total_duration,
+        "viseme_statistics": {
+            "counts": viseme_counts,
+            "total_visemes": len(viseme_timeline)
+        }
+    }
+
 # API endpoints
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     """Root endpoint với giao diện web"""
     return templates.TemplateResponse("index.html", {"request": request})
 
+async def check_mfa_components() -> Dict[str, Any]:
+    """Kiểm tra MFA, các model và tệp mapping (chạy trong nền bởi health_monitor)"""
+    status = "healthy"
+    components = {}
+    
+    # Chạy song song `mfa --version` và `mfa model inspect` cho từng ngôn ngữ
+    commands = {("mfa", None): [MFA_CMD, "--version"]}
+    specs = dict(language_registry.specs)
+    for lang, spec in specs.items():
+        commands[(lang, "acoustic")] = [MFA_CMD, "model", "inspect", "acoustic", spec.acoustic_model]
+        commands[(lang, "dictionary")] = [MFA_CMD, "model", "inspect", "dictionary", spec.dictionary]
+    results = dict(zip(commands, await asyncio.gather(
+        *(run_check_command(cmd, HEALTH_CHECK_TIMEOUT) for cmd in commands.values())
+    )))
+    
+    returncode, stdout = results[("mfa", None)]
+    if returncode == 0:
+        components["mfa"] = "ok"
+        components["mfa_version"] = stdout
+    else:
+        components["mfa"] = "error"
+        status = "degraded"
+    
+    components["models"] = {}
+    for lang in specs:
+        if results[(lang, "acoustic")][0] == 0 and results[(lang, "dictionary")][0] == 0:
+            components["models"][lang] = "ok"
+        else:
+            components["models"][lang] = "error"
+            status = "degraded"
+    
+    # Kiểm tra mapping files
+    components["viseme_mappings"] = {lang: "ok" if spec.mapping_path.exists() else "error"
+                                     for lang, spec in specs.items()}
+    if "error" in components["viseme_mappings"].values():
+        status = "degraded"
+    
+    return {"status": status, "components": components}
+
 @app.get("/api/health")
 async def health_check():
-    """Endpoint kiểm tra sức khỏe của API"""
-    # Kiểm tra xem các thành phần cần thiết có hoạt động không
+    """
+    Endpoint kiểm tra sức khỏe của API.
+    Kết quả kiểm tra MFA/model lấy từ lần kiểm tra nền gần nhất (xem checks.checked_at), không chạy subprocess.
+    """
+    checks = health_monitor.snapshot() if health_monitor is not None else {"status": "unknown", "components": {}}
     health_status = {
-        "status": "healthy",
+        "status": "healthy" if checks["status"] in ("healthy", "unknown") else checks["status"],
         "timestamp": datetime.now().isoformat(),
         "components": {
             "api": "ok",
-            "temp_directories": "ok"
-        }
+            "temp_directories": "ok",
+            **checks["components"],
+        },
+        "checks": {key: checks[key] for key in ("status", "checked_at", "age", "check_duration")},
     }
     
-    # Kiểm tra MFA có trong path không
-    try:
-        process = await asyncio.create_subprocess_exec(
-            MFA_CMD, "--version",
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
-        if process.returncode == 0:
-            health_status["components"]["mfa"] = "ok"
-            health_status["components"]["mfa_version"] = stdout.decode().strip()
-        else:
-            health_status["components"]["mfa"] = "error"
+    # Trạng thái hàng đợi alignment
+    health_status["components"]["scheduler"] = alignment_scheduler.stats()
+    
+    # Trạng thái pool worker MFA
+    if mfa_pool is not None:
+        health_status["components"]["mfa_pool"] = mfa_pool.stats()
+        if not all(w["alive"] for lang in health_status["components"]["mfa_pool"]["languages"].values()
+                   for w in lang["workers"]):
             health_status["status"] = "degraded"
-    except Exception:
-        health_status["components"]["mfa"] = "error"
-        health_status["status"] = "degraded"
     
-    # Kiểm tra mapping files
-    if VIETNAMESE_PHONEME_TO_VISEME_MAP_PATH.exists():
-        health_status["components"]["vietnamese_viseme_mapping"] = "ok"
-    else:
-        health_status["components"]["vietnamese_viseme_mapping"] = "error"
-        health_status["status"] = "degraded"
+    # Các phiên streaming đang mở
+    health_status["components"]["stream_sessions"] = len(active_stream_sessions)
     
-    if ENGLISH_PHONEME_TO_VISEME_MAP_PATH.exists():
-        health_status["components"]["english_viseme_mapping"] = "ok"
-    else:
-        health_status["components"]["english_viseme_mapping"] = "error"
-        health_status["status"] = "degraded"
+    # Workspace tạm của các request (RAM/đĩa, quota đã giữ chỗ)
+    health_status["components"]["scratch"] = scratch_space.stats()
     
-    # Kiểm tra các model MFA
-    health_status["components"]["models"] = {}
-    for lang, models in LANGUAGE_MODELS.items():
-        try:
-            # Kiểm tra acoustic model
-            process_acoustic = await asyncio.create_subprocess_exec(
-                MFA_CMD, "model", "inspect", "acoustic", models["acoustic_model"],
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout_acoustic, stderr_acoustic = await process_acoustic.communicate()
-            
-            # Kiểm tra dictionary
-            process_dict = await asyncio.create_subprocess_exec(
-                MFA_CMD, "model", "inspect", "dictionary", models["dictionary"],
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout_dict, stderr_dict = await process_dict.communicate()
-            
-            if process_acoustic.returncode == 0 and process_dict.returncode == 0:
-                health_status["components"]["models"][lang] = "ok"
-            else:
-                health_status["components"]["models"][lang] = "error"
-                health_status["status"] = "degraded"
-        except Exception:
-            health_status["components"]["models"][lang] = "error"
-            health_status["status"] = "degraded"
+    # Các phoneme không có trong bảng mapping (đã gặp từ khi khởi động)
+    health_status["components"]["unmapped_phonemes"] = {
+        lang: resources.mapper.unknown_counts() for lang, resources in language_registry.loaded().items()
+    }
+    
+    # Trạng thái khởi động: thời gian từng bước, time-to-ready, ngôn ngữ đã nạp
+    health_status["components"]["startup"] = {
+        **startup_tracker.snapshot(),
+        "languages": language_registry.status(),
+    }
+    if "error" in health_status["components"]["startup"]["languages"].values():
+        health_status["status"] = "degraded"
     
     return health_status
 
-# Thêm import
-from fastapi.responses import FileResponse
+@app.get("/api/health/live")
+async def liveness_check():
+    """Liveness probe: process còn phản hồi (không kiểm tra thành phần nào)"""
+    return {"status": "alive"}
 
-# Thêm vào API của bạn
-@app.get("/api/examples/{language}")
-async def get_example(language: str):
-    """Endpoint để lấy dữ liệu ví dụ cho từng ngôn ngữ"""
-    if language not in ["vi", "en"]:
+@app.get("/api/health/ready")
+async def readiness_check():
+    """
+    Readiness probe: trả 503 khi chưa khởi động xong (hoặc chưa warm-up xong), hàng đợi alignment/pool gần đầy,
+    không còn worker MFA sống, hoặc (khi không dùng pool) lần kiểm tra nền gần nhất thấy MFA lỗi.
+    """
+    pool_stats = mfa_pool.stats() if mfa_pool is not None else None
+    reasons = evaluate_readiness(alignment_scheduler.stats(), pool_stats, READY_MAX_QUEUE_RATIO)
+    if job_manager is None:
+        reasons.append("starting up")
+    elif READY_REQUIRE_WARMUP and not startup_tracker.ready:
+        reasons.append("warming up")
+    if mfa_pool is None and health_monitor is not None:
+        components = health_monitor.result["components"]
+        if components.get("mfa") == "error":
+            reasons.append("mfa command is not available")
+        reasons.extend(f"MFA models for {lang} failed inspection"
+                       for lang, state in components.get("models", {}).items() if state == "error")
+    
+    if reasons:
+        return JSONResponse(status_code=503, content={"status": "not_ready", "reasons": reasons})
+    return {"status": "ready"}
+
+@app.get("/api/scheduler/stats")
+async def scheduler_stats():
+    """Endpoint thống kê hàng đợi alignment (số đang chạy, đang chờ, thời gian chờ)"""
+    return alignment_scheduler.stats()
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Endpoint thống kê cache alignment (hit/miss, dung lượng)"""
+    if alignment_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **alignment_cache.stats()}
+
+@app.get("/metrics")
+async def metrics():
+    """Endpoint metrics theo định dạng Prometheus (thời gian từng bước, số request/lỗi, hàng đợi, mã thoát MFA)"""
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+def get_example_spec(language: str):
+    """Gói ngôn ngữ có clip ví dụ (400 nếu ngôn ngữ không được hỗ trợ)"""
+    if language not in language_registry:
         raise HTTPException(
             status_code=400,
-            detail=f"Unsupported language: {language}. Supported languages: vi, en"
+            detail=f"Unsupported language: {language}. Supported languages: {', '.join(language_registry.codes())}"
         )
-    
-    # Đường dẫn đến thư mục ví dụ
-    examples_dir = BASE_DIR / "static/examples"
+    return language_registry.spec(language)
+
+@app.get("/api/examples/{language}")
+async def get_example(language: str):
+    """Endpoint để lấy dữ liệu ví dụ cho từng ngôn ngữ (khai báo trong gói ngôn ngữ)"""
+    spec = get_example_spec(language)
     
     # Đọc nội dung tệp text
-    try:
-        with open(examples_dir / f"example_{language}.txt", "r", encoding="utf-8") as f:
-            text = f.read().strip()
-    except Exception as e:
-        logger.error(f"Error reading example text for {language}: {e}")
-        text = ""
+    text = ""
+    if spec.example_text is not None:
+        try:
+            with open(spec.example_text, "r", encoding="utf-8") as f:
+                text = f.read().strip()
+        except Exception as e:
+            logger.error(f"Error reading example text for {language}: {e}")
     
     # Trả về dữ liệu ví dụ
     return {
         "text": text,
-        "audio_path": f"/static/examples/example_{language}.wav"
+        "audio_path": f"/api/examples/{language}/audio"
     }
 
 # Hoặc có thể trả về file audio trực tiếp
 @app.get("/api/examples/{language}/audio")
 async def get_example_audio(language: str):
     """Endpoint để lấy file audio ví dụ"""
-    if language not in ["vi", "en"]:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported language: {language}. Supported languages: vi, en"
-        )
-    
-    # Đường dẫn đến file audio
-    audio_path = BASE_DIR / f"static/examples/example_{language}.wav"
+    audio_path = get_example_spec(language).example_audio
     
-    if not audio_path.exists():
+    if audio_path is None or not audio_path.exists():
         raise HTTPException(
             status_code=404,
             detail=f"Example audio for {language} not found"
@@ -401,110 +1158,1002 @@ async def get_example_audio(language: str):
     
     return FileResponse(audio_path)
 
+async def reload_language_packs() -> Dict[str, List[str]]:
+    """Quét lại thư mục gói ngôn ngữ và cập nhật worker MFA của các ngôn ngữ thêm/đổi/bỏ"""
+    changes = await asyncio.to_thread(language_registry.reload)
+    if mfa_pool is not None and any(changes[kind] for kind in ("added", "changed", "removed")):
+        await mfa_pool.update_languages(language_registry.models())
+    return changes
+
+async def language_reload_loop():
+    """Quét lại thư mục gói ngôn ngữ theo chu kỳ LANGUAGE_PACKS_RELOAD_INTERVAL"""
+    while True:
+        await asyncio.sleep(LANGUAGE_PACKS_RELOAD_INTERVAL)
+        try:
+            await reload_language_packs()
+        except Exception as e:
+            logger.error(f"Error reloading language packs: {e}")
+
+@app.get("/api/languages")
+async def list_languages():
+    """Các ngôn ngữ đang được hỗ trợ (theo gói trong LANGUAGE_PACKS_DIR) và trạng thái nạp"""
+    status = language_registry.status()
+    loaded = language_registry.loaded()
+    
+    def dictionary_info(code: str) -> Optional[Dict[str, int]]:
+        dictionary = loaded[code].dictionary if code in loaded else None
+        return {"words": len(dictionary), "memory_bytes": dictionary.memory_bytes} if dictionary is not None else None
+    
+    return {
+        "languages": [
+            {
+                "code": code,
+                "name": spec.name,
+                "acoustic_model": spec.acoustic_model,
+                "dictionary": spec.dictionary,
+                "status": status.get(code, "not_loaded"),
+                "has_example": spec.example_audio is not None and spec.example_audio.exists(),
+                "revision": spec.revision[:12],
+                "dictionary_index": dictionary_info(code),
+            }
+            for code, spec in language_registry.specs.items()
+        ],
+        "transcript_oov_policy": TRANSCRIPT_OOV_POLICY,
+        "errors": language_registry.errors(),
+        "generation": language_registry.generation,
+        "reloaded_at": datetime.fromtimestamp(language_registry.reloaded_at).isoformat()
+        if language_registry.reloaded_at else None,
+    }
+
+@app.post("/api/languages/reload")
+async def reload_languages():
+    """Quét lại thư mục gói ngôn ngữ ngay (chỉ trên worker nhận request; các worker khác tự quét theo chu kỳ)"""
+    changes = await reload_language_packs()
+    return {"changes": changes, "errors": language_registry.errors(), "languages": language_registry.codes()}
+
+async def process_viseme_generation(
+    request_id: str,
+    audio_path: Path,
+    audio_hash: str,
+    transcript: str,
+    language: str,
+    audio_filename: Optional[str] = None,
+    bypass_cache: bool = False,
+    start_time: Optional[float] = None,
+    background: bool = False,
+    columnar: bool = False,
+    resample_options: Optional[ResampleOptions] = None,
+    longform: Optional[bool] = None,
+    engine: str = "mfa",
+    timings: Optional[StageTimings] = None,
+    include_words: bool = True,
+    include_sentences: bool = False,
+    realign_base: Optional[TimelineIndex] = None,
+    workspace: Optional[Workspace] = None,
+) -> Dict[str, Any]:
+    """
+    Pipeline tạo viseme cho một tệp audio đã lưu: tra cứu cache, chuẩn hóa audio, chạy MFA, chuyển đổi sang viseme.
+    Dùng chung cho endpoint đồng bộ và job bất đồng bộ. Tệp audio do caller tự xóa.
+    Với columnar=True, viseme_timeline trong response là ColumnarTimeline thay vì danh sách dict.
+    Với resample_options, response có thêm frame_track (viseme theo từng khung hình).
+    longform=None: tự dùng chế độ long-form khi audio dài hơn LONGFORM_MIN_SECONDS.
+    engine="preview": ước lượng alignment từ transcript và năng lượng audio, không chạy MFA và không dùng cache.
+    Thời gian từng bước được ghi vào timings (tạo mới nếu không truyền) và trả về trong metadata.timings.
+    include_words/include_sentences: thêm word_timeline/sentence_timeline vào response; timeline được lưu
+    theo request_id để truy vấn qua /api/timelines/{request_id}/... (khi bật TIMELINE_STORE_ENABLED).
+    realign_base: timeline cũ của cùng audio; chỉ align lại các cửa sổ quanh từ thay đổi (xem realign.py).
+    Transcript được chuẩn hóa theo gói ngôn ngữ trước khi tra cache và align (response giữ transcript gốc,
+    kết quả chuẩn hóa/kiểm tra từ điển nằm trong metadata.transcript_check).
+    Tệp trung gian nằm trong workspace của caller (cùng tệp upload) hoặc một workspace riêng (scratch.py).
+    """
+    start_time = start_time or time.time()
+    timings = timings or new_stage_timings(language)
+    workspace_scope = ExitStack()
+    if workspace is None:
+        workspace = workspace_scope.enter_context(
+            scratch_space.workspace(request_id, estimate_workspace_bytes(audio_path.stat().st_size))
+        )
+    transcript_path = workspace.path / f"{request_id}_transcript.txt"
+    mfa_output_path = workspace.path / f"{request_id}_alignment{MFA_OUTPUT_SUFFIX}"
+    ingested_path = workspace.path / f"{request_id}_ingested.wav"
+    ingest_info = None
+    longform_stats = None
+    realign_stats = None
+    confidence = None
+    
+    try:
+        # Chuẩn hóa transcript (đọc số, ký hiệu, viết tắt) và kiểm tra từ điển trước khi làm bất cứ việc gì khác;
+        # engine preview không dùng từ điển MFA nên không kiểm tra
+        normalized = await prepare_transcript(transcript, language, timings, check=engine == "mfa")
+        aligned_transcript = normalized.text
+        
+        # Tra cứu cache alignment (khóa theo nội dung tệp gốc nên không cần chuẩn hóa audio khi hit)
+        mfa_data = None
+        cache_key = None
+        cache_status = "disabled"
+        if engine == "preview":
+            cache_status = "not_used"
+        elif alignment_cache is not None:
+            cache_key = make_cache_key(
+                audio_hash,
+                aligned_transcript,
+                language,
+                get_model_signature(language) + {True: ":longform", False: ":single"}.get(longform, "")
+            )
+            if bypass_cache:
+                cache_status = "bypass"
+            else:
+                with timings.stage("cache_lookup"):
+                    mfa_data = await asyncio.to_thread(alignment_cache.get, cache_key)
+                cache_status = "hit" if mfa_data is not None else "miss"
+        
+        if mfa_data is None:
+            # Chuẩn hóa audio: giải mã, mono, tần số của acoustic model, cắt khoảng lặng đầu/cuối
+            # (align lại một phần không cắt khoảng lặng để giữ nguyên thời gian của timeline cũ)
+            options = ingest_options if realign_base is None else batch_ingest_options
+            try:
+                with timings.stage("ingest"):
+                    ingested = await ingest_audio(audio_path, ingested_path, options, ingest_pool)
+            except AudioDecodeError as e:
+                raise HTTPException(status_code=415, detail=f"Cannot decode audio: {str(e)}")
+            ingest_info = ingested.info
+            logger.info(f"Request {request_id}: Ingested {ingest_info['source_format']} audio "
+                        f"({ingest_info['source_duration']:.2f}s, trimmed {ingest_info['trim_offset']:.2f}s) "
+                        f"in {ingest_info['ingest_time']:.3f}s")
+            if longform is None:
+                longform = engine == "mfa" and LONGFORM_ENABLED and ingest_info["duration"] >= LONGFORM_MIN_SECONDS
+            
+            if realign_base is not None:
+                mfa_data, realign_stats = await realign_changed_windows(
+                    request_id, ingested.path, ingest_info["duration"], aligned_transcript, language, realign_base,
+                    timings, workspace.path
+                )
+                logger.info(f"Request {request_id}: Re-alignment mode {realign_stats['mode']}, "
+                            f"{realign_stats['realigned_seconds']:.2f}s of {realign_stats['total_seconds']:.2f}s")
+            
+            if mfa_data is None:
+                if engine == "preview":
+                    with timings.stage("preview_alignment"):
+                        # Bộ luật G2P theo gói ngôn ngữ (mặc định theo mã ngôn ngữ)
+                        preview_rules = language_registry.spec(language).preview_rules or language
+                        mfa_data, confidence = await asyncio.to_thread(
+                            estimate_alignment, ingested.path, aligned_transcript, preview_rules
+                        )
+                elif longform:
+                    # Chia audio tại khoảng lặng, align các đoạn song song rồi ghép lại
+                    try:
+                        mfa_data, longform_stats = await align_longform(
+                            ingested.path,
+                            aligned_transcript,
+                            workspace.path,
+                            lambda segment_path, text: align_audio_segment(segment_path, text, language,
+                                                                           background=True, timings=timings),
+                            longform_options,
+                        )
+                    except LongformError as e:
+                        raise HTTPException(status_code=500, detail=f"Long-form alignment failed: {str(e)}")
+                else:
+                    # Tạo tệp transcript
+                    create_lab_file(aligned_transcript, transcript_path)
+                
+                    # Chạy MFA để tạo alignment
+                    mfa_success = await run_mfa_align(ingested.path, transcript_path, mfa_output_path, language,
+                                                      background=background, timings=timings,
+                                                      temporary_directory=workspace.mfa_temp_dir)
+                
+                    if not mfa_success:
+                        raise HTTPException(
+                            status_code=500,
+                            detail=f"Failed to generate alignment with Montreal Forced Aligner for {language}"
+                        )
+                
+                    with timings.stage("parse"):
+                        mfa_data = load_mfa_alignment(mfa_output_path)
+            
+            # Đưa timeline về thời gian của tệp gốc (bù phần khoảng lặng đầu đã cắt)
+            mfa_data = shift_alignment(mfa_data, ingested.trim_offset, ingested.source_duration)
+            if cache_key is not None and not (longform_stats and longform_stats["failed_segments"]):
+                await asyncio.to_thread(alignment_cache.put, cache_key, mfa_data)
+        else:
+            logger.info(f"Request {request_id}: Alignment cache hit")
+    finally:
+        cleanup_temp_files([transcript_path, mfa_output_path, ingested_path])
+        cleanup_temp_dir(workspace.mfa_temp_dir)
+        workspace_scope.close()
+    
+    # Chuyển đổi kết quả MFA thành viseme timeline và tính thống kê
+    with timings.stage("mapping"):
+        if columnar:
+            viseme_timeline = convert_mfa_data_to_columnar_timeline(mfa_data, language)
+            statistics = viseme_timeline.statistics()
+        else:
+            viseme_timeline = convert_mfa_data_to_viseme_timeline(mfa_data, language)
+            statistics = compute_viseme_statistics(viseme_timeline)
+    
+    # Tier từ/câu và chỉ mục thời gian cho các truy vấn theo khoảng
+    timeline_index = None
+    if include_words or include_sentences or timeline_store is not None:
+        with timings.stage("index"):
+            visemes = viseme_timeline.viseme if columnar else [entry["viseme"] for entry in viseme_timeline]
+            timeline_index = TimelineIndex.from_alignment(mfa_data, visemes, language, transcript, audio_hash)
+            if timeline_store is not None:
+                timeline_store.put(request_id, timeline_index)
+    
+    # Chuyển sang track theo khung hình nếu được yêu cầu
+    frame_track = None
+    if resample_options:
+        with timings.stage("resample"):
+            frame_track = resample_timeline(viseme_timeline, resample_options)
+    
+    # Chuẩn bị response
+    processing_time = time.time() - start_time
+    logger.info(f"Request {request_id}: Completed in {processing_time:.2f}s with {len(viseme_timeline)} visemes")
+    response = {
+        "request_id": request_id,
+        "processing_time": processing_time,
+        "status": "success",
+        "viseme_timeline": viseme_timeline,
+        "transcript": transcript,
+        "language": language,
+        "metadata": {
+            "audio_filename": audio_filename,
+            **statistics,
+            "alignment_cache": cache_status,
+            "engine": engine,
+            "transcript_check": normalized.report(),
+            "timings": timings.as_dict(),
+            "process_timestamp": datetime.now().isoformat()
+        }
+    }
+    if confidence is not None:
+        response["metadata"]["confidence"] = confidence
+    if longform_stats is not None:
+        response["metadata"]["longform"] = longform_stats
+    if realign_stats is not None:
+        response["metadata"]["realign"] = realign_stats
+    if ingest_info is not None:
+        response["metadata"]["ingest"] = ingest_info
+    if frame_track is not None:
+        response["frame_track"] = frame_track
+    if include_words:
+        response["word_timeline"] = timeline_index.words
+    if include_sentences:
+        response["sentence_timeline"] = timeline_index.sentences
+    return response
+
 @app.post("/api/generate-viseme", response_model=VisemeGenerationResponse)
 async def generate_viseme(
-    background_tasks: BackgroundTasks,
-    audio_file: UploadFile = File(..., description="Tệp audio WAV"),
+    request: Request,
+    audio_file: UploadFile = File(..., description="Tệp audio (WAV, FLAC, MP3, OGG, ...)"),
     transcript: str = Form(..., description="Văn bản cần xử lý"),
     language: str = Form("vi", description="Ngôn ngữ (vi: Tiếng Việt, en: Tiếng Anh)"),
+    fps: Optional[float] = Form(None, description="Số khung hình/giây cho frame_track (vd: 24, 30, 60)"),
+    merge_visemes: bool = Form(True, description="Gộp các viseme giống nhau liền kề trong frame_track"),
+    min_viseme_frames: float = Form(DEFAULT_MIN_FRAMES, description="Bỏ viseme ngắn hơn số khung hình này"),
+    crossfade: float = Form(0.0, description="Cửa sổ crossfade (giây) giữa các viseme kề nhau"),
+    longform: Optional[bool] = Form(None, description="Chia audio dài tại khoảng lặng (mặc định tự chọn theo độ dài)"),
+    engine: str = Form("mfa", description="Engine alignment (mfa: chính xác, preview: ước lượng nhanh)"),
+    words: bool = Form(True, description="Thêm word_timeline (tier từ gắn với dải phone)"),
+    sentences: bool = Form(False, description="Thêm sentence_timeline (nhóm từ theo câu của transcript)"),
+    output_format: Optional[str] = Query(None, alias="format",
+                                         description="Định dạng kết quả: json, compact, msgpack, binary"),
 ):
     """
     Endpoint chính để tạo viseme từ audio và văn bản
     
-    - Upload tệp audio WAV
+    - Upload tệp audio (WAV, hoặc FLAC/MP3/OGG/... khi có soundfile/audioread); audio được chuẩn hóa
+      về mono đúng tần số của model và cắt khoảng lặng đầu/cuối, timeline vẫn theo thời gian của tệp gốc
     - Cung cấp văn bản transcript tương ứng
     - Chọn ngôn ngữ (vi hoặc en)
     - Nhận kết quả là timeline các viseme phù hợp với audio
+    - Gửi header X-Cache-Bypass: 1 để bỏ qua cache alignment
+    - Chọn định dạng kết quả bằng tham số format hoặc header Accept
+      (application/x-msgpack, application/octet-stream); mặc định là JSON
+    - Gửi fps để nhận thêm frame_track: viseme (và trọng số crossfade) cho từng khung hình
+    - engine=preview: ước lượng nhanh không cần MFA (xem trước), metadata có confidence
+    - word_timeline (và sentence_timeline khi sentences=true) liên kết từ/câu với dải phone; timeline được
+      lưu theo request_id để truy vấn một đoạn qua /api/timelines/{request_id}/visemes?start=&end=
     """
-    if language not in LANGUAGE_MODELS:
+    if language not in language_registry:
         raise HTTPException(
             status_code=400,
-            detail=f"Unsupported language: {language}. Supported languages: {', '.join(LANGUAGE_MODELS.keys())}"
+            detail=f"Unsupported language: {language}. Supported languages: {', '.join(language_registry.codes())}"
         )
     
+    try:
+        response_format = negotiate_format(output_format, request.headers.get("accept"))
+    except TimelineFormatError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    resample_options = build_resample_options(fps, merge_visemes, min_viseme_frames, crossfade)
+    validate_engine(engine)
+    
     start_time = time.time()
     request_id = generate_unique_id()
     logger.info(f"Request {request_id}: Processing viseme generation for {language}")
     
-    # Tạo đường dẫn cho các tệp
-    audio_path = UPLOAD_DIR / f"{request_id}_audio.wav"
-    transcript_path = UPLOAD_DIR / f"{request_id}_transcript.txt"
-    mfa_output_path = RESULTS_DIR / f"{request_id}_alignment.json"
-    
-    temp_files = [audio_path, transcript_path, mfa_output_path]
+    # Workspace của request (tmpfs nếu còn quota): tệp upload và mọi tệp trung gian, bị xóa khi request kết thúc
+    workspace = scratch_space.open(request_id, estimate_workspace_bytes(request_content_length(request)))
+    audio_path = workspace.path / f"{request_id}_audio.wav"
     
+    timings = new_stage_timings(language)
+    REQUESTS_TOTAL.inc(endpoint="generate", language=language)
+    REQUESTS_IN_FLIGHT.inc(endpoint="generate")
     try:
-        # Lưu tệp audio
-        async with aiofiles.open(audio_path, 'wb') as out_file:
-            content = await audio_file.read()
-            await out_file.write(content)
-        logger.info(f"Request {request_id}: Saved audio file to {audio_path}")
+        # Lưu tệp audio theo từng chunk
+        with timings.stage("upload"):
+            saved = await save_audio_upload(audio_file, audio_path)
+        logger.info(f"Request {request_id}: Saved audio file to {audio_path} ({saved.size} bytes)")
         
-        # Tạo tệp transcript
-        create_lab_file(transcript, transcript_path)
-        
-        # Chạy MFA để tạo alignment
-        mfa_success = await run_mfa_align(audio_path, transcript_path, mfa_output_path, language)
-        
-        if not mfa_success:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to generate alignment with Montreal Forced Aligner for {language}"
+        result = await process_viseme_generation(
+            request_id,
+            audio_path,
+            saved.sha256,
+            transcript,
+            language,
+            audio_filename=audio_file.filename,
+            bypass_cache=is_cache_bypassed(request),
+            start_time=start_time,
+            columnar=response_format != "json",
+            resample_options=resample_options,
+            longform=longform,
+            engine=engine,
+            timings=timings,
+            include_words=words,
+            include_sentences=sentences,
+            workspace=workspace,
+        )
+        if response_format == "json":
+            return result
+        with timings.stage("encode"):
+            content = encode_response(result, response_format)
+        return Response(content=content, media_type=MEDIA_TYPES[response_format])
+    
+    except AdmissionError as e:
+        logger.warning(f"Request {request_id}: {e}")
+        REQUEST_FAILURES_TOTAL.inc(endpoint="generate", language=language, reason=failure_reason(e))
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    except PoolQueueFullError as e:
+        logger.warning(f"Request {request_id}: {e}")
+        REQUEST_FAILURES_TOTAL.inc(endpoint="generate", language=language, reason=failure_reason(e))
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
+    
+    except HTTPException as e:
+        REQUEST_FAILURES_TOTAL.inc(endpoint="generate", language=language, reason=failure_reason(e))
+        raise
+    
+    except Exception as e:
+        logger.error(f"Request {request_id}: Error - {str(e)}")
+        REQUEST_FAILURES_TOTAL.inc(endpoint="generate", language=language, reason=failure_reason(e))
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error generating viseme: {str(e)}"
+        )
+    
+    finally:
+        scratch_space.release(workspace)
+        REQUESTS_IN_FLIGHT.dec(endpoint="generate")
+        REQUEST_DURATION_SECONDS.observe(time.time() - start_time, endpoint="generate", language=language)
+
+async def run_viseme_job(job_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Chạy pipeline tạo viseme cho một job bất đồng bộ"""
+    language = payload["language"]
+    start_time = time.time()
+    REQUESTS_TOTAL.inc(endpoint="job", language=language)
+    try:
+        with REQUESTS_IN_FLIGHT.track(endpoint="job"):
+            return await process_viseme_generation(
+                job_id,
+                Path(payload["audio_path"]),
+                payload["audio_hash"],
+                payload["transcript"],
+                language,
+                audio_filename=payload.get("audio_filename"),
+                bypass_cache=payload.get("bypass_cache", False),
+                start_time=start_time,
+                background=True,
+                resample_options=build_resample_options(**payload["resample"]) if payload.get("resample") else None,
+                longform=payload.get("longform"),
+                engine=payload.get("engine", "mfa"),
+                include_words=payload.get("words", True),
+                include_sentences=payload.get("sentences", False),
             )
-        
-        # Chuyển đổi kết quả MFA thành viseme timeline
-        viseme_timeline = convert_mfa_json_to_viseme_timeline(mfa_output_path, language)
-        
-        # Tính thống kê về viseme
-        viseme_counts = {}
-        total_duration = 0
-        for item in viseme_timeline:
-            viseme = item["viseme"]
-            duration = item["duration"]
-            total_duration += duration
-            viseme_counts[str(viseme)] = viseme_counts.get(str(viseme), 0) + 1
-        
-        # Chuẩn bị response
-        processing_time = time.time() - start_time
-        response = {
-            "request_id": request_id,
-            "processing_time": processing_time,
-            "status": "success",
-            "viseme_timeline": viseme_timeline,
-            "transcript": transcript,
-            "language": language,
-            "metadata": {
-                "audio_filename": audio_file.filename,
-                "total_duration": total_duration,
-                "viseme_statistics": {
-                    "counts": viseme_counts,
-                    "total_visemes": len(viseme_timeline)
-                },
-                "process_timestamp": datetime.now().isoformat()
-            }
+    except Exception as e:
+        REQUEST_FAILURES_TOTAL.inc(endpoint="job", language=language, reason=failure_reason(e))
+        raise
+    finally:
+        REQUEST_DURATION_SECONDS.observe(time.time() - start_time, endpoint="job", language=language)
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(
+    request: Request,
+    audio_file: UploadFile = File(..., description="Tệp audio (WAV, FLAC, MP3, OGG, ...)"),
+    transcript: str = Form(..., description="Văn bản cần xử lý"),
+    language: str = Form("vi", description="Ngôn ngữ (vi: Tiếng Việt, en: Tiếng Anh)"),
+    fps: Optional[float] = Form(None, description="Số khung hình/giây cho frame_track (vd: 24, 30, 60)"),
+    merge_visemes: bool = Form(True, description="Gộp các viseme giống nhau liền kề trong frame_track"),
+    min_viseme_frames: float = Form(DEFAULT_MIN_FRAMES, description="Bỏ viseme ngắn hơn số khung hình này"),
+    crossfade: float = Form(0.0, description="Cửa sổ crossfade (giây) giữa các viseme kề nhau"),
+    longform: Optional[bool] = Form(None, description="Chia audio dài tại khoảng lặng (mặc định tự chọn theo độ dài)"),
+    engine: str = Form("mfa", description="Engine alignment (mfa: chính xác, preview: ước lượng nhanh)"),
+    words: bool = Form(True, description="Thêm word_timeline (tier từ gắn với dải phone)"),
+    sentences: bool = Form(False, description="Thêm sentence_timeline (nhóm từ theo câu của transcript)"),
+    callback_url: Optional[str] = Form(None, description="URL nhận kết quả (POST JSON) khi job hoàn tất"),
+):
+    """
+    Tạo job tạo viseme bất đồng bộ, trả về job id ngay lập tức
+    
+    - Hỏi trạng thái và kết quả qua GET /api/jobs/{job_id}
+    - Hoặc cung cấp callback_url để nhận kết quả khi job hoàn tất
+    """
+    if language not in language_registry:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported language: {language}. Supported languages: {', '.join(language_registry.codes())}"
+        )
+    if callback_url:
+        try:
+            await asyncio.to_thread(check_callback_url, callback_url, JOB_CALLBACK_ALLOWED_HOSTS)
+        except CallbackURLError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    build_resample_options(fps, merge_visemes, min_viseme_frames, crossfade)
+    validate_engine(engine)
+    # Từ chối transcript không align được ngay khi tạo job, trước khi lưu audio
+    await prepare_transcript(transcript, language, check=engine == "mfa")
+    
+    job_id = generate_unique_id()
+    # Audio chờ trong hàng đợi job nên nằm trên đĩa; workspace được xóa khi job kết thúc (cleanup của job_manager)
+    workspace = scratch_space.open(f"job-{job_id}", prefer_ram=False)
+    audio_path = workspace.path / f"{job_id}_audio.wav"
+    try:
+        saved = await save_audio_upload(audio_file, audio_path)
+    except BaseException:
+        scratch_space.release(workspace)
+        raise
+    
+    payload = {
+        "workspace": str(workspace.path),
+        "audio_path": str(audio_path),
+        "audio_hash": saved.sha256,
+        "audio_filename": audio_file.filename,
+        "transcript": transcript,
+        "language": language,
+        "bypass_cache": is_cache_bypassed(request),
+        "longform": longform,
+        "engine": engine,
+        "words": words,
+        "sentences": sentences,
+    }
+    if fps is not None:
+        payload["resample"] = {
+            "fps": fps,
+            "merge_visemes": merge_visemes,
+            "min_viseme_frames": min_viseme_frames,
+            "crossfade": crossfade,
         }
+    try:
+        job = await job_manager.submit(job_id, language, payload, callback_url=callback_url)
+    except BaseException:
+        scratch_space.release(workspace)
+        raise
+    
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "status_url": f"/api/jobs/{job_id}"
+    }
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Lấy trạng thái và kết quả của job"""
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Hủy job đang chờ hoặc đang chạy"""
+    job = await job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+def get_timeline_index(timeline_id: str) -> TimelineIndex:
+    """Lấy timeline đã lưu theo request_id/job_id, 404 nếu không có hoặc đã hết hạn"""
+    if timeline_store is None:
+        raise HTTPException(status_code=404, detail="Timeline store is disabled")
+    try:
+        # ID cũng là tên tệp trên đĩa nên chỉ chấp nhận UUID
+        uuid.UUID(timeline_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Timeline {timeline_id} not found")
+    index = timeline_store.get(timeline_id)
+    if index is None:
+        raise HTTPException(status_code=404, detail=f"Timeline {timeline_id} not found")
+    return index
+
+def validate_time_range(start: float, end: Optional[float]) -> float:
+    if end is None:
+        return float("inf")
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be greater than start")
+    return end
+
+@app.get("/api/timelines/{timeline_id}")
+async def get_timeline(timeline_id: str):
+    """Tổng quan timeline đã lưu: thời lượng, số phone/từ và tier câu"""
+    index = get_timeline_index(timeline_id)
+    return {
+        "timeline_id": timeline_id,
+        "language": index.language,
+        "duration": index.duration,
+        "phone_count": len(index),
+        "word_count": len(index.words),
+        "sentence_timeline": index.sentences,
+    }
+
+@app.get("/api/timelines/{timeline_id}/visemes")
+async def get_timeline_visemes(
+    timeline_id: str,
+    start: float = Query(0.0, ge=0, description="Thời điểm bắt đầu (giây)"),
+    end: Optional[float] = Query(None, description="Thời điểm kết thúc (giây), mặc định tới hết timeline"),
+    words: bool = Query(False, description="Thêm các từ giao với khoảng thời gian"),
+):
+    """
+    Các viseme giao với khoảng [start, end) của timeline đã lưu (tìm kiếm nhị phân, không duyệt cả timeline)
+    
+    - timeline_id là request_id của /api/generate-viseme hoặc job_id của /api/jobs
+    - phone_start/phone_end là chỉ số trong viseme_timeline đầy đủ
+    """
+    index = get_timeline_index(timeline_id)
+    t1 = validate_time_range(start, end)
+    phone_start, phone_end = index.phone_range(start, t1)
+    response = {
+        "timeline_id": timeline_id,
+        "start": start,
+        "end": end,
+        "phone_start": phone_start,
+        "phone_end": phone_end,
+        "viseme_timeline": index.visemes(phone_start, phone_end),
+    }
+    if words:
+        response["word_timeline"] = index.words_between(start, t1)
+    return response
+
+@app.get("/api/timelines/{timeline_id}/words")
+async def get_timeline_words(
+    timeline_id: str,
+    start: float = Query(0.0, ge=0, description="Thời điểm bắt đầu (giây)"),
+    end: Optional[float] = Query(None, description="Thời điểm kết thúc (giây), mặc định tới hết timeline"),
+):
+    """Các từ giao với khoảng [start, end) của timeline đã lưu"""
+    index = get_timeline_index(timeline_id)
+    return {
+        "timeline_id": timeline_id,
+        "start": start,
+        "end": end,
+        "word_timeline": index.words_between(start, validate_time_range(start, end)),
+    }
+
+@app.get("/api/timelines/{timeline_id}/word-at")
+async def get_timeline_word_at(
+    timeline_id: str,
+    t: float = Query(..., ge=0, description="Thời điểm (giây)"),
+):
+    """Từ (kèm các viseme của từ đó) và câu tại thời điểm t; word là null nếu t nằm trong khoảng lặng"""
+    index = get_timeline_index(timeline_id)
+    word = index.word_at(t)
+    return {
+        "timeline_id": timeline_id,
+        "time": t,
+        "word": word,
+        "viseme_timeline": index.visemes(word["phone_start"], word["phone_end"]) if word else [],
+        "sentence": index.sentence_at(t),
+    }
+
+@app.post("/api/timelines/{timeline_id}/realign", response_model=VisemeGenerationResponse)
+async def realign_timeline(
+    request: Request,
+    timeline_id: str,
+    audio_file: UploadFile = File(..., description="Tệp audio của request gốc (phải giống hệt)"),
+    transcript: str = Form(..., description="Transcript đã chỉnh sửa"),
+    fps: Optional[float] = Form(None, description="Số khung hình/giây cho frame_track (vd: 24, 30, 60)"),
+    words: bool = Form(True, description="Thêm word_timeline (tier từ gắn với dải phone)"),
+    sentences: bool = Form(False, description="Thêm sentence_timeline (nhóm từ theo câu của transcript)"),
+):
+    """
+    Tạo lại timeline viseme sau khi sửa transcript, chỉ align lại phần audio quanh các từ thay đổi
+    
+    - timeline_id là request_id (hoặc job_id) của kết quả trước, audio phải giống hệt audio đã dùng
+    - Transcript mới được so sánh với tier từ cũ ở mức từ; mỗi vùng thay đổi (kèm vài từ ngữ cảnh và khoảng đệm)
+      được align lại và ghép vào timeline cũ, phần còn lại giữ nguyên
+    - Nếu vùng thay đổi dài hơn REALIGN_MAX_FRACTION thời lượng audio thì align lại toàn bộ
+    - metadata.realign: chế độ (incremental/full/unchanged), các cửa sổ và số giây audio đã align lại
+    - Kết quả mới có request_id riêng và cũng được lưu để truy vấn/align lại tiếp
+    """
+    base = get_timeline_index(timeline_id)
+    language = base.language
+    resample_options = build_resample_options(fps)
+    
+    start_time = time.time()
+    request_id = generate_unique_id()
+    logger.info(f"Request {request_id}: Re-aligning timeline {timeline_id} for {language}")
+    workspace = scratch_space.open(request_id, estimate_workspace_bytes(request_content_length(request)))
+    audio_path = workspace.path / f"{request_id}_audio.wav"
+    
+    timings = new_stage_timings(language)
+    REQUESTS_TOTAL.inc(endpoint="realign", language=language)
+    REQUESTS_IN_FLIGHT.inc(endpoint="realign")
+    try:
+        with timings.stage("upload"):
+            saved = await save_audio_upload(audio_file, audio_path)
+        if base.audio_hash is not None and saved.sha256 != base.audio_hash:
+            raise HTTPException(
+                status_code=409,
+                detail="Audio differs from the audio of the original timeline; use /api/generate-viseme instead"
+            )
         
-        # Thêm task xóa tệp tạm thời
-        background_tasks.add_task(cleanup_temp_files, temp_files)
-        
-        logger.info(f"Request {request_id}: Completed in {processing_time:.2f}s with {len(viseme_timeline)} visemes")
-        return response
+        result = await process_viseme_generation(
+            request_id,
+            audio_path,
+            saved.sha256,
+            transcript,
+            language,
+            audio_filename=audio_file.filename,
+            bypass_cache=is_cache_bypassed(request),
+            start_time=start_time,
+            resample_options=resample_options,
+            timings=timings,
+            include_words=words,
+            include_sentences=sentences,
+            realign_base=base,
+            workspace=workspace,
+        )
+        if "realign" in result["metadata"]:
+            result["metadata"]["realign"]["base_timeline_id"] = timeline_id
+        return result
+    
+    except (AdmissionError, PoolQueueFullError) as e:
+        logger.warning(f"Request {request_id}: {e}")
+        REQUEST_FAILURES_TOTAL.inc(endpoint="realign", language=language, reason=failure_reason(e))
+        raise HTTPException(
+            status_code=getattr(e, "status_code", 503),
+            detail=str(e),
+            headers={"Retry-After": str(getattr(e, "retry_after", 5))}
+        )
+    
+    except HTTPException as e:
+        REQUEST_FAILURES_TOTAL.inc(endpoint="realign", language=language, reason=failure_reason(e))
+        raise
     
     except Exception as e:
         logger.error(f"Request {request_id}: Error - {str(e)}")
-        # Xóa tệp tạm thời nếu có lỗi
-        background_tasks.add_task(cleanup_temp_files, temp_files)
+        REQUEST_FAILURES_TOTAL.inc(endpoint="realign", language=language, reason=failure_reason(e))
         raise HTTPException(
             status_code=500,
-            detail=f"Error generating viseme: {str(e)}"
+            detail=f"Error re-aligning timeline: {str(e)}"
+        )
+    
+    finally:
+        scratch_space.release(workspace)
+        REQUESTS_IN_FLIGHT.dec(endpoint="realign")
+        REQUEST_DURATION_SECONDS.observe(time.time() - start_time, endpoint="realign", language=language)
+
+@app.post("/api/generate-viseme/batch")
+async def generate_viseme_batch(
+    background_tasks: BackgroundTasks,
+    audio_files: Optional[List[UploadFile]] = File(None, description="Danh sách tệp audio (WAV, FLAC, MP3, OGG, ...)"),
+    transcripts: Optional[List[str]] = Form(None, description="Danh sách transcript, cùng thứ tự với audio_files"),
+    languages: Optional[List[str]] = Form(None, description="Ngôn ngữ cho từng item (tùy chọn)"),
+    archive: Optional[UploadFile] = File(None, description="Archive zip/tar chứa các cặp .wav và .txt/.lab"),
+    language: str = Form("vi", description="Ngôn ngữ mặc định (vi: Tiếng Việt, en: Tiếng Anh)"),
+):
+    """
+    Endpoint batch để tạo viseme cho nhiều cặp audio/transcript
+    
+    - Gửi danh sách audio_files + transcripts, hoặc một archive zip/tar
+    - Các item được gom thành một corpus tạm cho mỗi ngôn ngữ và chạy `mfa align` một lần
+    - Trả về timeline viseme cho từng item, lỗi được báo riêng theo từng item
+    """
+    if language not in language_registry:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported language: {language}. Supported languages: {', '.join(language_registry.codes())}"
+        )
+    
+    start_time = time.time()
+    batch_id = generate_unique_id()
+    batch_dir = BATCH_DIR / batch_id
+    upload_dir = batch_dir / "uploads"
+    upload_dir.mkdir(parents=True)
+    background_tasks.add_task(cleanup_temp_dir, batch_dir)
+    
+    items: List[BatchItem] = []
+    
+    # Đọc các item từ archive
+    if archive is not None:
+        archive_path = batch_dir / "archive"
+        try:
+            await save_upload_streaming(archive, archive_path, MAX_BATCH_UPLOAD_BYTES, validate_audio=False)
+            items = await asyncio.to_thread(extract_archive_items, archive_path, upload_dir,
+                                            language_registry.codes(), language, BATCH_MAX_ITEMS,
+                                            MAX_BATCH_ARCHIVE_EXTRACTED_BYTES)
+        except (UploadTooLargeError, ArchiveLimitError) as e:
+            cleanup_temp_dir(batch_dir)
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception as e:
+            cleanup_temp_dir(batch_dir)
+            raise HTTPException(status_code=400, detail=f"Invalid archive: {str(e)}")
+        archive_path.unlink()
+    
+    # Đọc các item từ danh sách tệp upload
+    audio_files = audio_files or []
+    transcripts = transcripts or []
+    if len(audio_files) != len(transcripts):
+        cleanup_temp_dir(batch_dir)
+        raise HTTPException(
+            status_code=400,
+            detail=f"audio_files ({len(audio_files)}) and transcripts ({len(transcripts)}) must have the same length"
+        )
+    if languages and len(languages) != len(audio_files):
+        cleanup_temp_dir(batch_dir)
+        raise HTTPException(status_code=400, detail="languages must have the same length as audio_files")
+    
+    if len(items) + len(audio_files) > BATCH_MAX_ITEMS:
+        cleanup_temp_dir(batch_dir)
+        raise HTTPException(status_code=400,
+                            detail=f"Too many items: {len(items) + len(audio_files)} (max {BATCH_MAX_ITEMS})")
+    
+    # Audio của mọi item (tệp upload và tệp trong archive) được chuẩn hóa như request đơn lẻ (mono, tần số của
+    # acoustic model), song song, mỗi lúc tối đa INGEST_WORKERS item (bằng số worker của pool)
+    ingest_slots = asyncio.Semaphore(INGEST_WORKERS)
+    
+    async def ingest_item(item: BatchItem, source_path: Path, upload: Optional[UploadFile] = None):
+        audio_path = upload_dir / f"{item.item_id}.wav"
+        async with ingest_slots:
+            try:
+                if upload is not None:
+                    await save_upload_streaming(upload, source_path, MAX_UPLOAD_BYTES)
+                ingested = await ingest_audio(source_path, audio_path, batch_ingest_options, ingest_pool)
+                if ingested.path == source_path:
+                    source_path.rename(audio_path)
+                item.audio_path = audio_path
+            except (UploadTooLargeError, InvalidAudioError, AudioDecodeError) as e:
+                item.error = str(e)
+            finally:
+                source_path.unlink(missing_ok=True)
+        if item.error is None and item.language not in language_registry:
+            item.error = f"Unsupported language: {item.language}"
+        elif item.error is None and not item.transcript:
+            item.error = "Empty transcript"
+    
+    uploaded_items = [
+        BatchItem(
+            index=len(items) + i,
+            name=upload.filename or f"audio_{i}",
+            language=languages[i] if languages else language,
+            transcript=item_transcript.strip(),
         )
+        for i, (upload, item_transcript) in enumerate(zip(audio_files, transcripts))
+    ]
+    await asyncio.gather(
+        *(ingest_item(item, item.audio_path) for item in items if item.error is None),
+        *(ingest_item(item, upload_dir / f"{item.item_id}.upload", upload)
+          for item, upload in zip(uploaded_items, audio_files)),
+    )
+    items.extend(uploaded_items)
+    
+    if not items:
+        cleanup_temp_dir(batch_dir)
+        raise HTTPException(status_code=400, detail="No items provided. Send audio_files + transcripts or an archive")
+    
+    logger.info(f"Batch {batch_id}: Processing {len(items)} items")
+    
+    # Chuẩn hóa và kiểm tra transcript của mọi item song song (ngoài event loop) trước khi dựng corpus;
+    # item có từ ngoài từ điển (policy reject) bị loại khỏi corpus thay vì làm hỏng lần align của cả ngôn ngữ
+    def check_item(item: BatchItem):
+        try:
+            normalized = normalize_for_alignment(item.transcript, item.language)
+            item.metadata["transcript_check"] = normalized.report()
+            check_normalized_transcript(normalized, item.language)
+        except HTTPException as e:
+            item.error = e.detail
+            return
+        item.transcript = normalized.text
+    
+    await asyncio.gather(*(asyncio.to_thread(check_item, item) for item in items if not item.error))
+    
+    # Dựng corpus cho từng ngôn ngữ và chạy MFA một lần cho mỗi corpus
+    corpora = build_corpora(items, batch_dir / "corpus", create_lab_file)
+    language_results = {}
+    for corpus_language, corpus_dir in corpora.items():
+        output_dir = batch_dir / "aligned" / corpus_language
+        error = "Failed to generate alignment with Montreal Forced Aligner"
+        try:
+            success = await run_mfa_align_corpus(corpus_dir, output_dir, corpus_language,
+                                                 temporary_directory=batch_dir / "mfa" / corpus_language)
+        except (AdmissionError, PoolQueueFullError) as e:
+            logger.warning(f"Batch {batch_id}: {e}")
+            success = False
+            error = f"Server busy: {str(e)}"
+        language_results[corpus_language] = (success, error, collect_alignment_outputs(output_dir))
+    
+    # Chuyển đổi kết quả cho từng item
+    results = []
+    for item in items:
+        result = {
+            "index": item.index,
+            "name": item.name,
+            "language": item.language,
+        }
+        if "transcript_check" in item.metadata:
+            result["transcript_check"] = item.metadata["transcript_check"]
+        if not item.error:
+            success, error, outputs = language_results[item.language]
+            alignment_path = outputs.get(item.item_id)
+            if alignment_path is None:
+                item.error = error if not success else "MFA did not produce an alignment for this item"
+            else:
+                try:
+                    viseme_timeline = convert_mfa_json_to_viseme_timeline(alignment_path, item.language)
+                    result.update({
+                        "status": "success",
+                        "viseme_timeline": viseme_timeline,
+                        "metadata": compute_viseme_statistics(viseme_timeline),
+                    })
+                except Exception as e:
+                    item.error = f"Error converting alignment: {str(e)}"
+        if item.error:
+            result.update({"status": "error", "error": item.error})
+        results.append(result)
+    
+    succeeded = sum(1 for r in results if r["status"] == "success")
+    processing_time = time.time() - start_time
+    logger.info(f"Batch {batch_id}: Completed in {processing_time:.2f}s, {succeeded}/{len(results)} items succeeded")
+    
+    return {
+        "batch_id": batch_id,
+        "processing_time": processing_time,
+        "status": "success" if succeeded == len(results) else ("partial" if succeeded else "error"),
+        "items": results,
+        "metadata": {
+            "total_items": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "languages": sorted(corpora.keys()),
+            "process_timestamp": datetime.now().isoformat()
+        }
+    }
+
+@app.websocket("/ws/stream-viseme")
+async def stream_viseme(websocket: WebSocket):
+    """
+    Tạo viseme theo thời gian thực cho audio đang được sinh ra
+    
+    - Message đầu tiên: {"type": "start", "language": "vi", "sample_rate": 16000}
+    - Audio: message binary chứa PCM 16-bit little-endian mono
+    - Transcript: {"type": "transcript", "text": "..."} (có thể gửi nhiều lần)
+    - Kết thúc: {"type": "end"}; server chốt toàn bộ, gửi {"type": "done"} rồi đóng kết nối
+    - Server gửi {"type": "segments", "from": t, "segments": [...]}: thay thế mọi segment từ t trở đi,
+      mỗi segment có "final" (đã chốt) hoặc tạm thời (có thể được sửa ở revision sau)
+    """
+    await websocket.accept()
+    session = None
+    workspace = None
+    alignment_task: Optional[asyncio.Task] = None
+    
+    async def run_window(final: bool = False):
+        try:
+            message = await session.align_window(final=final)
+            if message is not None:
+                await websocket.send_json(message)
+        except AdmissionError as e:
+            # Server đang bận: giữ audio lại, cửa sổ sau sẽ align phần này
+            logger.warning(f"Stream {session.session_id}: {e}")
+        except Exception as e:
+            logger.error(f"Stream {session.session_id}: Error aligning window - {str(e)}")
+            await websocket.send_json({"type": "error", "detail": f"Error aligning window: {str(e)}"})
+    
+    try:
+        first = await websocket.receive()
+        if first["type"] == "websocket.disconnect":
+            return
+        start = parse_control_message(first)
+        if start.get("type") != "start":
+            raise StreamProtocolError("First message must be a start message")
+        language = start.get("language", "vi")
+        if not isinstance(language, str) or language not in language_registry:
+            raise StreamProtocolError(f"Unsupported language: {language}. "
+                                      f"Supported languages: {', '.join(language_registry.codes())}")
+        
+        try:
+            sample_rate = int(start.get("sample_rate", 16000))
+        except (TypeError, ValueError):
+            raise StreamProtocolError('"sample_rate" must be an integer')
+        transcript = message_text(start, "transcript")
+        
+        session_id = generate_unique_id()
+        # Cửa sổ audio và tệp trung gian của phiên nằm trong một workspace, bị xóa khi phiên đóng
+        workspace = scratch_space.open(f"stream-{session_id}")
+        session = StreamingSession(
+            session_id,
+            language,
+            sample_rate,
+            workspace.path,
+            align=lambda audio_path, text: align_audio_segment(audio_path, text, language),
+            convert=lambda mfa_data: convert_mfa_data_to_viseme_timeline(mfa_data, language),
+            window_seconds=STREAM_WINDOW_SECONDS,
+            final_margin=STREAM_FINAL_MARGIN,
+            holdback_words=STREAM_HOLDBACK_WORDS,
+            max_pending_seconds=STREAM_MAX_PENDING_SECONDS,
+        )
+        # Transcript được chuẩn hóa như request thường (không kiểm tra từ điển: text đến theo từng phần)
+        async def add_text(text: str):
+            normalized = await asyncio.to_thread(normalize_for_alignment, text, language, False)
+            session.add_text(normalized.text)
+        
+        await add_text(transcript)
+        active_stream_sessions[session_id] = session
+        logger.info(f"Stream {session_id}: Started for {language} at {session.sample_rate} Hz")
+        await websocket.send_json({"type": "ready", "session_id": session_id,
+                                   "window_seconds": STREAM_WINDOW_SECONDS})
+        
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            if message.get("bytes"):
+                session.add_audio(message["bytes"])
+            elif message.get("text"):
+                data = parse_control_message(message)
+                if data.get("type") == "transcript":
+                    await add_text(message_text(data, "text"))
+                elif data.get("type") == "end":
+                    if alignment_task is not None:
+                        await alignment_task
+                    await run_window(final=True)
+                    await websocket.send_json({"type": "done", **session.stats()})
+                    await websocket.close()
+                    break
+                else:
+                    raise StreamProtocolError(f"Unknown message type: {data.get('type')}")
+            
+            # Chỉ align một cửa sổ tại một thời điểm cho mỗi phiên
+            if (alignment_task is None or alignment_task.done()) and session.ready_for_window():
+                alignment_task = asyncio.create_task(run_window(final=session.must_finalize()))
+    
+    except WebSocketDisconnect:
+        pass
+    except (StreamProtocolError, ValueError) as e:
+        logger.warning(f"Stream: Protocol error - {str(e)}")
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1003)
+    finally:
+        if alignment_task is not None and not alignment_task.done():
+            alignment_task.cancel()
+        if session is not None:
+            active_stream_sessions.pop(session.session_id, None)
+            logger.info(f"Stream {session.session_id}: Closed after {session.revision} revisions")
+        if workspace is not None:
+            scratch_space.release(workspace)
 
 # Xử lý lỗi
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     return JSONResponse(
         status_code=exc.status_code,
-        content={"error": exc.detail}
+        content={"error": exc.detail},
+        headers=getattr(exc, "headers", None)
     )
 
 @app.exception_handler(Exception)
@@ -517,5 +2166,6 @@ async def general_exception_handler(request, exc):
 
 # Entry point
 if __name__ == "__main__":
+    # Chế độ phát triển (tự reload); chạy production nhiều worker bằng launcher.py
     import uvicorn
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
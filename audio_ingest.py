@@ -0,0 +1,373 @@
+"""
+Audio Ingest
+--------------------------------
+Chuẩn hóa audio upload trước khi align: giải mã, trộn về mono, đổi tần số lấy mẫu về tần số của
+acoustic model và cắt khoảng lặng ở đầu/cuối.
+
+- WAV (PCM 8/16/24/32-bit, float) được đọc trực tiếp bằng NumPy
+- Các định dạng khác (MP3, FLAC, OGG, ...) dùng `soundfile` hoặc `audioread` nếu được cài đặt
+- Đổi tần số bằng scipy.signal.resample_poly nếu có, nếu không dùng FFT theo từng khối
+- Độ lệch do cắt khoảng lặng đầu được ghi lại để đưa timeline về thời gian của tệp gốc
+- Năng lượng khung và tệp WAV đầu ra được tính/ghi theo từng khối float32, không tạo thêm bản sao cả tệp
+- Chạy trong process pool để không chặn event loop; pool được tạo lại khi process con chết (OOM kill,
+  bộ giải mã crash) và request đang chạy được thử lại một lần
+"""
+
+import time
+import wave
+import struct
+import asyncio
+import logging
+import threading
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from uploads import sniff_audio_format
+from longform import silence_mask
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_RATE = 16000
+TRIM_FRAME_SECONDS = 0.01
+RESAMPLE_BLOCK_SECONDS = 10.0
+RESAMPLE_PAD_SECONDS = 0.05
+# Độ dài khối khi tính năng lượng khung và khi ghi WAV đầu ra
+BLOCK_SECONDS = 10.0
+
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class AudioDecodeError(Exception):
+    """Không giải mã được tệp audio"""
+
+
+class IngestOptions:
+    """Tham số chuẩn hóa audio"""
+
+    def __init__(self, sample_rate: int = DEFAULT_SAMPLE_RATE, trim_silence: bool = True,
+                 trim_padding: float = 0.1, min_trim: float = 0.05):
+        self.sample_rate = sample_rate
+        self.trim_silence = trim_silence
+        self.trim_padding = trim_padding
+        self.min_trim = min_trim
+
+
+class IngestResult:
+    """Kết quả chuẩn hóa một tệp audio"""
+
+    def __init__(self, path: Path, info: Dict[str, Any]):
+        self.path = path
+        self.info = info
+
+    @property
+    def trim_offset(self) -> float:
+        return self.info["trim_offset"]
+
+    @property
+    def source_duration(self) -> float:
+        return self.info["source_duration"]
+
+
+_SUPPORTED_WAV_ENCODINGS = {(_WAVE_FORMAT_FLOAT, 32), (_WAVE_FORMAT_FLOAT, 64), (_WAVE_FORMAT_PCM, 8),
+                            (_WAVE_FORMAT_PCM, 16), (_WAVE_FORMAT_PCM, 24), (_WAVE_FORMAT_PCM, 32)}
+
+
+def _pcm_to_float32(data: bytes, audio_format: int, bits: int) -> np.ndarray:
+    """Chuyển một khối dữ liệu WAV (đủ số mẫu) thành float32 trong khoảng [-1, 1]"""
+    if audio_format == _WAVE_FORMAT_FLOAT:
+        return np.frombuffer(data, dtype="<f4" if bits == 32 else "<f8").astype(np.float32)
+    if bits == 24:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        values = np.where(values >= 1 << 23, values - (1 << 24), values)
+        samples = values.astype(np.float32)
+    else:
+        samples = np.frombuffer(data, dtype={8: np.uint8, 16: "<i2", 32: "<i4"}[bits]).astype(np.float32)
+    if bits == 8:
+        samples -= 128.0
+    samples /= float(1 << (bits - 1))
+    return samples
+
+
+def read_wav(path: Path) -> Tuple[np.ndarray, int]:
+    """Đọc WAV PCM/float thành mảng float32 (số mẫu, số kênh) và tần số lấy mẫu, chuyển đổi theo từng khối"""
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise AudioDecodeError("Not a RIFF/WAVE file")
+        fmt = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise AudioDecodeError("WAV file has no data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+            if chunk_id == b"fmt ":
+                body = f.read(chunk_size + (chunk_size & 1))
+                audio_format, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+                if audio_format == _WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    audio_format = struct.unpack("<H", body[24:26])[0]
+                fmt = (audio_format, channels, sample_rate, bits)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise AudioDecodeError("WAV data chunk before fmt chunk")
+                break
+            else:
+                f.seek(chunk_size + (chunk_size & 1), 1)
+
+        audio_format, channels, sample_rate, bits = fmt
+        if (audio_format, bits) not in _SUPPORTED_WAV_ENCODINGS or not channels:
+            raise AudioDecodeError(f"Unsupported WAV encoding (format {audio_format}, {bits} bit)")
+        width = bits // 8
+        frame_bytes = width * channels
+        # Kích thước chunk data có thể lớn hơn phần thực có trong tệp (WAV ghi dở, ghi dạng stream)
+        available = Path(path).stat().st_size - f.tell()
+        usable = min(chunk_size, available) // frame_bytes * frame_bytes
+
+        samples = np.empty(usable // width, dtype=np.float32)
+        block_bytes = frame_bytes * int(DEFAULT_SAMPLE_RATE * BLOCK_SECONDS)
+        filled = 0
+        while filled * width < usable:
+            data = f.read(min(block_bytes, usable - filled * width))
+            data = data[:len(data) // frame_bytes * frame_bytes]
+            if not data:
+                break
+            values = _pcm_to_float32(data, audio_format, bits)
+            samples[filled:filled + len(values)] = values
+            filled += len(values)
+    return samples[:filled].reshape(-1, channels), sample_rate
+
+
+def decode_audio(path: Path, audio_format: Optional[str]) -> Tuple[np.ndarray, int, str]:
+    """Giải mã audio thành mảng float32 (số mẫu, số kênh); trả về thêm tên bộ giải mã đã dùng"""
+    if audio_format == "wav":
+        try:
+            samples, sample_rate = read_wav(path)
+            return samples, sample_rate, "wav"
+        except AudioDecodeError as e:
+            logger.debug(f"Built-in WAV reader failed for {path.name}: {e}")
+
+    try:
+        import soundfile
+        samples, sample_rate = soundfile.read(str(path), dtype="float32", always_2d=True)
+        return samples, sample_rate, "soundfile"
+    except ImportError:
+        pass
+    except Exception as e:
+        logger.debug(f"soundfile failed for {path.name}: {e}")
+
+    try:
+        import audioread
+        with audioread.audio_open(str(path)) as source:
+            channels, sample_rate = source.channels, source.samplerate
+            pcm = b"".join(source)
+        samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+        return samples.reshape(-1, channels), sample_rate, "audioread"
+    except ImportError:
+        pass
+    except Exception as e:
+        raise AudioDecodeError(f"Cannot decode {audio_format or 'unknown'} audio: {e}")
+
+    raise AudioDecodeError(f"No decoder available for {audio_format or 'unknown'} audio "
+                           f"(install soundfile or audioread)")
+
+
+def _fft_resample(samples: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """Đổi tần số lấy mẫu bằng FFT theo từng khối có phần đệm chồng lấn (không cần scipy)"""
+    ratio = target_rate / source_rate
+    output = np.zeros(int(round(len(samples) * ratio)), dtype=np.float32)
+    block = int(source_rate * RESAMPLE_BLOCK_SECONDS)
+    pad = int(source_rate * RESAMPLE_PAD_SECONDS)
+
+    for start in range(0, len(samples), block):
+        lo, hi = max(0, start - pad), min(len(samples), start + block + pad)
+        segment = samples[lo:hi]
+        segment_out = int(round(len(segment) * ratio))
+        if segment_out == 0:
+            continue
+        spectrum = np.fft.rfft(segment)
+        resized = np.zeros(segment_out // 2 + 1, dtype=spectrum.dtype)
+        keep = min(len(spectrum), len(resized))
+        resized[:keep] = spectrum[:keep]
+        resampled = np.fft.irfft(resized, segment_out) * (segment_out / len(segment))
+
+        out_start = int(round(start * ratio))
+        out_end = min(len(output), int(round(min(len(samples), start + block) * ratio)))
+        skip = out_start - int(round(lo * ratio))
+        piece = resampled[skip:skip + out_end - out_start]
+        output[out_start:out_start + len(piece)] = piece
+    return output
+
+
+def resample(samples: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """Đổi tần số lấy mẫu của tín hiệu mono"""
+    if source_rate == target_rate or not len(samples):
+        return samples
+    try:
+        from math import gcd
+        from scipy.signal import resample_poly
+        factor = gcd(source_rate, target_rate)
+        return resample_poly(samples, target_rate // factor, source_rate // factor).astype(np.float32, copy=False)
+    except ImportError:
+        return _fft_resample(samples, source_rate, target_rate)
+
+
+def speech_bounds(samples: np.ndarray, sample_rate: int, options: IngestOptions) -> Tuple[int, int]:
+    """Vị trí mẫu đầu và cuối của phần có tiếng nói (kèm phần đệm)"""
+    frame_length = max(1, int(sample_rate * TRIM_FRAME_SECONDS))
+    frame_count = len(samples) // frame_length
+    if frame_count < 2:
+        return 0, len(samples)
+    # Trung bình bình phương theo từng khối (float32), chỉ mảng năng lượng khung có độ dài cả tệp
+    block_frames = max(1, int(BLOCK_SECONDS / TRIM_FRAME_SECONDS))
+    energies = np.empty(frame_count, dtype=np.float32)
+    for first in range(0, frame_count, block_frames):
+        last = min(frame_count, first + block_frames)
+        frames = samples[first * frame_length:last * frame_length].reshape(-1, frame_length)
+        energies[first:last] = np.einsum("ij,ij->i", frames, frames)
+    energies /= frame_length
+    energies_db = 20.0 * np.log10(np.sqrt(energies) + 1e-9)
+    voiced = np.flatnonzero(~silence_mask(energies_db))
+    if not len(voiced):
+        return 0, len(samples)
+
+    padding = int(options.trim_padding * sample_rate)
+    start = max(0, voiced[0] * frame_length - padding)
+    end = min(len(samples), (voiced[-1] + 1) * frame_length + padding)
+    if start < options.min_trim * sample_rate:
+        start = 0
+    if len(samples) - end < options.min_trim * sample_rate:
+        end = len(samples)
+    return start, end
+
+
+def write_wav(path: Path, samples: np.ndarray, sample_rate: int):
+    """Ghi tín hiệu mono float32 thành WAV PCM 16-bit, chuyển đổi theo từng khối"""
+    block = max(1, int(sample_rate * BLOCK_SECONDS))
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        for start in range(0, len(samples), block):
+            chunk = np.clip(samples[start:start + block], -1.0, 1.0)
+            chunk *= 32767.0
+            wav_file.writeframes(chunk.astype("<i2").tobytes())
+
+
+def ingest_file(source: Path, dest: Path, options: IngestOptions) -> Dict[str, Any]:
+    """
+    Chuẩn hóa một tệp audio (chạy đồng bộ, dùng được trong process pool).
+    Nếu tệp đã là WAV mono 16-bit đúng tần số và không cần cắt thì không ghi lại (output_path là tệp gốc).
+    """
+    started = time.perf_counter()
+    with open(source, "rb") as f:
+        audio_format = sniff_audio_format(f.read(64))
+
+    samples, source_rate, decoder = decode_audio(source, audio_format)
+    channels = samples.shape[1]
+    source_length = len(samples)
+
+    mono = samples[:, 0] if channels == 1 else samples.mean(axis=1, dtype=np.float32)
+    del samples  # Audio nhiều kênh không còn cần tới, giải phóng trước khi đổi tần số
+    mono = resample(mono, source_rate, options.sample_rate)
+
+    start, end = speech_bounds(mono, options.sample_rate, options) if options.trim_silence else (0, len(mono))
+
+    is_canonical = False
+    if decoder == "wav" and channels == 1 and source_rate == options.sample_rate:
+        with wave.open(str(source), "rb") as wav_file:
+            is_canonical = wav_file.getsampwidth() == 2
+    if is_canonical and start == 0 and end == len(mono):
+        output_path = source
+    else:
+        write_wav(dest, mono[start:end], options.sample_rate)
+        output_path = dest
+
+    return {
+        "output_path": str(output_path),
+        "source_format": audio_format,
+        "decoder": decoder,
+        "source_sample_rate": source_rate,
+        "source_channels": channels,
+        "source_duration": source_length / source_rate,
+        "sample_rate": options.sample_rate,
+        "duration": (end - start) / options.sample_rate,
+        "trim_offset": start / options.sample_rate,
+        "trimmed_tail": (len(mono) - end) / options.sample_rate,
+        "converted": output_path != source,
+        "ingest_time": time.perf_counter() - started,
+    }
+
+
+def create_ingest_executor(max_workers: int, use_processes: bool = True) -> Executor:
+    """Tạo pool cho ingest; process pool dùng "spawn" để không fork process đang chạy event loop"""
+    if use_processes:
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+
+
+class IngestPool:
+    """Executor cho ingest, được tạo lại khi process con chết làm pool bị hỏng (BrokenProcessPool)"""
+
+    def __init__(self, max_workers: int, use_processes: bool = True):
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self.executor = create_ingest_executor(max_workers, use_processes)
+        self.restarts = 0
+        self._lock = threading.Lock()
+
+    def restart(self, broken: Executor):
+        """Thay executor bị hỏng bằng executor mới (nhiều request cùng gặp lỗi thì chỉ tạo lại một lần)"""
+        with self._lock:
+            if self.executor is not broken:
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.executor = create_ingest_executor(self.max_workers, self.use_processes)
+            self.restarts += 1
+        logger.warning(f"Ingest worker process died, recreated the ingest pool (restart #{self.restarts})")
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def ingest_audio(source: Path, dest: Path, options: IngestOptions,
+                       pool: Optional[IngestPool] = None) -> IngestResult:
+    """
+    Chuẩn hóa audio trong pool, không chặn event loop.
+    Process con chết giữa chừng: tạo lại pool và thử lại một lần; lần thử lại cũng chết thì coi như tệp
+    không giải mã được (AudioDecodeError).
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        executor = pool.executor if pool is not None else None
+        try:
+            info = await loop.run_in_executor(executor, ingest_file, source, dest, options)
+            break
+        except BrokenProcessPool:
+            if pool is None:
+                raise
+            pool.restart(executor)
+            if attempt:
+                raise AudioDecodeError("The ingest worker crashed twice while decoding this file")
+            logger.warning(f"Ingest worker died while processing {source.name}, retrying")
+    return IngestResult(Path(info.pop("output_path")), info)
+
+
+def shift_alignment(mfa_data: Dict[str, Any], offset: float, duration: Optional[float] = None) -> Dict[str, Any]:
+    """Cộng offset vào mọi entry của alignment (đưa về thời gian của tệp gốc)"""
+    shifted = dict(mfa_data)
+    if offset > 0:
+        shifted["tiers"] = {
+            name: {**tier, "entries": [[round(start + offset, 4), round(end + offset, 4), label]
+                                       for start, end, label in tier.get("entries", [])]}
+            for name, tier in mfa_data.get("tiers", {}).items()
+        }
+    if duration is not None:
+        shifted["end"] = duration
+    return shifted
@@ -0,0 +1,195 @@
+"""
+Batch Corpus
+--------------------------------
+Tiện ích cho endpoint batch: giải nén archive (zip/tar) thành các cặp audio/transcript
+và dựng một corpus MFA tạm thời cho từng ngôn ngữ để chạy một lần `mfa align` duy nhất.
+
+Cấu trúc archive được chấp nhận:
+    clip_001.wav + clip_001.txt (hoặc .lab)
+    vi/clip_002.wav + vi/clip_002.lab   (thư mục cấp đầu là mã ngôn ngữ thì dùng ngôn ngữ đó)
+
+Giải nén có giới hạn số item và tổng dung lượng sau giải nén (chống zip bomb), đếm theo số byte thực sự đọc
+được chứ không theo kích thước khai báo trong archive; giải nén đọc ghi đĩa nên được gọi trong thread.
+"""
+
+import shutil
+import logging
+import tarfile
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = {".wav"}
+TRANSCRIPT_EXTENSIONS = {".txt", ".lab"}
+COPY_CHUNK_BYTES = 1024 * 1024
+# Transcript được đọc vào bộ nhớ nên có giới hạn riêng
+MAX_TRANSCRIPT_BYTES = 1024 * 1024
+
+
+class ArchiveLimitError(ValueError):
+    """Archive vượt giới hạn số item hoặc dung lượng sau giải nén"""
+
+
+@dataclass
+class BatchItem:
+    """Một cặp audio/transcript trong batch"""
+    index: int
+    name: str
+    language: str
+    audio_path: Optional[Path] = None
+    transcript: Optional[str] = None
+    error: Optional[str] = None
+    metadata: Dict = field(default_factory=dict)
+
+    @property
+    def item_id(self) -> str:
+        # Tên tệp trong corpus, không phụ thuộc tên gốc để tránh trùng lặp
+        return f"item_{self.index:05d}"
+
+
+def _safe_member_path(name: str) -> Optional[PurePosixPath]:
+    """Trả về đường dẫn tương đối an toàn của một mục trong archive (chặn path traversal)"""
+    path = PurePosixPath(name.replace("\\", "/"))
+    if path.is_absolute() or ".." in path.parts or not path.name or path.name.startswith("."):
+        return None
+    if "__MACOSX" in path.parts:
+        return None
+    return path
+
+
+def _iter_archive_members(archive_path: Path) -> Iterable[tuple]:
+    """Duyệt các tệp trong archive zip/tar, trả về (đường dẫn tương đối, hàm đọc nội dung)"""
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                yield info.filename, lambda info=info: zf.open(info)
+    elif tarfile.is_tarfile(archive_path):
+        with tarfile.open(archive_path) as tf:
+            for member in tf.getmembers():
+                if not member.isfile():
+                    continue
+                yield member.name, lambda member=member: tf.extractfile(member)
+    else:
+        raise ValueError("Unsupported archive format, expected zip or tar")
+
+
+def extract_archive_items(
+    archive_path: Path,
+    dest_dir: Path,
+    supported_languages: Iterable[str],
+    default_language: str,
+    max_items: Optional[int] = None,
+    max_uncompressed_bytes: Optional[int] = None,
+) -> List[BatchItem]:
+    """
+    Giải nén archive thành danh sách BatchItem, ghép audio và transcript theo tên tệp.
+    Raise ArchiveLimitError ngay khi số item vượt max_items hoặc tổng số byte giải nén vượt max_uncompressed_bytes.
+    """
+    supported_languages = set(supported_languages)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+
+    audio_files: Dict[PurePosixPath, Path] = {}
+    transcripts: Dict[PurePosixPath, str] = {}
+    keys = set()
+    extracted = 0
+
+    def copy_limited(name, src, dst=None) -> bytes:
+        """Đọc src theo từng khối (ghi vào dst nếu có, nếu không thì trả về nội dung), dừng khi vượt giới hạn"""
+        nonlocal extracted
+        chunks = []
+        size = 0
+        while True:
+            chunk = src.read(COPY_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            extracted += len(chunk)
+            if dst is None and size > MAX_TRANSCRIPT_BYTES:
+                raise ArchiveLimitError(f"Transcript {name} is larger than {MAX_TRANSCRIPT_BYTES // 1024} KB")
+            if max_uncompressed_bytes is not None and extracted > max_uncompressed_bytes:
+                raise ArchiveLimitError(f"Archive expands to more than {max_uncompressed_bytes // (1024 * 1024)} MB")
+            if dst is not None:
+                dst.write(chunk)
+            else:
+                chunks.append(chunk)
+        return b"".join(chunks)
+
+    for name, opener in _iter_archive_members(archive_path):
+        path = _safe_member_path(name)
+        if path is None:
+            logger.warning(f"Skipping unsafe archive member: {name}")
+            continue
+
+        suffix = path.suffix.lower()
+        if suffix not in AUDIO_EXTENSIONS and suffix not in TRANSCRIPT_EXTENSIONS:
+            continue
+        key = path.with_suffix("")
+        keys.add(key)
+        if max_items is not None and len(keys) > max_items:
+            raise ArchiveLimitError(f"Too many items in archive (max {max_items})")
+        if suffix in AUDIO_EXTENSIONS:
+            target = dest_dir / f"member_{len(audio_files):05d}{suffix}"
+            with opener() as src, open(target, "wb") as dst:
+                copy_limited(name, src, dst)
+            audio_files[key] = target
+        else:
+            with opener() as src:
+                transcripts[key] = copy_limited(name, src).decode("utf-8-sig").strip()
+
+    items = []
+    for key in sorted(set(audio_files) | set(transcripts)):
+        language = default_language
+        if len(key.parts) > 1 and key.parts[0] in supported_languages:
+            language = key.parts[0]
+
+        item = BatchItem(
+            index=len(items),
+            name=str(key),
+            language=language,
+            audio_path=audio_files.get(key),
+            transcript=transcripts.get(key),
+        )
+        if item.audio_path is None:
+            item.error = "Missing audio file for transcript"
+        elif not item.transcript:
+            item.error = "Missing or empty transcript for audio file"
+        items.append(item)
+
+    return items
+
+
+def build_corpora(
+    items: List[BatchItem],
+    corpus_root: Path,
+    write_transcript: Callable[[str, Path], Path],
+) -> Dict[str, Path]:
+    """Dựng một thư mục corpus cho mỗi ngôn ngữ từ các item hợp lệ"""
+    corpora: Dict[str, Path] = {}
+    for item in items:
+        if item.error:
+            continue
+        corpus_dir = corpora.get(item.language)
+        if corpus_dir is None:
+            corpus_dir = corpus_root / item.language
+            corpus_dir.mkdir(parents=True, exist_ok=True)
+            corpora[item.language] = corpus_dir
+
+        # Di chuyển audio thay vì sao chép, audio tạm đã thuộc về batch này
+        target_audio = corpus_dir / f"{item.item_id}.wav"
+        shutil.move(str(item.audio_path), target_audio)
+        item.audio_path = target_audio
+        write_transcript(item.transcript, corpus_dir / f"{item.item_id}.lab")
+
+    return corpora
+
+
+def collect_alignment_outputs(output_dir: Path) -> Dict[str, Path]:
+    """Tìm các tệp alignment (JSON hoặc TextGrid) mà MFA đã tạo, theo tên item"""
+    if not output_dir.exists():
+        return {}
+    return {path.stem: path for pattern in ("*.json", "*.TextGrid") for path in output_dir.rglob(pattern)}
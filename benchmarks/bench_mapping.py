@@ -0,0 +1,111 @@
+"""
+Micro-benchmark: phoneme -> viseme mapping
+--------------------------------
+So sánh cách chuyển đổi cũ (tra từng phone, `import re` + regex khi không tìm thấy,
+log cảnh báo cho mỗi phone không có trong bảng) với PhonemeVisemeMapper
+trên timeline tổng hợp dài (mặc định 10 phút, ~12 phone/giây).
+
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_mapping.py --minutes 10 --repeat 5
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from viseme_mapper import VIETNAMESE_STRIP_CHARS, PhonemeVisemeMapper  # noqa: E402
+
+PHONES_PER_SECOND = 12
+
+logger = logging.getLogger("bench_mapping")
+
+
+def load_mapping(filename):
+    with open(BASE_DIR / "data" / filename, "r", encoding="utf-8") as f:
+        return json.load(f)["phonemeToViseme"]
+
+
+def legacy_map_phoneme_to_viseme(phoneme, mapping, language):
+    """Bản sao cách chuyển đổi trước khi có PhonemeVisemeMapper"""
+    if phoneme in mapping:
+        return mapping[phoneme]
+    if language == "vi":
+        import re
+        simplified_phoneme = re.sub(r'[ː˦˥˨ˀ˦˨˩ˀ˩˦˩˨̚ʷw͡]', '', phoneme)
+        if simplified_phoneme in mapping:
+            return mapping[simplified_phoneme]
+    logger.warning(f"No viseme mapping found for phoneme: {phoneme} in {language}, using default 0")
+    return 0
+
+
+def synthetic_phones(mapping, count, language, seed=0):
+    """Sinh danh sách phone: phần lớn có trong bảng, một phần cần fallback, một ít không tìm thấy"""
+    rng = random.Random(seed)
+    known = list(mapping)
+    if language == "vi":
+        fallback = ["tw", "ʈw", "aː˦", "ŋ͡mw", "e˦˥ː", "ʷo", "ɔː˦ˀ"]
+    else:
+        fallback = []
+    unknown = ["<unk>", "ʰx", "Q1"]
+
+    phones = []
+    for _ in range(count):
+        r = rng.random()
+        if r >= 0.99:
+            phones.append(rng.choice(unknown))
+        elif r >= 0.9 and fallback:
+            phones.append(rng.choice(fallback))
+        else:
+            phones.append(rng.choice(known))
+    return phones
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark phoneme -> viseme mapping")
+    parser.add_argument("--minutes", type=float, default=10.0, help="Độ dài timeline tổng hợp (phút)")
+    parser.add_argument("--repeat", type=int, default=5, help="Số lần lặp, lấy thời gian tốt nhất")
+    args = parser.parse_args()
+
+    # Ghi log như server (StreamHandler) để tính cả chi phí log cảnh báo
+    logging.basicConfig(level=logging.INFO, handlers=[logging.StreamHandler(open(os.devnull, "w"))])
+
+    count = int(args.minutes * 60 * PHONES_PER_SECOND)
+    print(f"Timeline: {args.minutes:g} minutes, {count} phones, best of {args.repeat}")
+
+    for language, filename, strip_chars in (
+        ("vi", "vietnamese-phoneme-to-viseme.json", VIETNAMESE_STRIP_CHARS),
+        ("en", "english-phoneme-to-viseme.json", None),
+    ):
+        mapping = load_mapping(filename)
+        phones = synthetic_phones(mapping, count, language)
+        mapper = PhonemeVisemeMapper(language, mapping, strip_chars=strip_chars)
+
+        legacy = timed(lambda: [legacy_map_phoneme_to_viseme(p, mapping, language) for p in phones], args.repeat)
+        compiled = timed(lambda: mapper.map_many(phones), args.repeat)
+
+        expected = [legacy_map_phoneme_to_viseme(p, mapping, language) for p in phones]
+        assert mapper.map_many(phones).tolist() == expected, "mapper output differs from legacy mapping"
+
+        print(f"  {language}: legacy {legacy * 1000:8.2f} ms | compiled {compiled * 1000:8.2f} ms "
+              f"| speedup x{legacy / compiled:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Micro-benchmark: đọc output alignment của MFA
+--------------------------------
+So sánh cách đọc cũ (`json.load` cả tệp) với các parser của mfa_output.py (json của thư viện chuẩn rồi bỏ tier
+không cần, orjson nếu đã cài, quét regex chỉ tier words/phones, TextGrid dạng long) trên alignment tổng hợp dài
+1 giờ trở lên.
+
+- Tệp JSON được ghi như MFA (thụt lề 4, UTF-8), TextGrid ghi bằng mfa_output.write_textgrid
+- Mỗi alignment có thêm một tier không dùng tới (vd tier của người nói khác) mà parser mới bỏ qua
+- Đo thời gian tốt nhất và bộ nhớ đỉnh (tracemalloc) của từng cách, kiểm tra kết quả trùng với `json.load`
+
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_mfa_output.py
+    python benchmarks/bench_mfa_output.py --hours 1,4 --repeat 5 --language en
+"""
+
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import mfa_output  # noqa: E402
+
+PHONE_DURATION = 1.0 / 12  # ~12 phone/giây như giọng nói thực
+PHONES_PER_WORD = 4
+PAUSE_EVERY = 12  # Khoảng lặng sau mỗi 12 từ
+
+PHONES = {
+    "vi": ["a", "b", "tɕ", "d", "ɛ", "f", "ɣ", "h", "i", "k", "l", "m", "n", "ŋ", "ɔ", "p", "r", "s", "t", "u",
+           "v", "w", "ɯ", "ə", "aː", "ɲ", "tʰ", "ʔ"],
+    "en": ["AA1", "AE1", "AH0", "B", "CH", "D", "DH", "EH1", "ER0", "F", "G", "HH", "IH1", "IY1", "JH", "K",
+           "L", "M", "N", "NG", "OW1", "P", "R", "S", "SH", "T", "TH", "UW1", "V", "W", "Y", "Z"],
+}
+
+
+def synthetic_alignment(hours: float, language: str, seed: int = 0) -> dict:
+    """Alignment có cùng định dạng JSON với MFA, gồm tier words, phones và một tier không dùng tới"""
+    rng = random.Random(seed)
+    phones = PHONES[language]
+    vocabulary = [f"từ{i}" if language == "vi" else f"word{i}" for i in range(5000)]
+    word_entries, phone_entries, speaker_entries = [], [], []
+    t = 0.0
+    total = hours * 3600
+    while t < total:
+        word_start = t
+        for _ in range(PHONES_PER_WORD):
+            phone_entries.append([round(t, 3), round(t + PHONE_DURATION, 3), rng.choice(phones)])
+            t += PHONE_DURATION
+        word_entries.append([round(word_start, 3), round(t, 3), rng.choice(vocabulary)])
+        if len(word_entries) % PAUSE_EVERY == 0:
+            word_entries.append([round(t, 3), round(t + 0.3, 3), "<eps>"])
+            phone_entries.append([round(t, 3), round(t + 0.3, 3), "sil"])
+            speaker_entries.append([round(word_entries[-PAUSE_EVERY - 1][0], 3), round(t, 3), "speaker"])
+            t += 0.3
+    return {
+        "start": 0,
+        "end": round(t, 3),
+        "tiers": {
+            "words": {"type": "IntervalTier", "entries": word_entries},
+            "phones": {"type": "IntervalTier", "entries": phone_entries},
+            "speaker": {"type": "IntervalTier", "entries": speaker_entries},
+        },
+    }
+
+
+def load_json_baseline(path: Path) -> dict:
+    """Cách đọc cũ của app.py: json.load cả tệp"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def measure(fn, repeat):
+    """Thời gian tốt nhất (giây), bộ nhớ đỉnh (bytes) và kết quả của fn"""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MFA alignment output parsing")
+    parser.add_argument("--hours", default="1,4", help="Thời lượng alignment (giờ), cách nhau bởi dấu phẩy")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần lặp, lấy thời gian tốt nhất")
+    parser.add_argument("--language", choices=sorted(PHONES), default="vi")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Language {args.language}, best of {args.repeat}, "
+          f"orjson {'available' if mfa_output.orjson is not None else 'not installed'}")
+    with tempfile.TemporaryDirectory(prefix="mfa_output_bench_") as tmp:
+        for hours in (float(value) for value in args.hours.split(",")):
+            alignment = synthetic_alignment(hours, args.language, args.seed)
+            json_path = Path(tmp) / f"alignment_{hours:g}h.json"
+            textgrid_path = json_path.with_suffix(".TextGrid")
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(alignment, f, indent=4, ensure_ascii=False)
+            mfa_output.write_textgrid(alignment, textgrid_path)
+            expected = {"start": alignment["start"], "end": alignment["end"],
+                        "tiers": {name: alignment["tiers"][name] for name in mfa_output.ALIGNMENT_TIERS}}
+            del alignment
+
+            cases = [
+                ("json.load (baseline)", lambda: load_json_baseline(json_path)),
+                ("json", lambda: mfa_output.read_alignment(json_path, backend="json")),
+                ("scan", lambda: mfa_output.read_alignment(json_path, backend="scan")),
+            ]
+            if mfa_output.orjson is not None:
+                cases.append(("orjson", lambda: mfa_output.read_alignment(json_path, backend="orjson")))
+            cases.append(("textgrid", lambda: mfa_output.read_alignment(textgrid_path)))
+
+            phones = len(expected["tiers"]["phones"]["entries"])
+            print(f"\n{hours:g} h: {phones} phones, {len(expected['tiers']['words']['entries'])} words, "
+                  f"JSON {json_path.stat().st_size / 2 ** 20:.1f} MB, "
+                  f"TextGrid {textgrid_path.stat().st_size / 2 ** 20:.1f} MB")
+            baseline = None
+            for name, fn in cases:
+                elapsed, peak, result = measure(fn, args.repeat)
+                if name.startswith("json.load"):
+                    baseline = (elapsed, peak)
+                    result = {**result, "tiers": {key: result["tiers"][key] for key in mfa_output.ALIGNMENT_TIERS}}
+                if result != expected:
+                    print(f"  {name}: result differs from json.load")
+                del result
+                print(f"  {name:<22} {elapsed * 1000:9.1f} ms ({baseline[0] / elapsed:4.1f}x)  "
+                      f"peak {peak / 2 ** 20:7.1f} MB ({baseline[1] / peak:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Micro-benchmark: chuyển đổi timeline MFA -> viseme
+--------------------------------
+Đo `convert_mfa_json_to_viseme_timeline` (đọc JSON + chuyển đổi) và `map_phoneme_to_viseme`
+(tra từng phone) của app.py trên timeline MFA tổng hợp từ 10k tới 1M phone.
+
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_timeline.py
+    python benchmarks/bench_timeline.py --sizes 10000,100000 --repeat 5 --language en
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import resource
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+PHONE_DURATION = 1.0 / 12  # ~12 phone/giây như giọng nói thực
+
+
+def synthetic_mfa_data(phones, words_per_phone=0.3):
+    """Dữ liệu alignment có cùng định dạng JSON với MFA"""
+    phone_entries = []
+    word_entries = []
+    t = 0.0
+    word_start = 0.0
+    for i, phone in enumerate(phones):
+        phone_entries.append([round(t, 3), round(t + PHONE_DURATION, 3), phone])
+        t += PHONE_DURATION
+        if (i + 1) % int(1 / words_per_phone) == 0:
+            word_entries.append([round(word_start, 3), round(t, 3), f"w{len(word_entries)}"])
+            word_start = t
+    return {
+        "start": 0,
+        "end": round(t, 3),
+        "tiers": {
+            "words": {"type": "IntervalTier", "entries": word_entries},
+            "phones": {"type": "IntervalTier", "entries": phone_entries},
+        },
+    }
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MFA JSON -> viseme timeline conversion")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Số phone của các timeline, cách nhau bởi dấu phẩy")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần lặp, lấy thời gian tốt nhất")
+    parser.add_argument("--language", choices=["vi", "en"], default="vi")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.chdir(BASE_DIR)
+    import app
+    logging.getLogger().setLevel(logging.ERROR)
+
+    # Lấy phone từ bảng mapping của ngôn ngữ, thêm một ít phone không có trong bảng
+    known = list(app.language_registry.get(args.language).mapping)
+    rng = random.Random(args.seed)
+
+    print(f"Language {args.language}, best of {args.repeat}")
+    with tempfile.TemporaryDirectory(prefix="viseme_bench_") as tmp:
+        for size in (int(value) for value in args.sizes.split(",")):
+            phones = [rng.choice(known) if rng.random() < 0.99 else "<unk>" for _ in range(size)]
+            json_path = Path(tmp) / f"alignment_{size}.json"
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(synthetic_mfa_data(phones), f)
+
+            convert = timed(lambda: app.convert_mfa_json_to_viseme_timeline(json_path, args.language), args.repeat)
+            lookup = timed(lambda: [app.map_phoneme_to_viseme(p, args.language) for p in phones], args.repeat)
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+            print(f"  {size:>8} phones ({json_path.stat().st_size / 1e6:6.1f} MB JSON): "
+                  f"convert_mfa_json_to_viseme_timeline {convert * 1000:9.1f} ms "
+                  f"({size / convert / 1e6:5.2f} M phones/s) | "
+                  f"map_phoneme_to_viseme {lookup * 1000:8.1f} ms ({lookup / size * 1e9:6.0f} ns/phone) | "
+                  f"peak RSS {peak_rss:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Fake `mfa` executable cho benchmark
+--------------------------------
+Giả lập các lệnh MFA mà API gọi, không cần cài MFA hay model:
+- `mfa --version`, `mfa model inspect ...`: trả về thành công ngay
+- `mfa align_one <audio> <transcript> <acoustic_model> <dictionary> <output> ...`:
+  chờ độ trễ cấu hình được rồi ghi lại fixture (output.json / test.json) đã co giãn theo thời lượng audio
+- `mfa align <corpus> <dictionary> <acoustic_model> <output_dir> ...`: như trên cho từng tệp .wav trong corpus
+- `--output_format long_textgrid`: ghi TextGrid dạng long thay cho JSON (như MFA)
+
+Cấu hình qua biến môi trường:
+- FAKE_MFA_LATENCY: độ trễ mỗi lần align (giây, mặc định 0.5)
+- FAKE_MFA_JITTER: độ lệch ngẫu nhiên tối đa cộng thêm vào độ trễ (giây, mặc định 0)
+- FAKE_MFA_FAIL_RATE: tỷ lệ lần align trả mã lỗi 1 (mặc định 0)
+- FAKE_MFA_FIXTURE: tệp JSON alignment dùng cho mọi ngôn ngữ (mặc định chọn theo dictionary)
+
+Dùng với API:
+    MFA_CMD=benchmarks/fake_mfa.py python app.py
+"""
+
+import os
+import sys
+import json
+import time
+import wave
+import random
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# Fixture theo ngôn ngữ của dictionary (tên model MFA chứa tên ngôn ngữ)
+FIXTURES = {
+    "english": BASE_DIR / "output.json",
+    "vietnamese": BASE_DIR / "test.json",
+}
+
+
+def load_fixture(dictionary: str) -> dict:
+    path = os.getenv("FAKE_MFA_FIXTURE")
+    if not path:
+        path = next((fixture for name, fixture in FIXTURES.items() if name in dictionary.lower()),
+                    FIXTURES["english"])
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def audio_duration(audio_path: str) -> float:
+    try:
+        with wave.open(audio_path, "rb") as wav_file:
+            return wav_file.getnframes() / float(wav_file.getframerate())
+    except Exception:
+        return 0.0
+
+
+def scaled_fixture(fixture: dict, duration: float) -> dict:
+    """Co giãn mọi mốc thời gian của fixture cho khớp thời lượng audio"""
+    if duration <= 0 or not fixture.get("end"):
+        return fixture
+    scale = duration / fixture["end"]
+    return {
+        **fixture,
+        "end": duration,
+        "tiers": {
+            name: {**tier, "entries": [[round(start * scale, 3), round(end * scale, 3), label]
+                                       for start, end, label in tier["entries"]]}
+            for name, tier in fixture["tiers"].items()
+        },
+    }
+
+
+def simulate_work() -> bool:
+    """Chờ độ trễ giả lập; trả về False nếu lần chạy này bị giả lập lỗi"""
+    latency = float(os.getenv("FAKE_MFA_LATENCY", "0.5")) + random.uniform(0, float(os.getenv("FAKE_MFA_JITTER", "0")))
+    time.sleep(max(0.0, latency))
+    return random.random() >= float(os.getenv("FAKE_MFA_FAIL_RATE", "0"))
+
+
+def write_output(alignment: dict, path: Path, output_format: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if output_format == "long_textgrid":
+        from mfa_output import write_textgrid
+        write_textgrid(alignment, path)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(alignment, f)
+
+
+def align_one(audio_path: str, transcript_path: str, acoustic_model: str, dictionary: str, output_path: str,
+              output_format: str = "json") -> int:
+    if not simulate_work():
+        print("fake mfa: simulated alignment failure", file=sys.stderr)
+        return 1
+    write_output(scaled_fixture(load_fixture(dictionary), audio_duration(audio_path)), Path(output_path), output_format)
+    return 0
+
+
+def align_corpus(corpus_dir: str, dictionary: str, acoustic_model: str, output_dir: str,
+                 output_format: str = "json") -> int:
+    if not simulate_work():
+        print("fake mfa: simulated alignment failure", file=sys.stderr)
+        return 1
+    fixture = load_fixture(dictionary)
+    suffix = ".TextGrid" if output_format == "long_textgrid" else ".json"
+    for audio_path in sorted(Path(corpus_dir).rglob("*.wav")):
+        target = Path(output_dir) / audio_path.relative_to(corpus_dir).with_suffix(suffix)
+        write_output(scaled_fixture(fixture, audio_duration(str(audio_path))), target, output_format)
+    return 0
+
+
+def main(argv=None) -> int:
+    args = list(sys.argv[1:] if argv is None else argv)
+    positional = [arg for arg in args if not arg.startswith("--")]
+    output_format = args[args.index("--output_format") + 1] if "--output_format" in args[:-1] else "json"
+    if "--version" in args:
+        print("3.0.0 (fake)")
+        return 0
+    if not positional:
+        print("usage: fake_mfa.py [--version | model inspect ... | align_one ... | align ...]", file=sys.stderr)
+        return 2
+
+    command = positional[0]
+    if command == "model":
+        return 0
+    if command == "align_one" and len(positional) >= 6:
+        return align_one(*positional[1:6], output_format=output_format)
+    if command == "align" and len(positional) >= 5:
+        return align_corpus(*positional[1:5], output_format=output_format)
+    print(f"fake mfa: unsupported command {' '.join(args)}", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Load test: /api/generate-viseme
+--------------------------------
+Chạy API trong cùng process (uvicorn trên cổng ngẫu nhiên) với `mfa` giả lập (benchmarks/fake_mfa.py),
+hoặc với --pool là pool worker backend stub có cùng độ trễ (so sánh chi phí một tiến trình `mfa` mỗi request
+với IPC tới worker chạy sẵn; chi phí MFA nạp lại model mỗi request không được giả lập ở cả hai chế độ),
+gửi request đồng thời bằng các clip mẫu trong data/ và static/examples, rồi báo cáo:
+- Độ trễ p50/p95/p99, số request/giây, số lỗi theo mã HTTP
+- RSS đỉnh của process (API) và của các process con (fake mfa, worker)
+
+Mặc định gửi header X-Cache-Bypass để đo cả pipeline alignment; dùng --use-cache để đo đường cache hit.
+
+Chạy từ thư mục gốc của repo:
+    python benchmarks/load_test.py --concurrency 8 --requests 200 --mfa-latency 0.5
+    python benchmarks/load_test.py --concurrency 16 --duration 30 --pool --json results.json
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import resource
+import tempfile
+import threading
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+FAKE_MFA = Path(__file__).resolve().parent / "fake_mfa.py"
+
+
+def find_clips():
+    """Các cặp (audio, transcript, ngôn ngữ) trong data/ và static/examples"""
+    clips = []
+    for directory in (BASE_DIR / "data", BASE_DIR / "static" / "examples"):
+        for audio_path in sorted(directory.glob("*.wav")):
+            transcript_path = audio_path.with_suffix(".txt")
+            if not transcript_path.exists():
+                continue
+            language = "en" if audio_path.stem.endswith("_en") else "vi"
+            clips.append((audio_path.read_bytes(), audio_path.name,
+                          transcript_path.read_text(encoding="utf-8").strip(), language))
+    return clips
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int):
+    """Import app với cấu hình benchmark và chạy uvicorn trong thread nền"""
+    import uvicorn
+
+    # Log của app ghi ra stderr và logs/api.log; chỉ giữ lỗi để không ảnh hưởng kết quả đo
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    import app as app_module
+    server = uvicorn.Server(uvicorn.Config(app_module.app, host="127.0.0.1", port=port,
+                                           log_level="error", access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            sys.exit("Server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def peak_rss_mb(who) -> float:
+    # ru_maxrss tính bằng KB trên Linux, byte trên macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def run_load(base_url, clips, args):
+    import httpx
+
+    latencies = []
+    statuses = {}
+    headers = {} if args.use_cache else {"X-Cache-Bypass": "1"}
+    deadline = time.perf_counter() + args.duration if args.duration else None
+    counter = iter(range(args.requests if not args.duration else 10 ** 12))
+
+    async def worker(client):
+        for i in counter:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            audio, filename, transcript, language = clips[i % len(clips)]
+            data = {"transcript": transcript, "language": language}
+            if args.fps:
+                data["fps"] = str(args.fps)
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"{base_url}/api/generate-viseme", headers=headers,
+                                             files={"audio_file": (filename, audio, "audio/wav")}, data=data)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    async with httpx.AsyncClient(timeout=args.timeout,
+                                 limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, statuses, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /api/generate-viseme against a fake mfa executable")
+    parser.add_argument("--concurrency", type=int, default=8, help="Số request đồng thời")
+    parser.add_argument("--requests", type=int, default=100, help="Tổng số request (bỏ qua khi có --duration)")
+    parser.add_argument("--duration", type=float, default=0.0, help="Chạy trong bao nhiêu giây thay vì số request")
+    parser.add_argument("--mfa-latency", type=float, default=0.5, help="Độ trễ của fake mfa mỗi lần align (giây)")
+    parser.add_argument("--mfa-jitter", type=float, default=0.0, help="Độ lệch ngẫu nhiên thêm vào độ trễ (giây)")
+    parser.add_argument("--pool", action="store_true", help="Dùng pool worker MFA (backend stub, cùng độ trễ)")
+    parser.add_argument("--use-cache", action="store_true", help="Không gửi X-Cache-Bypass (đo đường cache hit)")
+    parser.add_argument("--fps", type=float, default=0.0, help="Yêu cầu thêm frame_track ở fps này")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Timeout mỗi request (giây)")
+    parser.add_argument("--url", help="Đo server đang chạy thay vì chạy app trong process")
+    parser.add_argument("--json", help="Ghi kết quả ra tệp JSON (để so sánh giữa các lần chạy)")
+    args = parser.parse_args()
+
+    clips = find_clips()
+    if not clips:
+        sys.exit("No clips found in data/ or static/examples")
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        os.chdir(BASE_DIR)
+        os.environ.update({
+            "MFA_CMD": str(FAKE_MFA),
+            "FAKE_MFA_LATENCY": str(args.mfa_latency),
+            "FAKE_MFA_JITTER": str(args.mfa_jitter),
+            "MFA_POOL_ENABLED": "1" if args.pool else "0",
+            "MFA_POOL_BACKEND": "stub",
+            "MFA_POOL_STUB_LATENCY": str(args.mfa_latency),
+            "ALIGNMENT_CACHE_DIR": tempfile.mkdtemp(prefix="viseme_bench_cache_"),
+            "HEALTH_CHECK_INTERVAL": "3600",
+        })
+        # Hàng đợi đủ lớn để đo độ trễ thay vì đo số request bị từ chối
+        os.environ.setdefault("ALIGN_MAX_QUEUE", str(max(32, args.concurrency * 2)))
+        os.environ.setdefault("MFA_POOL_QUEUE_SIZE", str(max(32, args.concurrency * 2)))
+        port = free_port()
+        server, thread = start_server(port)
+        base_url = f"http://127.0.0.1:{port}"
+
+    mode = f"{args.duration:g}s" if args.duration else f"{args.requests} requests"
+    print(f"Load test: {mode}, concurrency {args.concurrency}, {len(clips)} clips, "
+          f"fake mfa latency {args.mfa_latency:g}s{' (worker pool)' if args.pool else ''}")
+
+    latencies, statuses, elapsed = asyncio.run(run_load(base_url, clips, args))
+
+    if server is not None:
+        server.should_exit = True
+        thread.join(timeout=30)
+
+    ok = statuses.get(200, 0)
+    result = {
+        "requests": len(latencies),
+        "ok": ok,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=lambda item: str(item[0]))},
+        "elapsed": elapsed,
+        "requests_per_second": len(latencies) / elapsed if elapsed else 0.0,
+        "latency": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": max(latencies or [0.0]),
+        },
+        "peak_rss_mb": {
+            "self": peak_rss_mb(resource.RUSAGE_SELF),
+            "children": peak_rss_mb(resource.RUSAGE_CHILDREN),
+        },
+        "config": vars(args),
+    }
+
+    print(f"  requests: {result['requests']} in {elapsed:.2f}s ({result['requests_per_second']:.2f} req/s), "
+          f"statuses {result['statuses']}")
+    print(f"  latency:  p50 {result['latency']['p50'] * 1000:8.1f} ms | p95 {result['latency']['p95'] * 1000:8.1f} ms"
+          f" | p99 {result['latency']['p99'] * 1000:8.1f} ms | max {result['latency']['max'] * 1000:8.1f} ms")
+    if not args.url:
+        print(f"  peak RSS: {result['peak_rss_mb']['self']:.1f} MB (API process), "
+              f"{result['peak_rss_mb']['children']:.1f} MB (largest child process)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
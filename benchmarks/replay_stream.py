@@ -0,0 +1,176 @@
+"""
+Replay harness: streaming viseme qua WebSocket
+--------------------------------
+Phát lại data/audio_vi.wav hoặc data/audio_en.wav theo thời gian thực tới /ws/stream-viseme,
+gửi transcript dần dần theo tiến độ audio (giống TTS trực tiếp) và đo độ trễ:
+- provisional: từ lúc audio của segment được gửi tới lúc segment xuất hiện lần đầu
+- final: từ lúc audio của segment được gửi tới lúc segment được chốt
+
+Mặc định chạy app trong cùng process (FastAPI TestClient) với pool worker "stub", không cần MFA.
+Dùng --url để kết nối tới server đang chạy (cần gói `websockets`).
+
+Chạy từ thư mục gốc của repo:
+    python benchmarks/replay_stream.py --language vi
+    python benchmarks/replay_stream.py --language en --url ws://localhost:8000/ws/stream-viseme
+"""
+
+import os
+import sys
+import json
+import time
+import wave
+import argparse
+import threading
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+
+class InProcessConnection:
+    """Kết nối WebSocket tới app trong cùng process qua TestClient"""
+
+    def __init__(self):
+        os.environ.setdefault("MFA_POOL_ENABLED", "1")
+        os.environ.setdefault("MFA_POOL_BACKEND", "stub")
+        os.chdir(BASE_DIR)
+        from fastapi.testclient import TestClient
+        import app
+
+        self._client = TestClient(app.app)
+        self._client.__enter__()
+        self._ws = self._client.websocket_connect("/ws/stream-viseme")
+        self._ws.__enter__()
+
+    def send_bytes(self, data: bytes):
+        self._ws.send_bytes(data)
+
+    def send_json(self, data):
+        self._ws.send_text(json.dumps(data))
+
+    def receive_json(self):
+        return self._ws.receive_json()
+
+    def close(self):
+        self._ws.__exit__(None, None, None)
+        self._client.__exit__(None, None, None)
+
+
+class RemoteConnection:
+    """Kết nối WebSocket tới server đang chạy"""
+
+    def __init__(self, url: str):
+        from websockets.sync.client import connect
+
+        self._ws = connect(url)
+
+    def send_bytes(self, data: bytes):
+        self._ws.send(data)
+
+    def send_json(self, data):
+        self._ws.send(json.dumps(data))
+
+    def receive_json(self):
+        return json.loads(self._ws.recv())
+
+    def close(self):
+        self._ws.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay audio in real time to the streaming viseme endpoint")
+    parser.add_argument("--language", choices=["vi", "en"], default="vi")
+    parser.add_argument("--audio", help="Tệp WAV PCM 16-bit mono (mặc định data/audio_{language}.wav)")
+    parser.add_argument("--transcript", help="Tệp transcript (mặc định data/audio_{language}.txt)")
+    parser.add_argument("--chunk-ms", type=int, default=100, help="Độ dài mỗi chunk audio (ms)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Tốc độ phát lại (1.0 = thời gian thực)")
+    parser.add_argument("--url", help="URL WebSocket của server (mặc định chạy app trong process)")
+    args = parser.parse_args()
+
+    audio_path = Path(args.audio or BASE_DIR / "data" / f"audio_{args.language}.wav")
+    transcript_path = Path(args.transcript or BASE_DIR / "data" / f"audio_{args.language}.txt")
+    words = transcript_path.read_text(encoding="utf-8").split()
+
+    with wave.open(str(audio_path), "rb") as wav_file:
+        if wav_file.getnchannels() != 1 or wav_file.getsampwidth() != 2:
+            sys.exit("Audio must be 16-bit mono PCM")
+        sample_rate = wav_file.getframerate()
+        pcm = wav_file.readframes(wav_file.getnframes())
+    duration = len(pcm) / 2 / sample_rate
+
+    connection = RemoteConnection(args.url) if args.url else InProcessConnection()
+    connection.send_json({"type": "start", "language": args.language, "sample_rate": sample_rate})
+    ready = connection.receive_json()
+    print(f"Session {ready.get('session_id')}: {audio_path.name} ({duration:.2f}s, {len(words)} words)")
+
+    messages = []
+
+    def reader():
+        while True:
+            message = connection.receive_json()
+            messages.append((time.perf_counter(), message))
+            if message["type"] in ("done", "error"):
+                return
+
+    reader_thread = threading.Thread(target=reader, daemon=True)
+    reader_thread.start()
+
+    # Gửi audio theo thời gian thực; mỗi từ được gửi khi audio tới phần tương ứng (chia đều theo thời lượng)
+    chunk_bytes = int(sample_rate * args.chunk_ms / 1000) * 2
+    started = time.perf_counter()
+    sent_words = 0
+    for offset in range(0, len(pcm), chunk_bytes):
+        audio_time = offset / 2 / sample_rate
+        due_words = min(len(words), int((audio_time + args.chunk_ms / 1000) / duration * len(words)) + 1)
+        if due_words > sent_words:
+            connection.send_json({"type": "transcript", "text": " ".join(words[sent_words:due_words])})
+            sent_words = due_words
+        connection.send_bytes(pcm[offset:offset + chunk_bytes])
+        next_at = started + (offset + chunk_bytes) / 2 / sample_rate / args.speed
+        time.sleep(max(0.0, next_at - time.perf_counter()))
+    connection.send_json({"type": "end"})
+    reader_thread.join(timeout=60)
+    connection.close()
+
+    # Thời điểm (đồng hồ phía client) mà audio tới thời điểm t đã được gửi xong
+    def sent_at(t):
+        return started + min(t, duration) / args.speed
+
+    provisional_latency = []
+    final_latency = []
+    seen = set()
+    finalized = set()
+    revisions = 0
+    for received, message in messages:
+        if message["type"] == "error":
+            print(f"  error: {message['detail']}")
+        if message["type"] != "segments":
+            continue
+        revisions += 1
+        for segment in message["segments"]:
+            key = (round(segment["start"], 3), segment["phoneme"])
+            latency = received - sent_at(segment["end"])
+            if key not in seen:
+                seen.add(key)
+                provisional_latency.append(latency)
+            if segment["final"] and key not in finalized:
+                finalized.add(key)
+                final_latency.append(latency)
+
+    done = messages[-1][1] if messages else {}
+    print(f"  messages: {revisions} segment revisions, windows aligned: {done.get('windows')}")
+    print(f"  segments: {len(seen)} seen, {len(finalized)} final")
+    for name, values in (("first seen", provisional_latency), ("final", final_latency)):
+        print(f"  {name:>10} latency: p50 {percentile(values, 0.5) * 1000:7.1f} ms | "
+              f"p95 {percentile(values, 0.95) * 1000:7.1f} ms | max {max(values or [0]) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Health Monitor
+--------------------------------
+Kiểm tra sức khỏe các thành phần tốn kém (lệnh `mfa --version`, `mfa model inspect`) trong task nền
+theo chu kỳ, để endpoint health chỉ đọc kết quả đã lưu thay vì chạy subprocess ở mỗi lần probe.
+
+- Kết quả kiểm tra kèm thời điểm kiểm tra, tuổi và thời gian chạy
+- Các lệnh kiểm tra chạy song song, có timeout
+- evaluate_readiness: đánh giá mức bão hòa của scheduler và pool worker cho readiness probe
+"""
+
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# check() -> {"status": "healthy" | "degraded", "components": {...}}
+HealthCheck = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+async def run_check_command(cmd: List[str], timeout: float) -> Tuple[Optional[int], str]:
+    """Chạy một lệnh kiểm tra, trả về (mã thoát, stdout); mã thoát None nếu không chạy được hoặc quá thời gian"""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+    except Exception as e:
+        logger.warning(f"Health check command {cmd[0]} failed to start: {e}")
+        return None, ""
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        logger.warning(f"Health check command {' '.join(cmd)} timed out after {timeout:.0f}s")
+        return None, ""
+    return process.returncode, stdout.decode(errors="replace").strip()
+
+
+class HealthMonitor:
+    """Chạy hàm kiểm tra định kỳ trong nền và giữ kết quả gần nhất"""
+
+    def __init__(self, check: HealthCheck, interval: float = 60.0):
+        self.check = check
+        self.interval = interval
+        self.result: Dict[str, Any] = {"status": "unknown", "components": {}}
+        self.checked_at: Optional[float] = None
+        self.check_duration: Optional[float] = None
+        self.failures = 0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Bắt đầu vòng kiểm tra nền; lần kiểm tra đầu tiên chạy ngay nhưng không chặn khởi động"""
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Chạy kiểm tra ngay; nếu đang có lần kiểm tra khác thì chờ và dùng kết quả đó"""
+        if self._lock.locked():
+            async with self._lock:
+                return self.result
+        async with self._lock:
+            started = time.time()
+            try:
+                self.result = await self.check()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Health check failed: {e}")
+                self.result = {"status": "degraded", "components": {}, "error": str(e)}
+            self.checked_at = time.time()
+            self.check_duration = self.checked_at - started
+            return self.result
+
+    async def _loop(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Kết quả kiểm tra gần nhất kèm thời điểm và tuổi của kết quả"""
+        return {
+            **self.result,
+            "checked_at": datetime.fromtimestamp(self.checked_at).isoformat() if self.checked_at else None,
+            "age": time.time() - self.checked_at if self.checked_at else None,
+            "check_duration": self.check_duration,
+        }
+
+
+def evaluate_readiness(scheduler_stats: Dict[str, Any], pool_stats: Optional[Dict[str, Any]],
+                       max_queue_ratio: float = 0.9) -> List[str]:
+    """Lý do không sẵn sàng nhận request (rỗng nếu sẵn sàng): hàng đợi gần đầy hoặc không còn worker sống"""
+    reasons = []
+    if scheduler_stats["waiting"] >= max(1, int(scheduler_stats["max_queue"] * max_queue_ratio)):
+        reasons.append(f"alignment queue saturated ({scheduler_stats['waiting']}/{scheduler_stats['max_queue']})")
+
+    if pool_stats is not None:
+        limit = max(1, int(pool_stats["queue_size"] * max_queue_ratio))
+        for language, info in pool_stats["languages"].items():
+            if not any(worker["alive"] for worker in info["workers"]):
+                reasons.append(f"no live MFA worker for {language}")
+            if info["queued"] >= limit:
+                reasons.append(f"MFA worker queue for {language} saturated ({info['queued']}/{pool_stats['queue_size']})")
+    return reasons
@@ -0,0 +1,536 @@
+"""
+Job API
+--------------------------------
+Chế độ submit/poll cho các alignment dài: request trả về job id ngay lập tức,
+client hỏi trạng thái qua GET hoặc nhận kết quả qua callback URL khi job hoàn tất.
+
+- JobStore: nơi lưu trạng thái job, có bản trong bộ nhớ và bản SQLite
+- JobManager: chạy job với giới hạn đồng thời theo ngôn ngữ, hỗ trợ hủy job
+- Khi nhiều process dùng chung SQLite store, job bị hủy từ process khác được phát hiện bằng polling
+- Mỗi job ghi PID của process chạy nó và heartbeat định kỳ; job chưa xong mà process sở hữu đã chết (crash,
+  bị kill khi đang drain) hoặc heartbeat quá hạn được đánh dấu failed lúc khởi động và trong lượt bảo trì
+  định kỳ (không chạy lại được vì audio nằm trong workspace của process đã chết)
+- Lượt bảo trì (xóa job hết hạn, heartbeat, tìm job mồ côi) chạy trong thread, không chặn event loop
+- Callback URL chỉ được trỏ tới địa chỉ public (hoặc host trong allow-list), kiểm tra khi tạo job và trước mỗi
+  lần gửi; không theo redirect
+"""
+
+import os
+import json
+import time
+import socket
+import ipaddress
+import asyncio
+import logging
+import sqlite3
+import threading
+import urllib.parse
+import urllib.request
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Collection, Dict, List, Optional, Tuple
+
+from scratch import process_alive
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATUSES = {JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED}
+UNFINISHED_STATUSES = {JOB_QUEUED, JOB_RUNNING}
+ORPHANED_JOB_ERROR = "The worker process running this job exited before it finished"
+CANCELLED_JOB_ERROR = "Cancelled by client"
+SHUTDOWN_JOB_ERROR = "Server shutting down before the job finished"
+
+
+class JobStore(ABC):
+    """Giao diện lưu trữ trạng thái job"""
+
+    @abstractmethod
+    def create(self, job: Dict[str, Any]):
+        """Lưu một job mới"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy job theo id, None nếu không tồn tại"""
+
+    @abstractmethod
+    def update(self, job_id: str, **fields):
+        """Cập nhật các trường của job"""
+
+    @abstractmethod
+    def purge_finished(self, older_than: float) -> int:
+        """Xóa các job đã kết thúc trước thời điểm older_than, trả về số job đã xóa"""
+
+    @abstractmethod
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """Các job đang chờ hoặc đang chạy (của mọi process)"""
+
+    @abstractmethod
+    def heartbeat(self, job_ids: List[str]):
+        """Ghi heartbeat cho các job chưa kết thúc mà process hiện tại đang chạy"""
+
+    @abstractmethod
+    def fail_unfinished(self, job_id: str, error: str) -> bool:
+        """Đánh dấu failed nếu job vẫn chưa kết thúc; trả về True nếu đã cập nhật"""
+
+
+class InMemoryJobStore(JobStore):
+    """Lưu job trong bộ nhớ của process (mất khi khởi động lại)"""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: Dict[str, Any]):
+        with self._lock:
+            self._jobs[job["job_id"]] = dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def purge_finished(self, older_than: float) -> int:
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["status"] in FINISHED_STATUSES and job["updated_at"] < older_than]
+            for job_id in expired:
+                del self._jobs[job_id]
+            return len(expired)
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(job) for job in self._jobs.values() if job["status"] in UNFINISHED_STATUSES]
+
+    def heartbeat(self, job_ids: List[str]):
+        now = time.time()
+        with self._lock:
+            for job_id in job_ids:
+                job = self._jobs.get(job_id)
+                if job is not None and job["status"] in UNFINISHED_STATUSES:
+                    job["heartbeat_at"] = now
+
+    def fail_unfinished(self, job_id: str, error: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] not in UNFINISHED_STATUSES:
+                return False
+            job.update(status=JOB_FAILED, error=error, updated_at=time.time())
+            return True
+
+
+class SQLiteJobStore(JobStore):
+    """Lưu job trong SQLite, dùng chung được giữa nhiều process trên cùng máy"""
+
+    COLUMNS = ("job_id", "status", "language", "callback_url", "created_at", "updated_at", "result", "error",
+               "owner_pid", "heartbeat_at")
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                language TEXT,
+                callback_url TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                result TEXT,
+                error TEXT,
+                owner_pid INTEGER,
+                heartbeat_at REAL
+            )
+        """)
+        # Store tạo bởi phiên bản cũ chưa có cột owner_pid/heartbeat_at
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in (("owner_pid", "INTEGER"), ("heartbeat_at", "REAL")):
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_updated ON jobs (status, updated_at)")
+        self._conn.commit()
+
+    def create(self, job: Dict[str, Any]):
+        row = {column: job.get(column) for column in self.COLUMNS}
+        row["result"] = json.dumps(row["result"]) if row["result"] is not None else None
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' for _ in self.COLUMNS)})",
+                [row[column] for column in self.COLUMNS],
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def update(self, job_id: str, **fields):
+        fields = {k: v for k, v in fields.items() if k in self.COLUMNS and k != "job_id"}
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE job_id = ?",
+                [*fields.values(), job_id],
+            )
+            self._conn.commit()
+
+    def purge_finished(self, older_than: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({', '.join('?' for _ in FINISHED_STATUSES)}) AND updated_at < ?",
+                [*FINISHED_STATUSES, older_than],
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE status IN "
+                f"({', '.join('?' for _ in UNFINISHED_STATUSES)})",
+                list(UNFINISHED_STATUSES),
+            ).fetchall()
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+
+    def heartbeat(self, job_ids: List[str]):
+        if not job_ids:
+            return
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET heartbeat_at = ? WHERE job_id IN ({', '.join('?' for _ in job_ids)}) "
+                f"AND status IN ({', '.join('?' for _ in UNFINISHED_STATUSES)})",
+                [time.time(), *job_ids, *UNFINISHED_STATUSES],
+            )
+            self._conn.commit()
+
+    def fail_unfinished(self, job_id: str, error: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ? "
+                f"AND status IN ({', '.join('?' for _ in UNFINISHED_STATUSES)})",
+                [JOB_FAILED, error, time.time(), job_id, *UNFINISHED_STATUSES],
+            )
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+
+class CallbackURLError(ValueError):
+    """Callback URL không hợp lệ hoặc trỏ tới địa chỉ không được phép"""
+
+
+def check_callback_url(callback_url: str, allowed_hosts: Optional[Collection[str]] = None):
+    """
+    Kiểm tra callback URL: http(s), host nằm trong allowed_hosts (nếu có allow-list) hoặc mọi địa chỉ host
+    phân giải ra đều là địa chỉ public (không phải private, loopback, link-local/metadata, multicast, reserved).
+    Có phân giải DNS nên gọi trong thread.
+    """
+    parsed = urllib.parse.urlsplit(callback_url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise CallbackURLError("callback_url must be an http(s) URL")
+    host = parsed.hostname.lower()
+    if allowed_hosts:
+        if host not in allowed_hosts:
+            raise CallbackURLError(f"callback_url host {host} is not in the allowed callback hosts")
+        return
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (ValueError, OSError) as e:
+        raise CallbackURLError(f"callback_url host {host} cannot be resolved: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+        if ip.version == 6 and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise CallbackURLError(f"callback_url must not point to a private, loopback or link-local address "
+                                   f"({host} resolves to {ip})")
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Không theo redirect của callback (redirect có thể trỏ vào mạng nội bộ)"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_callback_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def post_callback(callback_url: str, payload: Dict[str, Any], timeout: float = 10.0, retries: int = 3,
+                  allowed_hosts: Optional[Collection[str]] = None):
+    """Gửi kết quả job tới callback URL (POST JSON), thử lại với backoff khi lỗi"""
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    for attempt in range(1, retries + 1):
+        try:
+            # Kiểm tra lại trước mỗi lần gửi: địa chỉ DNS có thể đã đổi từ lúc tạo job
+            check_callback_url(callback_url, allowed_hosts)
+        except CallbackURLError as e:
+            logger.warning(f"Job {payload['job_id']}: Callback to {callback_url} refused: {e}")
+            return False
+        try:
+            request = urllib.request.Request(
+                callback_url, data=data, method="POST", headers={"Content-Type": "application/json"}
+            )
+            with _callback_opener.open(request, timeout=timeout) as response:
+                logger.info(f"Job {payload['job_id']}: Callback delivered to {callback_url} ({response.status})")
+                return True
+        except Exception as e:
+            logger.warning(f"Job {payload['job_id']}: Callback attempt {attempt} to {callback_url} failed: {e}")
+            if attempt < retries:
+                time.sleep(2 ** attempt)
+    return False
+
+
+class JobManager:
+    """Chạy job alignment nền với giới hạn đồng thời theo ngôn ngữ"""
+
+    def __init__(
+        self,
+        store: JobStore,
+        runner: Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        concurrency_per_language: int = 2,
+        result_ttl: float = 24 * 3600,
+        cleanup: Optional[Callable[[Dict[str, Any]], None]] = None,
+        cancel_poll_interval: Optional[float] = None,
+        maintenance_interval: float = 60.0,
+        heartbeat_timeout: Optional[float] = None,
+        callback_allowed_hosts: Optional[Collection[str]] = None,
+    ):
+        self.store = store
+        self.runner = runner
+        self.cleanup = cleanup
+        self.concurrency_per_language = concurrency_per_language
+        self.result_ttl = result_ttl
+        # Chu kỳ kiểm tra job bị hủy bởi process khác (None: chỉ một process dùng store)
+        self.cancel_poll_interval = cancel_poll_interval
+        # Chu kỳ xóa job hết hạn và tìm job mồ côi; job chưa xong không có heartbeat trong heartbeat_timeout
+        # giây cũng bị coi là mồ côi (None: chỉ dựa vào PID của process sở hữu)
+        self.maintenance_interval = maintenance_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.orphans_failed = 0
+        # Host được nhận callback (rỗng: mọi host có địa chỉ public)
+        self.callback_allowed_hosts = callback_allowed_hosts
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._watcher: Optional[asyncio.Task] = None
+        self._shutting_down = False
+
+    def _semaphore(self, language: str) -> asyncio.Semaphore:
+        if language not in self._semaphores:
+            self._semaphores[language] = asyncio.Semaphore(self.concurrency_per_language)
+        return self._semaphores[language]
+
+    async def submit(self, job_id: str, language: str, payload: Dict[str, Any],
+                     callback_url: Optional[str] = None) -> Dict[str, Any]:
+        """Tạo job mới và lên lịch chạy nền (store được ghi trong thread, không chặn event loop)"""
+        now = time.time()
+        job = {
+            "job_id": job_id,
+            "status": JOB_QUEUED,
+            "language": language,
+            "callback_url": callback_url,
+            "created_at": now,
+            "updated_at": now,
+            "result": None,
+            "error": None,
+            "owner_pid": os.getpid(),
+            "heartbeat_at": now,
+        }
+        # Đăng ký task trước khi lưu job để lượt tìm job mồ côi (chạy trong thread) không coi job là mồ côi;
+        # task chờ tới khi job đã được lưu (created = True) mới bắt đầu, created = False thì bỏ qua
+        created = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(self._run(job_id, language, payload, callback_url, created))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        try:
+            await asyncio.to_thread(self.store.create, job)
+        except BaseException:
+            created.set_result(False)
+            raise
+        created.set_result(True)
+        self._start_watcher()
+        logger.info(f"Job {job_id}: Queued for {language}")
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    def _cancel_in_store(self, job_id: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Đánh dấu job bị hủy trong store (gọi trong thread); trả về (job, True nếu vừa bị hủy)"""
+        job = self.store.get(job_id)
+        if job is None or job["status"] in FINISHED_STATUSES:
+            return job, False
+        self.store.update(job_id, status=JOB_CANCELLED, error=CANCELLED_JOB_ERROR)
+        return self.store.get(job_id), True
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Hủy job đang chờ hoặc đang chạy; trả về job sau khi hủy, None nếu không tồn tại"""
+        job, cancelled = await asyncio.to_thread(self._cancel_in_store, job_id)
+        if cancelled:
+            task = self._tasks.get(job_id)
+            if task is not None:
+                task.cancel()
+            logger.info(f"Job {job_id}: Cancelled")
+        return job
+
+    async def _run(self, job_id: str, language: str, payload: Dict[str, Any], callback_url: Optional[str],
+                   created: "asyncio.Future[bool]"):
+        if not await created:
+            return
+        try:
+            async with self._semaphore(language):
+                # Job có thể đã bị hủy (kể cả từ process khác) trong lúc chờ
+                job = await asyncio.to_thread(self.store.get, job_id)
+                if job is None or job["status"] == JOB_CANCELLED:
+                    return
+                await asyncio.to_thread(self.store.update, job_id, status=JOB_RUNNING)
+                logger.info(f"Job {job_id}: Running")
+
+                try:
+                    result = await self.runner(job_id, payload)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    error = getattr(e, "detail", None) or str(e)
+                    logger.error(f"Job {job_id}: Failed - {error}")
+                    await asyncio.to_thread(self.store.update, job_id, status=JOB_FAILED, error=str(error))
+                else:
+                    job = await asyncio.to_thread(self.store.get, job_id)
+                    if job is not None and job["status"] == JOB_CANCELLED:
+                        # Bị hủy từ process khác trong lúc đang chạy
+                        logger.info(f"Job {job_id}: Finished after being cancelled, result discarded")
+                    else:
+                        await asyncio.to_thread(self.store.update, job_id, status=JOB_SUCCEEDED, result=result)
+                        logger.info(f"Job {job_id}: Succeeded")
+        except asyncio.CancelledError:
+            if self._shutting_down:
+                # Bị hủy vì server dừng (hết drain timeout): failed để client biết cần gửi lại job
+                logger.warning(f"Job {job_id}: {SHUTDOWN_JOB_ERROR}")
+                await asyncio.to_thread(self.store.update, job_id, status=JOB_FAILED, error=SHUTDOWN_JOB_ERROR)
+            else:
+                await asyncio.to_thread(self.store.update, job_id, status=JOB_CANCELLED, error=CANCELLED_JOB_ERROR)
+        finally:
+            if self.cleanup is not None:
+                self.cleanup(payload)
+
+        if callback_url:
+            job = await asyncio.to_thread(self.store.get, job_id)
+            if job is not None:
+                callback_payload = {k: job[k] for k in ("job_id", "status", "result", "error")}
+                await asyncio.to_thread(post_callback, callback_url, callback_payload,
+                                        allowed_hosts=self.callback_allowed_hosts)
+
+    async def start(self):
+        """Gọi khi khởi động: đánh dấu job mồ côi của các process đã chết và bắt đầu lượt bảo trì định kỳ"""
+        await asyncio.to_thread(self.recover_orphaned)
+        self._start_watcher()
+
+    def _start_watcher(self):
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    def recover_orphaned(self) -> int:
+        """Đánh dấu failed các job chưa xong mà không process nào còn chạy (gọi trong thread)"""
+        now = time.time()
+        pid = os.getpid()
+        failed = 0
+        for job in self.store.unfinished():
+            owner = job.get("owner_pid")
+            if owner == pid:
+                # PID trùng với process trước khi khởi động lại: job không có task trong process này là mồ côi
+                orphaned = job["job_id"] not in self._tasks
+            else:
+                last_seen = job.get("heartbeat_at") or job["updated_at"]
+                orphaned = (owner is None or not process_alive(owner) or
+                            (self.heartbeat_timeout is not None and last_seen < now - self.heartbeat_timeout))
+            if orphaned and self.store.fail_unfinished(job["job_id"], ORPHANED_JOB_ERROR):
+                failed += 1
+                logger.warning(f"Job {job['job_id']}: Owner process {owner} is gone or stopped sending heartbeats, "
+                               f"marked as failed")
+                if job.get("callback_url"):
+                    post_callback(job["callback_url"], {"job_id": job["job_id"], "status": JOB_FAILED,
+                                                        "result": None, "error": ORPHANED_JOB_ERROR},
+                                  allowed_hosts=self.callback_allowed_hosts)
+        self.orphans_failed += failed
+        return failed
+
+    def _maintain(self):
+        """Xóa job hết hạn và tìm job mồ côi (gọi trong thread)"""
+        self.store.purge_finished(time.time() - self.result_ttl)
+        self.recover_orphaned()
+
+    def _poll_store(self, job_ids: List[str]) -> List[str]:
+        """Ghi heartbeat cho job của process này, trả về các job đã bị hủy bởi process khác (gọi trong thread)"""
+        self.store.heartbeat(job_ids)
+        if not self.cancel_poll_interval:
+            return []
+        cancelled = []
+        for job_id in job_ids:
+            job = self.store.get(job_id)
+            if job is not None and job["status"] == JOB_CANCELLED:
+                cancelled.append(job_id)
+        return cancelled
+
+    async def _watch(self):
+        """Lượt bảo trì định kỳ: heartbeat, hủy job bị hủy từ process khác, xóa job hết hạn, tìm job mồ côi"""
+        interval = min(self.cancel_poll_interval or self.maintenance_interval, self.maintenance_interval)
+        last_maintenance = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                for job_id in await asyncio.to_thread(self._poll_store, list(self._tasks)):
+                    task = self._tasks.get(job_id)
+                    if task is not None and not task.done():
+                        logger.info(f"Job {job_id}: Cancelled by another process")
+                        task.cancel()
+                if time.monotonic() - last_maintenance >= self.maintenance_interval:
+                    last_maintenance = time.monotonic()
+                    await asyncio.to_thread(self._maintain)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job store maintenance failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_tasks": len(self._tasks),
+            "concurrency_per_language": self.concurrency_per_language,
+            "orphans_failed": self.orphans_failed,
+        }
+
+    async def shutdown(self, drain_timeout: float = 0.0):
+        """Chờ các job đang chạy trong process này tối đa drain_timeout giây, phần còn lại bị hủy và đánh dấu failed"""
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+        tasks: List[asyncio.Task] = list(self._tasks.values())
+        if tasks and drain_timeout > 0:
+            logger.info(f"Waiting up to {drain_timeout:.0f}s for {len(tasks)} jobs to finish")
+            _, pending = await asyncio.wait(tasks, timeout=drain_timeout)
+            tasks = list(pending)
+        self._shutting_down = True
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
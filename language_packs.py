@@ -0,0 +1,376 @@
+"""
+Language Packs
+--------------------------------
+Mỗi ngôn ngữ là một "gói" trong data/languages/<code>.json; thêm ngôn ngữ mới không cần sửa code.
+
+- Gói gồm: bảng mapping phoneme -> viseme (đường dẫn tương đối với tệp gói), tên model MFA (acoustic,
+  dictionary), quy tắc chuẩn hóa transcript, ký tự bỏ qua khi tra phoneme, clip ví dụ và câu warm-up
+- LanguageRegistry nạp tài nguyên của gói (bảng mapping đã kiểm tra, mapper đã biên dịch, bộ chuẩn hóa
+  transcript và tập từ của từ điển MFA) khi dùng lần đầu hoặc ngay khi khởi động, an toàn giữa các thread
+- reload() quét lại thư mục: gói mới được thêm, gói bị xóa được bỏ, gói thay đổi (nội dung gói hoặc tệp
+  mapping) được nạp lại và tài nguyên cũ của ngôn ngữ đó bị hủy; gói lỗi giữ nguyên phiên bản đang chạy
+
+Ví dụ data/languages/vi.json:
+    {
+        "name": "Tiếng Việt",
+        "mapping": "../vietnamese-phoneme-to-viseme.json",
+        "acoustic_model": "vietnamese_mfa",
+        "dictionary": "vietnamese_mfa",
+        "strip_chars": "ː˦˥˨ˀ˩̚ʷw͡",
+        "normalization": {"unicode_form": "NFC", "lowercase": true, "numbers": "vi"},
+        "examples": {"text": "../../static/examples/example_vi.txt", "audio": "../../static/examples/example_vi.wav"},
+        "warmup_text": "xin chào"
+    }
+"""
+
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from text_normalization import DictionaryIndex, TextNormalizer, find_mfa_dictionary
+from viseme_mapper import PhonemeVisemeMapper
+
+logger = logging.getLogger(__name__)
+
+# Viseme được lưu dạng uint8 trong timeline dạng cột
+MAX_VISEME = 255
+# Mã ngôn ngữ được dùng trong URL, tên thư mục corpus và nhãn metrics
+LANGUAGE_CODE_PATTERN = re.compile(r"^[a-z]{2,3}([_-][a-z0-9]+)*$")
+
+
+class LanguageResourceError(Exception):
+    """Gói ngôn ngữ hoặc bảng mapping không đọc được hoặc không hợp lệ"""
+
+
+class NotALanguagePack(Exception):
+    """Tệp JSON trong thư mục gói là bảng mapping (có thể đặt cạnh các gói), không phải gói ngôn ngữ"""
+
+
+@dataclass(frozen=True)
+class LanguageSpec:
+    """Cấu hình của một ngôn ngữ đọc từ gói (chưa nạp bảng mapping)"""
+    code: str
+    mapping_path: Path
+    acoustic_model: str
+    dictionary: str
+    name: str = ""
+    strip_chars: Optional[str] = None
+    warmup_text: str = "a"
+    # Phiên bản model riêng của gói (None: dùng MFA_MODEL_VERSION chung), nằm trong khóa cache alignment
+    model_version: Optional[str] = None
+    # Bộ luật G2P của engine preview ("vi" hoặc "en")
+    preview_rules: Optional[str] = None
+    normalization: Mapping[str, Any] = field(default_factory=dict, compare=False)
+    # Tệp từ điển phát âm dùng để kiểm tra từ (None: tìm từ điển pretrained của MFA theo tên)
+    dictionary_path: Optional[Path] = None
+    example_text: Optional[Path] = None
+    example_audio: Optional[Path] = None
+    source: Optional[Path] = None
+    # Hash nội dung tệp gói và tệp mapping, dùng để phát hiện thay đổi khi reload
+    revision: str = ""
+
+    @property
+    def models(self) -> Dict[str, str]:
+        return {"acoustic_model": self.acoustic_model, "dictionary": self.dictionary}
+
+
+@dataclass(frozen=True)
+class LanguageResources:
+    """Tài nguyên đã nạp và kiểm tra của một ngôn ngữ (bảng mapping chỉ đọc)"""
+    spec: LanguageSpec
+    mapping: Mapping[str, int]
+    mapper: PhonemeVisemeMapper = field(compare=False)
+    normalizer: TextNormalizer = field(compare=False)
+    viseme_count: int
+    load_time: float
+
+    @property
+    def dictionary(self) -> Optional[DictionaryIndex]:
+        return self.normalizer.dictionary
+
+
+def read_language_pack(path: Path) -> LanguageSpec:
+    """Đọc một tệp gói ngôn ngữ; đường dẫn trong gói tính tương đối với thư mục chứa tệp gói"""
+    try:
+        raw = path.read_bytes()
+        data = json.loads(raw)
+    except (OSError, ValueError) as e:
+        raise LanguageResourceError(f"Cannot read language pack {path}: {e}")
+    if not isinstance(data, dict):
+        raise LanguageResourceError(f"Language pack {path} must be a JSON object")
+    if "phonemeToViseme" in data and "acoustic_model" not in data:
+        raise NotALanguagePack(path)
+
+    code = str(data.get("code", path.stem))
+    if not LANGUAGE_CODE_PATTERN.match(code):
+        raise LanguageResourceError(f"Invalid language code {code!r} in {path}")
+    missing = [key for key in ("mapping", "acoustic_model", "dictionary") if not data.get(key)]
+    if missing:
+        raise LanguageResourceError(f"Language pack {path} is missing {', '.join(missing)}")
+
+    base = path.parent
+    mapping_path = (base / data["mapping"]).resolve()
+    try:
+        mapping_bytes = mapping_path.read_bytes()
+    except OSError as e:
+        raise LanguageResourceError(f"Cannot read mapping of language pack {path}: {e}")
+    normalization = data.get("normalization", {})
+    if not isinstance(normalization, dict):
+        raise LanguageResourceError(f"normalization in {path} must be an object")
+    examples = data.get("examples", {})
+
+    return LanguageSpec(
+        code=code,
+        mapping_path=mapping_path,
+        acoustic_model=str(data["acoustic_model"]),
+        dictionary=str(data["dictionary"]),
+        name=str(data.get("name", code)),
+        strip_chars=data.get("strip_chars"),
+        warmup_text=str(data.get("warmup_text", "a")),
+        model_version=str(data["model_version"]) if data.get("model_version") is not None else None,
+        preview_rules=data.get("preview_rules"),
+        normalization=MappingProxyType(dict(normalization)),
+        dictionary_path=(base / data["dictionary_path"]).resolve() if data.get("dictionary_path") else None,
+        example_text=(base / examples["text"]).resolve() if examples.get("text") else None,
+        example_audio=(base / examples["audio"]).resolve() if examples.get("audio") else None,
+        source=path,
+        revision=hashlib.sha256(raw + b"\0" + mapping_bytes).hexdigest(),
+    )
+
+
+def load_phoneme_mapping(path: Path) -> Mapping[str, int]:
+    """
+    Đọc và kiểm tra bảng phonemeToViseme: khóa là chuỗi khác rỗng, giá trị là số nguyên 0..255
+    và (nếu tệp có visemeDescriptions) là một viseme đã được mô tả. Trả về bảng chỉ đọc.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise LanguageResourceError(f"Cannot read {path}: {e}")
+
+    mapping = data.get("phonemeToViseme") if isinstance(data, dict) else None
+    if not isinstance(mapping, dict) or not mapping:
+        raise LanguageResourceError(f"{path} has no phonemeToViseme table")
+
+    described = {str(key) for key in data.get("visemeDescriptions", {})}
+    errors = []
+    for phoneme, viseme in mapping.items():
+        if not phoneme:
+            errors.append("empty phoneme")
+        elif isinstance(viseme, bool) or not isinstance(viseme, int) or not 0 <= viseme <= MAX_VISEME:
+            errors.append(f"{phoneme!r} -> {viseme!r} is not a viseme id")
+        elif described and str(viseme) not in described:
+            errors.append(f"{phoneme!r} -> {viseme} has no entry in visemeDescriptions")
+    if errors:
+        raise LanguageResourceError(f"Invalid mapping in {path}: {'; '.join(errors[:5])}"
+                                    + (f" (+{len(errors) - 5} more)" if len(errors) > 5 else ""))
+    return MappingProxyType(dict(mapping))
+
+
+def load_dictionary_index(spec: LanguageSpec, mfa_root: Optional[Path] = None) -> Optional[DictionaryIndex]:
+    """Tập từ của từ điển của gói (dictionary_path hoặc từ điển pretrained của MFA); None nếu không tìm thấy"""
+    path = spec.dictionary_path or find_mfa_dictionary(spec.dictionary, mfa_root)
+    if path is None:
+        logger.warning(f"Dictionary {spec.dictionary} for {spec.code} not found; transcripts are not checked")
+        return None
+    try:
+        return DictionaryIndex.from_file(path, unicode_form=spec.normalization.get("unicode_form", "NFC"),
+                                         lowercase=spec.normalization.get("lowercase", True))
+    except OSError as e:
+        raise LanguageResourceError(f"Cannot read dictionary {path} for {spec.code}: {e}")
+
+
+def load_language_resources(spec: LanguageSpec, mfa_root: Optional[Path] = None,
+                            check_dictionary: bool = True) -> LanguageResources:
+    started = time.perf_counter()
+    mapping = load_phoneme_mapping(spec.mapping_path)
+    mapper = PhonemeVisemeMapper(spec.code, mapping, strip_chars=spec.strip_chars)
+    dictionary = load_dictionary_index(spec, mfa_root) if check_dictionary else None
+    return LanguageResources(
+        spec=spec,
+        mapping=mapping,
+        mapper=mapper,
+        normalizer=TextNormalizer(spec.normalization, dictionary),
+        viseme_count=len(set(mapping.values())),
+        load_time=time.perf_counter() - started,
+    )
+
+
+class LanguageRegistry:
+    """Các gói ngôn ngữ trong một thư mục; tài nguyên nạp một lần khi cần (hoặc trước bằng load)"""
+
+    def __init__(self, directory: Path, mfa_root: Optional[Path] = None, check_dictionary: bool = True):
+        self.directory = directory
+        self.mfa_root = mfa_root
+        self.check_dictionary = check_dictionary
+        self.specs: Dict[str, LanguageSpec] = {}
+        self.generation = 0  # Số lần quét thư mục (0: chưa quét)
+        self.reloaded_at: Optional[float] = None
+        self._resources: Dict[str, LanguageResources] = {}
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.RLock()
+
+    def _ensure_discovered(self):
+        if self.generation == 0:
+            self.reload()
+
+    def __contains__(self, language: str) -> bool:
+        self._ensure_discovered()
+        return language in self.specs
+
+    def codes(self) -> List[str]:
+        self._ensure_discovered()
+        return list(self.specs)
+
+    def spec(self, language: str) -> LanguageSpec:
+        """Cấu hình gói của ngôn ngữ; KeyError nếu không có gói"""
+        self._ensure_discovered()
+        return self.specs[language]
+
+    def models(self) -> Dict[str, Dict[str, str]]:
+        """Model MFA của từng ngôn ngữ (cấu hình của MFAWorkerPool)"""
+        self._ensure_discovered()
+        return {code: spec.models for code, spec in self.specs.items()}
+
+    def get(self, language: str) -> LanguageResources:
+        """Tài nguyên của ngôn ngữ, nạp ở lần gọi đầu tiên; KeyError nếu không có gói"""
+        resources = self._resources.get(language)
+        if resources is not None:
+            return resources
+        self._ensure_discovered()
+        with self._lock:
+            spec = self.specs[language]
+            resources = self._resources.get(language)
+            if resources is None:
+                try:
+                    resources = load_language_resources(spec, self.mfa_root, self.check_dictionary)
+                except LanguageResourceError as e:
+                    self._errors[language] = str(e)
+                    logger.error(f"Failed to load resources for {language}: {e}")
+                    raise
+                self._errors.pop(language, None)
+                self._resources[language] = resources
+                dictionary = resources.dictionary
+                logger.info(f"Loaded {language} phoneme to viseme mapping from {spec.mapping_path} "
+                            f"({len(resources.mapping)} phonemes"
+                            + (f", {len(dictionary)} dictionary words" if dictionary is not None else "")
+                            + f", {resources.load_time * 1000:.1f} ms)")
+        return resources
+
+    def load(self, languages: Optional[List[str]] = None) -> Dict[str, LanguageResources]:
+        """Nạp trước tài nguyên (mặc định tất cả ngôn ngữ); lỗi đầu tiên được raise sau khi thử hết"""
+        failures = []
+        for language in (self.codes() if languages is None else languages):
+            try:
+                self.get(language)
+            except LanguageResourceError as e:
+                failures.append(e)
+        if failures:
+            raise failures[0]
+        return dict(self._resources)
+
+    def loaded(self) -> Dict[str, LanguageResources]:
+        """Các ngôn ngữ đã được nạp (không kích hoạt nạp thêm)"""
+        return dict(self._resources)
+
+    def discover(self) -> Tuple[Dict[str, LanguageSpec], Dict[str, str]]:
+        """Đọc tất cả gói trong thư mục, trả về (gói hợp lệ theo mã ngôn ngữ, lỗi theo tên tệp/mã)"""
+        specs: Dict[str, LanguageSpec] = {}
+        errors: Dict[str, str] = {}
+        for path in sorted(self.directory.glob("*.json")):
+            try:
+                spec = read_language_pack(path)
+            except NotALanguagePack:
+                continue
+            except LanguageResourceError as e:
+                errors[path.stem] = str(e)
+                continue
+            if spec.code in specs:
+                errors[spec.code] = f"Duplicate language pack {path.name} for {spec.code}"
+                continue
+            specs[spec.code] = spec
+        return specs, errors
+
+    def reload(self) -> Dict[str, List[str]]:
+        """
+        Quét lại thư mục gói. Ngôn ngữ đã nạp có gói thay đổi được nạp và kiểm tra lại trước khi thay thế;
+        gói lỗi (hoặc bảng mapping mới không hợp lệ) giữ phiên bản đang chạy. Trả về các ngôn ngữ
+        added / changed / removed / failed.
+        """
+        specs, errors = self.discover()
+        changes: Dict[str, List[str]] = {"added": [], "changed": [], "removed": [], "failed": []}
+        with self._lock:
+            new_specs: Dict[str, LanguageSpec] = {}
+            new_resources: Dict[str, LanguageResources] = {}
+
+            def keep_current(code: str):
+                new_specs[code] = self.specs[code]
+                if code in self._resources:
+                    new_resources[code] = self._resources[code]
+
+            for code, spec in specs.items():
+                current = self.specs.get(code)
+                if current is not None and current.revision == spec.revision:
+                    keep_current(code)
+                    continue
+                if code in self._resources:
+                    try:
+                        new_resources[code] = load_language_resources(spec, self.mfa_root, self.check_dictionary)
+                    except LanguageResourceError as e:
+                        errors[code] = str(e)
+                        keep_current(code)
+                        changes["failed"].append(code)
+                        continue
+                new_specs[code] = spec
+                changes["added" if current is None else "changed"].append(code)
+
+            for code in self.specs:
+                if code in new_specs:
+                    continue
+                if code in errors:
+                    keep_current(code)
+                    changes["failed"].append(code)
+                else:
+                    changes["removed"].append(code)
+
+            # Lỗi nạp bảng mapping (từ get) của gói không đổi vẫn còn hiệu lực
+            errors.update({code: error for code, error in self._errors.items()
+                           if code in new_specs and code not in new_resources and code not in errors
+                           and new_specs[code] is self.specs.get(code)})
+            previous_errors = self._errors
+            self.specs = new_specs
+            self._resources = new_resources
+            self._errors = errors
+            self.generation += 1
+            self.reloaded_at = time.time()
+
+        # Chỉ ghi log lỗi mới (reload chạy theo chu kỳ)
+        for key, error in errors.items():
+            if previous_errors.get(key) != error:
+                logger.error(error)
+        if any(changes.values()):
+            logger.info(f"Language packs reloaded from {self.directory}: "
+                        + ", ".join(f"{kind} {', '.join(codes)}" for kind, codes in changes.items() if codes))
+        return changes
+
+    def status(self) -> Dict[str, str]:
+        """Trạng thái từng ngôn ngữ: loaded, error hoặc not_loaded (gói lỗi chưa từng chạy: error)"""
+        self._ensure_discovered()
+        status = {key: "error" for key in self._errors}
+        status.update({
+            language: "loaded" if language in self._resources else "error" if language in self._errors
+            else "not_loaded"
+            for language in self.specs
+        })
+        return status
+
+    def errors(self) -> Dict[str, str]:
+        return dict(self._errors)
@@ -0,0 +1,209 @@
+"""
+Production Launcher
+--------------------------------
+Chạy API với nhiều worker process dùng chung một socket (pre-fork), thay cho `python app.py` (chế độ reload).
+
+- app.py và tài nguyên ngôn ngữ trong STARTUP_PRELOAD_LANGUAGES (bảng mapping phoneme -> viseme, mapper
+  đã biên dịch) được nạp một lần trong process cha trước khi fork; các worker dùng chung phần bộ nhớ này
+  theo copy-on-write, rồi tự warm-up (pool chuẩn hóa audio, aligner) trước khi báo ready
+- Trạng thái dùng chung giữa các worker:
+  + Job: SQLite job store (JOB_STORE_BACKEND=sqlite), hủy job từ worker bất kỳ; job của worker đã chết
+    được các worker còn lại đánh dấu failed
+  + Cache alignment: tầng đĩa (ghi nguyên tử) dùng chung, tầng bộ nhớ riêng từng worker
+  + Timeline để truy vấn theo thời gian (/api/timelines/...): tầng đĩa dùng chung như cache alignment
+  + Giới hạn alignment đồng thời: slot khóa tệp (ALIGN_SHARED_SLOTS_DIR), không mất slot khi worker crash
+- SIGTERM/SIGINT được chuyển cho các worker: worker ngừng nhận kết nối, chờ request, job và alignment
+  đang chạy (tối đa SHUTDOWN_DRAIN_TIMEOUT) rồi thoát
+- Worker chết ngoài ý muốn được khởi động lại
+- MFA_POOL_SIZE, ALIGN_MAX_QUEUE, ... vẫn tính theo từng worker; riêng ALIGN_MAX_CONCURRENT áp dụng chung
+
+Chạy từ thư mục gốc của repo (chỉ hỗ trợ Linux/macOS):
+    python launcher.py --workers 4 --port 8000
+"""
+
+import os
+import gc
+import sys
+import time
+import socket
+import signal
+import logging
+import argparse
+import tempfile
+import traceback
+from pathlib import Path
+from typing import Dict
+
+BASE_DIR = Path(__file__).resolve().parent
+
+logger = logging.getLogger("launcher")
+
+# Worker thoát sớm hơn mức này sau khi khởi động được tính là lỗi khởi động
+MIN_WORKER_LIFETIME = 5.0
+MAX_FAST_FAILURES = 5
+
+
+def configure_environment(workers: int):
+    """Đặt cấu hình mặc định cho chế độ nhiều worker (trước khi import app)"""
+    cpu_count = os.cpu_count() or 1
+    os.environ.setdefault("JOB_STORE_BACKEND", "sqlite")
+    os.environ.setdefault("ALIGN_SHARED_SLOTS_DIR",
+                          str(Path(tempfile.gettempdir()) / "viseme_api" / "align_slots"))
+    # Chia số CPU cho --num_jobs giữa các worker thay vì mỗi worker dùng toàn bộ
+    os.environ.setdefault("ALIGN_TOTAL_JOBS", str(max(1, cpu_count // workers)))
+
+
+def create_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, args: argparse.Namespace):
+    """Chạy uvicorn trên socket dùng chung (trong process con)"""
+    import uvicorn
+    import app as app_module
+    from startup import StartupTracker
+
+    # Time-to-ready của worker tính từ lúc fork (worker khởi động lại không kế thừa thời điểm của process cha)
+    app_module.startup_tracker = StartupTracker()
+    config = uvicorn.Config(
+        app_module.app,
+        log_config=None,  # Dùng cấu hình logging của app.py
+        access_log=args.access_log,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        timeout_keep_alive=args.keep_alive,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Launcher:
+    """Process cha: fork worker, chuyển tín hiệu, khởi động lại worker bị chết"""
+
+    def __init__(self, sock: socket.socket, args: argparse.Namespace):
+        self.sock = sock
+        self.args = args
+        self.children: Dict[int, tuple] = {}  # pid -> (số thứ tự worker, thời điểm khởi động)
+        self.stopping = False
+        self.stop_requested_at = 0.0
+        self.fast_failures = 0
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(self.sock, self.args)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = (index, time.time())
+        logger.info(f"Started worker {index} (pid {pid})")
+
+    def _handle_signal(self, signum, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        self.stop_requested_at = time.time()
+        logger.info(f"Received {signal.Signals(signum).name}, stopping {len(self.children)} workers")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        for index in range(self.args.workers):
+            self.spawn(index)
+
+        # Worker cần thời gian cho request đang xử lý (uvicorn) và drain alignment/job (shutdown hook)
+        stop_timeout = self.args.graceful_timeout + self.args.drain_timeout + 10
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                if self.stopping and time.time() - self.stop_requested_at > stop_timeout:
+                    logger.warning(f"Workers did not stop within {stop_timeout:.0f}s, killing them")
+                    for child in list(self.children):
+                        try:
+                            os.kill(child, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+                    self.stop_requested_at = time.time()
+                time.sleep(0.2)
+                continue
+            if pid not in self.children:
+                continue
+
+            index, started_at = self.children.pop(pid)
+            exit_code = os.waitstatus_to_exitcode(status)
+            if self.stopping:
+                logger.info(f"Worker {index} (pid {pid}) exited with code {exit_code}")
+                continue
+
+            logger.error(f"Worker {index} (pid {pid}) died unexpectedly with code {exit_code}, restarting")
+            if time.time() - started_at < MIN_WORKER_LIFETIME:
+                self.fast_failures += 1
+                if self.fast_failures >= MAX_FAST_FAILURES:
+                    logger.error("Workers keep failing right after startup, giving up")
+                    self._handle_signal(signal.SIGTERM, None)
+                    continue
+                time.sleep(1.0)
+            self.spawn(index)
+
+        self.sock.close()
+        logger.info("All workers stopped")
+        return 1 if self.fast_failures >= MAX_FAST_FAILURES else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the viseme API with multiple pre-forked workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="Số giây chờ request HTTP đang xử lý khi tắt worker")
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--access-log", action="store_true")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("launcher.py requires a platform with fork(); use `uvicorn app:app` instead")
+
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, str(BASE_DIR))
+    configure_environment(args.workers)
+    from language_packs import LanguageResourceError
+    from startup import parse_language_list
+
+    # Nạp app và tài nguyên ngôn ngữ (bảng mapping, mapper) một lần trước khi fork
+    import app as app_module
+    app_module.configure_logging()
+    app_module.prepare_directories()
+    preload = parse_language_list(app_module.STARTUP_PRELOAD_LANGUAGES, app_module.language_registry.codes())
+    try:
+        app_module.language_registry.load(preload)
+    except LanguageResourceError as e:
+        sys.exit(f"Cannot load language resources: {e}")
+    args.drain_timeout = app_module.SHUTDOWN_DRAIN_TIMEOUT
+    logger.info(f"Preloaded app with mappings for {', '.join(app_module.language_registry.loaded()) or 'no languages'}; "
+                f"starting {args.workers} workers on {args.host}:{args.port}")
+
+    sock = create_socket(args.host, args.port, args.backlog)
+    # Đưa các object đã nạp ra khỏi GC để worker không làm bẩn các trang bộ nhớ dùng chung
+    gc.freeze()
+    sys.exit(Launcher(sock, args).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+Long-form Alignment
+--------------------------------
+Align audio dài (tới hàng giờ) bằng cách chia thành các đoạn ngắn tại khoảng lặng.
+
+- VAD dựa trên năng lượng: RMS theo khung 30 ms, ngưỡng tự thích nghi theo mức nền của tệp,
+  đọc WAV theo từng khối nên không cần nạp cả tệp vào bộ nhớ
+- Chọn điểm cắt ở giữa khoảng lặng gần độ dài mục tiêu nhất; cắt cứng nếu không có khoảng lặng
+- Chia transcript theo số âm tiết: số âm tiết tích lũy của transcript (nhóm nguyên âm của từng từ) khớp với số
+  nhân âm tiết (đỉnh của đường bao năng lượng) tích lũy trong audio, nên không lệch khi tốc độ nói thay đổi;
+  không đếm được âm tiết đáng tin cậy thì chia theo tỉ lệ số ký tự với thời lượng có tiếng nói
+- Kiểm tra các từ quanh mỗi điểm cắt: hai cách chia lệch nhau quá BOUNDARY_TOLERANCE_WORDS từ (tốc độ nói đổi
+  quanh điểm cắt) thì gộp hai đoạn kề nhau để align chung, trong giới hạn max_merged_seconds
+- Align các đoạn song song (giới hạn bởi max_parallel), mỗi đoạn là một utterance ngắn
+- Ghép timeline với offset toàn cục, cắt các entry về trong biên của đoạn để ranh giới không chồng lấn
+"""
+
+import os
+import wave
+import math
+import unicodedata
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FRAME_SECONDS = 0.03
+READ_BLOCK_SECONDS = 10.0
+# Khung có năng lượng thấp hơn (mức nền + SILENCE_MARGIN_DB) được coi là lặng
+SILENCE_MARGIN_DB = 10.0
+NOISE_FLOOR_PERCENTILE = 10
+
+_SAMPLE_DTYPES = {1: np.uint8, 2: np.dtype("<i2"), 4: np.dtype("<i4")}
+
+# Đếm nhân âm tiết: khung 10 ms, đỉnh năng lượng cách nhau ít nhất 100 ms (tối đa ~10 âm tiết/giây) và nổi
+# hơn vùng xung quanh ít nhất SYLLABLE_PROMINENCE_DB
+SYLLABLE_FRAME_SECONDS = 0.01
+SYLLABLE_MIN_GAP_SECONDS = 0.1
+SYLLABLE_PROMINENCE_DB = 4.0
+# Số nhân âm tiết đếm được phải nằm trong khoảng này so với số âm tiết của transcript mới dùng để chia
+SYLLABLE_RATIO_RANGE = (0.5, 2.0)
+# Điểm cắt mà hai cách chia lệch nhau nhiều hơn số từ này (hoặc 10% số từ của hai đoạn) thì gộp hai đoạn
+BOUNDARY_TOLERANCE_WORDS = 2
+
+_VOWELS = set("aeiouy")
+
+# align_segment(audio_path, transcript) -> dữ liệu JSON alignment của MFA cho đoạn
+SegmentAligner = Callable[[Path, str], Awaitable[Dict[str, Any]]]
+
+
+class LongformError(Exception):
+    """Không thể xử lý audio ở chế độ long-form"""
+
+
+class LongformOptions:
+    """Tham số chia đoạn và align song song"""
+
+    def __init__(self, target_segment_seconds: float = 30.0, max_segment_seconds: float = 60.0,
+                 min_silence_seconds: float = 0.3, max_parallel: Optional[int] = None,
+                 max_merged_seconds: Optional[float] = None):
+        self.target_segment_seconds = target_segment_seconds
+        self.max_segment_seconds = max(max_segment_seconds, target_segment_seconds)
+        self.min_silence_seconds = min_silence_seconds
+        self.max_parallel = max_parallel or os.cpu_count() or 1
+        # Độ dài tối đa của đoạn gộp khi từ quanh điểm cắt không khớp (mặc định gấp đôi độ dài tối đa)
+        self.max_merged_seconds = max_merged_seconds or self.max_segment_seconds * 2
+
+
+class AudioSegment:
+    """Một đoạn audio cùng phần transcript tương ứng"""
+
+    def __init__(self, index: int, start: float, end: float, speech_seconds: float, syllables: int = 0):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.speech_seconds = speech_seconds
+        # Số nhân âm tiết đếm được trong đoạn (0: không đếm)
+        self.syllables = syllables
+        self.words: List[str] = []
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def wav_duration(audio_path: Path) -> float:
+    """Thời lượng tệp WAV (giây), 0 nếu không đọc được header"""
+    try:
+        with wave.open(str(audio_path), "rb") as wav_file:
+            return wav_file.getnframes() / wav_file.getframerate()
+    except (wave.Error, EOFError, OSError):
+        return 0.0
+
+
+def frame_energies(audio_path: Path, frame_seconds: float = FRAME_SECONDS) -> Tuple[np.ndarray, float]:
+    """Năng lượng (dB) của từng khung, đọc tệp theo từng khối; trả về (mảng dB, độ dài khung thực tế)"""
+    try:
+        wav_file = wave.open(str(audio_path), "rb")
+    except (wave.Error, EOFError) as e:
+        raise LongformError(f"Cannot read WAV file: {e}")
+
+    with wav_file:
+        sample_width = wav_file.getsampwidth()
+        if sample_width not in _SAMPLE_DTYPES:
+            raise LongformError(f"Unsupported sample width: {sample_width * 8} bit")
+        channels = wav_file.getnchannels()
+        sample_rate = wav_file.getframerate()
+        frame_length = max(1, int(sample_rate * frame_seconds))
+        block_frames = frame_length * max(1, int(READ_BLOCK_SECONDS / frame_seconds))
+
+        energies = []
+        while True:
+            data = wav_file.readframes(block_frames)
+            if not data:
+                break
+            samples = np.frombuffer(data, dtype=_SAMPLE_DTYPES[sample_width]).astype(np.float64)
+            if sample_width == 1:
+                samples -= 128.0
+            samples = samples.reshape(-1, channels).mean(axis=1)
+            usable = len(samples) // frame_length * frame_length
+            if usable:
+                frames = samples[:usable].reshape(-1, frame_length)
+                energies.append(np.sqrt(np.mean(frames * frames, axis=1)))
+            if usable < len(samples):
+                tail = samples[usable:]
+                energies.append(np.array([np.sqrt(np.mean(tail * tail))]))
+
+    if not energies:
+        return np.zeros(0), frame_length / sample_rate
+    rms = np.concatenate(energies)
+    return 20.0 * np.log10(rms + 1e-9), frame_length / sample_rate
+
+
+def silence_mask(energies_db: np.ndarray, margin_db: float = SILENCE_MARGIN_DB) -> np.ndarray:
+    """Đánh dấu khung lặng theo ngưỡng tự thích nghi: mức nền của tệp cộng margin_db"""
+    if not len(energies_db):
+        return np.zeros(0, dtype=bool)
+    floor = np.percentile(energies_db, NOISE_FLOOR_PERCENTILE)
+    threshold = min(floor + margin_db, float(energies_db.max()) - margin_db)
+    return energies_db <= threshold
+
+
+def silence_midpoints(mask: np.ndarray, frame_seconds: float, min_silence_seconds: float) -> np.ndarray:
+    """Thời điểm giữa của các khoảng lặng dài ít nhất min_silence_seconds"""
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    long_runs = (ends - starts) * frame_seconds >= min_silence_seconds
+    return (starts[long_runs] + ends[long_runs]) / 2.0 * frame_seconds
+
+
+def syllable_nuclei(audio_path: Path) -> np.ndarray:
+    """
+    Thời điểm các nhân âm tiết ước lượng từ đường bao năng lượng (khung 10 ms): đỉnh cục bộ trong cửa sổ
+    ±SYLLABLE_MIN_GAP_SECONDS, không nằm trong khoảng lặng, cao hơn điểm thấp nhất của vùng xung quanh ít nhất
+    SYLLABLE_PROMINENCE_DB
+    """
+    energies_db, frame_seconds = frame_energies(audio_path, SYLLABLE_FRAME_SECONDS)
+    half = max(1, int(round(SYLLABLE_MIN_GAP_SECONDS / frame_seconds)))
+    if len(energies_db) < 2 * half + 1:
+        return np.zeros(0)
+    # Làm mượt 30 ms để nhiễu trong một âm tiết không tạo thành nhiều đỉnh
+    smoothed = np.convolve(energies_db, np.ones(3) / 3.0, mode="same")
+    padded = np.pad(smoothed, 2 * half, mode="edge")
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 4 * half + 1)
+    local_max = windows[:, half:3 * half + 1].max(axis=1)
+    surrounding_min = windows.min(axis=1)
+    previous = np.concatenate(([-np.inf], smoothed[:-1]))
+    peaks = ((smoothed >= local_max) & (smoothed > previous) & ~silence_mask(energies_db)
+             & (smoothed - surrounding_min >= SYLLABLE_PROMINENCE_DB))
+    return (np.flatnonzero(peaks) + 0.5) * frame_seconds
+
+
+def word_syllables(word: str) -> int:
+    """Số âm tiết ước lượng của một từ: số nhóm nguyên âm sau khi bỏ dấu (tiếng Việt: một âm tiết mỗi từ)"""
+    letters = "".join(c for c in unicodedata.normalize("NFD", word.lower()) if not unicodedata.combining(c))
+    groups = 0
+    previous_vowel = False
+    for c in letters:
+        is_vowel = c in _VOWELS
+        groups += is_vowel and not previous_vowel
+        previous_vowel = is_vowel
+    return max(groups, 1)
+
+
+def plan_segments(audio_path: Path, options: LongformOptions) -> List[AudioSegment]:
+    """Chia audio thành các đoạn tại khoảng lặng gần độ dài mục tiêu nhất"""
+    energies_db, frame_seconds = frame_energies(audio_path)
+    duration = wav_duration(audio_path)
+    mask = silence_mask(energies_db)
+    candidates = silence_midpoints(mask, frame_seconds, options.min_silence_seconds)
+
+    boundaries = [0.0]
+    # Phần còn lại ngắn hơn 1.5 lần độ dài mục tiêu được giữ nguyên làm đoạn cuối
+    while duration - boundaries[-1] > min(options.max_segment_seconds, options.target_segment_seconds * 1.5):
+        start = boundaries[-1]
+        # Điểm cắt hợp lệ: đoạn dài từ một nửa độ dài mục tiêu tới độ dài tối đa
+        lo = np.searchsorted(candidates, start + options.target_segment_seconds / 2, side="left")
+        hi = np.searchsorted(candidates, start + options.max_segment_seconds, side="right")
+        if lo < hi:
+            window = candidates[lo:hi]
+            cut = float(window[np.argmin(np.abs(window - (start + options.target_segment_seconds)))])
+        else:
+            cut = start + options.target_segment_seconds
+            logger.warning(f"No silence found after {start:.1f}s, cutting at {cut:.1f}s")
+        boundaries.append(cut)
+    boundaries.append(duration)
+
+    speech = ~mask
+    nuclei = syllable_nuclei(audio_path)
+    segments = []
+    for index, (start, end) in enumerate(zip(boundaries[:-1], boundaries[1:])):
+        first, last = int(start / frame_seconds), int(math.ceil(end / frame_seconds))
+        syllables = int(np.searchsorted(nuclei, end) - np.searchsorted(nuclei, start))
+        segments.append(AudioSegment(index, start, end, float(speech[first:last].sum()) * frame_seconds, syllables))
+    return segments
+
+
+def _assign_words(word_weights: np.ndarray, segment_weights: np.ndarray) -> np.ndarray:
+    """Đoạn của từng từ: từ thuộc đoạn chứa điểm giữa của nó khi trải trọng số từ lên trọng số các đoạn"""
+    segment_fraction = np.cumsum(segment_weights) / segment_weights.sum()
+    cumulative = np.cumsum(word_weights)
+    word_mid = (cumulative - word_weights / 2.0) / cumulative[-1]
+    return np.minimum(np.searchsorted(segment_fraction, word_mid, side="left"), len(segment_weights) - 1)
+
+
+def _merge_segments(first: AudioSegment, second: AudioSegment) -> AudioSegment:
+    return AudioSegment(first.index, first.start, second.end, first.speech_seconds + second.speech_seconds,
+                        first.syllables + second.syllables)
+
+
+def split_transcript(words: List[str], segments: List[AudioSegment],
+                     max_merged_seconds: Optional[float] = None) -> Tuple[List[AudioSegment], Dict[str, Any]]:
+    """
+    Chia các từ cho các đoạn. Trả về (danh sách đoạn sau khi gộp, thống kê).
+
+    - Theo âm tiết khi số nhân âm tiết đếm được khớp với transcript (trong SYLLABLE_RATIO_RANGE), nếu không
+      theo tỉ lệ số ký tự với thời lượng có tiếng nói
+    - Điểm cắt mà hai cách chia lệch nhau quá nhiều từ thì gộp hai đoạn kề nhau (nếu đoạn gộp không dài quá
+      max_merged_seconds) để MFA không phải align từ của đoạn này vào audio của đoạn kia
+    """
+    stats = {"split": "speech", "merged_boundaries": 0, "uncertain_boundaries": 0}
+    if not words:
+        return segments, stats
+
+    speech = np.array([segment.speech_seconds for segment in segments], dtype=np.float64)
+    if speech.sum() <= 0:
+        speech = np.array([segment.duration for segment in segments], dtype=np.float64)
+    lengths = np.array([len(word) + 1 for word in words], dtype=np.float64)
+    by_speech = _assign_words(lengths, speech)
+
+    owners = by_speech
+    syllables = np.array([segment.syllables for segment in segments], dtype=np.float64)
+    word_weights = np.array([word_syllables(word) for word in words], dtype=np.float64)
+    ratio = syllables.sum() / word_weights.sum()
+    if SYLLABLE_RATIO_RANGE[0] <= ratio <= SYLLABLE_RATIO_RANGE[1]:
+        stats["split"] = "syllables"
+        owners = _assign_words(word_weights, syllables)
+
+        # So sánh điểm cắt (số từ trước điểm cắt) của hai cách chia
+        cuts = np.searchsorted(owners, np.arange(len(segments) - 1), side="right")
+        speech_cuts = np.searchsorted(by_speech, np.arange(len(segments) - 1), side="right")
+        counts = np.bincount(owners, minlength=len(segments))
+        merged = [segments[0]]
+        merge_with_previous = [False]
+        for boundary in range(len(segments) - 1):
+            pair_words = counts[boundary] + counts[boundary + 1]
+            tolerance = max(BOUNDARY_TOLERANCE_WORDS, 0.1 * pair_words)
+            nxt = segments[boundary + 1]
+            if abs(int(cuts[boundary]) - int(speech_cuts[boundary])) <= tolerance:
+                merged.append(nxt)
+                merge_with_previous.append(False)
+            elif max_merged_seconds is None or nxt.end - merged[-1].start <= max_merged_seconds:
+                merged[-1] = _merge_segments(merged[-1], nxt)
+                merge_with_previous.append(True)
+                stats["merged_boundaries"] += 1
+            else:
+                merged.append(nxt)
+                merge_with_previous.append(False)
+                stats["uncertain_boundaries"] += 1
+                logger.warning(f"Long-form boundary at {nxt.start:.1f}s is uncertain (word split estimates differ "
+                               f"by {abs(int(cuts[boundary]) - int(speech_cuts[boundary]))} words) "
+                               f"but the merged segment would be too long")
+        # Đoạn gộp nhận mọi từ của các đoạn thành phần
+        group = np.cumsum([not flag for flag in merge_with_previous]) - 1
+        owners = group[owners]
+        segments = merged
+        for index, segment in enumerate(segments):
+            segment.index = index
+
+    for word, owner in zip(words, owners):
+        segments[owner].words.append(word)
+    return segments, stats
+
+
+def write_segment(audio_path: Path, segment: AudioSegment, dest: Path):
+    """Ghi một đoạn của tệp WAV gốc ra tệp riêng (giữ nguyên định dạng)"""
+    with wave.open(str(audio_path), "rb") as source:
+        sample_rate = source.getframerate()
+        first = int(round(segment.start * sample_rate))
+        last = min(source.getnframes(), int(round(segment.end * sample_rate)))
+        source.setpos(first)
+        data = source.readframes(last - first)
+        with wave.open(str(dest), "wb") as target:
+            target.setnchannels(source.getnchannels())
+            target.setsampwidth(source.getsampwidth())
+            target.setframerate(sample_rate)
+            target.writeframes(data)
+
+
+def shift_segment_entries(entries: List[List[Any]], segment: AudioSegment, previous_end: float) -> List[List[Any]]:
+    """Cộng offset của đoạn và cắt entry về trong biên [start, end] của đoạn"""
+    shifted = []
+    for start, end, label in entries:
+        start = max(start + segment.start, segment.start, previous_end)
+        end = min(end + segment.start, segment.end)
+        if end - start > 1e-6:
+            shifted.append([round(start, 4), round(end, 4), label])
+            previous_end = end
+    return shifted
+
+
+def stitch_alignments(segments: List[AudioSegment], alignments: List[Optional[Dict[str, Any]]],
+                      duration: float) -> Dict[str, Any]:
+    """Ghép alignment của các đoạn thành một alignment có cùng định dạng JSON với MFA"""
+    tiers: Dict[str, List[List[Any]]] = {"words": [], "phones": []}
+    for segment, mfa_data in zip(segments, alignments):
+        if mfa_data is None:
+            continue
+        for tier_name, entries in tiers.items():
+            tier = mfa_data.get("tiers", {}).get(tier_name)
+            if tier:
+                previous_end = entries[-1][1] if entries else 0.0
+                entries.extend(shift_segment_entries(tier["entries"], segment, previous_end))
+
+    return {
+        "start": 0,
+        "end": duration,
+        "tiers": {name: {"type": "IntervalTier", "entries": entries} for name, entries in tiers.items()},
+    }
+
+
+async def align_longform(audio_path: Path, transcript: str, work_dir: Path, align_segment: SegmentAligner,
+                         options: Optional[LongformOptions] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Align audio dài theo từng đoạn song song và ghép kết quả.
+    Trả về (dữ liệu alignment đã ghép, thống kê). Đoạn lỗi để trống trong timeline;
+    raise LongformError nếu mọi đoạn đều lỗi.
+    """
+    options = options or LongformOptions()
+    duration = wav_duration(audio_path)
+    segments, split_stats = split_transcript(transcript.split(), plan_segments(audio_path, options),
+                                             options.max_merged_seconds)
+    logger.info(f"Long-form alignment of {audio_path.name}: {duration:.1f}s in {len(segments)} segments "
+                f"(split by {split_stats['split']}, {split_stats['merged_boundaries']} boundaries merged)")
+
+    semaphore = asyncio.Semaphore(options.max_parallel)
+
+    async def run(segment: AudioSegment) -> Optional[Dict[str, Any]]:
+        if not segment.words:
+            return None
+        segment_path = work_dir / f"{audio_path.stem}_seg{segment.index:04d}.wav"
+        async with semaphore:
+            try:
+                await asyncio.to_thread(write_segment, audio_path, segment, segment_path)
+                return await align_segment(segment_path, " ".join(segment.words))
+            except Exception as e:
+                segment.error = str(e)
+                logger.warning(f"Long-form segment {segment.index} ({segment.start:.1f}-{segment.end:.1f}s) "
+                               f"failed: {e}")
+                return None
+            finally:
+                segment_path.unlink(missing_ok=True)
+
+    alignments = await asyncio.gather(*(run(segment) for segment in segments))
+    aligned = sum(1 for result in alignments if result is not None)
+    if not aligned and any(segment.words for segment in segments):
+        raise LongformError(f"All {len(segments)} long-form segments failed to align")
+
+    stats = {
+        "segments": len(segments),
+        "aligned_segments": aligned,
+        **split_stats,
+        "failed_segments": [
+            {"index": s.index, "start": s.start, "end": s.end, "error": s.error}
+            for s in segments if s.error
+        ],
+    }
+    return stitch_alignments(segments, alignments, duration), stats
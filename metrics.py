@@ -0,0 +1,242 @@
+"""
+Metrics
+--------------------------------
+Registry metrics tối giản xuất theo định dạng text của Prometheus (không cần prometheus_client).
+
+- Counter, Gauge, Histogram có label; giá trị được giữ trong process
+- Collector: hàm được gọi lúc scrape để xuất số liệu lấy từ thành phần khác (scheduler, pool, mapper)
+- StageTimings: đo thời gian từng bước của pipeline cho một request, vừa ghi vào histogram
+  vừa trả về trong metadata của response
+"""
+
+import time
+import math
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bucket (giây) phù hợp từ bước xử lý vài ms tới alignment MFA vài phút
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Một sample: (tên metric kèm hậu tố, label, giá trị)
+Sample = Tuple[str, Dict[str, str], float]
+# Collector trả về các metric dạng (tên, loại, mô tả, danh sách sample)
+CollectedMetric = Tuple[str, str, str, List[Sample]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_sample(name: str, labels: Dict[str, str], value: float) -> str:
+    if labels:
+        label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+        return f"{name}{{{label_text}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Bộ đếm chỉ tăng"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(f"{self.name}_total", dict(zip(self.labelnames, key)), value)
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """Giá trị tăng giảm tùy ý (số request đang xử lý, ...)"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        """Tăng gauge trong khi khối lệnh đang chạy"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, dict(zip(self.labelnames, key)), value)
+                    for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    """Phân phối giá trị theo bucket cố định (thời gian xử lý)"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Mỗi bộ label: [số đếm theo bucket (không cộng dồn), tổng, số lần quan sát]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += bucket_count
+                    samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """Tập hợp các metric và collector của process"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[CollectedMetric]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if any(existing.name == metric.name for existing in self._metrics):
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[CollectedMetric]]):
+        """Đăng ký hàm sinh metric lúc scrape"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Xuất toàn bộ metric theo định dạng text của Prometheus"""
+        collected: List[CollectedMetric] = [
+            (metric.name, metric.type_name, metric.documentation, metric.samples()) for metric in self._metrics
+        ]
+        for collector in self._collectors:
+            try:
+                collected.extend(collector())
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+
+        lines = []
+        for name, type_name, documentation, samples in collected:
+            lines.append(f"# HELP {name} {_escape(documentation)}")
+            lines.append(f"# TYPE {name} {type_name}")
+            lines.extend(_format_sample(*sample) for sample in samples)
+        return "\n".join(lines) + "\n"
+
+
+class StageTimings:
+    """
+    Thời gian từng bước pipeline của một request. Mỗi lần ghi được quan sát vào histogram
+    (label stage, language); bước lặp lại nhiều lần (các đoạn long-form) được cộng dồn.
+    """
+
+    def __init__(self, histogram: Histogram, language: str):
+        self._histogram = histogram
+        self.language = language
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self._histogram.observe(seconds, stage=stage, language=self.language)
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        """Đo thời gian khối lệnh, kể cả khi khối lệnh lỗi"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def as_dict(self, ndigits: Optional[int] = 4) -> Dict[str, float]:
+        if ndigits is None:
+            return dict(self.stages)
+        return {stage: round(seconds, ndigits) for stage, seconds in self.stages.items()}
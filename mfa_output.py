@@ -0,0 +1,258 @@
+"""
+MFA Output Parser
+--------------------------------
+Đọc kết quả alignment của MFA (JSON hoặc TextGrid dạng long) mà chỉ giữ các tier cần dùng (words, phones).
+
+- Tệp được mmap và quét trực tiếp trên bytes (không giải mã cả tệp thành str, không dựng cây JSON đầy đủ);
+  nhãn phone/từ lặp lại được dùng chung một đối tượng str
+- JSON ("auto"): parse bằng orjson nếu đã cài (nhanh hơn json.load), nếu không thì bằng json của thư viện chuẩn,
+  rồi bỏ các tier không cần
+- JSON ("scan"): quét các mảng entries bằng regex, bộ nhớ đỉnh thấp hơn json.load vài lần nhưng chậm hơn;
+  chỉ nên chọn khi bộ nhớ quan trọng hơn thời gian đọc
+- So sánh trên alignment dài nhiều giờ: benchmarks/bench_mfa_output.py
+- TextGrid: đọc trực tiếp (MFA --output_format long_textgrid), không cần bước JSON trung gian; khoảng trống
+  (text rỗng) thành "sil" / "<eps>" như trong JSON của MFA
+- Kết quả có cùng dạng với JSON của MFA: {"start", "end", "tiers": {tên: {"type", "entries": [[start, end, nhãn]]}}}
+- Tên tier có tiền tố người nói ("spk1 - phones") được gộp theo tên tier
+"""
+
+import re
+import json
+import mmap
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # orjson là phụ thuộc tùy chọn
+    orjson = None
+
+ALIGNMENT_TIERS = ("words", "phones")
+# Nhãn của khoảng trống trong TextGrid, giống nhãn MFA dùng trong JSON
+EMPTY_INTERVAL_LABELS = {"words": "<eps>", "phones": "sil"}
+# Định dạng output của MFA (--output_format) và phần mở rộng tệp tương ứng
+OUTPUT_FORMATS = {"json": ".json", "long_textgrid": ".TextGrid"}
+
+_NUMBER = rb"-?\d[\d.eE+-]*"
+_STRING_BODY = rb'"(?:[^"\\]|\\.)*"'
+_STRING = rb'"((?:[^"\\]|\\.)*)"'
+_JSON_TIERS = re.compile(rb'"tiers"\s*:\s*\{')
+_JSON_TIER_KEY = re.compile(rb'"((?:[^"\\]|\\.)*)"\s*:\s*\{')
+_JSON_ENTRIES = re.compile(rb'"entries"\s*:\s*\[')
+_JSON_ENTRY = re.compile(rb"\s*,?\s*\[\s*(" + _NUMBER + rb")\s*,\s*(" + _NUMBER + rb")\s*,\s*" + _STRING
+                         + rb"\s*\]")
+_JSON_ENTRIES_END = re.compile(rb"\s*\]")
+# Cả mảng entries tới dấu "]" đóng mảng, dùng để bỏ qua tier không cần trong một lần match
+_JSON_ENTRIES_BODY = re.compile(rb"(?:\s*\[\s*" + _NUMBER + rb"\s*,\s*" + _NUMBER + rb"\s*,\s*" + _STRING_BODY
+                                + rb"\s*\]\s*,?)*\s*\]")
+_JSON_BOUND = {key: re.compile(rb'"' + key.encode() + rb'"\s*:\s*(' + _NUMBER + rb")") for key in ("start", "end")}
+
+_TEXTGRID_TIER = re.compile(rb'item\s*\[\d+\]:\s*class\s*=\s*"(\w+)"\s*name\s*=\s*"((?:[^"]|"")*)"')
+_TEXTGRID_INTERVAL = re.compile(rb'xmin\s*=\s*(' + _NUMBER + rb')\s*xmax\s*=\s*(' + _NUMBER + rb')\s*'
+                                rb'text\s*=\s*"((?:[^"]|"")*)"')
+_TEXTGRID_INTERVALS = re.compile(rb"intervals:\s*size\s*=\s*\d+")
+_TEXTGRID_BOUND = {"start": re.compile(rb"xmin\s*=\s*(" + _NUMBER + rb")"),
+                   "end": re.compile(rb"xmax\s*=\s*(" + _NUMBER + rb")")}
+
+
+class AlignmentParseError(ValueError):
+    """Tệp output của MFA không đọc được hoặc thiếu tier phones"""
+
+
+def output_suffix(output_format: str) -> str:
+    """Phần mở rộng tệp output của MFA theo --output_format"""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported MFA output format: {output_format}. "
+                         f"Supported formats: {', '.join(OUTPUT_FORMATS)}")
+    return OUTPUT_FORMATS[output_format]
+
+
+def _tier_name(name: str, tiers: Sequence[str]) -> Optional[str]:
+    """Tên tier cần lấy ("phones") từ tên trong tệp ("phones" hoặc "spk1 - phones"), None nếu không cần"""
+    if name in tiers:
+        return name
+    base = name.rpartition(" - ")[2]
+    return base if base in tiers else None
+
+
+def _build(start: float, end: float, collected: Dict[str, List[List[list]]]) -> Dict[str, Any]:
+    tiers = {}
+    for name, parts in collected.items():
+        entries = parts[0] if len(parts) == 1 else sorted((e for part in parts for e in part), key=lambda e: e[0])
+        tiers[name] = {"type": "IntervalTier", "entries": entries}
+    if "phones" not in tiers:
+        raise AlignmentParseError("Alignment has no phones tier")
+    return {"start": start, "end": end, "tiers": tiers}
+
+
+class _Interned(dict):
+    """bytes -> nhãn đã giải mã; mỗi nhãn khác nhau chỉ giải mã một lần và dùng chung một str"""
+
+    def __init__(self, convert: Callable[[bytes], Any]):
+        super().__init__()
+        self.convert = convert
+
+    def __missing__(self, raw: bytes) -> Any:
+        value = self[raw] = self.convert(raw)
+        return value
+
+
+def _json_unescape(raw: bytes) -> str:
+    return json.loads(b'"' + raw + b'"') if b"\\" in raw else raw.decode("utf-8")
+
+
+def parse_alignment_json(buffer, tiers: Sequence[str] = ALIGNMENT_TIERS) -> Dict[str, Any]:
+    """Quét JSON của MFA (bytes hoặc mmap) và chỉ dựng entries của các tier cần dùng"""
+    labels = _Interned(_json_unescape)
+    bounds = {key: pattern.search(buffer) for key, pattern in _JSON_BOUND.items()}
+    collected: Dict[str, List[List[list]]] = {}
+
+    tiers_key = _JSON_TIERS.search(buffer)
+    if tiers_key is None:
+        raise AlignmentParseError("Alignment JSON has no tiers")
+    pos = tiers_key.end()
+    while True:
+        key = _JSON_TIER_KEY.search(buffer, pos)
+        if key is None:
+            break
+        name = _tier_name(_json_unescape(key.group(1)), tiers)
+        entries_key = _JSON_ENTRIES.search(buffer, key.end())
+        if entries_key is None:
+            break
+        pos = entries_key.end()
+        if name is None:
+            body = _JSON_ENTRIES_BODY.match(buffer, pos)
+            if body is None:
+                raise AlignmentParseError(f"Malformed entries in alignment JSON near byte {pos}")
+            pos = body.end()
+            continue
+
+        entries = []
+        for match in _JSON_ENTRY.finditer(buffer, pos):
+            if match.start() != pos:  # Hết các entry liền nhau của mảng này
+                break
+            entries.append([float(match[1]), float(match[2]), labels[match[3]]])
+            pos = match.end()
+        closing = _JSON_ENTRIES_END.match(buffer, pos)
+        if closing is None:
+            raise AlignmentParseError(f"Malformed entries in alignment JSON near byte {pos}")
+        pos = closing.end()
+        collected.setdefault(name, []).append(entries)
+
+    return _build(float(bounds["start"].group(1)) if bounds["start"] else 0.0,
+                  float(bounds["end"].group(1)) if bounds["end"] else 0.0, collected)
+
+
+def parse_alignment_json_orjson(buffer, tiers: Sequence[str] = ALIGNMENT_TIERS) -> Dict[str, Any]:
+    """Parse JSON của MFA bằng orjson (nhận trực tiếp bytes/memoryview) và chỉ giữ các tier cần dùng"""
+    try:
+        data = orjson.loads(buffer)
+    except orjson.JSONDecodeError as e:
+        raise AlignmentParseError(f"Invalid alignment JSON: {e}")
+    return _select_tiers(data, tiers)
+
+
+def parse_alignment_json_stdlib(buffer, tiers: Sequence[str] = ALIGNMENT_TIERS) -> Dict[str, Any]:
+    """Parse JSON của MFA bằng json của thư viện chuẩn (khi không có orjson) và chỉ giữ các tier cần dùng"""
+    try:
+        data = json.loads(bytes(buffer))
+    except ValueError as e:
+        raise AlignmentParseError(f"Invalid alignment JSON: {e}")
+    return _select_tiers(data, tiers)
+
+
+def _select_tiers(data: Any, tiers: Sequence[str]) -> Dict[str, Any]:
+    if not isinstance(data, dict):
+        raise AlignmentParseError("Alignment JSON is not an object")
+    collected: Dict[str, List[List[list]]] = {}
+    for name, tier in (data.get("tiers") or {}).items():
+        name = _tier_name(name, tiers)
+        if name is not None and isinstance(tier, dict) and isinstance(tier.get("entries"), list):
+            collected.setdefault(name, []).append(tier["entries"])
+    return _build(data.get("start", 0.0), data.get("end", 0.0), collected)
+
+
+def parse_textgrid(buffer, tiers: Sequence[str] = ALIGNMENT_TIERS) -> Dict[str, Any]:
+    """Đọc TextGrid dạng long (như MFA ghi) từ bytes hoặc mmap, chỉ lấy các IntervalTier cần dùng"""
+    headers = list(_TEXTGRID_TIER.finditer(buffer))
+    if not headers:
+        raise AlignmentParseError("TextGrid has no tiers (only the long TextGrid format is supported)")
+    bounds = {key: pattern.search(buffer, 0, headers[0].start()) for key, pattern in _TEXTGRID_BOUND.items()}
+
+    collected: Dict[str, List[List[list]]] = {}
+    for i, header in enumerate(headers):
+        name = _tier_name(header.group(2).replace(b'""', b'"').decode("utf-8"), tiers)
+        if name is None or header.group(1) != b"IntervalTier":
+            continue
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(buffer)
+        # Bỏ qua xmin/xmax của chính tier, interval đầu tiên nằm sau "intervals: size = N"
+        body = _TEXTGRID_INTERVALS.search(buffer, header.end(), end)
+        if body is None:
+            continue
+        empty = EMPTY_INTERVAL_LABELS.get(name, "")
+        labels = _Interned(lambda raw: raw.replace(b'""', b'"').decode("utf-8").strip() or empty)
+        entries = [[float(match[1]), float(match[2]), labels[match[3]]]
+                   for match in _TEXTGRID_INTERVAL.finditer(buffer, body.end(), end)]
+        collected.setdefault(name, []).append(entries)
+
+    return _build(float(bounds["start"].group(1)) if bounds["start"] else 0.0,
+                  float(bounds["end"].group(1)) if bounds["end"] else 0.0, collected)
+
+
+def read_alignment(path: Path, tiers: Sequence[str] = ALIGNMENT_TIERS, backend: str = "auto") -> Dict[str, Any]:
+    """
+    Đọc tệp output của MFA theo phần mở rộng (.json hoặc .TextGrid), chỉ giữ các tier cần dùng.
+    backend cho JSON: "auto" (orjson nếu đã cài, nếu không thì json của thư viện chuẩn), "orjson" (như "auto"),
+    "json" (luôn dùng thư viện chuẩn) hoặc "scan" (quét regex, ít bộ nhớ nhất nhưng chậm hơn).
+    """
+    path = Path(path)
+    with open(path, "rb") as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Tệp rỗng không mmap được
+            raise AlignmentParseError(f"Alignment file {path} is empty")
+    try:
+        if path.suffix.lower() == ".textgrid":
+            return parse_textgrid(buffer, tiers)
+        if backend == "scan":
+            return parse_alignment_json(buffer, tiers)
+        if orjson is not None and backend in ("auto", "orjson"):
+            with memoryview(buffer) as view:
+                return parse_alignment_json_orjson(view, tiers)
+        return parse_alignment_json_stdlib(buffer, tiers)
+    finally:
+        buffer.close()
+
+
+def _textgrid_number(value: float) -> str:
+    return repr(float(value))
+
+
+def write_textgrid(alignment: Dict[str, Any], path: Path):
+    """Ghi alignment (dạng JSON của MFA) thành TextGrid dạng long, khoảng trống giữa các entry có text rỗng"""
+    start, end = alignment.get("start", 0), alignment.get("end", 0)
+    tiers = alignment.get("tiers", {})
+    lines = ['File type = "ooTextFile"', 'Object class = "TextGrid"', "",
+             f"xmin = {_textgrid_number(start)} ", f"xmax = {_textgrid_number(end)} ", "tiers? <exists> ",
+             f"size = {len(tiers)} ", "item []: "]
+    for index, (name, tier) in enumerate(tiers.items(), start=1):
+        intervals = []
+        cursor = start
+        for entry_start, entry_end, label in tier.get("entries", []):
+            if entry_start > cursor:
+                intervals.append((cursor, entry_start, ""))
+            intervals.append((entry_start, entry_end, label))
+            cursor = entry_end
+        if cursor < end:
+            intervals.append((cursor, end, ""))
+        lines += [f"    item [{index}]:", '        class = "IntervalTier" ', f'        name = "{name}" ',
+                  f"        xmin = {_textgrid_number(start)} ", f"        xmax = {_textgrid_number(end)} ",
+                  f"        intervals: size = {len(intervals)} "]
+        for number, (interval_start, interval_end, label) in enumerate(intervals, start=1):
+            text = str(label).replace('"', '""')
+            lines += [f"        intervals [{number}]:", f"            xmin = {_textgrid_number(interval_start)} ",
+                      f"            xmax = {_textgrid_number(interval_end)} ", f'            text = "{text}" ']
+    Path(path).write_text("\n".join(lines) + "\n", encoding="utf-8")
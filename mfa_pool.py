@@ -0,0 +1,364 @@
+"""
+MFA Worker Pool
+--------------------------------
+Pool các tiến trình aligner chạy lâu dài (mfa_worker.py), khởi động sẵn cho từng ngôn ngữ.
+Request được gửi tới worker qua stdin/stdout (JSON lines) thay vì chạy tiến trình `mfa align_one` mới mỗi lần:
+bỏ được thời gian khởi động Python và import MFA, model vẫn được MFA nạp lại cho từng request.
+Worker backend mfa cần import được MFA; app tắt pool khi không worker nào khởi động được.
+
+- Kích thước pool và hàng đợi có giới hạn, cấu hình được
+- Health check định kỳ bằng lệnh ping
+- Tự động khởi động lại worker khi bị crash hoặc treo
+- Thêm/bỏ ngôn ngữ hoặc đổi model lúc đang chạy (update_languages, khi gói ngôn ngữ được nạp lại)
+"""
+
+import sys
+import json
+import time
+import asyncio
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = Path(__file__).resolve().parent / "mfa_worker.py"
+
+
+class PoolQueueFullError(Exception):
+    """Hàng đợi của pool đã đầy"""
+
+
+class AlignerWorker:
+    """Một tiến trình mfa_worker.py và kênh IPC tới nó"""
+
+    def __init__(self, language: str, index: int, command: List[str]):
+        self.language = language
+        self.index = index
+        self.command = command
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.lock = asyncio.Lock()
+        self.restarts = 0
+        self.completed = 0
+        self.last_ok: Optional[float] = None
+        self.startup_time: Optional[float] = None
+        self._next_id = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.language}-{self.index}"
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self, timeout: float):
+        """Khởi động tiến trình worker và chờ thông báo sẵn sàng"""
+        started = time.time()
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        try:
+            line = await asyncio.wait_for(self.process.stdout.readline(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+            raise RuntimeError(f"Worker {self.name} did not become ready within {timeout:.0f}s")
+        if not line:
+            # Chờ process kết thúc hẳn để alive phản ánh đúng trạng thái
+            await self.process.wait()
+            raise RuntimeError(f"Worker {self.name} exited during startup with code {self.process.returncode}")
+        ready = json.loads(line)
+        self.last_ok = time.time()
+        self.startup_time = self.last_ok - started
+        logger.info(f"MFA worker {self.name} ready (backend={ready.get('backend')}, "
+                    f"startup_time={ready.get('startup_time', 0):.2f}s)")
+
+    async def request(self, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """Gửi một request tới worker và chờ response"""
+        self._next_id += 1
+        payload = dict(payload, id=self._next_id)
+        self.process.stdin.write((json.dumps(payload) + "\n").encode("utf-8"))
+        await self.process.stdin.drain()
+
+        while True:
+            line = await asyncio.wait_for(self.process.stdout.readline(), timeout=timeout)
+            if not line:
+                raise RuntimeError(f"Worker {self.name} exited with code {self.process.returncode}")
+            response = json.loads(line)
+            # Bỏ qua response cũ của request đã timeout trước đó
+            if response.get("id") == self._next_id:
+                self.last_ok = time.time()
+                return response
+
+    async def stop(self, timeout: float = 5.0):
+        """Dừng tiến trình worker"""
+        if not self.alive:
+            return
+        try:
+            self.process.stdin.close()
+            await asyncio.wait_for(self.process.wait(), timeout=timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            self.process.kill()
+            await self.process.wait()
+
+
+class MFAWorkerPool:
+    """Pool worker aligner theo ngôn ngữ với hàng đợi giới hạn"""
+
+    def __init__(
+        self,
+        language_models: Dict[str, Dict[str, str]],
+        size: int = 2,
+        queue_size: int = 32,
+        backend: str = "mfa",
+        request_timeout: float = 600.0,
+        startup_timeout: float = 120.0,
+        health_interval: float = 30.0,
+        stub_latency: float = 0.0,
+    ):
+        self.language_models = language_models
+        self.size = size
+        self.queue_size = queue_size
+        self.backend = backend
+        self.request_timeout = request_timeout
+        self.startup_timeout = startup_timeout
+        self.health_interval = health_interval
+        # Độ trễ giả lập mỗi request của backend stub (benchmark, test)
+        self.stub_latency = stub_latency
+
+        self.workers: Dict[str, List[AlignerWorker]] = {}
+        self.queues: Dict[str, asyncio.Queue] = {}
+        # Số lần kết thúc theo (op, mã thoát) của các lệnh MFA chạy trong worker
+        self.exit_codes: Counter = Counter()
+        self._tasks: List[asyncio.Task] = []
+        self._serve_tasks: Dict[str, List[asyncio.Task]] = {}
+
+    def _worker_command(self, language: str) -> List[str]:
+        models = self.language_models[language]
+        return [
+            sys.executable, str(WORKER_SCRIPT),
+            "--language", language,
+            "--acoustic-model", models["acoustic_model"],
+            "--dictionary", models["dictionary"],
+            "--backend", self.backend,
+            *(["--stub-latency", str(self.stub_latency)] if self.backend == "stub" else []),
+        ]
+
+    async def start(self):
+        """Khởi động và làm nóng tất cả worker"""
+        await self._add_languages(list(self.language_models))
+        self._tasks.append(asyncio.create_task(self._health_loop()))
+        logger.info(f"MFA worker pool started: {self.size} workers x {len(self.workers)} languages "
+                    f"(backend={self.backend})")
+
+    async def _add_languages(self, languages: List[str]):
+        """Tạo hàng đợi, khởi động worker và vòng phục vụ cho các ngôn ngữ"""
+        new_workers = []
+        for language in languages:
+            self.queues[language] = asyncio.Queue(maxsize=self.queue_size)
+            self.workers[language] = [
+                AlignerWorker(language, i, self._worker_command(language)) for i in range(self.size)
+            ]
+            new_workers.extend(self.workers[language])
+
+        results = await asyncio.gather(*(w.start(self.startup_timeout) for w in new_workers),
+                                       return_exceptions=True)
+        for worker, result in zip(new_workers, results):
+            if isinstance(result, Exception):
+                logger.error(f"MFA worker {worker.name} failed to start: {result}")
+
+        for worker in new_workers:
+            self._serve_tasks.setdefault(worker.language, []).append(asyncio.create_task(self._serve(worker)))
+
+    async def _remove_language(self, language: str):
+        """Dừng worker của một ngôn ngữ; request còn trong hàng đợi nhận kết quả thất bại"""
+        tasks = self._serve_tasks.pop(language, [])
+        workers = self.workers.pop(language, [])
+        queue = self.queues.pop(language, None)
+        # Chờ request đang chạy trên worker xong rồi mới dừng vòng phục vụ
+        for worker in workers:
+            async with worker.lock:
+                pass
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        while queue is not None and not queue.empty():
+            future, _ = queue.get_nowait()
+            if not future.done():
+                future.set_result(False)
+        await asyncio.gather(*(w.stop() for w in workers), return_exceptions=True)
+
+    async def update_languages(self, language_models: Dict[str, Dict[str, str]]):
+        """
+        Đồng bộ pool với cấu hình ngôn ngữ mới: khởi động worker cho ngôn ngữ mới, dừng worker của ngôn ngữ
+        bị bỏ, khởi động lại worker của ngôn ngữ đổi model (request đang chạy được chờ xong)
+        """
+        previous, self.language_models = self.language_models, language_models
+        removed = [language for language in self.workers if language not in language_models]
+        added = [language for language in language_models if language not in self.workers]
+        changed = [language for language in language_models
+                   if language in self.workers and previous.get(language) != language_models[language]]
+
+        for language in removed:
+            await self._remove_language(language)
+        await self._add_languages(added)
+        for language in changed:
+            for worker in self.workers[language]:
+                async with worker.lock:
+                    worker.command = self._worker_command(language)
+                    await worker.stop()
+                    try:
+                        await worker.start(self.startup_timeout)
+                    except Exception as e:
+                        logger.error(f"MFA worker {worker.name} failed to restart with new models: {e}")
+        if removed or added or changed:
+            logger.info(f"MFA worker pool languages updated: added {added}, changed {changed}, removed {removed}")
+
+    async def stop(self):
+        """Dừng pool và tất cả worker"""
+        tasks = self._tasks + [task for tasks in self._serve_tasks.values() for task in tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._serve_tasks = {}
+        await asyncio.gather(*(w.stop() for workers in self.workers.values() for w in workers),
+                             return_exceptions=True)
+        logger.info("MFA worker pool stopped")
+
+    async def align(self, language: str, audio_path: Path, transcript_path: Path, output_path: Path,
+                    num_jobs: int = 1, temporary_directory: Optional[Path] = None,
+                    output_format: str = "json") -> bool:
+        """Đưa một request alignment vào hàng đợi của ngôn ngữ và chờ kết quả"""
+        return await self._submit(language, {
+            "op": "align",
+            "audio_path": str(audio_path),
+            "transcript_path": str(transcript_path),
+            "output_path": str(output_path),
+            "num_jobs": num_jobs,
+            "temporary_directory": str(temporary_directory) if temporary_directory else None,
+            "output_format": output_format,
+        })
+
+    async def align_corpus(self, language: str, corpus_dir: Path, output_dir: Path, num_jobs: int = 1,
+                           temporary_directory: Optional[Path] = None, output_format: str = "json") -> bool:
+        """Đưa một request alignment cho cả corpus vào hàng đợi của ngôn ngữ và chờ kết quả"""
+        return await self._submit(language, {
+            "op": "align_corpus",
+            "corpus_dir": str(corpus_dir),
+            "output_dir": str(output_dir),
+            "num_jobs": num_jobs,
+            "temporary_directory": str(temporary_directory) if temporary_directory else None,
+            "output_format": output_format,
+        })
+
+    async def _submit(self, language: str, payload: Dict[str, Any]) -> bool:
+        if language not in self.queues:
+            logger.error(f"Unsupported language for MFA worker pool: {language}")
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queues[language].put_nowait((future, payload))
+        except asyncio.QueueFull:
+            raise PoolQueueFullError(f"MFA worker queue for {language} is full ({self.queue_size} waiting)")
+
+        return await future
+
+    async def _restart(self, worker: AlignerWorker):
+        """Khởi động lại một worker bị crash hoặc không phản hồi"""
+        worker.restarts += 1
+        logger.warning(f"Restarting MFA worker {worker.name} (restart #{worker.restarts})")
+        if worker.alive:
+            worker.process.kill()
+            await worker.process.wait()
+        await worker.start(self.startup_timeout)
+
+    async def _serve(self, worker: AlignerWorker):
+        """Vòng lặp lấy request từ hàng đợi và chuyển cho worker"""
+        queue = self.queues[worker.language]
+        while True:
+            future, payload = await queue.get()
+            try:
+                if future.done():
+                    continue
+                async with worker.lock:
+                    if not worker.alive:
+                        await self._restart(worker)
+                    response = await worker.request(payload, self.request_timeout)
+                if response.get("exit_code") is not None:
+                    self.exit_codes[(payload["op"], int(response["exit_code"]))] += 1
+                if response["ok"]:
+                    worker.completed += 1
+                else:
+                    logger.error(f"MFA worker {worker.name} alignment failed: {response['error']}")
+                if not future.done():
+                    future.set_result(response["ok"])
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.set_result(False)
+                raise
+            except Exception as e:
+                logger.error(f"MFA worker {worker.name} error: {e}")
+                if not future.done():
+                    future.set_result(False)
+                try:
+                    async with worker.lock:
+                        await self._restart(worker)
+                except Exception as restart_error:
+                    logger.error(f"MFA worker {worker.name} failed to restart: {restart_error}")
+            finally:
+                queue.task_done()
+
+    async def _health_loop(self):
+        """Ping định kỳ các worker đang rảnh, khởi động lại worker không phản hồi"""
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for workers in list(self.workers.values()):
+                for worker in workers:
+                    if worker.lock.locked():
+                        continue
+                    async with worker.lock:
+                        try:
+                            if not worker.alive:
+                                raise RuntimeError("process is not running")
+                            await worker.request({"op": "ping"}, timeout=10.0)
+                        except Exception as e:
+                            logger.warning(f"MFA worker {worker.name} failed health check: {e}")
+                            try:
+                                await self._restart(worker)
+                            except Exception as restart_error:
+                                logger.error(f"MFA worker {worker.name} failed to restart: {restart_error}")
+
+    def alive_workers(self) -> int:
+        """Số worker đang chạy trên mọi ngôn ngữ"""
+        return sum(1 for workers in self.workers.values() for worker in workers if worker.alive)
+
+    def stats(self) -> Dict[str, Any]:
+        """Trạng thái của pool cho endpoint health"""
+        return {
+            "backend": self.backend,
+            "size": self.size,
+            "queue_size": self.queue_size,
+            "languages": {
+                language: {
+                    "queued": self.queues[language].qsize(),
+                    "workers": [
+                        {
+                            "name": w.name,
+                            "alive": w.alive,
+                            "busy": w.lock.locked(),
+                            "completed": w.completed,
+                            "restarts": w.restarts,
+                            "startup_time": w.startup_time,
+                        }
+                        for w in workers
+                    ],
+                }
+                for language, workers in self.workers.items()
+            },
+        }
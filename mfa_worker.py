@@ -0,0 +1,277 @@
+"""
+MFA Aligner Worker
+--------------------------------
+Tiến trình aligner chạy lâu dài cho một ngôn ngữ, được quản lý bởi MFAWorkerPool (mfa_pool.py).
+Worker import MFA và kiểm tra acoustic model, dictionary một lần khi khởi động, sau đó nhận request qua
+stdin/stdout. Mỗi request vẫn là một lệnh MFA (`align_one`/`align`) chạy trong tiến trình worker: MFA tự nạp lại
+acoustic model và dictionary cho từng lệnh, worker chỉ bỏ được thời gian khởi động Python và import MFA.
+Không import được MFA thì worker thoát ngay khi khởi động (gọi lệnh `mfa` từ worker không tiết kiệm được gì).
+
+Giao thức IPC (mỗi dòng là một đối tượng JSON):
+- Khi sẵn sàng, worker ghi: {"event": "ready", "backend": ..., "startup_time": ...}
+- Request:  {"id": 1, "op": "align", "audio_path": ..., "transcript_path": ..., "output_path": ..., "num_jobs": 4}
+            {"id": 2, "op": "align_corpus", "corpus_dir": ..., "output_dir": ..., "num_jobs": 4}
+            (tùy chọn "temporary_directory": thư mục tạm của MFA cho request, vd trong workspace trên tmpfs;
+             "output_format": "json" (mặc định) hoặc "long_textgrid")
+            {"id": 3, "op": "ping"}
+- Response: {"id": 1, "ok": true, "error": null, "elapsed": 1.23, "exit_code": 0}
+  (exit_code chỉ có khi lệnh MFA thực sự được chạy)
+
+Chạy thủ công:
+    python mfa_worker.py --language vi --acoustic-model vietnamese_mfa --dictionary vietnamese_mfa --backend stub
+"""
+
+import os
+import sys
+import json
+import time
+import wave
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+def build_align_one_args(audio_path: str, transcript_path: str, acoustic_model: str, dictionary: str,
+                         output_path: str, num_jobs: int, temporary_directory: Optional[str] = None,
+                         output_format: str = "json") -> List[str]:
+    """Tạo danh sách tham số cho lệnh `mfa align_one` (không gồm tên lệnh mfa)"""
+    return [
+        "align_one",
+        audio_path, transcript_path,
+        acoustic_model, dictionary,
+        output_path,
+        "--output_format", output_format,
+        "--single_speaker",
+        "--use_mp",
+        "--num_jobs", str(num_jobs),
+        "--clean",
+        "--final_clean",
+        "--overwrite",
+        "--textgrid_cleanup",
+        *temporary_directory_args(temporary_directory),
+    ]
+
+
+def build_align_corpus_args(corpus_dir: str, dictionary: str, acoustic_model: str, output_dir: str,
+                            num_jobs: int, temporary_directory: Optional[str] = None,
+                            output_format: str = "json") -> List[str]:
+    """Tạo danh sách tham số cho lệnh `mfa align` trên cả một corpus (không gồm tên lệnh mfa)"""
+    return [
+        "align",
+        corpus_dir, dictionary, acoustic_model, output_dir,
+        "--output_format", output_format,
+        "--use_mp",
+        "--num_jobs", str(num_jobs),
+        "--clean",
+        "--final_clean",
+        "--overwrite",
+        "--textgrid_cleanup",
+        *temporary_directory_args(temporary_directory),
+    ]
+
+
+def temporary_directory_args(temporary_directory: Optional[str]) -> List[str]:
+    """Thư mục làm việc riêng của MFA cho một lệnh (mặc định MFA dùng thư mục chung trong MFA_ROOT_DIR)"""
+    return ["--temporary_directory", str(temporary_directory)] if temporary_directory else []
+
+
+class MFACommandError(RuntimeError):
+    """Lệnh MFA kết thúc với mã lỗi khác 0"""
+
+    def __init__(self, message: str, returncode: int):
+        super().__init__(message)
+        self.returncode = returncode
+
+
+class MFAAligner:
+    """Backend gọi CLI của MFA ngay trong tiến trình worker, tránh khởi động lại Python và import MFA mỗi lần
+
+    Model không được giữ giữa các request: mỗi lệnh MFA nạp lại acoustic model và dictionary.
+    """
+
+    name = "mfa"
+
+    def __init__(self, acoustic_model: str, dictionary: str):
+        self.acoustic_model = acoustic_model
+        self.dictionary = dictionary
+        self._cli = None
+
+    def prepare(self):
+        """Import MFA và kiểm tra acoustic model, dictionary tồn tại (`mfa model inspect`) một lần khi khởi động"""
+        # ImportError: worker thoát trước khi báo sẵn sàng, pool không dùng worker này
+        from montreal_forced_aligner.command_line.mfa import mfa_cli
+        self._cli = mfa_cli
+
+        self._run(["model", "inspect", "acoustic", self.acoustic_model])
+        self._run(["model", "inspect", "dictionary", self.dictionary])
+
+    def align(self, audio_path: str, transcript_path: str, output_path: str, num_jobs: int,
+              temporary_directory: Optional[str] = None, output_format: str = "json"):
+        args = build_align_one_args(audio_path, transcript_path, self.acoustic_model, self.dictionary,
+                                    output_path, num_jobs, temporary_directory, output_format)
+        return self._run(args)
+
+    def align_corpus(self, corpus_dir: str, output_dir: str, num_jobs: int, temporary_directory: Optional[str] = None,
+                     output_format: str = "json"):
+        args = build_align_corpus_args(corpus_dir, self.dictionary, self.acoustic_model, output_dir, num_jobs,
+                                       temporary_directory, output_format)
+        return self._run(args)
+
+    def _run(self, args: List[str]) -> int:
+        """Chạy một lệnh MFA, trả về mã thoát (0); raise MFACommandError nếu thất bại"""
+        try:
+            self._cli.main(args=args, prog_name="mfa", standalone_mode=False)
+        except SystemExit as e:
+            if e.code not in (0, None):
+                code = e.code if isinstance(e.code, int) else 1
+                raise MFACommandError(f"mfa {args[0]} exited with code {e.code}", code)
+        return 0
+
+
+class StubAligner:
+    """Backend giả lập MFA, chia đều thời lượng audio cho các từ trong transcript (dùng để test)"""
+
+    name = "stub"
+
+    def __init__(self, language: str, latency: float = 0.0):
+        self.language = language
+        self.latency = latency
+
+    def prepare(self):
+        pass
+
+    def align(self, audio_path: str, transcript_path: str, output_path: str, num_jobs: int,
+              temporary_directory: Optional[str] = None, output_format: str = "json"):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        with wave.open(audio_path, "rb") as wav:
+            duration = wav.getnframes() / float(wav.getframerate())
+        with open(transcript_path, "r", encoding="utf-8") as f:
+            words = f.read().split()
+
+        alignment = build_stub_alignment(words, duration, self.language)
+        if output_format == "long_textgrid":
+            from mfa_output import write_textgrid
+            write_textgrid(alignment, Path(output_path))
+        else:
+            with open(output_path, "w", encoding="utf-8") as f:
+                json.dump(alignment, f)
+
+    def align_corpus(self, corpus_dir: str, output_dir: str, num_jobs: int, temporary_directory: Optional[str] = None,
+                     output_format: str = "json"):
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        suffix = ".TextGrid" if output_format == "long_textgrid" else ".json"
+        for audio_path in sorted(Path(corpus_dir).rglob("*.wav")):
+            transcript_path = audio_path.with_suffix(".lab")
+            if transcript_path.exists():
+                self.align(str(audio_path), str(transcript_path),
+                           str(Path(output_dir) / f"{audio_path.stem}{suffix}"), num_jobs,
+                           output_format=output_format)
+
+
+def build_stub_alignment(words: List[str], duration: float, language: str) -> Dict[str, Any]:
+    """Tạo alignment giả có cùng định dạng JSON với MFA"""
+    word_entries = []
+    phone_entries = []
+    if words:
+        word_duration = duration / len(words)
+        for i, word in enumerate(words):
+            start = round(i * word_duration, 3)
+            end = round((i + 1) * word_duration, 3)
+            word_entries.append([start, end, word])
+
+            letters = [c for c in word if c.isalpha()] or ["spn"]
+            phone_duration = (end - start) / len(letters)
+            for j, letter in enumerate(letters):
+                phone = letter.upper() if language == "en" else letter
+                phone_entries.append([round(start + j * phone_duration, 3),
+                                      round(start + (j + 1) * phone_duration, 3), phone])
+    else:
+        word_entries.append([0.0, duration, "<eps>"])
+        phone_entries.append([0.0, duration, "sil"])
+
+    return {
+        "start": 0,
+        "end": duration,
+        "tiers": {
+            "words": {"type": "IntervalTier", "entries": word_entries},
+            "phones": {"type": "IntervalTier", "entries": phone_entries}
+        }
+    }
+
+
+def handle_request(aligner, request: Dict[str, Any]) -> Dict[str, Any]:
+    """Xử lý một request IPC và trả về response tương ứng"""
+    start_time = time.time()
+    response = {"id": request.get("id"), "ok": True, "error": None}
+    try:
+        op = request.get("op")
+        if op == "align":
+            exit_code = aligner.align(request["audio_path"], request["transcript_path"], request["output_path"],
+                                      int(request.get("num_jobs") or 1), request.get("temporary_directory"),
+                                      request.get("output_format") or "json")
+            if exit_code is not None:
+                response["exit_code"] = exit_code
+            if not Path(request["output_path"]).exists():
+                raise RuntimeError("Aligner finished without writing an output file")
+        elif op == "align_corpus":
+            exit_code = aligner.align_corpus(request["corpus_dir"], request["output_dir"],
+                                             int(request.get("num_jobs") or 1), request.get("temporary_directory"),
+                                             request.get("output_format") or "json")
+            if exit_code is not None:
+                response["exit_code"] = exit_code
+        elif op != "ping":
+            raise ValueError(f"Unknown op: {op}")
+    except MFACommandError as e:
+        response["ok"] = False
+        response["error"] = str(e)
+        response["exit_code"] = e.returncode
+    except Exception as e:
+        response["ok"] = False
+        response["error"] = str(e)
+    response["elapsed"] = time.time() - start_time
+    return response
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Worker aligner MFA chạy lâu dài")
+    parser.add_argument("--language", required=True, help="Mã ngôn ngữ (vi, en)")
+    parser.add_argument("--acoustic-model", required=True, help="Tên acoustic model MFA")
+    parser.add_argument("--dictionary", required=True, help="Tên dictionary MFA")
+    parser.add_argument("--backend", default="mfa", choices=["mfa", "stub"], help="Backend aligner")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="Độ trễ giả lập của backend stub (giây)")
+    args = parser.parse_args(argv)
+
+    # Giữ stdout gốc cho kênh IPC, mọi output khác (kể cả của MFA) chuyển sang stderr
+    ipc_out = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8", buffering=1)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+
+    if args.backend == "stub":
+        aligner = StubAligner(args.language, latency=args.stub_latency)
+    else:
+        aligner = MFAAligner(args.acoustic_model, args.dictionary)
+
+    prepare_start = time.time()
+    try:
+        aligner.prepare()
+    except ImportError as e:
+        sys.exit(f"montreal_forced_aligner is not importable, the worker cannot start: {e}")
+    ipc_out.write(json.dumps({"event": "ready", "backend": aligner.name,
+                              "startup_time": time.time() - prepare_start}) + "\n")
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            ipc_out.write(json.dumps({"id": None, "ok": False, "error": f"Invalid JSON: {e}"}) + "\n")
+            continue
+        ipc_out.write(json.dumps(handle_request(aligner, request)) + "\n")
+
+
+if __name__ == "__main__":
+    main()
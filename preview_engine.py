@@ -0,0 +1,295 @@
+"""
+Preview Engine
+--------------------------------
+Engine ước lượng alignment không cần MFA, dùng cho xem trước với độ trễ thấp.
+
+- G2P dựa trên luật cho tiếng Việt (chữ quốc ngữ gần như ghi âm) và tiếng Anh
+  (dùng từ điển CMU nếu gói `cmudict` có sẵn, nếu không dùng luật chữ -> âm)
+- Đường bao năng lượng audio (NumPy) xác định các đoạn có tiếng nói và các khoảng dừng
+- Thời lượng phone tỉ lệ với trọng số (nguyên âm dài hơn phụ âm), trải lên thời gian có tiếng nói;
+  ranh giới từ gần khoảng dừng được kéo về khoảng dừng
+- Kết quả có cùng định dạng JSON với MFA (tier words/phones) kèm độ tin cậy ước lượng
+"""
+
+import re
+import math
+import logging
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from longform import frame_energies, silence_mask
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_FRAME_SECONDS = 0.01
+MIN_PAUSE_SECONDS = 0.15
+VOWEL_WEIGHT = 1.0
+CONSONANT_WEIGHT = 0.6
+# Tốc độ nói điển hình (phone/giây) dùng để ước lượng độ tin cậy
+TYPICAL_PHONE_RATE = 12.0
+MAX_CONFIDENCE = 0.9
+
+# Dấu thanh tiếng Việt (dạng tổ hợp Unicode): huyền, sắc, ngã, hỏi, nặng
+_VI_TONE_MARKS = {"̀", "́", "̃", "̉", "̣"}
+
+# Phụ âm đầu tiếng Việt -> phone (khớp chuỗi dài nhất trước)
+_VI_ONSETS = {
+    "ngh": "ŋ", "ng": "ŋ", "nh": "ɲ", "ch": "c", "tr": "ʈ", "th": "tʰ", "ph": "f", "kh": "x",
+    "gh": "ɣ", "gi": "z", "qu": "kw", "đ": "ɗ", "d": "z", "b": "ɓ", "c": "k", "k": "k", "q": "k",
+    "g": "ɣ", "h": "h", "l": "l", "m": "m", "n": "n", "p": "p", "r": "r", "s": "ʂ", "t": "t",
+    "v": "v", "x": "s",
+}
+# Nguyên âm (đã bỏ dấu thanh) -> phone
+_VI_VOWELS = {
+    "iê": "iə", "ia": "iə", "yê": "iə", "uô": "uə", "ua": "uə", "ươ": "ɨə", "ưa": "ɨə",
+    "a": "a", "ă": "ă", "â": "ə", "e": "ɛ", "ê": "e", "i": "i", "y": "i", "o": "ɔ", "ô": "o",
+    "ơ": "ə", "u": "u", "ư": "ɨ",
+}
+# Phụ âm cuối tiếng Việt -> phone
+_VI_CODAS = {
+    "ng": "ŋ", "nh": "ɲ", "ch": "k̚", "c": "k̚", "t": "t̚", "p": "p̚", "m": "m", "n": "n",
+}
+
+# Luật chữ -> âm tiếng Anh (ARPAbet), khớp chuỗi dài nhất trước
+_EN_GRAPHEMES = {
+    "tch": ["CH"], "igh": ["AY1"], "th": ["TH"], "sh": ["SH"], "ch": ["CH"], "ph": ["F"], "ng": ["NG"],
+    "ck": ["K"], "wh": ["W"], "qu": ["K", "W"], "ee": ["IY1"], "ea": ["IY1"], "oo": ["UW1"],
+    "ou": ["AW1"], "ow": ["OW1"], "ai": ["EY1"], "ay": ["EY1"], "oi": ["OY1"], "oy": ["OY1"],
+    "au": ["AO1"], "aw": ["AO1"], "er": ["ER0"], "ir": ["ER1"], "ur": ["ER1"],
+    "a": ["AE1"], "e": ["EH1"], "i": ["IH1"], "o": ["AA1"], "u": ["AH1"], "y": ["IY0"],
+    "b": ["B"], "c": ["K"], "d": ["D"], "f": ["F"], "g": ["G"], "h": ["HH"], "j": ["JH"], "k": ["K"],
+    "l": ["L"], "m": ["M"], "n": ["N"], "p": ["P"], "q": ["K"], "r": ["R"], "s": ["S"], "t": ["T"],
+    "v": ["V"], "w": ["W"], "x": ["K", "S"], "z": ["Z"],
+}
+
+_WORD_PATTERN = re.compile(r"[\w']+")
+
+_cmu_dict: Optional[Dict[str, List[List[str]]]] = None
+_cmu_loaded = False
+
+
+def _longest_match(text: str, position: int, table: Dict[str, Any], max_length: int = 3) -> Optional[str]:
+    for length in range(min(max_length, len(text) - position), 0, -1):
+        candidate = text[position:position + length]
+        if candidate in table:
+            return candidate
+    return None
+
+
+def strip_vietnamese_tones(word: str) -> str:
+    """Bỏ dấu thanh nhưng giữ dấu nguyên âm (ă, â, ê, ô, ơ, ư)"""
+    decomposed = unicodedata.normalize("NFD", word)
+    return unicodedata.normalize("NFC", "".join(c for c in decomposed if c not in _VI_TONE_MARKS))
+
+
+def vietnamese_g2p(word: str) -> List[str]:
+    """Chuyển một âm tiết tiếng Việt sang các phone theo luật (không có thanh điệu)"""
+    text = strip_vietnamese_tones(word.lower())
+    phones = []
+    position = 0
+
+    onset = _longest_match(text, position, _VI_ONSETS)
+    # "gi" trước nguyên âm khác là phụ âm đầu; "gi" đứng riêng (vd "gì") là g + i
+    if onset == "gi" and len(text) == 2:
+        onset = "g"
+    if onset:
+        phones.append(_VI_ONSETS[onset])
+        position += len(onset)
+
+    while position < len(text):
+        vowel = _longest_match(text, position, _VI_VOWELS, max_length=2)
+        if vowel:
+            phones.append(_VI_VOWELS[vowel])
+            position += len(vowel)
+            continue
+        coda = _longest_match(text, position, _VI_CODAS, max_length=2)
+        if coda:
+            phones.append(_VI_CODAS[coda])
+            position += len(coda)
+            continue
+        consonant = _longest_match(text, position, _VI_ONSETS)
+        if consonant:
+            phones.append(_VI_ONSETS[consonant])
+            position += len(consonant)
+            continue
+        position += 1
+    return phones
+
+
+def _load_cmudict() -> Optional[Dict[str, List[List[str]]]]:
+    """Nạp từ điển CMU một lần nếu gói cmudict có sẵn"""
+    global _cmu_dict, _cmu_loaded
+    if not _cmu_loaded:
+        _cmu_loaded = True
+        try:
+            import cmudict
+            _cmu_dict = cmudict.dict()
+            logger.info(f"Loaded CMU pronouncing dictionary ({len(_cmu_dict)} words)")
+        except Exception as e:
+            logger.warning(f"CMU pronouncing dictionary not available, using letter-to-sound rules: {e}")
+    return _cmu_dict
+
+
+def english_g2p(word: str) -> Tuple[List[str], bool]:
+    """Chuyển một từ tiếng Anh sang ARPAbet; trả về (phones, có trong từ điển hay không)"""
+    word = word.lower().strip("'")
+    cmu = _load_cmudict()
+    if cmu is not None and word in cmu:
+        return cmu[word][0], True
+
+    # Bỏ "e" câm ở cuối từ (khi phần còn lại vẫn có nguyên âm)
+    silent_e = (len(word) > 2 and word.endswith("e") and word[-2] not in "aeiou"
+                and any(c in "aeiouy" for c in word[:-2]))
+    text = word[:-1] if silent_e else word
+    phones = []
+    position = 0
+    while position < len(text):
+        grapheme = _longest_match(text, position, _EN_GRAPHEMES)
+        if grapheme is None:
+            position += 1
+            continue
+        if grapheme == "c" and word[position + 1:position + 2] in ("e", "i", "y"):
+            phones.append("S")
+        elif grapheme == "y" and position == 0:
+            phones.append("Y")
+        else:
+            phones.extend(_EN_GRAPHEMES[grapheme])
+        position += len(grapheme)
+    return phones, False
+
+
+def transcript_to_phones(transcript: str, language: str) -> Tuple[List[Tuple[str, List[str]]], float]:
+    """Chuyển transcript thành danh sách (từ, phones) và tỉ lệ từ có phát âm đáng tin cậy"""
+    words = []
+    reliable = 0
+    for word in _WORD_PATTERN.findall(transcript):
+        if language == "en":
+            phones, in_dictionary = english_g2p(word)
+            reliable += in_dictionary
+        else:
+            phones = vietnamese_g2p(word)
+            reliable += bool(phones)
+        if phones:
+            words.append((word.lower(), phones))
+    coverage = reliable / len(words) if words else 0.0
+    # Luật tiếng Anh kém chính xác hơn luật tiếng Việt
+    if language == "en":
+        coverage = 0.5 + 0.5 * coverage
+    return words, coverage
+
+
+def _phone_weight(phone: str) -> float:
+    base = phone.rstrip("012")
+    is_vowel = any(c in "aeiouăəɛɔɨɤAEIOU" for c in base)
+    if not is_vowel:
+        return CONSONANT_WEIGHT
+    # Nguyên âm đôi dài hơn
+    return VOWEL_WEIGHT * (1.3 if len(base) > 1 and base not in ("AA", "AE", "AH", "AO", "EH", "ER", "IH",
+                                                                   "IY", "UH", "UW") else 1.0)
+
+
+def _voiced_axis(audio_path: Path) -> Tuple[np.ndarray, np.ndarray, float, List[float]]:
+    """
+    Trục thời gian có tiếng nói: voiced_end[i] là tổng thời gian có tiếng tính tới hết khung i.
+    Khoảng lặng ngắn hơn MIN_PAUSE_SECONDS được coi là có tiếng. Trả về thêm vị trí các khoảng dừng
+    trên trục có tiếng (không tính khoảng lặng đầu và cuối).
+    """
+    energies_db, frame_seconds = frame_energies(audio_path, PREVIEW_FRAME_SECONDS)
+    silent = silence_mask(energies_db)
+
+    # Bỏ các khoảng lặng ngắn
+    padded = np.concatenate(([False], silent, [False])).astype(np.int8)
+    edges = np.diff(padded)
+    run_starts, run_ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    pause = np.zeros(len(silent), dtype=bool)
+    pauses = []
+    for start, end in zip(run_starts, run_ends):
+        if (end - start) * frame_seconds >= MIN_PAUSE_SECONDS:
+            pause[start:end] = True
+            if start > 0 and end < len(silent):
+                pauses.append(start)
+
+    voiced = (~pause).astype(np.float64) * frame_seconds
+    voiced_end = np.cumsum(voiced)
+    pause_positions = [float(voiced_end[start - 1]) for start in pauses]
+    return voiced_end, voiced, frame_seconds, pause_positions
+
+
+def _to_real_time(positions: np.ndarray, voiced_end: np.ndarray, voiced: np.ndarray, frame_seconds: float,
+                  side: str) -> np.ndarray:
+    """
+    Đổi vị trí trên trục có tiếng sang thời gian thực. side="left" cho thời điểm kết thúc
+    (dừng ở đầu khoảng dừng), side="right" cho thời điểm bắt đầu (bắt đầu sau khoảng dừng).
+    """
+    index = np.clip(np.searchsorted(voiced_end, positions, side=side), 0, len(voiced_end) - 1)
+    voiced_start = voiced_end[index] - voiced[index]
+    return index * frame_seconds + np.clip(positions - voiced_start, 0.0, frame_seconds)
+
+
+def estimate_alignment(audio_path: Path, transcript: str, language: str) -> Tuple[Dict[str, Any], float]:
+    """
+    Ước lượng alignment từ transcript và đường bao năng lượng audio.
+    Trả về (dữ liệu cùng định dạng JSON với MFA, độ tin cậy 0..1).
+    """
+    words, coverage = transcript_to_phones(transcript, language)
+    voiced_end, voiced, frame_seconds, pause_positions = _voiced_axis(audio_path)
+    duration = len(voiced_end) * frame_seconds
+    total_voiced = float(voiced_end[-1]) if len(voiced_end) else 0.0
+    if not words or total_voiced <= 0:
+        return {"start": 0, "end": duration, "tiers": {
+            "words": {"type": "IntervalTier", "entries": []},
+            "phones": {"type": "IntervalTier", "entries": []},
+        }}, 0.0
+
+    # Ranh giới từ trên trục có tiếng, tỉ lệ với tổng trọng số phone
+    word_weights = np.array([sum(_phone_weight(p) for p in phones) for _, phones in words])
+    boundaries = np.concatenate(([0.0], np.cumsum(word_weights))) / word_weights.sum() * total_voiced
+
+    # Kéo ranh giới từ gần nhất về mỗi khoảng dừng (giữ thứ tự tăng dần)
+    snapped = 0
+    for position in pause_positions:
+        nearest = int(np.argmin(np.abs(boundaries[1:-1] - position))) + 1 if len(words) > 1 else None
+        if nearest is None:
+            break
+        if boundaries[nearest - 1] < position < boundaries[nearest + 1]:
+            boundaries[nearest] = position
+            snapped += 1
+
+    # Ranh giới phone trong từng từ, tỉ lệ với trọng số phone
+    phone_labels = []
+    phone_starts = []
+    phone_ends = []
+    for (word, phones), word_start, word_end, weight in zip(words, boundaries[:-1], boundaries[1:], word_weights):
+        cumulative = np.cumsum([0.0] + [_phone_weight(p) for p in phones]) / weight
+        points = word_start + cumulative * (word_end - word_start)
+        phone_labels.extend(phones)
+        phone_starts.extend(points[:-1])
+        phone_ends.extend(points[1:])
+
+    starts = _to_real_time(np.array(phone_starts), voiced_end, voiced, frame_seconds, side="right")
+    ends = _to_real_time(np.array(phone_ends), voiced_end, voiced, frame_seconds, side="left")
+    word_starts = _to_real_time(boundaries[:-1], voiced_end, voiced, frame_seconds, side="right")
+    word_ends = _to_real_time(boundaries[1:], voiced_end, voiced, frame_seconds, side="left")
+
+    phone_entries = [[round(float(s), 3), round(float(e), 3), label]
+                     for s, e, label in zip(starts, ends, phone_labels) if e > s]
+    word_entries = [[round(float(s), 3), round(float(e), 3), word]
+                    for s, e, (word, _) in zip(word_starts, word_ends, words) if e > s]
+
+    # Độ tin cậy: độ phủ G2P, tốc độ nói hợp lý, các khoảng dừng rơi vào ranh giới từ
+    rate = len(phone_labels) / total_voiced
+    rate_score = math.exp(-abs(math.log(rate / TYPICAL_PHONE_RATE)))
+    pause_score = snapped / len(pause_positions) if pause_positions else 1.0
+    confidence = MAX_CONFIDENCE * (0.5 * coverage + 0.3 * rate_score + 0.2 * pause_score)
+
+    return {
+        "start": 0,
+        "end": duration,
+        "tiers": {
+            "words": {"type": "IntervalTier", "entries": word_entries},
+            "phones": {"type": "IntervalTier", "entries": phone_entries},
+        },
+    }, round(confidence, 2)
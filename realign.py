@@ -0,0 +1,123 @@
+"""
+Incremental Re-alignment
+--------------------------------
+Align lại một phần timeline khi transcript chỉ thay đổi vài từ (cùng audio).
+
+- So sánh tier từ của timeline cũ với transcript mới ở mức từ (difflib)
+- Mỗi vùng thay đổi được mở rộng thêm vài từ ngữ cảnh và một khoảng đệm thời gian, biên cửa sổ luôn nằm
+  trong khoảng lặng giữa hai từ nên không cắt ngang từ nào; các vùng gần nhau được gộp thành một cửa sổ
+- Chỉ các cửa sổ này được align lại (như các đoạn long-form); phone/từ mới được ghép vào timeline cũ,
+  phần ngoài cửa sổ giữ nguyên
+"""
+
+import logging
+import difflib
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Tuple
+
+from longform import AudioSegment, shift_segment_entries
+from timeline_index import normalize_token
+
+logger = logging.getLogger(__name__)
+
+
+class RealignWindow(AudioSegment):
+    """Một cửa sổ audio cần align lại: dải từ [old_word_start, old_word_end) của timeline cũ và các từ mới"""
+
+    def __init__(self, index: int, start: float, end: float, old_word_start: int, old_word_end: int,
+                 words: List[str]):
+        super().__init__(index, start, end, speech_seconds=0.0)
+        self.old_word_start = old_word_start
+        self.old_word_end = old_word_end
+        self.words = words
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "start": self.start,
+            "end": self.end,
+            "old_words": [self.old_word_start, self.old_word_end],
+            "transcript": " ".join(self.words),
+        }
+
+
+def plan_realign_windows(old_words: List[Dict[str, Any]], new_tokens: List[str], duration: float,
+                         context_words: int = 2, margin: float = 0.15) -> List[RealignWindow]:
+    """
+    Các cửa sổ cần align lại để tier từ cũ (danh sách {start, end, word}) khớp với transcript mới.
+    Trả về danh sách rỗng nếu transcript không đổi (so sánh sau khi bỏ dấu câu và chữ hoa).
+    """
+    old = [normalize_token(word["word"]) for word in old_words]
+    new = [normalize_token(token) for token in new_tokens]
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    changes = [(i1, i2, j1, j2) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"]
+
+    # Gộp các vùng thay đổi mà phần giống nhau ở giữa không đủ chỗ cho ngữ cảnh của cả hai bên
+    merged: List[Tuple[int, int, int, int]] = []
+    for change in changes:
+        if merged and change[0] - merged[-1][1] <= 2 * context_words:
+            merged[-1] = (merged[-1][0], change[1], merged[-1][2], change[3])
+        else:
+            merged.append(change)
+
+    windows = []
+    for k, (i1, i2, j1, j2) in enumerate(merged):
+        # Phần giữa hai vùng thay đổi là các từ giống nhau nên dải cũ và mới dịch cùng một lượng
+        before = min(context_words, i1 - (merged[k - 1][1] if k else 0))
+        after = min(context_words, (merged[k + 1][0] if k + 1 < len(merged) else len(old)) - i2)
+        a, b = i1 - before, i2 + after
+
+        # Biên cửa sổ nằm trong khoảng lặng giữa từ ngữ cảnh và từ bên ngoài cửa sổ
+        previous_end = old_words[a - 1]["end"] if a > 0 else 0.0
+        next_start = old_words[b]["start"] if b < len(old_words) else duration
+        core_start = old_words[a]["start"] if a < b else previous_end
+        core_end = old_words[b - 1]["end"] if a < b else next_start
+        start = max(previous_end, core_start - margin)
+        end = min(next_start, core_end + margin)
+        if a == 0:
+            start = 0.0
+        if b == len(old_words):
+            end = duration
+
+        windows.append(RealignWindow(len(windows), round(start, 4), round(end, 4), a, b,
+                                     new_tokens[j1 - before:j2 + after]))
+    return windows
+
+
+def _clip_entries(entries: List[List[Any]], starts: List[float], ends: List[float],
+                  t0: float, t1: float) -> List[List[Any]]:
+    """Các entry giao với [t0, t1), cắt về trong khoảng đó"""
+    clipped = []
+    for start, end, label in entries[bisect_right(ends, t0):bisect_left(starts, t1)]:
+        start, end = max(start, t0), min(end, t1)
+        if end - start > 1e-6:
+            clipped.append([round(start, 4), round(end, 4), label])
+    return clipped
+
+
+def splice_alignment(base: Dict[str, Any], windows: List[RealignWindow],
+                     alignments: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Thay phần trong các cửa sổ của alignment cũ bằng alignment mới của từng cửa sổ (thời gian tương đối
+    với đầu cửa sổ). Cửa sổ có alignment None (transcript rỗng, vd chỉ xóa từ) được để trống.
+    """
+    tiers = {}
+    for tier_name in ("words", "phones"):
+        entries = base.get("tiers", {}).get(tier_name, {}).get("entries", [])
+        starts = [entry[0] for entry in entries]
+        ends = list(accumulate((entry[1] for entry in entries), max))
+
+        spliced: List[List[Any]] = []
+        cursor = 0.0
+        for window, mfa_data in zip(windows, alignments):
+            spliced.extend(_clip_entries(entries, starts, ends, cursor, window.start))
+            if mfa_data is not None:
+                tier = mfa_data.get("tiers", {}).get(tier_name)
+                if tier:
+                    previous_end = spliced[-1][1] if spliced else 0.0
+                    spliced.extend(shift_segment_entries(tier["entries"], window, previous_end))
+            cursor = window.end
+        spliced.extend(_clip_entries(entries, starts, ends, cursor, float("inf")))
+        tiers[tier_name] = {"type": "IntervalTier", "entries": spliced}
+
+    return {**base, "tiers": tiers}
@@ -0,0 +1,176 @@
+"""
+Frame Resampling
+--------------------------------
+Chuyển timeline viseme (các đoạn có độ dài thay đổi) thành track cố định theo khung hình (24/30/60 fps).
+
+- Gộp các đoạn liền kề có cùng viseme
+- Bỏ các đoạn ngắn hơn một khung hình (blip), thời gian của chúng được nhập vào đoạn đứng trước
+- Khoảng trống giữa các phone được lấp bằng viseme nghỉ
+- Mỗi khung hình lấy viseme của đoạn chứa tâm khung hình, gán bằng np.repeat: O(n + số khung hình)
+- Trọng số crossfade tuyến tính giữa hai viseme kề nhau quanh mỗi ranh giới
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from timeline_format import ColumnarTimeline
+
+MAX_FPS = 240.0
+REST_VISEME = 0
+DEFAULT_MIN_FRAMES = 1.0
+# Khoảng trống nhỏ hơn ngưỡng này (giây) được coi là liền kề
+GAP_EPSILON = 1e-4
+
+Segments = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+class ResampleOptions:
+    """Tùy chọn chuyển timeline sang track theo khung hình"""
+
+    def __init__(self, fps: float, merge: bool = True, min_frames: float = DEFAULT_MIN_FRAMES,
+                 crossfade: float = 0.0, rest_viseme: int = REST_VISEME):
+        if not 0 < fps <= MAX_FPS:
+            raise ValueError(f"fps must be in (0, {MAX_FPS:g}]")
+        if min_frames < 0 or crossfade < 0:
+            raise ValueError("min_frames and crossfade must not be negative")
+        self.fps = fps
+        self.merge = merge
+        self.min_frames = min_frames
+        self.crossfade = crossfade
+        self.rest_viseme = rest_viseme
+
+
+def timeline_segments(viseme_timeline: Union[ColumnarTimeline, List[Dict[str, Any]]]) -> Segments:
+    """Lấy các mảng start, end (float64) và viseme (uint8) từ timeline dạng cột hoặc danh sách dict"""
+    if isinstance(viseme_timeline, ColumnarTimeline):
+        return (viseme_timeline.start.astype(np.float64), viseme_timeline.end.astype(np.float64),
+                viseme_timeline.viseme.astype(np.uint8))
+    count = len(viseme_timeline)
+    return (
+        np.fromiter((item["start"] for item in viseme_timeline), dtype=np.float64, count=count),
+        np.fromiter((item["end"] for item in viseme_timeline), dtype=np.float64, count=count),
+        np.fromiter((item["viseme"] for item in viseme_timeline), dtype=np.uint8, count=count),
+    )
+
+
+def fill_gaps(start: np.ndarray, end: np.ndarray, viseme: np.ndarray, rest_viseme: int = REST_VISEME) -> Segments:
+    """Chèn đoạn viseme nghỉ vào khoảng trống giữa các đoạn (kể cả khoảng trống từ 0 tới đoạn đầu)"""
+    prev_end = np.concatenate(([0.0], end[:-1]))
+    gaps = np.flatnonzero(start - prev_end > GAP_EPSILON)
+    if not len(gaps):
+        return start, end, viseme
+    return (
+        np.insert(start, gaps, prev_end[gaps]),
+        np.insert(end, gaps, start[gaps]),
+        np.insert(viseme, gaps, rest_viseme),
+    )
+
+
+def merge_runs(start: np.ndarray, end: np.ndarray, viseme: np.ndarray) -> Segments:
+    """Gộp các đoạn liền kề có cùng viseme"""
+    if len(start) < 2:
+        return start, end, viseme
+    boundary = np.empty(len(start), dtype=bool)
+    boundary[0] = True
+    boundary[1:] = (viseme[1:] != viseme[:-1]) | (start[1:] - end[:-1] > GAP_EPSILON)
+    heads = np.flatnonzero(boundary)
+    return start[heads], np.maximum.reduceat(end, heads), viseme[heads]
+
+
+def drop_blips(start: np.ndarray, end: np.ndarray, viseme: np.ndarray, min_duration: float) -> Segments:
+    """Bỏ các đoạn ngắn hơn min_duration, nhập thời gian của chúng vào đoạn giữ lại đứng trước"""
+    keep = (end - start) >= min_duration
+    if keep.all() or not keep.any():
+        return start, end, viseme
+    kept = np.flatnonzero(keep)
+    # Các đoạn bị bỏ ở đầu timeline được nhập vào đoạn giữ lại đầu tiên
+    heads = kept.copy()
+    heads[0] = 0
+    return start[heads], np.maximum.reduceat(end, heads), viseme[kept]
+
+
+def resample_segments(start: np.ndarray, end: np.ndarray, viseme: np.ndarray, options: ResampleOptions,
+                      duration: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Chuyển các đoạn viseme đã sắp xếp theo thời gian thành các mảng theo khung hình.
+    Khung hình f ứng với khoảng [f/fps, (f+1)/fps) và lấy viseme của đoạn chứa tâm khung hình.
+    """
+    fps = options.fps
+    duration = max(duration or 0.0, float(end[-1]) if len(end) else 0.0)
+    frame_count = int(math.ceil(duration * fps - 1e-9))
+
+    if len(start) and options.merge:
+        start, end, viseme = merge_runs(start, end, viseme)
+    if len(start) and options.min_frames > 0:
+        start, end, viseme = drop_blips(start, end, viseme, options.min_frames / fps)
+        if options.merge:
+            start, end, viseme = merge_runs(start, end, viseme)
+
+    # Lấp khoảng trống và phần đuôi bằng viseme nghỉ để các đoạn phủ kín [0, duration)
+    start, end, viseme = fill_gaps(start, end, viseme, options.rest_viseme)
+    if not len(end) or end[-1] < duration:
+        tail_start = float(end[-1]) if len(end) else 0.0
+        start = np.append(start, tail_start)
+        end = np.append(end, duration)
+        viseme = np.append(viseme, np.uint8(options.rest_viseme)).astype(np.uint8)
+
+    # Khung hình đầu tiên của mỗi đoạn: f nhỏ nhất có (f + 0.5) / fps >= start
+    first_frame = np.clip(np.ceil(start * fps - 0.5), 0, frame_count).astype(np.int64)
+    first_frame = np.maximum.accumulate(first_frame)
+    lengths = np.diff(np.append(first_frame, frame_count))
+    segment_index = np.repeat(np.arange(len(start)), lengths)
+
+    track: Dict[str, Any] = {
+        "fps": fps,
+        "frame_count": frame_count,
+        "duration": duration,
+        "visemes": viseme[segment_index].tolist(),
+    }
+
+    if options.crossfade > 0 and frame_count:
+        blend_viseme, blend_weight = crossfade_weights(start, end, viseme, segment_index, fps, options.crossfade)
+        track["crossfade"] = options.crossfade
+        track["blend_visemes"] = blend_viseme.tolist()
+        track["blend_weights"] = np.round(blend_weight.astype(np.float64), 3).tolist()
+
+    return track
+
+
+def crossfade_weights(start: np.ndarray, end: np.ndarray, viseme: np.ndarray, segment_index: np.ndarray,
+                      fps: float, window: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Trọng số pha trộn với viseme kề bên cho từng khung hình.
+    Trong cửa sổ `window` giây quanh ranh giới, trọng số tăng tuyến tính từ 0 tới 0.5 tại ranh giới;
+    viseme chính của khung hình luôn giữ trọng số 1 - blend_weight >= 0.5.
+    """
+    count = len(start)
+    times = (np.arange(len(segment_index)) + 0.5) / fps
+    half = window / 2.0
+
+    # Pha trộn với đoạn đứng sau khi gần cuối đoạn hiện tại
+    next_index = np.minimum(segment_index + 1, count - 1)
+    next_weight = np.clip(0.5 - (end[segment_index] - times) / window, 0.0, 0.5)
+    next_weight[(segment_index == count - 1) | (end[segment_index] - times >= half)] = 0.0
+
+    # Pha trộn với đoạn đứng trước khi gần đầu đoạn hiện tại
+    prev_index = np.maximum(segment_index - 1, 0)
+    prev_weight = np.clip(0.5 - (times - start[segment_index]) / window, 0.0, 0.5)
+    prev_weight[(segment_index == 0) | (times - start[segment_index] >= half)] = 0.0
+
+    use_next = next_weight >= prev_weight
+    blend_viseme = np.where(use_next, viseme[next_index], viseme[prev_index]).astype(np.uint8)
+    blend_weight = np.where(use_next, next_weight, prev_weight)
+    # Không pha trộn khi hai viseme kề nhau giống nhau; khung hình không pha trộn dùng lại viseme chính
+    primary = viseme[segment_index]
+    blend_weight[blend_viseme == primary] = 0.0
+    blend_viseme = np.where(blend_weight > 0, blend_viseme, primary)
+    return blend_viseme, blend_weight.astype(np.float32)
+
+
+def resample_timeline(viseme_timeline: Union[ColumnarTimeline, List[Dict[str, Any]]], options: ResampleOptions,
+                      duration: Optional[float] = None) -> Dict[str, Any]:
+    """Chuyển timeline viseme thành track theo khung hình"""
+    start, end, viseme = timeline_segments(viseme_timeline)
+    return resample_segments(start, end, viseme, options, duration=duration)
@@ -0,0 +1,247 @@
+"""
+Alignment Scheduler
+--------------------------------
+Kiểm soát số alignment MFA chạy đồng thời trên toàn process (admission control).
+
+- Giới hạn số alignment chạy cùng lúc (mặc định bằng số CPU)
+- Chia số CPU cho các alignment đang chạy để chọn `--num_jobs` cho mỗi lần chạy MFA
+- Hàng đợi chờ có giới hạn; khi đầy trả lỗi 429, chờ quá lâu trả lỗi 503 (kèm Retry-After)
+- Thống kê thời gian chờ trong hàng đợi
+- SharedSlots: giới hạn chung cho nhiều process (các worker uvicorn) bằng khóa tệp; process giữ slot ghi PID
+  của mình vào tệp khóa để đếm slot bận (thống kê) mà không phải thử khóa
+"""
+
+import os
+import math
+import time
+import fcntl
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from scratch import process_alive
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionError(Exception):
+    """Request alignment không được nhận vào hàng đợi"""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SchedulerFullError(AdmissionError):
+    """Hàng đợi chờ đã đầy"""
+
+    status_code = 429
+
+
+class SchedulerTimeoutError(AdmissionError):
+    """Chờ trong hàng đợi quá thời gian cho phép"""
+
+    status_code = 503
+
+
+class SharedSlots:
+    """
+    N slot dùng chung giữa các process trên cùng máy, mỗi slot là một tệp khóa (flock).
+    Khóa được hệ điều hành nhả khi process chết, nên worker bị crash không làm mất slot.
+    """
+
+    def __init__(self, lock_dir: Path, count: int, poll_interval: float = 0.05):
+        self.lock_dir = lock_dir
+        self.count = count
+        self.poll_interval = poll_interval
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        self._paths: List[Path] = [lock_dir / f"slot-{i}.lock" for i in range(count)]
+
+    def try_acquire(self) -> Optional[int]:
+        """Giữ một slot trống nếu có, trả về file descriptor của slot (None nếu tất cả đang bận)"""
+        # Bắt đầu từ vị trí theo pid để các process không cùng tranh slot 0
+        start = os.getpid() % self.count
+        for i in range(self.count):
+            fd = os.open(self._paths[(start + i) % self.count], os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, str(os.getpid()).encode(), 0)
+            return fd
+        return None
+
+    async def acquire(self, deadline: Optional[float] = None) -> int:
+        """Chờ tới khi có slot trống; raise asyncio.TimeoutError nếu quá deadline (time.time())"""
+        delay = self.poll_interval / 5
+        while True:
+            fd = self.try_acquire()
+            if fd is not None:
+                return fd
+            if deadline is not None and time.time() >= deadline:
+                raise asyncio.TimeoutError()
+            await asyncio.sleep(delay)
+            delay = min(self.poll_interval, delay * 2)
+
+    @staticmethod
+    def release(fd: int):
+        os.ftruncate(fd, 0)
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def in_use(self) -> int:
+        """
+        Số slot đang bị giữ bởi bất kỳ process nào (ước lượng, chỉ dùng cho thống kê): đọc PID chủ slot trong tệp
+        khóa, không thử khóa nên không làm try_acquire của worker khác thất bại. PID của process đã chết (crash
+        trước khi release) không được tính
+        """
+        busy = 0
+        for path in self._paths:
+            try:
+                owner = int(path.read_text() or 0)
+            except (OSError, ValueError):
+                continue
+            if owner and process_alive(owner):
+                busy += 1
+        return busy
+
+
+class AlignmentSlot:
+    """Một lượt chạy alignment đã được cấp phép"""
+
+    def __init__(self, num_jobs: int, queue_time: float):
+        self.num_jobs = num_jobs
+        self.queue_time = queue_time
+
+
+class AlignmentScheduler:
+    """Semaphore toàn cục cho alignment, kèm hàng đợi giới hạn và thống kê"""
+
+    def __init__(self, max_concurrent: Optional[int] = None, max_queue: int = 32, max_wait: float = 120.0,
+                 total_jobs: Optional[int] = None, shared_slots: Optional[SharedSlots] = None):
+        cpu_count = os.cpu_count() or 1
+        self.max_concurrent = max_concurrent or cpu_count
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.total_jobs = total_jobs or cpu_count
+        # Khi chạy nhiều worker: ngoài giới hạn trong process, mỗi alignment còn phải giữ một slot chung
+        self.shared_slots = shared_slots
+
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.counters = {"admitted": 0, "rejected": 0, "timed_out": 0, "completed": 0}
+        self._queue_times = deque(maxlen=1000)
+        self._run_times = deque(maxlen=100)
+        self._queue_time_total = 0.0
+        self._queue_time_max = 0.0
+
+    def _num_jobs(self) -> int:
+        """Chia đều số CPU cho các alignment đang chạy và đang chờ"""
+        return max(1, self.total_jobs // max(1, self.active + self.waiting))
+
+    def retry_after(self) -> int:
+        """Ước lượng số giây client nên chờ trước khi thử lại"""
+        avg_run = sum(self._run_times) / len(self._run_times) if self._run_times else 5.0
+        return max(1, math.ceil(avg_run * (self.waiting + 1) / self.max_concurrent))
+
+    @asynccontextmanager
+    async def slot(self, background: bool = False) -> AsyncIterator[AlignmentSlot]:
+        """
+        Chờ tới lượt chạy alignment. Job nền (background=True) đã bị giới hạn bởi JobManager
+        nên không bị từ chối khi hàng đợi đầy và không bị giới hạn thời gian chờ.
+        """
+        enqueued_at = time.time()
+        shared_fd = None
+        if self.shared_slots is not None and not self._semaphore.locked():
+            shared_fd = self.shared_slots.try_acquire()
+        if not self._semaphore.locked() and (self.shared_slots is None or shared_fd is not None):
+            # Còn slot trống: nhận ngay, không tính vào hàng đợi
+            await self._semaphore.acquire()
+        else:
+            if not background and self.waiting >= self.max_queue:
+                self.counters["rejected"] += 1
+                raise SchedulerFullError(
+                    f"Alignment queue is full ({self.waiting} waiting, {self.active} running)",
+                    self.retry_after()
+                )
+
+            self.waiting += 1
+            acquired_local = False
+            try:
+                if background:
+                    await self._semaphore.acquire()
+                else:
+                    await asyncio.wait_for(self._semaphore.acquire(), timeout=self.max_wait)
+                acquired_local = True
+                if self.shared_slots is not None:
+                    # Slot chung được giữ sau cùng để không chiếm slot của process khác khi còn chờ trong process
+                    deadline = None if background else enqueued_at + self.max_wait
+                    shared_fd = await self.shared_slots.acquire(deadline)
+            except asyncio.TimeoutError:
+                self.counters["timed_out"] += 1
+                raise SchedulerTimeoutError(
+                    f"Timed out after {self.max_wait:.0f}s waiting for an alignment slot",
+                    self.retry_after()
+                )
+            finally:
+                self.waiting -= 1
+                if acquired_local and self.shared_slots is not None and shared_fd is None:
+                    self._semaphore.release()
+
+        queue_time = time.time() - enqueued_at
+        self._queue_times.append(queue_time)
+        self._queue_time_total += queue_time
+        self._queue_time_max = max(self._queue_time_max, queue_time)
+        self.counters["admitted"] += 1
+
+        self.active += 1
+        slot = AlignmentSlot(self._num_jobs(), queue_time)
+        started_at = time.time()
+        try:
+            yield slot
+        finally:
+            self.active -= 1
+            self.counters["completed"] += 1
+            self._run_times.append(time.time() - started_at)
+            self._semaphore.release()
+            if shared_fd is not None:
+                SharedSlots.release(shared_fd)
+
+    async def drain(self, timeout: float) -> bool:
+        """Chờ các alignment đang chạy và đang chờ kết thúc (khi tắt server); False nếu hết thời gian"""
+        deadline = time.time() + timeout
+        while self.active or self.waiting:
+            if time.time() >= deadline:
+                logger.warning(f"Drain timed out with {self.active} alignments running, {self.waiting} waiting")
+                return False
+            await asyncio.sleep(0.1)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê hàng đợi và thời gian chờ"""
+        recent = sorted(self._queue_times)
+        admitted = self.counters["admitted"]
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "total_jobs": self.total_jobs,
+            **({"shared_slots": self.shared_slots.count, "shared_in_use": self.shared_slots.in_use()}
+               if self.shared_slots is not None else {}),
+            **self.counters,
+            "queue_time": {
+                "avg": self._queue_time_total / admitted if admitted else 0.0,
+                "max": self._queue_time_max,
+                "p50_recent": recent[len(recent) // 2] if recent else 0.0,
+                "p95_recent": recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0,
+            },
+        }
@@ -0,0 +1,254 @@
+"""
+Scratch Space
+--------------------------------
+Thư mục làm việc tạm cho từng request: audio upload, audio đã chuẩn hóa, transcript, JSON alignment và thư mục
+tạm của MFA (--temporary_directory) nằm chung một thư mục và bị xóa cùng lúc khi request kết thúc.
+
+- Ưu tiên thư mục trên RAM (tmpfs, vd /dev/shm) trong giới hạn quota (dung lượng dự kiến được giữ chỗ khi mở
+  workspace); hết quota hoặc tmpfs gần đầy thì dùng thư mục trên đĩa
+- Quota tính chung cho mọi worker dùng cùng thư mục RAM (launcher pre-fork): mỗi workspace ghi phần giữ chỗ vào
+  tệp RESERVATION_FILE, việc kiểm tra quota và tạo workspace chạy dưới flock của QUOTA_LOCK_FILE; phần giữ chỗ
+  của process đã chết không được tính
+- workspace(): context manager, thư mục luôn bị xóa kể cả khi request lỗi hoặc bị hủy
+- Tên thư mục có PID của process sở hữu; sweep() xóa workspace của process đã chết (worker bị kill giữa
+  chừng), workspace của chính process mà không còn được dùng (PID trùng sau khi khởi động lại trong container)
+  và mọi mục quá hạn trong các thư mục tạm khác (uploads, results, batches)
+"""
+
+import os
+import re
+import time
+import fcntl
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Giữ chỗ mặc định khi không biết trước kích thước audio
+DEFAULT_RESERVATION_BYTES = 16 * 1024 * 1024
+_OWNER_PATTERN = re.compile(r"^(\d+)-")
+# Trong thư mục RAM: tệp lock dùng chung giữa các worker và tệp ghi phần giữ chỗ trong mỗi workspace
+QUOTA_LOCK_FILE = ".quota.lock"
+RESERVATION_FILE = ".reservation"
+
+
+def estimate_workspace_bytes(upload_bytes: int) -> int:
+    """Dung lượng dự kiến của một workspace: tệp upload, audio đã chuẩn hóa, thư mục tạm của MFA"""
+    return max(upload_bytes, 0) * 3 + 8 * 1024 * 1024
+
+
+def process_alive(pid: int) -> bool:
+    """Process có PID này còn chạy trên máy (PID của process khác người dùng cũng tính là còn chạy)"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _remove(path: Path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+@dataclass
+class Workspace:
+    """Thư mục làm việc của một request"""
+    path: Path
+    on_ram: bool
+    reserved_bytes: int = 0
+
+    @property
+    def mfa_temp_dir(self) -> Path:
+        """Thư mục tạm cho MFA (--temporary_directory), bị xóa cùng workspace"""
+        return self.path / "mfa"
+
+
+class ScratchSpace:
+    """Cấp workspace trên RAM (trong quota) hoặc trên đĩa và dọn các workspace mồ côi"""
+
+    def __init__(self, disk_dir: Path, ram_dir: Optional[Path] = None, ram_quota_bytes: int = 512 * 1024 * 1024,
+                 ram_min_free_bytes: int = 64 * 1024 * 1024):
+        self.disk_dir = disk_dir
+        self.ram_dir = ram_dir
+        self.ram_quota_bytes = ram_quota_bytes
+        self.ram_min_free_bytes = ram_min_free_bytes
+        self._lock = threading.Lock()
+        self._reserved = 0
+        self._active: Dict[Path, Workspace] = {}
+        self._counts = {"ram": 0, "disk": 0, "fallbacks": 0, "swept": 0}
+
+    def prepare(self):
+        """Tạo thư mục scratch; thư mục RAM không dùng được (không tồn tại, không ghi được) thì chỉ dùng đĩa"""
+        self.disk_dir.mkdir(parents=True, exist_ok=True)
+        if self.ram_dir is None:
+            return
+        try:
+            self.ram_dir.mkdir(parents=True, exist_ok=True)
+            probe = self.ram_dir / f".probe-{os.getpid()}"
+            probe.write_bytes(b"")
+            probe.unlink()
+        except OSError as e:
+            logger.warning(f"RAM scratch directory {self.ram_dir} is not usable, using {self.disk_dir}: {e}")
+            self.ram_dir = None
+
+    @contextmanager
+    def _quota_lock(self) -> Iterator[None]:
+        """flock trên thư mục RAM, dùng chung với các worker khác"""
+        fd = os.open(self.ram_dir / QUOTA_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _shared_reserved(self) -> int:
+        """Tổng phần giữ chỗ của mọi workspace trên RAM thuộc process còn chạy (gọi khi giữ self._lock)"""
+        total = 0
+        for path in self.ram_dir.iterdir():
+            match = _OWNER_PATTERN.match(path.name)
+            if not match:
+                continue
+            owner = int(match.group(1))
+            if owner == os.getpid():
+                if path not in self._active:
+                    continue
+            elif not process_alive(owner):
+                continue
+            try:
+                total += int((path / RESERVATION_FILE).read_text())
+            except (OSError, ValueError):
+                continue
+        return total
+
+    def _open_on_ram(self, path: Path, expected_bytes: int) -> Optional[Workspace]:
+        """Giữ chỗ quota và tạo workspace trên RAM; None nếu hết quota, tmpfs gần đầy hoặc không tạo được"""
+        with self._lock:
+            try:
+                with self._quota_lock():
+                    if self._shared_reserved() + expected_bytes > self.ram_quota_bytes:
+                        return None
+                    if shutil.disk_usage(self.ram_dir).free - expected_bytes < self.ram_min_free_bytes:
+                        return None
+                    workspace = Workspace(path, True, expected_bytes)
+                    # Đăng ký trước khi tạo thư mục để sweep() chạy song song không coi là mồ côi
+                    self._active[path] = workspace
+                    try:
+                        path.mkdir(parents=True)
+                        (path / RESERVATION_FILE).write_text(str(expected_bytes))
+                    except OSError:
+                        self._active.pop(path, None)
+                        shutil.rmtree(path, ignore_errors=True)
+                        raise
+            except OSError as e:
+                logger.warning(f"Could not open RAM scratch workspace {path}: {e}")
+                return None
+            self._reserved += expected_bytes
+        return workspace
+
+    def open(self, name: str, expected_bytes: Optional[int] = None, prefer_ram: bool = True) -> Workspace:
+        """Tạo workspace mới (caller phải gọi release); name cần là duy nhất, vd request_id"""
+        expected_bytes = expected_bytes or DEFAULT_RESERVATION_BYTES
+        directory = f"{os.getpid()}-{name}"
+        if prefer_ram and self.ram_dir is not None:
+            workspace = self._open_on_ram(self.ram_dir / directory, expected_bytes)
+            if workspace is not None:
+                self._counts["ram"] += 1
+                return workspace
+            self._counts["fallbacks"] += 1
+        workspace = Workspace(self.disk_dir / directory, False)
+        with self._lock:
+            self._active[workspace.path] = workspace
+        try:
+            workspace.path.mkdir(parents=True)
+        except OSError:
+            with self._lock:
+                self._active.pop(workspace.path, None)
+            raise
+        self._counts["disk"] += 1
+        return workspace
+
+    def release(self, workspace: Workspace):
+        """Xóa thư mục workspace và trả lại phần quota đã giữ chỗ (gọi nhiều lần không lỗi)"""
+        with self._lock:
+            if self._active.pop(workspace.path, None) is None:
+                return
+            self._reserved -= workspace.reserved_bytes
+        shutil.rmtree(workspace.path, ignore_errors=True)
+
+    def release_path(self, path: Path):
+        """Như release, theo đường dẫn workspace (vd đường dẫn lưu trong payload của job)"""
+        workspace = self._active.get(path)
+        if workspace is not None:
+            self.release(workspace)
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+
+    @contextmanager
+    def workspace(self, name: str, expected_bytes: Optional[int] = None,
+                  prefer_ram: bool = True) -> Iterator[Workspace]:
+        workspace = self.open(name, expected_bytes, prefer_ram)
+        try:
+            yield workspace
+        finally:
+            self.release(workspace)
+
+    def _is_orphan(self, path: Path, cutoff: float) -> bool:
+        match = _OWNER_PATTERN.match(path.name)
+        if match:
+            owner = int(match.group(1))
+            if owner == os.getpid():
+                return path not in self._active
+            if not process_alive(owner):
+                return True
+        try:
+            return path.stat().st_mtime < cutoff
+        except FileNotFoundError:
+            return False
+
+    def sweep(self, max_age: float, extra_dirs: Iterable[Path] = ()) -> int:
+        """Xóa các workspace/tệp mồ côi trong thư mục scratch và extra_dirs; trả về số mục đã xóa"""
+        cutoff = time.time() - max_age
+        removed = 0
+        for directory in (self.ram_dir, self.disk_dir, *extra_dirs):
+            if directory is None or not directory.is_dir():
+                continue
+            for path in directory.iterdir():
+                if path.name == QUOTA_LOCK_FILE:
+                    continue
+                with self._lock:
+                    orphan = self._is_orphan(path, cutoff)
+                if orphan:
+                    _remove(path)
+                    removed += 1
+                    logger.info(f"Removed orphaned scratch entry {path}")
+        self._counts["swept"] += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            try:
+                shared = self._shared_reserved() if self.ram_dir is not None else 0
+            except OSError:
+                shared = 0
+            return {
+                "ram_dir": str(self.ram_dir) if self.ram_dir else None,
+                "disk_dir": str(self.disk_dir),
+                "ram_quota_bytes": self.ram_quota_bytes,
+                "ram_reserved_bytes": self._reserved,
+                "ram_reserved_bytes_all_workers": shared,
+                "active": len(self._active),
+                "active_on_ram": sum(1 for workspace in self._active.values() if workspace.on_ram),
+                "workspaces": {"ram": self._counts["ram"], "disk": self._counts["disk"]},
+                "ram_fallbacks": self._counts["fallbacks"],
+                "swept": self._counts["swept"],
+            }
@@ -0,0 +1,117 @@
+"""
+Startup
+--------------------------------
+Khởi động ứng dụng theo từng bước có đo thời gian (tài nguyên ngôn ngữ nằm trong language_packs.py).
+
+- parse_language_list: danh sách ngôn ngữ nạp trước khi khởi động (lazy hoặc eager theo cấu hình)
+- StartupTracker: thời gian từng bước khởi động, thời điểm bắt đầu nhận request và sẵn sàng (time-to-ready,
+  tính từ lúc process bắt đầu)
+- write_warmup_clip: clip WAV ngắn tạo sẵn trong code để chạy thử aligner/ingest trước request đầu tiên
+"""
+
+import os
+import time
+import wave
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def parse_language_list(value: str, available: Iterable[str]) -> List[str]:
+    """'all' -> mọi ngôn ngữ, '' -> không ngôn ngữ nào, 'vi,en' -> các ngôn ngữ được liệt kê (bỏ mã lạ)"""
+    available = list(available)
+    value = value.strip().lower()
+    if value == "all":
+        return available
+    requested = [item.strip() for item in value.split(",") if item.strip()]
+    unknown = [item for item in requested if item not in available]
+    if unknown:
+        logger.warning(f"Ignoring unknown languages in startup configuration: {', '.join(unknown)}")
+    return [item for item in requested if item in available]
+
+
+def process_start_time() -> float:
+    """Thời điểm (epoch) process hiện tại bắt đầu; dùng /proc trên Linux, nếu không có thì là thời điểm gọi"""
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            # Trường 22 (starttime, đơn vị clock tick kể từ lúc boot) nằm sau tên process trong ngoặc
+            fields = f.read().rsplit(b")", 1)[1].split()
+        start_ticks = int(fields[19])
+        with open("/proc/stat", "rb") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith(b"btime"))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return time.time()
+
+
+class StartupTracker:
+    """Ghi thời gian từng bước khởi động và thời điểm process bắt đầu nhận request / sẵn sàng"""
+
+    def __init__(self, process_started_at: Optional[float] = None):
+        self.process_started_at = process_started_at or process_start_time()
+        self.phases: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.serving_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Đo một bước khởi động; lỗi được ghi lại rồi raise tiếp"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.errors[name] = str(e)
+            raise
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def mark_serving(self):
+        self.serving_at = time.time()
+        logger.info(f"Serving requests {self.serving_at - self.process_started_at:.2f}s after process start")
+
+    def mark_ready(self):
+        if self.ready_at is None:
+            self.ready_at = time.time()
+            logger.info(f"Ready {self.ready_at - self.process_started_at:.2f}s after process start "
+                        f"(phases: {', '.join(f'{k}={v:.2f}s' for k, v in self.phases.items())})")
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    @property
+    def time_to_ready(self) -> Optional[float]:
+        return self.ready_at - self.process_started_at if self.ready_at else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        def iso(ts: Optional[float]) -> Optional[str]:
+            return datetime.fromtimestamp(ts).isoformat() if ts else None
+        return {
+            "process_started_at": iso(self.process_started_at),
+            "serving_at": iso(self.serving_at),
+            "ready_at": iso(self.ready_at),
+            "time_to_serve": self.serving_at - self.process_started_at if self.serving_at else None,
+            "time_to_ready": self.time_to_ready,
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            "errors": dict(self.errors),
+        }
+
+
+def write_warmup_clip(path: Path, sample_rate: int = 16000, duration: float = 0.8):
+    """Clip warm-up: khoảng lặng ngắn, một đoạn âm hữu thanh tổng hợp (nhiều họa âm), khoảng lặng"""
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    voiced = (t > 0.15) & (t < duration - 0.15)
+    signal = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 6)) * 0.2 * voiced
+    pcm = (np.clip(signal, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
@@ -2,6 +2,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // API URLs
     const API_URL = 'http://127.0.0.1:8000/api/generate-viseme';
     const API_EXAMPLES_URL = 'http://127.0.0.1:8000/api/examples';
+    const API_LANGUAGES_URL = 'http://127.0.0.1:8000/api/languages';
     
     // Các phần tử DOM
     const avatar = document.getElementById('avatar');
@@ -13,6 +14,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const progressBar = document.getElementById('progress-bar');
     const statusMessage = document.getElementById('status-message');
     const languageSelect = document.getElementById('language-select');
+    const engineSelect = document.getElementById('engine-select');
     const exampleButton = document.getElementById('example-button');
     const avatarContainer = document.querySelector('.avatar-container');
     
@@ -87,6 +89,28 @@ document.addEventListener('DOMContentLoaded', function() {
     let preloadedImages = {};
     let currentLanguage = 'vi';
     
+    // Lấy danh sách ngôn ngữ từ các gói ngôn ngữ của server (giữ các lựa chọn mặc định nếu lỗi)
+    fetch(API_LANGUAGES_URL)
+        .then(response => response.ok ? response.json() : Promise.reject(response.status))
+        .then(data => {
+            if (!data.languages || data.languages.length === 0) {
+                return;
+            }
+            languageSelect.innerHTML = '';
+            data.languages.forEach(language => {
+                const option = document.createElement('option');
+                option.value = language.code;
+                option.textContent = language.name || language.code;
+                languageSelect.appendChild(option);
+            });
+            if (data.languages.some(language => language.code === currentLanguage)) {
+                languageSelect.value = currentLanguage;
+            } else {
+                currentLanguage = languageSelect.value;
+            }
+        })
+        .catch(error => console.warn('Không lấy được danh sách ngôn ngữ:', error));
+    
     // Hàm kiểm tra xem có thể xử lý được không
     function checkProcessEnabled() {
         const hasAudio = audioFile !== null;
@@ -172,7 +196,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // Lắng nghe sự kiện nút ví dụ
     exampleButton.addEventListener('click', function() {
         // Hiển thị trạng thái đang tải
-        statusMessage.textContent = `Đang tải ví dụ cho ${currentLanguage === 'vi' ? 'tiếng Việt' : 'tiếng Anh'}`;
+        statusMessage.textContent = `Đang tải ví dụ cho ${languageSelect.options[languageSelect.selectedIndex].text.toLowerCase()}`;
         statusMessage.className = "status-message loading";
         
         // Dừng phát nếu đang phát
@@ -254,6 +278,7 @@ document.addEventListener('DOMContentLoaded', function() {
         formData.append('audio_file', audioFile);
         formData.append('transcript', transcriptText.value.trim());
         formData.append('language', currentLanguage);
+        formData.append('engine', engineSelect.value);
         
         // Gọi API
         fetch(API_URL, {
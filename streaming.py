@@ -0,0 +1,227 @@
+"""
+Streaming Viseme Sessions
+--------------------------------
+Tạo viseme theo thời gian thực cho audio đang được sinh ra (TTS trực tiếp) qua WebSocket.
+
+Client gửi audio PCM 16-bit mono theo từng chunk và transcript theo từng đoạn.
+Khi đủ một cửa sổ audio chưa được chốt, phần audio đó được align cùng các từ chưa được chốt:
+- Các từ kết thúc đủ xa cuối cửa sổ được chốt (final), phần còn lại là tạm thời (provisional)
+- Cửa sổ tiếp theo bắt đầu từ điểm đã chốt, nên các segment tạm thời được gửi lại (revision)
+  cho tới khi được chốt
+- Mỗi message "segments" thay thế mọi segment từ thời điểm `from` trở đi ở phía client
+"""
+
+import re
+import json
+import time
+import wave
+import logging
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_WIDTH = 2  # PCM 16-bit
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 96000
+
+# Các mục trong tier words của MFA không ứng với từ nào trong transcript
+NON_WORD_LABELS = {"", "<eps>", "sil", "sp", "spn"}
+
+_WORD_CHARS = re.compile(r"\w")
+
+# align(audio_path, transcript) -> dữ liệu JSON alignment của MFA cho cửa sổ
+WindowAligner = Callable[[Path, str], Awaitable[Dict[str, Any]]]
+# convert(mfa_data) -> timeline viseme (danh sách dict start/end/duration/phoneme/viseme)
+TimelineConverter = Callable[[Dict[str, Any]], List[Dict[str, Any]]]
+
+
+class StreamProtocolError(Exception):
+    """Message không hợp lệ từ client"""
+
+
+def parse_control_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Message điều khiển từ message ASGI của websocket: phải là frame text chứa một JSON object"""
+    text = message.get("text")
+    if text is None:
+        raise StreamProtocolError("Expected a text frame containing a JSON object")
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise StreamProtocolError(f"Invalid JSON message: {e}")
+    if not isinstance(data, dict):
+        raise StreamProtocolError("Control messages must be JSON objects")
+    return data
+
+
+def message_text(data: Dict[str, Any], key: str) -> str:
+    """Trường văn bản của message điều khiển (mặc định rỗng); raise StreamProtocolError nếu không phải chuỗi"""
+    value = data.get(key, "")
+    if not isinstance(value, str):
+        raise StreamProtocolError(f'"{key}" must be a string')
+    return value
+
+
+class StreamingSession:
+    """Trạng thái của một phiên streaming: audio và từ chưa chốt, điểm đã chốt, số revision"""
+
+    def __init__(
+        self,
+        session_id: str,
+        language: str,
+        sample_rate: int,
+        work_dir: Path,
+        align: WindowAligner,
+        convert: TimelineConverter,
+        window_seconds: float = 1.5,
+        final_margin: float = 0.4,
+        holdback_words: int = 1,
+        max_pending_seconds: float = 30.0,
+    ):
+        if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            raise StreamProtocolError(f"sample_rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE}")
+        self.session_id = session_id
+        self.language = language
+        self.sample_rate = sample_rate
+        self.work_dir = work_dir
+        self.window_seconds = window_seconds
+        self.final_margin = final_margin
+        self.holdback_words = holdback_words
+        self.max_pending_seconds = max_pending_seconds
+        self._align = align
+        self._convert = convert
+
+        # Chỉ giữ audio chưa chốt; final_samples là vị trí (tuyệt đối) của byte đầu tiên trong buffer
+        self._pending_audio = bytearray()
+        self.final_samples = 0
+        self.words: List[str] = []
+        self.final_words = 0
+        self.revision = 0
+        self.windows = 0
+        self.started_at = time.time()
+
+    @property
+    def final_time(self) -> float:
+        return self.final_samples / self.sample_rate
+
+    @property
+    def pending_seconds(self) -> float:
+        return len(self._pending_audio) // SAMPLE_WIDTH / self.sample_rate
+
+    @property
+    def pending_words(self) -> List[str]:
+        return self.words[self.final_words:]
+
+    def add_audio(self, chunk: bytes):
+        """Thêm một chunk PCM 16-bit mono"""
+        self._pending_audio.extend(chunk)
+
+    def add_text(self, text: str):
+        """Thêm một đoạn transcript; token chỉ có dấu câu bị bỏ vì MFA không align chúng"""
+        self.words.extend(token for token in text.split() if _WORD_CHARS.search(token))
+
+    def ready_for_window(self) -> bool:
+        """Đã đủ audio chưa chốt (và có từ để align) cho một cửa sổ mới"""
+        return self.pending_seconds >= self.window_seconds and self.final_words < len(self.words)
+
+    def must_finalize(self) -> bool:
+        """Audio chưa chốt quá dài: cửa sổ tiếp theo phải chốt toàn bộ"""
+        return self.pending_seconds >= self.max_pending_seconds
+
+    def _write_window_audio(self, path: Path, data: bytes):
+        with wave.open(str(path), "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(SAMPLE_WIDTH)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(data)
+
+    def _count_final_words(self, mfa_data: Dict[str, Any], window_duration: float, final: bool) -> int:
+        """Số từ đầu cửa sổ có thể chốt và thời điểm kết thúc (tương đối) của từ cuối cùng được chốt"""
+        entries = mfa_data.get("tiers", {}).get("words", {}).get("entries", [])
+        word_entries = [entry for entry in entries if entry[2] not in NON_WORD_LABELS]
+        if final:
+            return len(word_entries)
+
+        limit = window_duration - self.final_margin
+        count = 0
+        for entry in word_entries[:max(0, len(word_entries) - self.holdback_words)]:
+            if entry[1] > limit:
+                break
+            count += 1
+        return count
+
+    async def align_window(self, final: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Align audio và các từ chưa chốt, trả về message "segments" cho client (None nếu không có gì để gửi).
+        Với final=True toàn bộ phần chưa chốt được chốt (kết thúc phiên hoặc buffer quá dài).
+        """
+        sample_count = len(self._pending_audio) // SAMPLE_WIDTH
+        word_count = len(self.words)
+        words = self.words[self.final_words:word_count]
+        if sample_count == 0 or (not words and not final):
+            return None
+
+        offset = self.final_time
+        window_duration = sample_count / self.sample_rate
+        self.revision += 1
+
+        if words:
+            audio_path = self.work_dir / f"{self.session_id}_window{self.revision}.wav"
+            try:
+                self._write_window_audio(audio_path, bytes(self._pending_audio[:sample_count * SAMPLE_WIDTH]))
+                mfa_data = await self._align(audio_path, " ".join(words))
+            finally:
+                audio_path.unlink(missing_ok=True)
+            self.windows += 1
+
+            final_word_count = self._count_final_words(mfa_data, window_duration, final)
+            segments = [
+                {**item, "start": item["start"] + offset, "end": item["end"] + offset}
+                for item in self._convert(mfa_data)
+            ]
+        else:
+            # Không còn từ nào: phần audio còn lại là khoảng lặng
+            final_word_count = 0
+            segments = [{"start": offset, "end": offset + window_duration, "duration": window_duration,
+                         "phoneme": "sil", "viseme": 0}]
+
+        if final:
+            final_until = offset + window_duration
+            final_samples = sample_count
+            final_word_count = len(words)
+        elif final_word_count:
+            word_entries = [entry for entry in mfa_data["tiers"]["words"]["entries"]
+                            if entry[2] not in NON_WORD_LABELS]
+            final_until = offset + word_entries[final_word_count - 1][1]
+            final_samples = min(sample_count, round(word_entries[final_word_count - 1][1] * self.sample_rate))
+        else:
+            final_until = offset
+            final_samples = 0
+
+        for segment in segments:
+            segment["final"] = segment["end"] <= final_until + 1e-6
+
+        # Bỏ phần audio và từ đã chốt khỏi buffer; audio mới nhận trong lúc align vẫn được giữ
+        del self._pending_audio[:final_samples * SAMPLE_WIDTH]
+        self.final_samples += final_samples
+        self.final_words += final_word_count
+
+        return {
+            "type": "segments",
+            "revision": self.revision,
+            "from": offset,
+            "final_until": final_until,
+            "segments": segments,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "language": self.language,
+            "revisions": self.revision,
+            "windows": self.windows,
+            "final_time": self.final_time,
+            "final_words": self.final_words,
+            "words": len(self.words),
+            "elapsed": time.time() - self.started_at,
+        }
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+import mfa_output
+from mfa_output import (AlignmentParseError, parse_alignment_json, parse_alignment_json_stdlib, parse_textgrid,
+                        read_alignment, write_textgrid)
+
+ALIGNMENT = {
+    "start": 0.0,
+    "end": 1.5,
+    "tiers": {
+        "words": {"type": "IntervalTier", "entries": [[0.1, 0.6, "xin"], [0.6, 1.2, "chào \"bạn\""]]},
+        "phones": {"type": "IntervalTier", "entries": [[0.1, 0.3, "s"], [0.3, 0.6, "i"], [0.6, 1.2, "tɕ"]]},
+        "speaker": {"type": "IntervalTier", "entries": [[0.0, 1.5, "spk1"]]},
+    },
+}
+EXPECTED_TIERS = {name: ALIGNMENT["tiers"][name] for name in ("words", "phones")}
+
+
+def test_json_parsers_agree():
+    raw = json.dumps(ALIGNMENT, ensure_ascii=False).encode("utf-8")
+    parsers = [parse_alignment_json, parse_alignment_json_stdlib]
+    if mfa_output.orjson is not None:
+        parsers.append(mfa_output.parse_alignment_json_orjson)
+    for parse in parsers:
+        parsed = parse(raw)
+        assert parsed["tiers"] == EXPECTED_TIERS, parse.__name__
+        assert (parsed["start"], parsed["end"]) == (0.0, 1.5)
+
+
+def test_speaker_prefixed_tiers_are_merged_in_time_order():
+    raw = json.dumps({"start": 0, "end": 2, "tiers": {
+        "spk2 - phones": {"entries": [[1.0, 1.5, "b"]]},
+        "spk1 - phones": {"entries": [[0.0, 0.5, "a"]]},
+    }}).encode()
+    for parse in (parse_alignment_json, parse_alignment_json_stdlib):
+        assert parse(raw)["tiers"]["phones"]["entries"] == [[0.0, 0.5, "a"], [1.0, 1.5, "b"]]
+
+
+def test_missing_phones_tier_is_an_error():
+    raw = json.dumps({"tiers": {"words": {"entries": []}}}).encode()
+    for parse in (parse_alignment_json, parse_alignment_json_stdlib):
+        with pytest.raises(AlignmentParseError):
+            parse(raw)
+    with pytest.raises(AlignmentParseError):
+        parse_alignment_json_stdlib(b"{not json")
+
+
+def test_textgrid_round_trip_fills_gaps_with_silence(tmp_path):
+    path = tmp_path / "utt.TextGrid"
+    write_textgrid(ALIGNMENT, path)
+    parsed = parse_textgrid(path.read_bytes())
+    assert parsed["tiers"]["words"]["entries"] == [
+        [0.0, 0.1, "<eps>"], [0.1, 0.6, "xin"], [0.6, 1.2, "chào \"bạn\""], [1.2, 1.5, "<eps>"]]
+    assert parsed["tiers"]["phones"]["entries"][0] == [0.0, 0.1, "sil"]
+    assert "speaker" not in parsed["tiers"]
+
+
+@pytest.mark.parametrize("backend", ["auto", "json", "scan"])
+def test_read_alignment_by_extension(tmp_path, backend):
+    json_path = tmp_path / "utt.json"
+    json_path.write_text(json.dumps(ALIGNMENT, ensure_ascii=False), encoding="utf-8")
+    assert read_alignment(json_path, backend=backend)["tiers"] == EXPECTED_TIERS
+
+    empty = tmp_path / "empty.json"
+    empty.write_bytes(b"")
+    with pytest.raises(AlignmentParseError):
+        read_alignment(empty, backend=backend)
@@ -0,0 +1,101 @@
+"""Pool worker MFA chạy với backend stub: align, hàng đợi đầy, tự khởi động lại và health check"""
+
+import json
+import wave
+import asyncio
+
+import pytest
+
+from mfa_pool import MFAWorkerPool, PoolQueueFullError
+
+LANGUAGE_MODELS = {"vi": {"acoustic_model": "vietnamese_mfa", "dictionary": "vietnamese_mfa"}}
+
+
+def write_utterance(directory, name="utt", words="xin chào thế giới", seconds=1.0):
+    audio_path = directory / f"{name}.wav"
+    with wave.open(str(audio_path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(b"\x00\x00" * int(16000 * seconds))
+    transcript_path = directory / f"{name}.txt"
+    transcript_path.write_text(words, encoding="utf-8")
+    return audio_path, transcript_path
+
+
+def run_with_pool(test, **options):
+    async def main():
+        pool = MFAWorkerPool(LANGUAGE_MODELS, backend="stub", **{"size": 1, "startup_timeout": 30.0, **options})
+        await pool.start()
+        try:
+            await test(pool)
+        finally:
+            await pool.stop()
+    asyncio.run(main())
+
+
+async def wait_for(condition, timeout=10.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condition not reached in time"
+        await asyncio.sleep(0.05)
+
+
+def test_align_writes_alignment(tmp_path):
+    audio_path, transcript_path = write_utterance(tmp_path)
+    output_path = tmp_path / "utt.json"
+
+    async def test(pool):
+        assert pool.alive_workers() == 1
+        assert await pool.align("vi", audio_path, transcript_path, output_path)
+        words = [entry[2] for entry in json.loads(output_path.read_text())["tiers"]["words"]["entries"]]
+        assert [word for word in words if word] == ["xin", "chào", "thế", "giới"]
+        assert pool.workers["vi"][0].completed == 1
+        assert not await pool.align("en", audio_path, transcript_path, output_path)
+
+    run_with_pool(test)
+
+
+def test_queue_full_raises(tmp_path):
+    audio_path, transcript_path = write_utterance(tmp_path)
+
+    async def test(pool):
+        running = asyncio.create_task(pool.align("vi", audio_path, transcript_path, tmp_path / "a.json"))
+        await wait_for(lambda: pool.workers["vi"][0].lock.locked())
+        queued = asyncio.create_task(pool.align("vi", audio_path, transcript_path, tmp_path / "b.json"))
+        await wait_for(lambda: pool.queues["vi"].full())
+        with pytest.raises(PoolQueueFullError):
+            await pool.align("vi", audio_path, transcript_path, tmp_path / "c.json")
+        assert await running and await queued
+
+    run_with_pool(test, queue_size=1, stub_latency=0.5)
+
+
+def test_crashed_worker_is_restarted_on_next_request(tmp_path):
+    audio_path, transcript_path = write_utterance(tmp_path)
+
+    async def test(pool):
+        worker = pool.workers["vi"][0]
+        worker.process.kill()
+        await worker.process.wait()
+        assert pool.alive_workers() == 0
+        assert await pool.align("vi", audio_path, transcript_path, tmp_path / "utt.json")
+        assert worker.restarts == 1
+        assert pool.alive_workers() == 1
+
+    run_with_pool(test)
+
+
+def test_health_check_pings_and_restarts_dead_worker():
+    async def test(pool):
+        worker = pool.workers["vi"][0]
+        first_ok = worker.last_ok
+        await wait_for(lambda: worker.last_ok > first_ok)
+        assert worker.restarts == 0
+
+        worker.process.kill()
+        await worker.process.wait()
+        await wait_for(lambda: worker.restarts == 1 and worker.alive)
+
+    run_with_pool(test, health_interval=0.2)
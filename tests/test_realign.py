@@ -0,0 +1,55 @@
+from realign import plan_realign_windows, splice_alignment
+
+WORDS = "một hai ba bốn năm sáu bảy tám".split()
+# Mỗi từ dài 0.4s, cách nhau 0.1s
+OLD_WORDS = [{"start": round(0.5 * i, 4), "end": round(0.5 * i + 0.4, 4), "word": word} for i, word in enumerate(WORDS)]
+
+
+def word_entries(words):
+    return [[word["start"], word["end"], word["word"]] for word in words]
+
+
+def test_unchanged_transcript_needs_no_window():
+    assert plan_realign_windows(OLD_WORDS, "Một hai, ba BỐN. năm sáu bảy tám".split(), 4.0) == []
+
+
+def test_window_covers_change_with_context_inside_silences():
+    windows = plan_realign_windows(OLD_WORDS, "một hai ba tư năm sáu bảy tám".split(), 4.0, context_words=1)
+    assert [window.to_dict() for window in windows] == [
+        {"start": 0.9, "end": 2.5, "old_words": [2, 5], "transcript": "ba tư năm"},
+    ]
+
+
+def test_windows_reach_audio_edges_and_close_changes_merge():
+    windows = plan_realign_windows(OLD_WORDS, "không hai ba bốn năm sáu bảy chín".split(), 4.0, context_words=1)
+    assert [(window.start, window.end, window.words) for window in windows] == [
+        (0.0, 1.0, ["không", "hai"]), (2.9, 4.0, ["bảy", "chín"]),
+    ]
+    merged = plan_realign_windows(OLD_WORDS, "một hai tư bốn năm sáu bảy tám".split(), 4.0, context_words=1)
+    assert len(merged) == 1
+
+
+def test_splice_replaces_only_window_contents():
+    base = {"start": 0.0, "end": 4.0,
+            "tiers": {"words": {"entries": word_entries(OLD_WORDS)}, "phones": {"entries": word_entries(OLD_WORDS)}}}
+    windows = plan_realign_windows(OLD_WORDS, "một hai ba tư năm sáu bảy tám".split(), 4.0, context_words=1)
+    # Thời gian của alignment mới tương đối với đầu cửa sổ (0.9s)
+    window_alignment = {"tiers": {"words": {"entries": [[0.1, 0.5, "ba"], [0.6, 0.9, "tư"], [1.1, 1.5, "năm"]]}}}
+
+    spliced = splice_alignment(base, windows, [window_alignment])
+
+    assert spliced["tiers"]["words"]["entries"] == [
+        [0.0, 0.4, "một"], [0.5, 0.9, "hai"],
+        [1.0, 1.4, "ba"], [1.5, 1.8, "tư"], [2.0, 2.4, "năm"],
+        [2.5, 2.9, "sáu"], [3.0, 3.4, "bảy"], [3.5, 3.9, "tám"],
+    ]
+    # Tier không có trong alignment mới: phần trong cửa sổ để trống
+    assert [entry[2] for entry in spliced["tiers"]["phones"]["entries"]] == ["một", "hai", "sáu", "bảy", "tám"]
+
+
+def test_splice_leaves_window_empty_without_alignment():
+    base = {"tiers": {"words": {"entries": word_entries(OLD_WORDS)}}}
+    windows = plan_realign_windows(OLD_WORDS, "một hai ba năm sáu bảy tám".split(), 4.0, context_words=0)
+    spliced = splice_alignment(base, windows, [None])
+    assert [entry[2] for entry in spliced["tiers"]["words"]["entries"]] == [
+        "một", "hai", "ba", "năm", "sáu", "bảy", "tám"]
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from resample import ResampleOptions, drop_blips, fill_gaps, merge_runs, resample_timeline
+
+
+def segments(*items):
+    start, end, viseme = zip(*items)
+    return np.array(start, dtype=np.float64), np.array(end, dtype=np.float64), np.array(viseme, dtype=np.uint8)
+
+
+def as_lists(arrays):
+    return [array.tolist() for array in arrays]
+
+
+def test_fill_gaps_inserts_rest_segments():
+    assert as_lists(fill_gaps(*segments((0.2, 0.4, 3), (0.4, 0.6, 5), (0.8, 1.0, 5)))) == [
+        [0.0, 0.2, 0.4, 0.6, 0.8], [0.2, 0.4, 0.6, 0.8, 1.0], [0, 3, 5, 0, 5]]
+
+
+def test_merge_runs_joins_adjacent_equal_visemes_only():
+    assert as_lists(merge_runs(*segments((0.0, 0.2, 3), (0.2, 0.5, 3), (0.6, 0.8, 3), (0.8, 0.9, 4)))) == [
+        [0.0, 0.6, 0.8], [0.5, 0.8, 0.9], [3, 3, 4]]
+
+
+def test_drop_blips_gives_time_to_previous_segment():
+    start, end, viseme = drop_blips(*segments((0.0, 0.5, 3), (0.5, 0.51, 7), (0.51, 1.0, 4)), 0.04)
+    assert viseme.tolist() == [3, 4]
+    assert end[0] == pytest.approx(0.51)
+
+
+def test_resample_timeline_uses_frame_centres():
+    timeline = [{"start": 0.0, "end": 0.1, "viseme": 2}, {"start": 0.1, "end": 0.25, "viseme": 6}]
+    track = resample_timeline(timeline, ResampleOptions(fps=10, min_frames=0), duration=0.4)
+    assert track["frame_count"] == 4
+    # Tâm khung hình 0.05, 0.15, 0.25, 0.35: khung 2 rơi vào khoảng nghỉ sau 0.25
+    assert track["visemes"] == [2, 6, 0, 0]
+
+
+def test_resample_timeline_drops_blips_and_crossfades():
+    timeline = [{"start": 0.0, "end": 0.5, "viseme": 2}, {"start": 0.5, "end": 0.505, "viseme": 9},
+                {"start": 0.505, "end": 1.0, "viseme": 4}]
+    track = resample_timeline(timeline, ResampleOptions(fps=10, crossfade=0.2))
+    assert 9 not in track["visemes"]
+    assert track["visemes"] == [2] * 5 + [4] * 5
+    weights = track["blend_weights"]
+    assert max(weights) <= 0.5 and weights[0] == 0.0
+    assert track["blend_visemes"][4] == 4 and weights[4] > 0
+
+
+def test_options_reject_invalid_fps():
+    with pytest.raises(ValueError):
+        ResampleOptions(fps=0)
@@ -0,0 +1,22 @@
+import pytest
+
+from text_normalization import read_number_vi
+
+
+@pytest.mark.parametrize("number, expected", [
+    (0, "không"),
+    (5, "năm"),
+    (10, "mười"),
+    (15, "mười lăm"),
+    (21, "hai mươi mốt"),
+    (24, "hai mươi tư"),
+    (25, "hai mươi lăm"),
+    (105, "một trăm lẻ năm"),
+    (1005, "một nghìn không trăm lẻ năm"),
+    (1015, "một nghìn không trăm mười lăm"),
+    (2024, "hai nghìn không trăm hai mươi tư"),
+    (1000000, "một triệu"),
+    (123456789, "một trăm hai mươi ba triệu bốn trăm năm mươi sáu nghìn bảy trăm tám mươi chín"),
+])
+def test_read_number_vi(number, expected):
+    assert read_number_vi(number) == expected
@@ -0,0 +1,345 @@
+"""
+Transcript Normalization
+--------------------------------
+Chuẩn hóa và kiểm tra transcript trước khi align, theo quy tắc của gói ngôn ngữ (mục "normalization").
+
+- Unicode NFC (dấu thanh tiếng Việt dựng sẵn như trong từ điển MFA), chữ thường
+- Thay ký hiệu (%, &, ...) và từ viết tắt (tp., dr., ...) bằng từ đầy đủ
+- Đọc số: số nguyên, số có dấu phân cách hàng nghìn, số thập phân (và số thứ tự tiếng Anh);
+  tiếng Việt và tiếng Anh có sẵn, ngôn ngữ khác dùng num2words nếu đã cài
+- Bỏ dấu câu (giữ dấu nháy trong từ như "don't")
+- DictionaryIndex: tập từ của từ điển MFA nạp sẵn (bytes đã sắp xếp + mảng offset, tra bằng tìm kiếm nhị phân)
+  để báo/từ chối từ ngoài từ điển trong vài mili giây, trước khi chạy MFA
+
+Quy tắc trong gói ngôn ngữ:
+    "normalization": {
+        "unicode_form": "NFC",
+        "lowercase": true,
+        "numbers": "vi",
+        "symbols": {"%": "phần trăm"},
+        "abbreviations": {"tp.": "thành phố"}
+    }
+"""
+
+import os
+import re
+import logging
+import unicodedata
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from num2words import num2words
+except ImportError:
+    num2words = None
+
+# Số dài hơn mức này được đọc từng chữ số (số điện thoại, mã số, ...)
+MAX_NUMBER_DIGITS = 15
+
+_VI_DIGITS = ["không", "một", "hai", "ba", "bốn", "năm", "sáu", "bảy", "tám", "chín"]
+_VI_SCALES = ["", "nghìn", "triệu", "tỷ", "nghìn tỷ"]
+
+_EN_ONES = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "eleven",
+            "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen"]
+_EN_TENS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+_EN_SCALES = ["", "thousand", "million", "billion", "trillion"]
+_EN_ORDINALS = {"one": "first", "two": "second", "three": "third", "five": "fifth", "eight": "eighth",
+                "nine": "ninth", "twelve": "twelfth"}
+
+
+def _vi_triple(n: int, full: bool) -> List[str]:
+    """Đọc một nhóm 3 chữ số; full=True khi không phải nhóm đầu (đọc cả "không trăm", "lẻ")"""
+    hundreds, tens, units = n // 100, n // 10 % 10, n % 10
+    words = []
+    if hundreds or full:
+        words += [_VI_DIGITS[hundreds], "trăm"]
+    if tens == 0:
+        if units and words:
+            words.append("lẻ")
+    elif tens == 1:
+        words.append("mười")
+    else:
+        words += [_VI_DIGITS[tens], "mươi"]
+    if units:
+        if units == 5 and tens:
+            words.append("lăm")
+        elif units == 1 and tens >= 2:
+            words.append("mốt")
+        elif units == 4 and tens >= 2:
+            words.append("tư")
+        else:
+            words.append(_VI_DIGITS[units])
+    return words
+
+
+def read_number_vi(n: int) -> str:
+    if n == 0:
+        return _VI_DIGITS[0]
+    groups = []
+    while n:
+        groups.append(n % 1000)
+        n //= 1000
+    words = []
+    for scale in range(len(groups) - 1, -1, -1):
+        if groups[scale] == 0:
+            continue
+        words += _vi_triple(groups[scale], full=bool(words))
+        words.append(_VI_SCALES[scale])
+    return " ".join(word for word in words if word)
+
+
+def _en_triple(n: int) -> List[str]:
+    words = []
+    if n >= 100:
+        words += [_EN_ONES[n // 100], "hundred"]
+        n %= 100
+    if n >= 20:
+        words.append(_EN_TENS[n // 10])
+        n %= 10
+        if n:
+            words.append(_EN_ONES[n])
+    elif n or not words:
+        words.append(_EN_ONES[n])
+    return words
+
+
+def read_number_en(n: int) -> str:
+    if n == 0:
+        return _EN_ONES[0]
+    groups = []
+    while n:
+        groups.append(n % 1000)
+        n //= 1000
+    words = []
+    for scale in range(len(groups) - 1, -1, -1):
+        if groups[scale]:
+            words += _en_triple(groups[scale])
+            if _EN_SCALES[scale]:
+                words.append(_EN_SCALES[scale])
+    return " ".join(words)
+
+
+def ordinal_en(cardinal: str) -> str:
+    """Số thứ tự tiếng Anh từ cách đọc số đếm ("twenty one" -> "twenty first")"""
+    *head, last = cardinal.split()
+    if last in _EN_ORDINALS:
+        last = _EN_ORDINALS[last]
+    elif last.endswith("y"):
+        last = last[:-1] + "ieth"
+    else:
+        last += "th"
+    return " ".join(head + [last])
+
+
+@dataclass(frozen=True)
+class NumberReader:
+    """Cách đọc số của một ngôn ngữ: hàm đọc số nguyên, ký hiệu phân cách và (tùy chọn) số thứ tự"""
+    read: Callable[[int], str]
+    decimal_separator: str
+    thousands_separator: str
+    decimal_word: str
+    ordinal: Optional[Callable[[str], str]] = None
+    ordinal_suffixes: Tuple[str, ...] = ()
+
+    def read_digits(self, digits: str) -> str:
+        return " ".join(self.read(int(d)) for d in digits)
+
+    def read_integer(self, digits: str) -> str:
+        if len(digits) > MAX_NUMBER_DIGITS:
+            return self.read_digits(digits)
+        return self.read(int(digits))
+
+    def read_number(self, text: str) -> str:
+        """Đọc một chuỗi số như "1.234,5" (vi) hoặc "1,234.5" (en); chuỗi không theo định dạng được đọc từng phần"""
+        integer, fraction = text, ""
+        head, separator, tail = text.rpartition(self.decimal_separator)
+        if separator and head and tail:
+            integer, fraction = head, tail
+        groups = integer.split(self.thousands_separator)
+        if not all(group.isdigit() for group in groups) or not fraction.isdigit() and fraction or (
+                len(groups) > 1 and not (len(groups[0]) <= 3 and all(len(group) == 3 for group in groups[1:]))):
+            # vd ngày "12.05.2024" hoặc "1,2,3"
+            return " ".join(self.read_integer(part) for part in re.split(r"[.,]", text) if part)
+        words = self.read_integer("".join(groups))
+        if fraction:
+            words += f" {self.decimal_word} {self.read_digits(fraction)}"
+        return words
+
+
+NUMBER_READERS: Dict[str, NumberReader] = {
+    "vi": NumberReader(read_number_vi, decimal_separator=",", thousands_separator=".", decimal_word="phẩy"),
+    "en": NumberReader(read_number_en, decimal_separator=".", thousands_separator=",", decimal_word="point",
+                       ordinal=ordinal_en, ordinal_suffixes=("st", "nd", "rd", "th")),
+}
+
+
+def get_number_reader(language: Optional[str]) -> Optional[NumberReader]:
+    """Cách đọc số có sẵn (vi, en), hoặc num2words (nếu đã cài) cho ngôn ngữ khác"""
+    if not language:
+        return None
+    if language in NUMBER_READERS:
+        return NUMBER_READERS[language]
+    if num2words is None:
+        logger.warning(f"No number reader for {language}; install num2words to expand numbers")
+        return None
+    try:
+        point = num2words(0.5, lang=language).split()[1:-1]
+    except NotImplementedError:
+        logger.warning(f"num2words does not support {language}; numbers are left as digits")
+        return None
+    return NumberReader(lambda n: num2words(n, lang=language).replace("-", " ").replace(",", ""),
+                        decimal_separator=".", thousands_separator=",", decimal_word=" ".join(point))
+
+
+class DictionaryIndex:
+    """
+    Tập từ của một từ điển phát âm, ít tốn bộ nhớ: các từ (UTF-8) đã sắp xếp nối thành một khối bytes
+    và một mảng offset uint32 (~ độ dài từ + 4 byte mỗi từ, so với ~60-80 byte mỗi phần tử của set[str]).
+    """
+
+    def __init__(self, words: Iterable[str], name: str = ""):
+        encoded = sorted({word.encode("utf-8") for word in words if word})
+        self.name = name
+        self._blob = b"".join(encoded)
+        self._offsets = array("I", [0])
+        position = 0
+        for word in encoded:
+            position += len(word)
+            self._offsets.append(position)
+
+    @classmethod
+    def from_file(cls, path: Path, unicode_form: Optional[str] = "NFC", lowercase: bool = True) -> "DictionaryIndex":
+        """Đọc từ điển MFA (.dict/.txt): mỗi dòng là từ, rồi (xác suất và) phone, cách nhau bởi khoảng trắng"""
+        def words():
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    word = line.split(maxsplit=1)[0] if line.strip() else ""
+                    if unicode_form:
+                        word = unicodedata.normalize(unicode_form, word)
+                    yield word.lower() if lowercase else word
+        return cls(words(), name=Path(path).stem)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __contains__(self, word: str) -> bool:
+        key = word.encode("utf-8")
+        blob, offsets = self._blob, self._offsets
+        low, high = 0, len(offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            candidate = blob[offsets[middle]:offsets[middle + 1]]
+            if candidate < key:
+                low = middle + 1
+            elif candidate > key:
+                high = middle
+            else:
+                return True
+        return False
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._blob) + self._offsets.itemsize * len(self._offsets)
+
+
+def find_mfa_dictionary(name: str, mfa_root: Optional[Path] = None) -> Optional[Path]:
+    """Tệp từ điển pretrained của MFA (MFA_ROOT_DIR, mặc định ~/Documents/MFA) theo tên model"""
+    root = Path(mfa_root or os.getenv("MFA_ROOT_DIR") or Path.home() / "Documents" / "MFA")
+    directory = root / "pretrained_models" / "dictionary"
+    for candidate in (directory / f"{name}.dict", directory / f"{name}.txt", directory / name / f"{name}.dict"):
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+@dataclass
+class NormalizedTranscript:
+    """Kết quả chuẩn hóa: văn bản gửi cho MFA, các từ, và từ không có trong từ điển (None: không kiểm tra)"""
+    text: str
+    words: List[str]
+    oov_words: Optional[List[str]] = None
+    dictionary: Optional[str] = None
+    replacements: Dict[str, str] = field(default_factory=dict)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "normalized": self.text,
+            "words": len(self.words),
+            "dictionary": self.dictionary,
+            "oov_words": self.oov_words,
+            "replacements": self.replacements,
+        }
+
+
+_TOKEN_EDGE_PUNCTUATION = "\"'“”‘’()[]{}<>«»,;:!?…"
+_NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+# Ký tự nối hai token (vd "1990–2000", "12/05") được tách thành khoảng trắng trước khi đọc số
+_TOKEN_SEPARATORS = re.compile(r"[—–/]")
+
+
+class TextNormalizer:
+    """Chuẩn hóa transcript theo quy tắc của một gói ngôn ngữ và kiểm tra từ với từ điển (nếu có)"""
+
+    def __init__(self, rules: Mapping[str, Any], dictionary: Optional[DictionaryIndex] = None):
+        self.unicode_form = rules.get("unicode_form", "NFC")
+        self.lowercase = rules.get("lowercase", True)
+        self.numbers = get_number_reader(rules.get("numbers"))
+        self.symbols = {self._prepare(key): f" {value} " for key, value in rules.get("symbols", {}).items()}
+        self.abbreviations = {self._prepare(key): value for key, value in rules.get("abbreviations", {}).items()}
+        self.dictionary = dictionary
+
+    def _prepare(self, text: str) -> str:
+        if self.unicode_form:
+            text = unicodedata.normalize(self.unicode_form, text)
+        return text.lower() if self.lowercase else text
+
+    def _expand_token(self, token: str, replacements: Dict[str, str]) -> str:
+        key = token.strip(_TOKEN_EDGE_PUNCTUATION)
+        if key in self.abbreviations:
+            replacements[key] = self.abbreviations[key]
+            return f" {self.abbreviations[key]} "
+        reader = self.numbers
+        if reader is None or not any(c.isdigit() for c in key):
+            return token
+        digits, suffix = re.fullmatch(r"(\d*)(.*)", key).groups()
+        if digits and suffix in reader.ordinal_suffixes:
+            expanded = reader.ordinal(reader.read_integer(digits))
+        else:
+            expanded = _NUMBER_PATTERN.sub(lambda match: f" {reader.read_number(match.group(0))} ", key)
+        expanded = " ".join(expanded.split())
+        replacements[key] = expanded
+        return f" {expanded} "
+
+    def normalize(self, transcript: str, check: bool = True) -> NormalizedTranscript:
+        text = self._prepare(transcript)
+        for symbol, replacement in self.symbols.items():
+            text = text.replace(symbol, replacement)
+
+        replacements: Dict[str, str] = {}
+        text = " ".join(self._expand_token(token, replacements) for token in _TOKEN_SEPARATORS.sub(" ", text).split())
+
+        # Bỏ dấu câu: giữ chữ, số, dấu nháy giữa hai chữ cái; dấu nối và ký tự khác thành khoảng trắng
+        cleaned = "".join(c if c.isalnum() or c == "'" or unicodedata.category(c).startswith("M") else " "
+                          for c in text)
+        words = [word.strip("'") for word in cleaned.split()]
+        words = [word for word in words if word]
+
+        oov_words = None
+        if check and self.dictionary is not None:
+            seen = set()
+            oov_words = []
+            for word in words:
+                if word not in seen and word not in self.dictionary:
+                    oov_words.append(word)
+                seen.add(word)
+        return NormalizedTranscript(
+            text=" ".join(words),
+            words=words,
+            oov_words=oov_words,
+            dictionary=self.dictionary.name if self.dictionary is not None else None,
+            replacements=replacements,
+        )
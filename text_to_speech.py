@@ -1,8 +1,30 @@
-from gtts import gTTS
+"""
+Text To Speech
+--------------------------------
+Chuyển văn bản thành giọng nói để tạo dữ liệu thử cho API alignment.
+
+- Chế độ một văn bản: --text/--file, ghi data/<output>.mp3|wav và .txt
+- Chế độ batch: --manifest (CSV hoặc JSONL) tổng hợp nhiều dòng song song với số luồng giới hạn,
+  chuyển định dạng trong process pool và ghi corpus dạng <out-dir>/<lang>/<id>.wav + <id>.lab,
+  nén được thành archive cho /api/generate-viseme/batch (--archive, chỉ với định dạng wav)
+- Kết quả tổng hợp được lưu theo hash (backend, văn bản, ngôn ngữ, định dạng); dòng đã có thì không tổng hợp lại
+- Backend TTS thay thế được (--backend): gtts (mặc định, cần mạng) hoặc stub (offline, cho kiểm thử)
+"""
+
+import io
 import os
+import csv
+import json
+import time
+import wave
+import shutil
+import hashlib
+import zipfile
 import argparse
-import subprocess
-from pydub import AudioSegment
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 def text_to_speech(text, output_file, lang='vi', output_format='mp3', english_voice=False):
     """
@@ -28,6 +50,7 @@ def text_to_speech(text, output_file, lang='vi', output_format='mp3', english_vo
         lang = 'en'
     
     # Tạo giọng nói từ văn bản
+    from gtts import gTTS
     tts = gTTS(text=text, lang=lang)
     
     # Lưu ra tệp mp3
@@ -43,6 +66,7 @@ def text_to_speech(text, output_file, lang='vi', output_format='mp3', english_vo
         
         # Sử dụng pydub để chuyển đổi
         try:
+            from pydub import AudioSegment
             sound = AudioSegment.from_mp3(mp3_file)
             sound.export(wav_file, format="wav")
             
@@ -59,6 +83,259 @@ def text_to_speech(text, output_file, lang='vi', output_format='mp3', english_vo
         print(f"Tệp mp3 đã được tạo: {mp3_file}")
         print(f"Nội dung văn bản được lưu tại: {txt_file}")
 
+# ---------------------------------------------------------------------------
+# Backend TTS
+# ---------------------------------------------------------------------------
+
+class GTTSBackend:
+    """Google TTS qua gTTS (cần mạng), trả về MP3"""
+    name = 'gtts'
+    extension = 'mp3'
+
+    def synthesize(self, text, lang):
+        from gtts import gTTS
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class StubBackend:
+    """
+    Backend offline cho kiểm thử: mỗi từ là một đoạn tone dài theo số ký tự, ngăn cách bởi khoảng lặng.
+    Kết quả xác định (cùng văn bản cho cùng audio), không cần mạng hay gTTS.
+    """
+    name = 'stub'
+    extension = 'wav'
+    sample_rate = 24000
+    seconds_per_char = 0.06
+    word_gap = 0.12
+    edge_silence = 0.2
+
+    def synthesize(self, text, lang):
+        import numpy as np
+
+        rate = self.sample_rate
+        parts = [np.zeros(int(self.edge_silence * rate), dtype=np.float32)]
+        for word in text.split():
+            duration = max(0.1, len(word) * self.seconds_per_char)
+            # Tần số cố định theo từ để audio giống nhau giữa các lần chạy
+            freq = 150 + int(hashlib.md5(f"{lang}:{word}".encode('utf-8')).hexdigest()[:4], 16) % 250
+            t = np.arange(int(duration * rate), dtype=np.float32) / rate
+            envelope = np.minimum(1.0, np.minimum(t, duration - t) / 0.02)
+            parts.append((0.4 * envelope * np.sin(2 * np.pi * freq * t)).astype(np.float32))
+            parts.append(np.zeros(int(self.word_gap * rate), dtype=np.float32))
+        parts.append(np.zeros(int(self.edge_silence * rate), dtype=np.float32))
+
+        pcm = (np.concatenate(parts) * 32767.0).astype('<i2')
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(rate)
+            wav_file.writeframes(pcm.tobytes())
+        return buffer.getvalue()
+
+
+TTS_BACKENDS = {
+    'gtts': GTTSBackend,
+    'stub': StubBackend,
+}
+
+
+def get_tts_backend(spec):
+    """
+    Tạo backend TTS theo tên trong TTS_BACKENDS hoặc đường dẫn 'module:Class'.
+    Backend cần thuộc tính name, extension ('mp3'/'wav') và hàm synthesize(text, lang) -> bytes.
+    """
+    if spec in TTS_BACKENDS:
+        return TTS_BACKENDS[spec]()
+    if ':' not in spec:
+        raise ValueError(f"Unknown TTS backend '{spec}', expected one of {', '.join(TTS_BACKENDS)} or module:Class")
+    module_name, class_name = spec.split(':', 1)
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+# ---------------------------------------------------------------------------
+# Batch
+# ---------------------------------------------------------------------------
+
+def _safe_item_id(value):
+    """Id dùng làm tên tệp: chỉ giữ chữ, số, '-', '_' và '.'"""
+    safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in str(value).strip())
+    return safe.lstrip('.')
+
+
+def read_manifest(path, default_lang='vi'):
+    """
+    Đọc manifest CSV (có dòng tiêu đề) hoặc JSONL thành danh sách {id, text, lang}.
+    Cột/trường: text (bắt buộc), id và lang (tùy chọn; id mặc định theo số dòng, lang mặc định default_lang).
+    """
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        if path.lower().endswith(('.jsonl', '.ndjson', '.json')):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    items = []
+    seen = set()
+    for number, row in enumerate(rows, start=1):
+        text = (row.get('text') or '').strip()
+        if not text:
+            print(f"Bỏ qua dòng {number}: không có văn bản")
+            continue
+        item_id = _safe_item_id(row.get('id') or f"line_{number:05d}")
+        if not item_id or item_id in seen:
+            raise ValueError(f"Invalid or duplicate id at line {number}: {row.get('id')!r}")
+        seen.add(item_id)
+        items.append({'id': item_id, 'text': text, 'lang': (row.get('lang') or default_lang).strip()})
+    return items
+
+
+def synthesis_key(backend_name, text, lang, output_format):
+    """Hash nội dung của một lần tổng hợp, dùng làm tên tệp trong cache"""
+    payload = json.dumps([backend_name, text, lang, output_format], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def convert_to_wav(source, dest, sample_rate):
+    """
+    Chuyển audio thành WAV mono 16-bit ở sample_rate (chạy trong process pool).
+    Dùng audio_ingest (NumPy, soundfile/audioread) như API; nếu không giải mã được thì dùng pydub.
+    """
+    from audio_ingest import AudioDecodeError, IngestOptions, ingest_file
+
+    try:
+        info = ingest_file(source, dest, IngestOptions(sample_rate=sample_rate, trim_silence=False))
+        if info['output_path'] == str(source):
+            shutil.copyfile(source, dest)
+        return info['duration']
+    except AudioDecodeError:
+        from pydub import AudioSegment
+        sound = AudioSegment.from_file(source).set_channels(1).set_frame_rate(sample_rate).set_sample_width(2)
+        sound.export(dest, format='wav')
+        return len(sound) / 1000.0
+
+
+def _link_or_copy(source, dest):
+    """Đưa tệp từ cache vào corpus: hard link nếu được, nếu không thì copy"""
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copyfile(source, dest)
+
+
+class BatchSynthesizer:
+    """Tổng hợp các dòng của manifest song song, dùng lại kết quả đã có trong cache"""
+
+    def __init__(self, backend, out_dir, cache_dir, output_format='wav', sample_rate=16000,
+                 concurrency=4, convert_workers=None, retries=2):
+        self.backend = backend
+        self.out_dir = out_dir
+        self.cache_dir = cache_dir
+        self.output_format = output_format
+        self.sample_rate = sample_rate
+        self.concurrency = max(1, concurrency)
+        self.convert_workers = convert_workers or min(self.concurrency, os.cpu_count() or 1)
+        self.retries = retries
+        self.convert_pool = None
+
+    def _synthesize_with_retry(self, text, lang):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.backend.synthesize(text, lang)
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+
+    def _produce(self, item, key):
+        """Tổng hợp và chuyển định dạng một dòng vào cache, trả về (đường dẫn, thời lượng, có sẵn trong cache)"""
+        cached = os.path.join(self.cache_dir, f"{key}.{self.output_format}")
+        if os.path.exists(cached):
+            return cached, None, True
+
+        audio = self._synthesize_with_retry(item['text'], item['lang'])
+        # Hai dòng cùng nội dung có thể được xử lý cùng lúc: tệp tạm riêng cho từng luồng
+        token = f"{os.getpid()}_{threading.get_ident()}"
+        raw = os.path.join(self.cache_dir, f"{key}.{token}.raw.{self.backend.extension}")
+        partial = os.path.join(self.cache_dir, f"{key}.{token}.partial.{self.output_format}")
+        with open(raw, 'wb') as f:
+            f.write(audio)
+        try:
+            duration = None
+            if self.output_format == 'wav':
+                duration = self.convert_pool.submit(convert_to_wav, raw, partial, self.sample_rate).result()
+            elif self.backend.extension == self.output_format:
+                os.replace(raw, partial)
+            else:
+                from pydub import AudioSegment
+                AudioSegment.from_file(raw).export(partial, format=self.output_format)
+            # Ghi nguyên tử: tiến trình khác không bao giờ thấy tệp cache dở dang
+            os.replace(partial, cached)
+        finally:
+            for path in (raw, partial):
+                if os.path.exists(path):
+                    os.remove(path)
+        return cached, duration, False
+
+    def _process(self, item):
+        key = synthesis_key(self.backend.name, item['text'], item['lang'], self.output_format)
+        result = {'id': item['id'], 'lang': item['lang'], 'hash': key}
+        started = time.perf_counter()
+        try:
+            cached, duration, hit = self._produce(item, key)
+            lang_dir = os.path.join(self.out_dir, item['lang'])
+            os.makedirs(lang_dir, exist_ok=True)
+            audio_path = os.path.join(lang_dir, f"{item['id']}.{self.output_format}")
+            _link_or_copy(cached, audio_path)
+            with open(os.path.join(lang_dir, f"{item['id']}.lab"), 'w', encoding='utf-8') as f:
+                f.write(item['text'])
+            result.update({
+                'audio': os.path.relpath(audio_path, self.out_dir),
+                'cached': hit,
+                'duration': duration,
+            })
+        except Exception as e:
+            result['error'] = f"{type(e).__name__}: {e}"
+        result['time'] = round(time.perf_counter() - started, 3)
+        return result
+
+    def run(self, items):
+        """Tổng hợp toàn bộ items, ghi tts_manifest.json vào out_dir và trả về kết quả từng dòng"""
+        os.makedirs(self.out_dir, exist_ok=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # "spawn" giống ingest của API: an toàn khi các luồng tổng hợp đang chạy
+        self.convert_pool = ProcessPoolExecutor(max_workers=self.convert_workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        results = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='tts') as pool:
+                for result in pool.map(self._process, items):
+                    results.append(result)
+                    status = result.get('error') or ('cached' if result['cached'] else 'synthesized')
+                    print(f"[{len(results)}/{len(items)}] {result['lang']}/{result['id']}: {status}")
+        finally:
+            self.convert_pool.shutdown()
+            self.convert_pool = None
+
+        with open(os.path.join(self.out_dir, 'tts_manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump({'backend': self.backend.name, 'format': self.output_format, 'items': results},
+                      f, ensure_ascii=False, indent=2)
+        return results
+
+
+def write_corpus_archive(out_dir, archive_path):
+    """Nén corpus (<lang>/<id>.wav + .lab) thành zip gửi được cho /api/generate-viseme/batch"""
+    with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for root, _, files in os.walk(out_dir):
+            for name in sorted(files):
+                if name.endswith(('.wav', '.lab')):
+                    path = os.path.join(root, name)
+                    zf.write(path, os.path.relpath(path, out_dir))
+
+
 def get_supported_languages():
     """Trả về danh sách các ngôn ngữ được hỗ trợ bởi gTTS"""
     supported_languages = {
@@ -155,12 +432,24 @@ if __name__ == "__main__":
     parser.add_argument('--lang', type=str, default='vi', 
                         choices=list(supported_languages.keys()),
                         help=f'Mã ngôn ngữ (mặc định: vi cho tiếng Việt). Sử dụng --list-languages để xem tất cả ngôn ngữ được hỗ trợ.')
-    parser.add_argument('--format', type=str, default='mp3', choices=['mp3', 'wav'], 
-                        help='Định dạng đầu ra (mp3 hoặc wav, mặc định: mp3)')
+    parser.add_argument('--format', type=str, default=None, choices=['mp3', 'wav'], 
+                        help='Định dạng đầu ra (mp3 hoặc wav, mặc định: mp3; chế độ batch: wav)')
     parser.add_argument('--english-voice', action='store_true', 
                         help='Sử dụng giọng tiếng Anh (bất kể ngôn ngữ văn bản)')
     parser.add_argument('--list-languages', action='store_true', 
                         help='Liệt kê tất cả các ngôn ngữ được hỗ trợ')
+    # Chế độ batch
+    parser.add_argument('--manifest', type=str, help='Manifest CSV/JSONL (id, text, lang) để tổng hợp hàng loạt')
+    parser.add_argument('--out-dir', type=str, default=os.path.join('data', 'tts_corpus'),
+                        help='Thư mục corpus đầu ra (<lang>/<id>.wav + .lab)')
+    parser.add_argument('--cache-dir', type=str, default=os.path.join('data', 'tts_cache'),
+                        help='Thư mục lưu kết quả tổng hợp theo hash để dùng lại')
+    parser.add_argument('--backend', type=str, default='gtts',
+                        help=f"Backend TTS: {', '.join(TTS_BACKENDS)} hoặc module:Class (mặc định: gtts)")
+    parser.add_argument('--concurrency', type=int, default=4, help='Số dòng tổng hợp đồng thời')
+    parser.add_argument('--convert-workers', type=int, default=None, help='Số process chuyển định dạng')
+    parser.add_argument('--sample-rate', type=int, default=16000, help='Tần số lấy mẫu của WAV đầu ra')
+    parser.add_argument('--archive', type=str, help='Nén corpus thành tệp zip cho /api/generate-viseme/batch (chỉ với --format wav)')
     
     args = parser.parse_args()
     
@@ -171,6 +460,30 @@ if __name__ == "__main__":
             print(f"  {code}: {name}")
         exit(0)
     
+    if args.manifest:
+        # Archive của endpoint batch chỉ nhận audio .wav
+        if args.archive and (args.format or 'wav') != 'wav':
+            parser.error('--archive chỉ dùng được với --format wav')
+        try:
+            items = read_manifest(args.manifest, args.lang)
+            backend = get_tts_backend(args.backend)
+        except Exception as e:
+            print(f"Lỗi khi đọc manifest hoặc tạo backend: {e}")
+            exit(1)
+        print(f"Đang tổng hợp {len(items)} dòng bằng backend {backend.name} (đồng thời: {args.concurrency})...")
+        started = time.perf_counter()
+        synthesizer = BatchSynthesizer(backend, args.out_dir, args.cache_dir, args.format or 'wav',
+                                       args.sample_rate, args.concurrency, args.convert_workers)
+        results = synthesizer.run(items)
+        failed = [result for result in results if 'error' in result]
+        cached = sum(1 for result in results if result.get('cached'))
+        print(f"Hoàn tất sau {time.perf_counter() - started:.1f}s: {len(results) - len(failed)} thành công "
+              f"({cached} dùng lại từ cache), {len(failed)} lỗi. Corpus: {args.out_dir}")
+        if args.archive:
+            write_corpus_archive(args.out_dir, args.archive)
+            print(f"Archive corpus: {args.archive}")
+        exit(1 if failed else 0)
+    
     # Lấy văn bản từ tham số hoặc tệp
     if args.text:
         input_text = args.text
@@ -196,4 +509,4 @@ if __name__ == "__main__":
         print(f"Đang sử dụng ngôn ngữ: {lang_name} ({args.lang})")
     
     # Chuyển văn bản thành giọng nói
-    text_to_speech(input_text, args.output, args.lang, args.format, args.english_voice)
\ No newline at end of file
+    text_to_speech(input_text, args.output, args.lang, args.format or 'mp3', args.english_voice)
\ No newline at end of file
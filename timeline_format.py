@@ -0,0 +1,211 @@
+"""
+Timeline Formats
+--------------------------------
+Biểu diễn timeline viseme dạng cột (columnar) và các định dạng response gọn hơn JSON mặc định.
+
+ColumnarTimeline gồm các mảng song song:
+- start, end: float32 (giây)
+- viseme: uint8
+- phoneme_id: uint16, chỉ số vào bảng chuỗi `phonemes`
+
+Định dạng response:
+- json:    JSON mặc định, mỗi phone một dict (giữ nguyên như trước)
+- compact: JSON dạng mảng song song
+- msgpack: MessagePack của dạng compact (cần cài gói `msgpack`)
+- binary:  blob little-endian, bố cục:
+    header  "<4sHHIIII": magic b"VSM1", version, reserved, count, phoneme_count, table_bytes, meta_bytes
+    start   float32[count]
+    end     float32[count]
+    phoneme uint16[count]
+    viseme  uint8[count], sau đó đệm 0 tới bội số của 4 byte
+    table   phoneme_count chuỗi UTF-8, mỗi chuỗi có tiền tố độ dài uint16
+    meta    JSON UTF-8 (request_id, language, transcript, metadata)
+"""
+
+import json
+import struct
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # msgpack là phụ thuộc tùy chọn
+    msgpack = None
+
+BINARY_MAGIC = b"VSM1"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sHHIIII")
+
+TIMELINE_FORMATS = ("json", "compact", "msgpack", "binary")
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "compact": "application/json",
+    "msgpack": "application/x-msgpack",
+    "binary": "application/octet-stream",
+}
+
+ACCEPT_FORMATS = {
+    "application/x-msgpack": "msgpack",
+    "application/msgpack": "msgpack",
+    "application/vnd.msgpack": "msgpack",
+    "application/octet-stream": "binary",
+}
+
+# Số chữ số thập phân khi xuất thời gian float32 ra JSON (MFA cho độ chính xác tới mili giây)
+TIME_DECIMALS = 4
+
+
+class TimelineFormatError(Exception):
+    """Định dạng timeline không hợp lệ hoặc không khả dụng"""
+
+
+class ColumnarTimeline:
+    """Timeline viseme dạng các mảng song song"""
+
+    def __init__(self, start: np.ndarray, end: np.ndarray, viseme: np.ndarray, phoneme_id: np.ndarray,
+                 phonemes: List[str], total_duration: Optional[float] = None):
+        self.start = start
+        self.end = end
+        self.viseme = viseme
+        self.phoneme_id = phoneme_id
+        self.phonemes = phonemes
+        self.total_duration = (float(np.sum(end.astype(np.float64) - start.astype(np.float64)))
+                               if total_duration is None else total_duration)
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    @classmethod
+    def from_entries(cls, phone_entries: Sequence[Sequence[Any]], visemes: np.ndarray) -> "ColumnarTimeline":
+        """Dựng timeline từ các entry [start, end, phone] của MFA và mảng viseme tương ứng"""
+        count = len(phone_entries)
+        times = np.fromiter((t for entry in phone_entries for t in (entry[0], entry[1])),
+                            dtype=np.float64, count=2 * count).reshape(count, 2)
+
+        table: Dict[str, int] = {}
+        phoneme_id = np.fromiter((table.setdefault(entry[2], len(table)) for entry in phone_entries),
+                                 dtype=np.uint32, count=count)
+        if len(table) <= np.iinfo(np.uint16).max:
+            phoneme_id = phoneme_id.astype(np.uint16)
+        else:
+            raise TimelineFormatError(f"Too many distinct phonemes for uint16 ids: {len(table)}")
+
+        return cls(
+            start=times[:, 0].astype(np.float32),
+            end=times[:, 1].astype(np.float32),
+            viseme=np.asarray(visemes, dtype=np.uint8),
+            phoneme_id=phoneme_id,
+            phonemes=list(table),
+            total_duration=float(np.sum(times[:, 1] - times[:, 0])),
+        )
+
+    def statistics(self) -> Dict[str, Any]:
+        """Thống kê giống compute_viseme_statistics nhưng tính bằng NumPy"""
+        counts = np.bincount(self.viseme, minlength=1)
+        return {
+            "total_duration": self.total_duration,
+            "viseme_statistics": {
+                "counts": {str(v): int(c) for v, c in enumerate(counts) if c},
+                "total_visemes": len(self),
+            },
+        }
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Chuyển về danh sách dict như response JSON mặc định"""
+        start = np.round(self.start.astype(np.float64), TIME_DECIMALS).tolist()
+        end = np.round(self.end.astype(np.float64), TIME_DECIMALS).tolist()
+        phonemes = self.phonemes
+        return [
+            {"start": s, "end": e, "duration": e - s, "phoneme": phonemes[p], "viseme": v}
+            for s, e, p, v in zip(start, end, self.phoneme_id.tolist(), self.viseme.tolist())
+        ]
+
+    def to_compact(self) -> Dict[str, Any]:
+        """Dạng JSON mảng song song"""
+        return {
+            "phonemes": self.phonemes,
+            "start": np.round(self.start.astype(np.float64), TIME_DECIMALS).tolist(),
+            "end": np.round(self.end.astype(np.float64), TIME_DECIMALS).tolist(),
+            "phoneme": self.phoneme_id.tolist(),
+            "viseme": self.viseme.tolist(),
+        }
+
+    def to_binary(self, meta: Optional[Dict[str, Any]] = None) -> bytes:
+        """Đóng gói timeline thành blob little-endian (xem docstring của module)"""
+        table = b"".join(struct.pack("<H", len(b)) + b
+                         for b in (p.encode("utf-8") for p in self.phonemes))
+        meta_bytes = json.dumps(meta or {}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        count = len(self)
+        padding = (-count) % 4
+
+        return b"".join((
+            BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, count, len(self.phonemes), len(table),
+                               len(meta_bytes)),
+            self.start.astype("<f4").tobytes(),
+            self.end.astype("<f4").tobytes(),
+            self.phoneme_id.astype("<u2").tobytes(),
+            self.viseme.astype("u1").tobytes(),
+            b"\0" * padding,
+            table,
+            meta_bytes,
+        ))
+
+    @classmethod
+    def from_binary(cls, blob: bytes) -> "ColumnarTimeline":
+        """Đọc lại blob do to_binary tạo ra (dùng cho client Python và kiểm thử)"""
+        magic, version, _, count, phoneme_count, table_bytes, meta_bytes = BINARY_HEADER.unpack_from(blob)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise TimelineFormatError("Not a viseme timeline blob")
+        offset = BINARY_HEADER.size
+        start = np.frombuffer(blob, dtype="<f4", count=count, offset=offset)
+        offset += 4 * count
+        end = np.frombuffer(blob, dtype="<f4", count=count, offset=offset)
+        offset += 4 * count
+        phoneme_id = np.frombuffer(blob, dtype="<u2", count=count, offset=offset)
+        offset += 2 * count
+        viseme = np.frombuffer(blob, dtype="u1", count=count, offset=offset)
+        offset += count + (-count) % 4
+
+        phonemes = []
+        for _ in range(phoneme_count):
+            (length,) = struct.unpack_from("<H", blob, offset)
+            phonemes.append(blob[offset + 2:offset + 2 + length].decode("utf-8"))
+            offset += 2 + length
+        return cls(start, end, viseme, phoneme_id, phonemes)
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """Chọn định dạng response từ tham số `format` hoặc header Accept (mặc định json)"""
+    if requested:
+        fmt = requested.lower()
+        if fmt not in TIMELINE_FORMATS:
+            raise TimelineFormatError(f"Unsupported format: {requested}. Supported formats: "
+                                      f"{', '.join(TIMELINE_FORMATS)}")
+    else:
+        fmt = "json"
+        for media_range in (accept or "").split(","):
+            media_type = media_range.split(";")[0].strip().lower()
+            if media_type in ACCEPT_FORMATS:
+                fmt = ACCEPT_FORMATS[media_type]
+                break
+            if media_type in ("application/json", "*/*"):
+                break
+
+    if fmt == "msgpack" and msgpack is None:
+        raise TimelineFormatError("MessagePack output requires the msgpack package")
+    return fmt
+
+
+def encode_response(response: Dict[str, Any], fmt: str) -> bytes:
+    """Mã hóa response có `viseme_timeline` là ColumnarTimeline theo định dạng compact/msgpack/binary"""
+    timeline: ColumnarTimeline = response["viseme_timeline"]
+    if fmt == "binary":
+        meta = {k: v for k, v in response.items() if k != "viseme_timeline"}
+        return timeline.to_binary(meta)
+
+    body = dict(response, viseme_timeline=timeline.to_compact(), timeline_format="compact")
+    if fmt == "msgpack":
+        return msgpack.packb(body, use_bin_type=True)
+    return json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
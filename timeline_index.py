@@ -0,0 +1,270 @@
+"""
+Timeline Index
+--------------------------------
+Tier từ và câu gắn với timeline viseme, cùng chỉ mục đã sắp xếp để truy vấn theo thời gian.
+
+- Tier từ lấy từ tier `words` của MFA (bỏ khoảng lặng <eps>/sil), mỗi từ trỏ tới dải phone
+  [phone_start, phone_end) trong viseme_timeline
+- Tier câu (tùy chọn): ghép từ của MFA với transcript gốc bằng difflib, ngắt câu theo dấu . ! ? …
+- TimelineIndex: truy vấn "viseme trong [t0, t1)", "từ tại thời điểm t" bằng tìm kiếm nhị phân (bisect)
+- TimelineStore: lưu timeline theo request_id (tầng đĩa dùng chung giữa các worker qua AlignmentCache,
+  tầng bộ nhớ giữ chỉ mục đã dựng)
+"""
+
+import re
+import time
+import logging
+import difflib
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from alignment_cache import AlignmentCache
+
+logger = logging.getLogger(__name__)
+
+# Nhãn khoảng lặng trong tier words của MFA
+SILENCE_WORDS = {"", "<eps>", "sil", "<sil>", "sp"}
+SENTENCE_END_PATTERN = re.compile(r"[.!?…]+[\"'”’)\]]*$")
+# Sai số thời gian khi so khớp biên của từ và phone (MFA làm tròn tới mili giây)
+TIME_EPSILON = 1e-6
+
+
+def normalize_token(token: str) -> str:
+    """Token để so khớp từ của MFA với transcript: chữ thường, bỏ dấu câu"""
+    return "".join(c for c in token.lower() if c.isalnum() or c == "'")
+
+
+def build_word_tier(mfa_data: Dict[str, Any], phone_starts: Sequence[float]) -> List[Dict[str, Any]]:
+    """Tier từ của MFA (không gồm khoảng lặng), mỗi từ kèm dải chỉ số phone [phone_start, phone_end)"""
+    words = []
+    for start, end, label in mfa_data.get("tiers", {}).get("words", {}).get("entries", []):
+        if label in SILENCE_WORDS:
+            continue
+        words.append({
+            "start": start,
+            "end": end,
+            "word": label,
+            "phone_start": bisect_left(phone_starts, start - TIME_EPSILON),
+            "phone_end": bisect_left(phone_starts, end - TIME_EPSILON),
+        })
+    return words
+
+
+def split_sentences(transcript: str) -> List[Tuple[str, List[str]]]:
+    """Tách transcript thành các câu, trả về (văn bản câu, các token đã chuẩn hóa)"""
+    sentences = []
+    tokens: List[str] = []
+    for token in transcript.split():
+        tokens.append(token)
+        if SENTENCE_END_PATTERN.search(token):
+            sentences.append(tokens)
+            tokens = []
+    if tokens:
+        sentences.append(tokens)
+    return [(" ".join(tokens), [normalize_token(t) for t in tokens]) for tokens in sentences]
+
+
+def build_sentence_tier(words: List[Dict[str, Any]], transcript: str) -> List[Dict[str, Any]]:
+    """
+    Nhóm các từ thành câu theo dấu câu của transcript, kèm dải chỉ số từ [word_start, word_end).
+    Từ của MFA được ghép với token của transcript bằng difflib (chịu được <unk>, từ bị tách/gộp);
+    từ không ghép được thuộc về câu của từ ghép được liền trước.
+    """
+    sentences = split_sentences(transcript)
+    if not words or not sentences:
+        return []
+
+    token_sentence = [index for index, (_, tokens) in enumerate(sentences) for _ in tokens]
+    transcript_tokens = [token for _, tokens in sentences for token in tokens]
+    word_tokens = [normalize_token(word["word"]) for word in words]
+
+    owner: List[Optional[int]] = [None] * len(words)
+    matcher = difflib.SequenceMatcher(None, transcript_tokens, word_tokens, autojunk=False)
+    for block in matcher.get_matching_blocks():
+        for offset in range(block.size):
+            owner[block.b + offset] = token_sentence[block.a + offset]
+
+    # Từ không ghép được: theo câu của từ liền trước (hoặc liền sau nếu ở đầu)
+    first_known = next((value for value in owner if value is not None), 0)
+    current = first_known
+    for i, value in enumerate(owner):
+        if value is None or value < current:
+            owner[i] = current
+        else:
+            current = value
+
+    tier = []
+    word_start = 0
+    for i in range(1, len(words) + 1):
+        if i == len(words) or owner[i] != owner[word_start]:
+            tier.append({
+                "start": words[word_start]["start"],
+                "end": words[i - 1]["end"],
+                "text": sentences[owner[word_start]][0],
+                "word_start": word_start,
+                "word_end": i,
+            })
+            word_start = i
+    return tier
+
+
+class TimelineIndex:
+    """Timeline viseme kèm tier từ/câu, truy vấn theo thời gian bằng bisect"""
+
+    def __init__(self, language: str, phones: Dict[str, List[Any]], words: List[Dict[str, Any]],
+                 sentences: List[Dict[str, Any]], duration: Optional[float] = None,
+                 transcript: Optional[str] = None, audio_hash: Optional[str] = None):
+        self.language = language
+        self.transcript = transcript
+        self.audio_hash = audio_hash
+        self.phones = phones
+        self.words = words
+        self.sentences = sentences
+        self.duration = duration if duration is not None else (phones["end"][-1] if phones["end"] else 0.0)
+
+        # Chỉ mục: start tăng dần; end lấy max lũy kế để bisect đúng cả khi các khoảng chồng nhau
+        self._phone_starts = phones["start"]
+        self._phone_ends = list(accumulate(phones["end"], max))
+        self._word_starts = [word["start"] for word in words]
+        self._word_ends = list(accumulate((word["end"] for word in words), max))
+        self._sentence_starts = [sentence["start"] for sentence in sentences]
+
+    @classmethod
+    def from_alignment(cls, mfa_data: Dict[str, Any], visemes: Sequence[int], language: str,
+                       transcript: Optional[str] = None, audio_hash: Optional[str] = None) -> "TimelineIndex":
+        """Dựng chỉ mục từ dữ liệu alignment MFA và viseme của từng phone"""
+        phone_entries = mfa_data["tiers"]["phones"]["entries"]
+        phones = {
+            "start": [entry[0] for entry in phone_entries],
+            "end": [entry[1] for entry in phone_entries],
+            "phoneme": [entry[2] for entry in phone_entries],
+            "viseme": [int(v) for v in visemes],
+        }
+        words = build_word_tier(mfa_data, phones["start"])
+        sentences = build_sentence_tier(words, transcript) if transcript else []
+        return cls(language, phones, words, sentences, mfa_data.get("end"), transcript, audio_hash)
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {
+            "language": self.language,
+            "duration": self.duration,
+            "phones": self.phones,
+            "words": self.words,
+            "sentences": self.sentences,
+            "transcript": self.transcript,
+            "audio_hash": self.audio_hash,
+        }
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> "TimelineIndex":
+        return cls(payload["language"], payload["phones"], payload["words"], payload["sentences"],
+                   payload.get("duration"), payload.get("transcript"), payload.get("audio_hash"))
+
+    def to_alignment(self) -> Dict[str, Any]:
+        """Dữ liệu alignment định dạng MFA (tier words không gồm khoảng lặng) để align lại một phần"""
+        phones = self.phones
+        return {
+            "start": 0,
+            "end": self.duration,
+            "tiers": {
+                "words": {"type": "IntervalTier",
+                          "entries": [[word["start"], word["end"], word["word"]] for word in self.words]},
+                "phones": {"type": "IntervalTier",
+                           "entries": [list(entry) for entry in zip(phones["start"], phones["end"], phones["phoneme"])]},
+            },
+        }
+
+    def __len__(self) -> int:
+        return len(self._phone_starts)
+
+    def phone_range(self, t0: float, t1: float) -> Tuple[int, int]:
+        """Dải chỉ số [i, j) của các phone giao với khoảng [t0, t1)"""
+        i = bisect_right(self._phone_ends, t0)
+        j = bisect_left(self._phone_starts, t1)
+        return i, max(i, j)
+
+    def word_range(self, t0: float, t1: float) -> Tuple[int, int]:
+        """Dải chỉ số [i, j) của các từ giao với khoảng [t0, t1)"""
+        i = bisect_right(self._word_ends, t0)
+        j = bisect_left(self._word_starts, t1)
+        return i, max(i, j)
+
+    def visemes(self, i: int, j: int) -> List[Dict[str, Any]]:
+        """Các phone [i, j) dưới dạng dict như viseme_timeline của response"""
+        phones = self.phones
+        return [
+            {
+                "index": k,
+                "start": phones["start"][k],
+                "end": phones["end"][k],
+                "duration": phones["end"][k] - phones["start"][k],
+                "phoneme": phones["phoneme"][k],
+                "viseme": phones["viseme"][k],
+            }
+            for k in range(i, j)
+        ]
+
+    def visemes_between(self, t0: float, t1: float) -> List[Dict[str, Any]]:
+        return self.visemes(*self.phone_range(t0, t1))
+
+    def words_between(self, t0: float, t1: float) -> List[Dict[str, Any]]:
+        i, j = self.word_range(t0, t1)
+        return [{"index": k, **self.words[k]} for k in range(i, j)]
+
+    def word_at(self, t: float) -> Optional[Dict[str, Any]]:
+        """Từ đang được nói tại thời điểm t (None nếu t rơi vào khoảng lặng)"""
+        k = bisect_right(self._word_starts, t) - 1
+        if k < 0 or t >= self.words[k]["end"]:
+            return None
+        return {"index": k, **self.words[k]}
+
+    def sentence_at(self, t: float) -> Optional[Dict[str, Any]]:
+        """Câu chứa thời điểm t (None nếu không có tier câu hoặc t nằm ngoài mọi câu)"""
+        k = bisect_right(self._sentence_starts, t) - 1
+        if k < 0 or t >= self.sentences[k]["end"]:
+            return None
+        return {"index": k, **self.sentences[k]}
+
+
+class TimelineStore:
+    """Lưu TimelineIndex theo request_id: đĩa (AlignmentCache, có TTL và giới hạn dung lượng) + LRU bộ nhớ"""
+
+    def __init__(self, storage: AlignmentCache, memory_entries: int = 64):
+        self.storage = storage
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def put(self, request_id: str, index: TimelineIndex):
+        self.storage.put(request_id, index.to_payload())
+        self._remember(request_id, index, time.time())
+
+    def get(self, request_id: str) -> Optional[TimelineIndex]:
+        entry = self._memory.get(request_id)
+        if entry is not None:
+            stored_at, index = entry
+            if time.time() - stored_at <= self.storage.ttl:
+                self._memory.move_to_end(request_id)
+                return index
+            del self._memory[request_id]
+        payload = self.storage.get(request_id)
+        if payload is None:
+            return None
+        try:
+            index = TimelineIndex.from_payload(payload)
+        except (KeyError, TypeError) as e:
+            logger.warning(f"Invalid stored timeline {request_id}: {e}")
+            return None
+        # Thời điểm lưu thật nằm trên đĩa; tính TTL bộ nhớ từ lúc nạp lại là đủ cho LRU
+        self._remember(request_id, index, time.time())
+        return index
+
+    def _remember(self, request_id: str, index: TimelineIndex, stored_at: float):
+        self._memory[request_id] = (stored_at, index)
+        self._memory.move_to_end(request_id)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"memory_entries": len(self._memory), **self.storage.stats()}
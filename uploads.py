@@ -0,0 +1,144 @@
+"""
+Streaming Uploads
+--------------------------------
+Ghi tệp upload xuống đĩa theo từng chunk thay vì đọc toàn bộ vào bộ nhớ.
+Trong cùng một lần đọc: giới hạn kích thước, nhận dạng định dạng audio từ chunk đầu tiên
+(đọc thêm header nếu là WAV) và tính hash SHA-256 tăng dần (dùng cho cache alignment).
+"""
+
+import struct
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import aiofiles
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Tệp upload vượt quá kích thước cho phép"""
+
+
+class InvalidAudioError(Exception):
+    """Tệp upload không phải audio hợp lệ"""
+
+
+class SavedUpload:
+    """Thông tin tệp upload đã lưu"""
+
+    def __init__(self, path: Path, size: int, sha256: str, audio_info: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.audio_info = audio_info or {}
+
+
+def sniff_audio_format(data: bytes) -> Optional[str]:
+    """Nhận dạng định dạng audio từ các byte đầu tiên, None nếu không nhận ra"""
+    if len(data) >= 12 and data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        return "wav"
+    if data[:4] == b"fLaC":
+        return "flac"
+    if data[:4] == b"OggS":
+        return "ogg"
+    if len(data) >= 12 and data[:4] == b"FORM" and data[8:12] in (b"AIFF", b"AIFC"):
+        return "aiff"
+    if data[4:8] == b"ftyp":
+        return "m4a"
+    if data[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    if data[:3] == b"ID3":
+        return "mp3"
+    if len(data) >= 2 and data[0] == 0xFF:
+        # ADTS (AAC) và frame MPEG audio đều bắt đầu bằng 11-12 bit đồng bộ
+        if data[1] & 0xF6 == 0xF0:
+            return "aac"
+        if data[1] & 0xE0 == 0xE0:
+            return "mp3"
+    return None
+
+
+def parse_wav_header(data: bytes) -> Dict[str, Any]:
+    """Đọc thông tin định dạng từ header WAV (RIFF), raise InvalidAudioError nếu không hợp lệ"""
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise InvalidAudioError("Audio file is not a RIFF/WAVE file")
+
+    info: Dict[str, Any] = {"format": "wav"}
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack("<I", data[offset + 4:offset + 8])[0]
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            if body + 16 > len(data):
+                break
+            audio_format, channels, sample_rate, byte_rate, block_align, bits = struct.unpack(
+                "<HHIIHH", data[body:body + 16]
+            )
+            info.update({
+                "audio_format": audio_format,
+                "channels": channels,
+                "sample_rate": sample_rate,
+                "bits_per_sample": bits,
+                "byte_rate": byte_rate,
+            })
+        elif chunk_id == b"data":
+            info["data_bytes"] = chunk_size
+            break
+        # Các chunk RIFF được căn theo số byte chẵn
+        offset = body + chunk_size + (chunk_size & 1)
+
+    if "sample_rate" not in info:
+        raise InvalidAudioError("WAV header has no fmt chunk")
+    if info["channels"] == 0 or info["sample_rate"] == 0:
+        raise InvalidAudioError("WAV header has invalid channel count or sample rate")
+    if "data_bytes" in info and info["byte_rate"]:
+        info["duration"] = info["data_bytes"] / info["byte_rate"]
+    return info
+
+
+async def save_upload_streaming(
+    upload: UploadFile,
+    dest: Path,
+    max_bytes: int,
+    validate_audio: bool = True,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> SavedUpload:
+    """
+    Ghi tệp upload xuống dest theo từng chunk, tính SHA-256 và kiểm tra định dạng audio
+    (WAV, MP3, FLAC, OGG, ...; với WAV kiểm tra cả header).
+    Tệp dở dang bị xóa nếu vượt kích thước hoặc không hợp lệ.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    audio_info = None
+
+    try:
+        async with aiofiles.open(dest, "wb") as out_file:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                if size == 0 and validate_audio:
+                    audio_format = sniff_audio_format(chunk)
+                    if audio_format is None:
+                        raise InvalidAudioError("Unsupported or unrecognized audio format")
+                    audio_info = parse_wav_header(chunk) if audio_format == "wav" else {"format": audio_format}
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds the maximum size of {max_bytes} bytes")
+                digest.update(chunk)
+                await out_file.write(chunk)
+
+        if size == 0:
+            raise InvalidAudioError("Uploaded file is empty")
+    except Exception:
+        dest.unlink(missing_ok=True)
+        raise
+
+    return SavedUpload(dest, size, digest.hexdigest(), audio_info)
@@ -0,0 +1,73 @@
+"""
+Phoneme to Viseme Mapper
+--------------------------------
+Bộ chuyển đổi phoneme sang viseme được dựng một lần từ bảng mapping của mỗi ngôn ngữ.
+
+- Bảng loại bỏ ký tự thanh điệu/độ dài được biên dịch sẵn (str.translate thay cho regex)
+- Ghi nhớ kết quả của mọi phoneme đã gặp, kể cả kết quả fallback
+- Chuyển cả một tier phone trong một lần gọi thành mảng uint8
+- Phoneme không có trong bảng chỉ được log một lần, số lần xuất hiện được cộng dồn
+"""
+
+import logging
+from collections import Counter
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Các ký tự đánh dấu thanh điệu và độ dài bị loại bỏ khi phoneme tiếng Việt không có trong bảng
+VIETNAMESE_STRIP_CHARS = "ː˦˥˨ˀ˩̚ʷw͡"
+
+DEFAULT_VISEME = 0
+
+
+class PhonemeVisemeMapper:
+    """Bảng tra phoneme -> viseme đã biên dịch cho một ngôn ngữ"""
+
+    def __init__(self, language: str, phoneme_to_viseme: Dict[str, int], strip_chars: Optional[str] = None,
+                 default_viseme: int = DEFAULT_VISEME):
+        self.language = language
+        self.default_viseme = default_viseme
+        self._mapping = dict(phoneme_to_viseme)
+        self._strip_table = str.maketrans("", "", strip_chars) if strip_chars else None
+        # Bảng ghi nhớ: ban đầu là bảng mapping, sau đó thêm dần các phoneme đã được giải quyết
+        self._memo: Dict[str, int] = dict(self._mapping)
+        self._unknown = Counter()
+
+    def _resolve(self, phoneme: str) -> int:
+        """Tìm viseme cho phoneme chưa có trong bảng ghi nhớ và ghi nhớ kết quả"""
+        if self._strip_table is not None:
+            simplified = phoneme.translate(self._strip_table)
+            if simplified in self._mapping:
+                viseme = self._mapping[simplified]
+                self._memo[phoneme] = viseme
+                return viseme
+
+        if self._unknown[phoneme] == 0:
+            logger.warning(f"No viseme mapping found for phoneme: {phoneme} in {self.language}, "
+                           f"using default {self.default_viseme}")
+        self._unknown[phoneme] += 1
+        return self.default_viseme
+
+    def map(self, phoneme: str) -> int:
+        """Chuyển một phoneme sang viseme"""
+        viseme = self._memo.get(phoneme)
+        if viseme is None:
+            return self._resolve(phoneme)
+        return viseme
+
+    def map_many(self, phonemes: Sequence[str]) -> np.ndarray:
+        """Chuyển cả một tier phone sang mảng viseme uint8"""
+        memo = self._memo
+        resolve = self._resolve
+        return np.fromiter(
+            (memo[p] if p in memo else resolve(p) for p in phonemes),
+            dtype=np.uint8,
+            count=len(phonemes),
+        )
+
+    def unknown_counts(self) -> Dict[str, int]:
+        """Số lần xuất hiện của từng phoneme không có trong bảng mapping"""
+        return dict(self._unknown)